@@ -3,26 +3,76 @@
 #------------------------------------------
 
 #IMPORTACOES
-from fastapi import FastAPI
+import os
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from fastapi import FastAPI, Header, HTTPException
 import uvicorn
 from pydantic import BaseModel, Field
 
-#instancia da API
-app = FastAPI(title = "Conta bancária - Conta Corrente")
+from livro_razao import ChaveReutilizada, ContaInexistente, LivroRazao, SaldoInsuficiente, centavos
 
-#Adicionar clientes
+#Adicionar clientes (saldo de abertura; depois disso o que vale é o livro razão em disco)
 db_clientes = {
     'João': 1000,
     'Maria': 2000,
     'Pedro': 3000,
 }
 
+#Livro razão: saldos em centavos, cada movimentação gravada (com fsync) antes da resposta
+#Aberto no ciclo de vida, e não no import: com reload=True o processo que vigia os arquivos
+#também importa este módulo, e o log só pode ter um escritor
+livro: Optional[LivroRazao] = None
+
+
+@asynccontextmanager
+async def ciclo_de_vida(app):
+    global livro
+    livro = LivroRazao(
+        os.getenv("LIVRO_RAZAO_DIR", "tmp/livro_razao"),
+        saldos_iniciais={cliente: centavos(saldo) for cliente, saldo in db_clientes.items()},
+    )
+    yield
+    livro.fechar()
+
+
+#instancia da API
+app = FastAPI(title = "Conta bancária - Conta Corrente", lifespan=ciclo_de_vida)
+
 #criar uma classe para movimentacoes (saque, deposito) obs: usar Pydantic (para não acontecer erros)
 class Movimentacao(BaseModel):
     cliente: str = Field(..., description="Nome do cliente")
     valor: float = Field(..., description="Valor da movimentação", gt=0)
     tipo: str = Field(..., description="Tipo de movimentação")
 
+
+class Lote(BaseModel):
+    movimentacoes: List[Movimentacao] = Field(..., description="Movimentações aplicadas juntas (todas ou nenhuma)", min_length=1)
+
+
+def sinal(movimentacao: Movimentacao, tipo: str) -> int:
+    valor = centavos(movimentacao.valor)
+    return -valor if tipo == "saque" else valor
+
+
+async def movimentar(movimentos, chave: Optional[str]):
+    """Manda para o livro razão e traduz os erros para HTTP."""
+    try:
+        return await livro.amovimentar(movimentos, chave)
+    except ContaInexistente as erro:
+        raise HTTPException(status_code=404, detail=f"Cliente {erro.args[0]} não encontrado")
+    except SaldoInsuficiente as erro:
+        raise HTTPException(status_code=422, detail=str(erro))
+    except ChaveReutilizada as erro:
+        raise HTTPException(status_code=409, detail=str(erro))
+
+
+async def movimentacao_unica(movimentacao: Movimentacao, tipo: str, chave: Optional[str]):
+    valor = sinal(movimentacao, tipo)
+    resultado = await movimentar([(movimentacao.cliente, valor)], chave)
+    return {"message": {"cliente": movimentacao.cliente, "valor_movimentacao": valor / 100, "saldo": resultado.saldos[0] / 100}}
+
 #Criar um endpoint Home
 @app.get("/")
 def read_root():
@@ -31,20 +81,44 @@ def read_root():
 #Criar um endpoint para consultar o saldo
 @app.post("/saldo/")
 def read_saldo(cliente: str):
-    return {"message": f"Saldo do cliente {cliente} é de {db_clientes[cliente]}"}
+    try:
+        saldo = livro.saldo(cliente)
+    except ContaInexistente:
+        raise HTTPException(status_code=404, detail=f"Cliente {cliente} não encontrado")
+    return {"message": f"Saldo do cliente {cliente} é de {saldo / 100}"}
 
-#Criar um endpoint para sacar
+#Criar um endpoint para sacar (sem cheque especial: saldo insuficiente -> 422)
+#Header Idempotency-Key: reenviar a mesma requisição não saca duas vezes
 @app.post("/saque/")
-def saque(movimentacao: Movimentacao):
-    db_clientes[movimentacao.cliente] -= movimentacao.valor
-    return {"message": {"cliente": movimentacao.cliente, "valor_movimentacao": -movimentacao.valor, "saldo": db_clientes[movimentacao.cliente]}}
+async def saque(movimentacao: Movimentacao, idempotency_key: Optional[str] = Header(None)):
+    return await movimentacao_unica(movimentacao, "saque", idempotency_key)
 
 #Criar um endpoint para depositar
 @app.post("/deposito/")
-def deposito(movimentacao: Movimentacao):
-    db_clientes[movimentacao.cliente] += movimentacao.valor
-    return {"message": {"cliente": movimentacao.cliente, "valor_movimentacao": movimentacao.valor, "saldo": db_clientes[movimentacao.cliente]}}
+async def deposito(movimentacao: Movimentacao, idempotency_key: Optional[str] = Header(None)):
+    return await movimentacao_unica(movimentacao, "deposito", idempotency_key)
+
+#Criar um endpoint para várias movimentações de uma vez (ex.: transferência = saque + depósito)
+@app.post("/movimentacoes/")
+async def movimentacoes(lote: Lote, idempotency_key: Optional[str] = Header(None)):
+    for movimentacao in lote.movimentacoes:
+        if movimentacao.tipo not in ("saque", "deposito"):
+            raise HTTPException(status_code=422, detail=f"Tipo de movimentação inválido: {movimentacao.tipo}")
+    movimentos = [(m.cliente, sinal(m, m.tipo)) for m in lote.movimentacoes]
+    resultado = await movimentar(movimentos, idempotency_key)
+    return {"message": {
+        "transacao": resultado.seq,
+        "movimentacoes": [
+            {"cliente": cliente, "valor_movimentacao": valor / 100, "saldo": saldo / 100}
+            for (cliente, valor), saldo in zip(movimentos, resultado.saldos)
+        ],
+    }}
+
+#Estatísticas do livro razão (transações, fsyncs, transações por fsync, snapshots...)
+@app.get("/estatisticas/")
+def read_estatisticas():
+    return livro.estatisticas()
 
 
 if __name__ == "__main__":
-    uvicorn.run("exemplo2:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("exemplo2:app", host="0.0.0.0", port=8000, reload=True)
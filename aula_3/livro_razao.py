@@ -0,0 +1,462 @@
+#Livro razão da conta corrente
+#Log append-only com group commit (um fsync por lote), escritor único, chaves de idempotência e snapshots
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from hashlib import sha256
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("livro_razao")
+
+# Um movimento é (conta, valor em centavos): positivo = depósito, negativo = saque
+Movimento = Tuple[str, int]
+
+
+# ERROS =============================================================
+class ContaInexistente(KeyError):
+    pass
+
+
+class SaldoInsuficiente(ValueError):
+    pass
+
+
+class ChaveReutilizada(ValueError):
+    """A mesma chave de idempotência veio com outra movimentação."""
+
+
+@dataclass
+class Resultado:
+    seq: int                # posição da transação no log
+    saldos: List[int]       # saldo (centavos) de cada conta logo depois de cada movimento
+    repetida: bool = False  # True: chave de idempotência já vista, nada foi aplicado de novo
+
+
+def centavos(valor: float) -> int:
+    return round(valor * 100)
+
+
+def _linha(registro: dict) -> bytes:
+    # crc32 na frente: uma linha cortada por queda no meio da escrita é descartada na recuperação
+    corpo = json.dumps(registro, ensure_ascii=False, separators=(",", ":")).encode()
+    return b"%08x %s\n" % (zlib.crc32(corpo), corpo)
+
+
+def _ler_linha(linha: bytes) -> Optional[dict]:
+    crc, _, corpo = linha.rstrip(b"\n").partition(b" ")
+    try:
+        if int(crc, 16) != zlib.crc32(corpo):
+            return None
+        return json.loads(corpo)
+    except ValueError:
+        return None
+
+
+def _fsync_diretorio(diretorio: Path):
+    fd = os.open(diretorio, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# LIVRO RAZÃO =======================================================
+class LivroRazao:
+    """
+    Saldos em memória, duráveis em um log append-only.
+
+    - Escritor único: todas as movimentações passam por uma fila e uma só thread as aplica,
+      em ordem. Não há leitura-modifica-escrita concorrente, então não há atualização perdida,
+      e a checagem de saldo (sem cheque especial) vê sempre o saldo de verdade.
+    - Group commit: a thread pega tudo o que está na fila (até `max_lote`), escreve as linhas
+      e faz um único fsync para o lote. Quem chamou só recebe a resposta depois do fsync, e os
+      saldos novos só ficam visíveis para leitura depois dele também.
+    - Idempotência: uma movimentação com `chave` já aplicada devolve o resultado da primeira vez
+      (as últimas `max_chaves` chaves ficam guardadas; recusas não são guardadas).
+    - Lote atômico: `movimentar` recebe vários movimentos, que entram juntos ou nenhum entra
+      (ex.: transferência = saque de uma conta + depósito em outra).
+    - Snapshots: a cada `snapshot_a_cada` transações, os saldos vão para `snapshot.json` e os
+      segmentos antigos do log são apagados. A recuperação lê o snapshot e refaz só o resto.
+
+    Args:
+        diretorio: Onde ficam o log (wal-*.log) e o snapshot
+        saldos_iniciais: Contas abertas (em centavos) quando o livro ainda não existe
+        max_lote: Máximo de transações por fsync
+        snapshot_a_cada: Transações entre snapshots (0 = nunca)
+        max_chaves: Chaves de idempotência guardadas (as mais antigas saem primeiro)
+        fsync: False só para medir o custo do fsync (perde durabilidade)
+    """
+
+    def __init__(
+        self,
+        diretorio: str = "tmp/livro_razao",
+        saldos_iniciais: Optional[Dict[str, int]] = None,
+        max_lote: int = 1000,
+        snapshot_a_cada: int = 100_000,
+        max_chaves: int = 100_000,
+        fsync: bool = True,
+    ):
+        self.diretorio = Path(diretorio)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self.max_lote = max_lote
+        self.snapshot_a_cada = snapshot_a_cada
+        self.max_chaves = max_chaves
+        self.fsync = fsync
+        self._saldos: Dict[str, int] = {}
+        self._chaves: "OrderedDict[str, Tuple[str, Resultado]]" = OrderedDict()
+        self._seq = 0
+        self._estatisticas = {"transacoes": 0, "recusadas": 0, "repetidas": 0, "fsyncs": 0, "lotes": 0,
+                              "snapshots": 0, "recuperacao_s": 0.0, "recuperadas": 0}
+
+        inicio = time.perf_counter()
+        self._recuperar()
+        self._estatisticas["recuperacao_s"] = time.perf_counter() - inicio
+        self._desde_snapshot = 0
+        self._quebrado: Optional[OSError] = None
+        self._log = open(self.diretorio / f"wal-{self._seq + 1:012d}.log", "ab")
+        if self._seq == 0 and saldos_iniciais:
+            self._gravar([self._aplicar({"seq": 1, "movs": list(saldos_iniciais.items()), "abrir": True}, {})])
+            self._saldos.update(saldos_iniciais)
+            self._seq = 1
+
+        self._fila: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._escritor = threading.Thread(target=self._escrever, name="livro-razao", daemon=True)
+        self._escritor.start()
+
+    # RECUPERAÇÃO ---------------------------------------------------
+    def _recuperar(self):
+        snapshot = self.diretorio / "snapshot.json"
+        if snapshot.exists():
+            dados = json.loads(snapshot.read_text(encoding="utf-8"))
+            self._seq = dados["seq"]
+            self._saldos = dados["saldos"]
+            for chave, (hash_, seq, saldos) in dados["chaves"]:
+                self._chaves[chave] = (hash_, Resultado(seq, saldos, repetida=True))
+        segmentos = sorted(self.diretorio.glob("wal-*.log"))
+        for i, segmento in enumerate(segmentos):
+            valido = self._refazer(segmento)
+            if valido is None:
+                continue
+            # Linha cortada (queda no meio da escrita) ou buraco na sequência: nada depois disso vale.
+            # O segmento é cortado no último registro bom (o escritor vai continuar a partir dali)
+            # e os seguintes saem do caminho, para a próxima recuperação não refazê-los.
+            logger.warning(f"{segmento.name}: log cortado em {valido} bytes (registro incompleto ou fora de sequência)")
+            with open(segmento, "r+b") as f:
+                f.truncate(valido)
+                os.fsync(f.fileno())
+            for seguinte in segmentos[i + 1:]:
+                logger.warning(f"{seguinte.name}: segmento depois do corte descartado")
+                seguinte.rename(seguinte.with_suffix(".descartado"))
+            _fsync_diretorio(self.diretorio)
+            break
+
+    def _refazer(self, segmento: Path) -> Optional[int]:
+        """Refaz os registros do segmento. Returns: None se ele está inteiro, ou o tamanho da parte válida."""
+        valido = 0
+        with open(segmento, "rb") as f:
+            for linha in f:
+                registro = _ler_linha(linha) if linha.endswith(b"\n") else None
+                if registro is None:
+                    return valido
+                if registro["seq"] > self._seq + 1:
+                    return valido
+                if registro["seq"] == self._seq + 1:  # <= seq: já está no snapshot
+                    novos: Dict[str, int] = {}
+                    self._aplicar(registro, novos)
+                    self._saldos.update(novos)
+                    self._seq = registro["seq"]
+                    self._estatisticas["recuperadas"] += 1
+                valido += len(linha)
+        return None
+
+    # APLICAÇÃO -----------------------------------------------------
+    def _saldo(self, conta: str, novos: Dict[str, int]) -> int:
+        saldo = novos.get(conta, self._saldos.get(conta))
+        if saldo is None:
+            raise ContaInexistente(conta)
+        return saldo
+
+    def _aplicar(self, registro: dict, novos: Dict[str, int]) -> dict:
+        """Aplica o registro em `novos` (saldos ainda não publicados). Tudo ou nada."""
+        tentativa: Dict[str, int] = {}
+        saldos = []
+        for conta, valor in registro["movs"]:
+            if registro.get("abrir"):
+                saldo = valor
+            else:
+                saldo = tentativa.get(conta, None)
+                saldo = (self._saldo(conta, novos) if saldo is None else saldo) + valor
+                if saldo < 0:
+                    raise SaldoInsuficiente(f"Saldo insuficiente na conta {conta}")
+            tentativa[conta] = saldo
+            saldos.append(saldo)
+        novos.update(tentativa)
+        registro["saldos"] = saldos
+        if registro.get("chave"):
+            self._lembrar(registro["chave"], registro["hash"], Resultado(registro["seq"], saldos, repetida=True))
+        return registro
+
+    def _lembrar(self, chave: str, hash_: str, resultado: Resultado):
+        self._chaves[chave] = (hash_, resultado)
+        self._chaves.move_to_end(chave)
+        while len(self._chaves) > self.max_chaves:
+            self._chaves.popitem(last=False)
+
+    # ESCRITOR ÚNICO ------------------------------------------------
+    def _gravar(self, registros: List[dict]):
+        self._log.write(b"".join(_linha({k: v for k, v in r.items() if k != "saldos"}) for r in registros))
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+            self._estatisticas["fsyncs"] += 1
+
+    def _escrever(self):
+        while True:
+            pedidos = [self._fila.get()]
+            while len(pedidos) < self.max_lote:
+                try:
+                    pedidos.append(self._fila.get_nowait())
+                except queue.Empty:
+                    break
+            fim = None in pedidos
+            pedidos = [p for p in pedidos if p is not None]
+
+            novos: Dict[str, int] = {}
+            registros, respostas = [], []
+            for movimentos, chave, hash_, futuro in pedidos:
+                if chave and chave in self._chaves:
+                    anterior, resultado = self._chaves[chave]
+                    if anterior != hash_:
+                        respostas.append((futuro, ChaveReutilizada(f"Chave de idempotência {chave} já usada com outra movimentação")))
+                    else:
+                        self._estatisticas["repetidas"] += 1
+                        respostas.append((futuro, resultado))
+                    continue
+                registro = {"seq": self._seq + 1, "movs": movimentos}
+                if chave:
+                    registro.update(chave=chave, hash=hash_)
+                try:
+                    self._aplicar(registro, novos)
+                except (ContaInexistente, SaldoInsuficiente) as erro:
+                    self._estatisticas["recusadas"] += 1
+                    respostas.append((futuro, erro))
+                    continue
+                self._seq += 1
+                registros.append(registro)
+                respostas.append((futuro, Resultado(registro["seq"], registro["saldos"])))
+
+            erro_gravacao = self._quebrado
+            if registros and erro_gravacao is None:
+                posicao = self._log.tell()
+                try:
+                    self._gravar(registros)
+                except OSError as erro:
+                    erro_gravacao = erro
+                    self._desfazer_gravacao(posicao)
+            if erro_gravacao is not None:
+                # Nada do lote ficou durável: descarta os saldos novos e avisa todo mundo
+                logger.error(f"Erro ao gravar o log: {erro_gravacao}")
+                self._seq -= len(registros)
+                for chave in (r.get("chave") for r in registros):
+                    self._chaves.pop(chave, None)
+                respostas = [(futuro, erro_gravacao) for futuro, _ in respostas]
+            else:
+                self._saldos.update(novos)  # publica: leitores só veem o que já está no disco
+                self._estatisticas["transacoes"] += len(registros)
+                self._estatisticas["lotes"] += 1
+                self._desde_snapshot += len(registros)
+
+            for futuro, resposta in respostas:
+                if isinstance(resposta, BaseException):
+                    futuro.set_exception(resposta)
+                else:
+                    futuro.set_result(resposta)
+
+            if self.snapshot_a_cada and self._desde_snapshot >= self.snapshot_a_cada:
+                self._snapshot()
+            if fim:
+                self._log.close()
+                return
+
+    def _desfazer_gravacao(self, posicao: int):
+        """
+        Tira do segmento o que um lote que falhou chegou a escrever: os mesmos números de sequência
+        vão ser usados de novo. Se nem isso der certo, o livro para de aceitar movimentações.
+        """
+        caminho = self._log.name
+        try:
+            try:
+                self._log.close()
+            except OSError:
+                pass  # o buffer que não foi para o disco é justamente o que queremos descartar
+            os.truncate(caminho, posicao)
+            self._log = open(caminho, "ab")
+        except OSError as erro:
+            logger.error(f"Livro razão parado: não deu para desfazer a escrita no log: {erro}")
+            self._quebrado = erro
+
+    def _snapshot(self):
+        """Abre um segmento novo, grava os saldos até `seq` e apaga os segmentos que ele cobre."""
+        self._desde_snapshot = 0
+        antigos = sorted(self.diretorio.glob("wal-*.log"))
+        try:
+            novo = open(self.diretorio / f"wal-{self._seq + 1:012d}.log", "ab")
+        except OSError as erro:
+            logger.error(f"Snapshot adiado, não deu para abrir um segmento novo do log: {erro}")
+            return
+        self._log.close()
+        self._log = novo
+        dados = {
+            "seq": self._seq,
+            "saldos": self._saldos,
+            "chaves": [[chave, [hash_, r.seq, r.saldos]] for chave, (hash_, r) in self._chaves.items()],
+        }
+        temporario = self.diretorio / "snapshot.json.tmp"
+        try:
+            with open(temporario, "w", encoding="utf-8") as f:
+                json.dump(dados, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporario, self.diretorio / "snapshot.json")
+            _fsync_diretorio(self.diretorio)
+        except OSError as erro:
+            # Os segmentos antigos continuam lá: a recuperação só fica mais longa
+            logger.error(f"Erro ao gravar o snapshot: {erro}")
+            return
+        for segmento in antigos:
+            try:
+                segmento.unlink()
+            except OSError as erro:
+                # O snapshot já vale: o segmento que sobrar é ignorado na recuperação (seq <= snapshot)
+                logger.error(f"Erro ao apagar o segmento {segmento.name}: {erro}")
+        self._estatisticas["snapshots"] += 1
+
+    # API -----------------------------------------------------------
+    def enviar(self, movimentos: Sequence[Movimento], chave: Optional[str] = None) -> Future:
+        """
+        Enfileira uma transação (um ou mais movimentos, atômicos). O Future resolve depois do fsync.
+
+        Args:
+            movimentos: [(conta, centavos)], positivo = depósito, negativo = saque
+            chave: Chave de idempotência (ex.: header Idempotency-Key)
+        """
+        movimentos = [[conta, int(valor)] for conta, valor in movimentos]
+        hash_ = sha256(json.dumps(movimentos, ensure_ascii=False).encode()).hexdigest()[:16] if chave else None
+        futuro: Future = Future()
+        self._fila.put((movimentos, chave, hash_, futuro))
+        return futuro
+
+    def movimentar(self, movimentos: Sequence[Movimento], chave: Optional[str] = None) -> Resultado:
+        return self.enviar(movimentos, chave).result()
+
+    async def amovimentar(self, movimentos: Sequence[Movimento], chave: Optional[str] = None) -> Resultado:
+        return await asyncio.wrap_future(self.enviar(movimentos, chave))
+
+    def saldo(self, conta: str) -> int:
+        if conta not in self._saldos:
+            raise ContaInexistente(conta)
+        return self._saldos[conta]
+
+    def saldos(self) -> Dict[str, int]:
+        return dict(self._saldos)
+
+    def estatisticas(self) -> Dict[str, float]:
+        dados = dict(self._estatisticas, seq=self._seq, contas=len(self._saldos), chaves=len(self._chaves))
+        dados["transacoes_por_fsync"] = round(dados["transacoes"] / dados["fsyncs"], 1) if dados["fsyncs"] else 0
+        return dados
+
+    def fechar(self):
+        """Termina o que está na fila e fecha o log."""
+        if self._escritor.is_alive():
+            self._fila.put(None)
+            self._escritor.join()
+
+
+# RUN ===========================================================
+if __name__ == "__main__":
+    # Benchmark de concorrência: muitas threads fazendo saques/depósitos aleatórios em poucas
+    # contas (muita disputa), com chaves de idempotência repetidas. No fim, confere que
+    # saldo final = saldo inicial + soma das transações aceitas, antes e depois de reabrir o livro.
+    import random
+    import shutil
+    import sys
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    n_transacoes = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    n_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    contas = {f"conta{i}": 10_000 for i in range(20)}
+
+    def rodar(fsync: bool):
+        diretorio = tempfile.mkdtemp(prefix="livro_razao_")
+        livro = LivroRazao(diretorio, saldos_iniciais=contas, snapshot_a_cada=n_transacoes // 3, fsync=fsync)
+        aceitas: List[List[Movimento]] = []
+        trava = threading.Lock()  # só para a lista de conferência do benchmark
+
+        def cliente(indice: int) -> Tuple[int, int]:
+            rng = random.Random(indice)
+            ok = recusadas = 0
+            for i in range(n_transacoes // n_threads):
+                origem, destino = rng.sample(list(contas), 2)
+                valor = rng.randint(1, 3_000)
+                movimentos = (
+                    [(origem, -valor), (destino, valor)] if rng.random() < 0.3  # transferência (lote atômico)
+                    else [(origem, rng.choice((-valor, valor)))]
+                )
+                chave = f"{indice}-{i}"
+                for _ in range(2 if rng.random() < 0.05 else 1):  # 5% reenviadas com a mesma chave
+                    try:
+                        resultado = livro.movimentar(movimentos, chave)
+                    except SaldoInsuficiente:
+                        recusadas += 1
+                        break
+                    if not resultado.repetida:
+                        ok += 1
+                        with trava:
+                            aceitas.append(movimentos)
+            return ok, recusadas
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(n_threads) as pool:
+            totais = list(pool.map(cliente, range(n_threads)))
+        duracao = time.perf_counter() - inicio
+        livro.fechar()
+
+        esperado = dict(contas)
+        for movimentos in aceitas:
+            for conta, valor in movimentos:
+                esperado[conta] += valor
+        consistente = livro.saldos() == esperado and min(esperado.values()) >= 0
+        estatisticas = livro.estatisticas()
+
+        reaberto = LivroRazao(diretorio)
+        recuperado = reaberto.saldos() == esperado
+        recuperacao = reaberto.estatisticas()
+        reaberto.fechar()
+        shutil.rmtree(diretorio)
+
+        ok = sum(t[0] for t in totais)
+        print(f"\n{'✅' if consistente and recuperado else '❌'} fsync={'sim' if fsync else 'não'}: "
+              f"{ok} transações aceitas, {sum(t[1] for t in totais)} recusadas (saldo insuficiente), "
+              f"{estatisticas['repetidas']} repetidas pela chave")
+        print(f"   {ok / duracao:,.0f} transações/s | {estatisticas['fsyncs']} fsyncs "
+              f"({estatisticas['transacoes_por_fsync']} transações por fsync) | {estatisticas['snapshots']} snapshots")
+        print(f"   sem atualização perdida: {'sim' if consistente else 'NÃO'} | "
+              f"recuperação igual: {'sim' if recuperado else 'NÃO'} "
+              f"({recuperacao['recuperadas']} transações refeitas do log em {recuperacao['recuperacao_s'] * 1000:.0f} ms)")
+
+    print(f"🚀 {n_transacoes} transações, {n_threads} threads, {len(contas)} contas")
+    rodar(fsync=True)
+    rodar(fsync=False)
@@ -0,0 +1,153 @@
+#Controle de admissão para endpoints assíncronos
+#Limita quantas execuções rodam ao mesmo tempo e rejeita rápido quando a fila enche
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Dict, TypeVar
+
+from agno.os.utils import format_sse_event
+from agno.run.agent import RunErrorEvent
+from fastapi import HTTPException
+
+T = TypeVar("T")
+
+
+class ControleAdmissao:
+    """
+    Semáforo com fila limitada.
+
+    - Até `max_concorrentes` execuções ao mesmo tempo.
+    - Até `max_fila` requisições esperando vaga; a próxima recebe 503 na hora (com Retry-After).
+    - Quem espera mais de `timeout_fila` segundos na fila também recebe 503.
+    - Cada execução tem no máximo `timeout_execucao` segundos (504 se passar).
+    """
+
+    def __init__(
+        self,
+        max_concorrentes: int = 200,
+        max_fila: int = 500,
+        timeout_fila: float = 10.0,
+        timeout_execucao: float = 120.0,
+        status_rejeicao: int = 503,
+    ):
+        self.max_concorrentes = max_concorrentes
+        self.max_fila = max_fila
+        self.timeout_fila = timeout_fila
+        self.timeout_execucao = timeout_execucao
+        self.status_rejeicao = status_rejeicao
+        self._semaforo = asyncio.Semaphore(max_concorrentes)
+        self.em_execucao = 0
+        self.na_fila = 0
+        self.rejeitadas = 0
+        self.expiradas = 0
+
+    def _rejeitar(self, motivo: str):
+        self.rejeitadas += 1
+        raise HTTPException(status_code=self.status_rejeicao, detail=motivo, headers={"Retry-After": "1"})
+
+    async def entrar(self):
+        """Ocupa uma vaga (ou levanta HTTPException). Quem entra precisa chamar `sair()`."""
+        if self._semaforo.locked() and self.na_fila >= self.max_fila:
+            self._rejeitar("Servidor ocupado: fila de espera cheia")
+        self.na_fila += 1
+        try:
+            await asyncio.wait_for(self._semaforo.acquire(), timeout=self.timeout_fila)
+        except asyncio.TimeoutError:
+            self._rejeitar("Servidor ocupado: tempo de espera na fila esgotado")
+        finally:
+            self.na_fila -= 1
+        self.em_execucao += 1
+
+    def sair(self):
+        self.em_execucao -= 1
+        self._semaforo.release()
+
+    @asynccontextmanager
+    async def vaga(self):
+        await self.entrar()
+        try:
+            yield
+        finally:
+            self.sair()
+
+    async def executar(self, coro: Awaitable[T]) -> T:
+        """Executa a corrotina ocupando uma vaga e respeitando `timeout_execucao`."""
+        try:
+            await self.entrar()
+        except HTTPException:
+            # Rejeitada na fila: a corrotina nunca vai rodar
+            if asyncio.iscoroutine(coro):
+                coro.close()
+            raise
+        try:
+            return await asyncio.wait_for(coro, timeout=self.timeout_execucao)
+        except asyncio.TimeoutError:
+            self.expiradas += 1
+            raise HTTPException(status_code=504, detail="Tempo limite da execução esgotado")
+        finally:
+            self.sair()
+
+    async def admitir_stream(self, eventos: AsyncIterator[str]) -> AsyncIterator[str]:
+        """
+        Ocupa uma vaga para um stream (ex.: SSE) e devolve o stream que a libera ao terminar.
+
+        Deve ser aguardado ANTES de montar a `StreamingResponse`: com o servidor lotado a
+        requisição recebe 503 com Retry-After (HTTPException), e não um 200 com evento de erro.
+        A vaga é liberada no `finally` do gerador; se o corpo nunca chegar a ser lido (cliente
+        caiu antes), ela é liberada depois de `timeout_fila` segundos. O timeout de execução vale
+        para o stream inteiro e fecha o stream de origem.
+        """
+        try:
+            await self.entrar()
+        except HTTPException:
+            # Rejeitado: o stream de origem nunca vai ser lido
+            await _fechar(eventos)
+            raise
+
+        liberada = False
+
+        def liberar():
+            nonlocal liberada
+            if not liberada:
+                liberada = True
+                self.sair()
+
+        nunca_lido = asyncio.get_running_loop().call_later(self.timeout_fila, liberar)
+
+        async def repassar() -> AsyncIterator[str]:
+            nunca_lido.cancel()
+            try:
+                if liberada:
+                    # Começou a ser lido depois do prazo: a vaga já foi devolvida
+                    yield format_sse_event(RunErrorEvent(content="Tempo de espera para iniciar o stream esgotado"))
+                    return
+                async with asyncio.timeout(self.timeout_execucao):
+                    async for evento in eventos:
+                        yield evento
+            except TimeoutError:
+                self.expiradas += 1
+                yield format_sse_event(RunErrorEvent(content="Tempo limite da execução esgotado"))
+            finally:
+                await _fechar(eventos)
+                liberar()
+
+        return repassar()
+
+    def estatisticas(self) -> Dict[str, int]:
+        return {
+            "em_execucao": self.em_execucao,
+            "na_fila": self.na_fila,
+            "max_concorrentes": self.max_concorrentes,
+            "max_fila": self.max_fila,
+            "rejeitadas": self.rejeitadas,
+            "expiradas": self.expiradas,
+        }
+
+
+async def _fechar(eventos: AsyncIterator[str]):
+    """Fecha o gerador de origem (se for um), liberando o que ele segura (ex.: o run do agente)."""
+    aclose = getattr(eventos, "aclose", None)
+    if aclose is not None:
+        await aclose()
@@ -0,0 +1,436 @@
+#Cache da camada de busca (retrieval)
+#Evita embeddar de novo a mesma consulta e repetir a busca no Chroma para a mesma consulta
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from copy import deepcopy
+from dataclasses import dataclass, replace
+from hashlib import md5, sha1
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from agno.knowledge.document import Document
+from agno.utils.log import log_debug, logger
+from agno.vectordb.chroma import ChromaDb
+from agno.vectordb.chroma.chromadb import reciprocal_rank_fusion
+from agno.vectordb.search import SearchType
+
+from indice_lexico import IndiceBM25
+from metricas import registrar
+
+
+class LRU:
+    """Dicionário LRU simples e seguro entre threads (o `search` do Chroma roda em threads)."""
+
+    def __init__(self, max_itens: int):
+        self.max_itens = max_itens
+        self._itens: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def buscar(self, chave):
+        with self._lock:
+            valor = self._itens.get(chave)
+            if valor is None:
+                self.misses += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.hits += 1
+            return valor
+
+    def gravar(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def __len__(self):
+        return len(self._itens)
+
+
+def copiar_documentos(documentos: List[Document]) -> List[Document]:
+    """
+    Cópias dos documentos para entrar ou sair do cache de resultados.
+
+    Quem recebe o resultado altera os documentos (ex.: `meta_data["rrf_score"]` na mescla dos
+    fragmentos, `reranking_score` no reranker); sem cópia, a alteração ficaria no cache e
+    apareceria na próxima busca. O embedder é compartilhado (não é copiado).
+    """
+    return [replace(doc, meta_data=deepcopy(doc.meta_data)) for doc in documentos]
+
+
+def impressao_digital(vetor: List[float]) -> str:
+    # Arredonda antes do hash: o mesmo texto pode voltar da API com diferenças na última casa
+    return sha1(np.round(np.asarray(vetor, dtype=np.float32), 5).tobytes()).hexdigest()
+
+
+@dataclass
+class _Busca:
+    """Estado de uma busca entre os passos comuns a `search` e `async_search`."""
+
+    query: str
+    limit: int
+    filters: Any
+    vetor: Optional[List[float]] = None
+    hit_embedding: bool = False
+    falta_embedding: bool = False
+    embed_s: float = 0.0
+    cache_s: float = 0.0
+    chave: Optional[Tuple] = None
+
+
+class ChromaDbComCache(ChromaDb):
+    """
+    ChromaDb com dois caches em memória na frente da busca:
+
+    1. consulta -> embedding (LRU): a mesma consulta não é embeddada de novo.
+    2. (impressão digital do embedding, k, filtros, tipo de busca, geração) -> documentos (LRU).
+
+    A geração muda a cada upsert/insert/delete feito por esta instância (ou via `invalidar()`,
+    chamado pela ingestão) e também quando `versao()` muda (ex.: `manifesto.geracao`, que vale
+    entre processos). Resultados de gerações antigas nunca são usados.
+
+    Com um `indice_lexico` (BM25), `search_type=SearchType.hybrid` funde a busca por embedding
+    com o BM25 (reciprocal rank fusion) e `SearchType.keyword` usa só o BM25, sem chamar a API
+    de embeddings. O índice é mantido nas escritas feitas por esta instância e pela ingestão.
+
+    Cada busca registra o tempo gasto em embedding, busca e cache (`ultimas_buscas`).
+    """
+
+    def __init__(
+        self,
+        *args,
+        max_consultas: int = 2048,
+        max_resultados: int = 1024,
+        versao: Callable[[], int] = lambda: 0,
+        indice_lexico: Optional[IndiceBM25] = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.versao = versao
+        self.indice_lexico = indice_lexico
+        self._geracao_local = 0
+        self._embeddings_consulta = LRU(max_consultas)
+        self._resultados = LRU(max_resultados)
+        self._sem_cache = 0
+        self.ultimas_buscas: deque = deque(maxlen=200)
+
+    # INVALIDAÇÃO ===============================================
+    def invalidar(self):
+        """Chamar sempre que a coleção mudar por fora desta instância (ex.: upsert direto no Chroma)."""
+        self._geracao_local += 1
+        self._resultados.limpar()
+
+    def geracao(self) -> Tuple[int, int]:
+        return self.versao(), self._geracao_local
+
+    def _indexar(self, documents: List[Document]):
+        # Mesmo ID que o ChromaDb do Agno usa (md5 do conteúdo)
+        if self.indice_lexico is not None:
+            conteudos = [doc.content.replace("\x00", "\ufffd") for doc in documents]
+            self.indice_lexico.adicionar((md5(c.encode()).hexdigest(), c) for c in conteudos)
+
+    def _reindexar(self):
+        # Deleções por nome/metadado: não sabemos os IDs apagados, então o índice é refeito
+        if self.indice_lexico is not None and self.exists():
+            self.indice_lexico.reconstruir(self.client.get_collection(name=self.collection_name))
+
+    def sincronizar_indice_lexico(self):
+        """Reconstrói o índice léxico se ele não bate com a coleção (ex.: coleção ingerida antes do índice)."""
+        if self.indice_lexico is None or not self.exists():
+            return
+        colecao = self.client.get_collection(name=self.collection_name)
+        if colecao.count() != len(self.indice_lexico):
+            print(f"🔤 Reconstruindo índice léxico ({colecao.count()} chunks)...")
+            self.indice_lexico.reconstruir(colecao)
+            self.invalidar()
+
+    def insert(self, content_hash: str, documents: List[Document], filters=None) -> None:
+        try:
+            super().insert(content_hash, documents, filters)
+            self._indexar(documents)
+        finally:
+            self.invalidar()
+
+    async def async_insert(self, content_hash: str, documents: List[Document], filters=None) -> None:
+        try:
+            await super().async_insert(content_hash, documents, filters)
+            self._indexar(documents)
+        finally:
+            self.invalidar()
+
+    def upsert(self, content_hash: str, documents: List[Document], filters=None) -> None:
+        try:
+            super().upsert(content_hash, documents, filters)
+            self._indexar(documents)
+        finally:
+            self.invalidar()
+
+    async def async_upsert(self, content_hash: str, documents: List[Document], filters=None) -> None:
+        try:
+            await super().async_upsert(content_hash, documents, filters)
+            self._indexar(documents)
+        finally:
+            self.invalidar()
+
+    def delete(self) -> bool:
+        try:
+            return super().delete()
+        finally:
+            if self.indice_lexico is not None:
+                self.indice_lexico.limpar()
+            self.invalidar()
+
+    def drop(self) -> None:
+        try:
+            return super().drop()
+        finally:
+            if self.indice_lexico is not None:
+                self.indice_lexico.limpar()
+            self.invalidar()
+
+    def delete_by_id(self, id: str) -> bool:
+        try:
+            return super().delete_by_id(id)
+        finally:
+            if self.indice_lexico is not None:
+                self.indice_lexico.remover([id])
+            self.invalidar()
+
+    def delete_by_name(self, name: str) -> bool:
+        try:
+            return super().delete_by_name(name)
+        finally:
+            self._reindexar()
+            self.invalidar()
+
+    def delete_by_metadata(self, metadata: Dict[str, Any]) -> bool:
+        try:
+            return super().delete_by_metadata(metadata)
+        finally:
+            self._reindexar()
+            self.invalidar()
+
+    def delete_by_content_id(self, content_id: str) -> bool:
+        try:
+            return super().delete_by_content_id(content_id)
+        finally:
+            self._reindexar()
+            self.invalidar()
+
+    def update_metadata(self, content_id: str, metadata: Dict[str, Any]) -> None:
+        try:
+            return super().update_metadata(content_id, metadata)
+        finally:
+            self.invalidar()
+
+    # BUSCA =======================================================
+    def _chave_resultado(self, vetor, query: str, limit: int, filters) -> Tuple:
+        filtros = json.dumps(filters, sort_keys=True, default=str) if isinstance(filters, dict) else None
+        # Busca por palavra-chave/híbrida também depende do texto, não só do embedding
+        texto = query if self.search_type != SearchType.vector else None
+        digital = impressao_digital(vetor) if vetor is not None else None
+        return (digital, texto, limit, filtros, self.search_type.value, self.geracao())
+
+    def _where(self, filters):
+        return self._convert_filters(filters) if isinstance(filters, dict) and filters else None
+
+    def _consultar_vetor(self, vetor: List[float], limit: int, filters) -> List[Document]:
+        if not self._collection:
+            self._collection = self.client.get_collection(name=self.collection_name)
+        resultado = self._collection.query(
+            query_embeddings=vetor,
+            n_results=limit,
+            where=self._where(filters),
+            include=["metadatas", "documents", "embeddings", "distances", "uris"],
+        )
+        return self._build_search_results(resultado)
+
+    def _obter(self, ids: List[str], filters) -> Dict[str, Document]:
+        # Conteúdo e metadados dos chunks achados pelo índice léxico (o filtro é aplicado aqui)
+        if not ids:
+            return {}
+        if not self._collection:
+            self._collection = self.client.get_collection(name=self.collection_name)
+        resultado = self._collection.get(ids=ids, where=self._where(filters), include=["metadatas", "documents"])
+        return {doc.id: doc for doc in self._build_get_results(resultado)}
+
+    def _buscar_lexico(self, query: str, limit: int, filters) -> List[Document]:
+        # Com filtro, parte dos candidatos pode ser descartada: busca alguns a mais
+        candidatos = self.indice_lexico.buscar(query, limit * 4 if filters else limit)
+        documentos = self._obter([chunk_id for chunk_id, _ in candidatos], filters)
+        resultado = []
+        for chunk_id, score in candidatos:
+            if chunk_id in documentos:
+                documentos[chunk_id].meta_data["bm25"] = round(score, 4)
+                resultado.append(documentos[chunk_id])
+        return resultado[:limit]
+
+    def _buscar_hibrido(self, query: str, vetor: List[float], limit: int, filters) -> List[Document]:
+        # Reciprocal rank fusion entre a busca por embedding e o BM25
+        por_vetor = self._consultar_vetor(vetor, limit * 2, filters)
+        lexicos = self.indice_lexico.buscar(query, limit * 4 if filters else limit * 2)
+        documentos = {doc.id: doc for doc in por_vetor}
+        faltando = [chunk_id for chunk_id, _ in lexicos if chunk_id not in documentos]
+        documentos.update(self._obter(faltando, filters))
+        lexicos = [(chunk_id, score) for chunk_id, score in lexicos if chunk_id in documentos]
+        # As pontuações de cada perna ficam no documento (distances já vem do Chroma): quem junta
+        # resultados de várias coleções (ColecaoFragmentada) refaz o RRF com elas
+        for chunk_id, score in lexicos:
+            documentos[chunk_id].meta_data["bm25"] = round(score, 4)
+
+        fundidos = reciprocal_rank_fusion(
+            [[(doc.id, 0.0) for doc in por_vetor], lexicos[: limit * 2]], k=self.hybrid_rrf_k
+        )
+        resultado = []
+        for chunk_id, score in fundidos[:limit]:
+            documentos[chunk_id].meta_data["rrf_score"] = round(score, 6)
+            resultado.append(documentos[chunk_id])
+        return resultado
+
+    def _buscar_no_chroma(self, query: str, vetor: Optional[List[float]], limit: int, filters) -> List[Document]:
+        if self.indice_lexico is not None and self.search_type == SearchType.keyword:
+            documentos = self._buscar_lexico(query, limit, filters)
+        elif self.indice_lexico is not None and self.search_type == SearchType.hybrid:
+            documentos = self._buscar_hibrido(query, vetor, limit, filters)
+        elif self.search_type != SearchType.vector:
+            # Híbrida/palavra-chave sem índice léxico: fluxo normal do Agno (o resultado continua indo para o cache)
+            return super().search(query, limit, filters)
+        else:
+            documentos = self._consultar_vetor(vetor, limit, filters)
+
+        if self.reranker and documentos:
+            try:
+                documentos = self.reranker.rerank(query=query, documents=documentos)
+            except Exception as e:
+                logger.warning(f"Reranker falhou, usando a ordem original: {e}")
+        return documentos
+
+    def _registrar(self, query: str, embed_s: float, busca_s: float, cache_s: float, hit_embedding: bool, hit_resultado: bool):
+        medida = {
+            "consulta": query[:80],
+            "tipo": self.search_type.value,
+            "embed_ms": round(embed_s * 1000, 2),
+            "busca_ms": round(busca_s * 1000, 2),
+            "cache_ms": round(cache_s * 1000, 2),
+            "hit_embedding": hit_embedding,
+            "hit_resultado": hit_resultado,
+        }
+        self.ultimas_buscas.append(medida)
+        log_debug(f"Busca: {medida}")
+
+    def _filtro_sem_cache(self, filters) -> bool:
+        # Filtros em expressão (List[FilterExpr]) não viram `where` aqui: nem cache nem busca própria,
+        # o fluxo normal do Agno decide o que fazer com eles
+        if filters is None or isinstance(filters, dict):
+            return False
+        self._sem_cache += 1
+        return True
+
+    def _precisa_embedding(self) -> bool:
+        # Caminho rápido: busca só léxica não chama a API de embeddings
+        return not (self.indice_lexico is not None and self.search_type == SearchType.keyword)
+
+    def _iniciar_busca(self, query: str, limit: int, filters, vetor: Optional[List[float]]) -> "_Busca":
+        # `vetor`: embedding da consulta já calculado (ex.: a mesma consulta em vários fragmentos)
+        inicio = time.perf_counter()
+        busca = _Busca(query, limit, filters)
+        if not self._precisa_embedding():
+            return busca
+        busca.vetor = vetor if vetor is not None else self._embeddings_consulta.buscar(query)
+        busca.hit_embedding = busca.vetor is not None
+        busca.falta_embedding = busca.vetor is None
+        busca.cache_s = time.perf_counter() - inicio
+        return busca
+
+    def _embedding_calculado(self, busca: "_Busca", vetor: Optional[List[float]], inicio: float) -> bool:
+        """Guarda o embedding que acabou de ser calculado. False se o embedder falhou."""
+        busca.embed_s = time.perf_counter() - inicio
+        registrar("embedding", busca.embed_s, inicio)
+        if not vetor:
+            logger.error(f"Erro ao gerar o embedding da consulta: {busca.query}")
+            return False
+        busca.vetor = vetor
+        self._embeddings_consulta.gravar(busca.query, vetor)
+        return True
+
+    def _resultado_em_cache(self, busca: "_Busca") -> Optional[List[Document]]:
+        t = time.perf_counter()
+        busca.chave = self._chave_resultado(busca.vetor, busca.query, busca.limit, busca.filters)
+        documentos = self._resultados.buscar(busca.chave)
+        busca.cache_s += time.perf_counter() - t
+        if documentos is None:
+            return None
+        self._registrar(busca.query, busca.embed_s, 0.0, busca.cache_s, busca.hit_embedding, True)
+        return copiar_documentos(documentos)
+
+    def _guardar_resultado(self, busca: "_Busca", documentos: List[Document], inicio: float) -> List[Document]:
+        busca_s = time.perf_counter() - inicio
+        registrar("chroma", busca_s, inicio)
+        self._resultados.gravar(busca.chave, copiar_documentos(documentos))
+        self._registrar(busca.query, busca.embed_s, busca_s, busca.cache_s, busca.hit_embedding, False)
+        return documentos
+
+    def search(self, query: str, limit: int = 5, filters=None, vetor: Optional[List[float]] = None) -> List[Document]:
+        if self._filtro_sem_cache(filters):
+            return super().search(query, limit, filters)
+        busca = self._iniciar_busca(query, limit, filters, vetor)
+        if busca.falta_embedding:
+            t = time.perf_counter()
+            if not self._embedding_calculado(busca, self.embedder.get_embedding(query), t):
+                return []
+        documentos = self._resultado_em_cache(busca)
+        if documentos is not None:
+            return documentos
+        t = time.perf_counter()
+        return self._guardar_resultado(busca, self._buscar_no_chroma(query, busca.vetor, limit, filters), t)
+
+    async def async_search(self, query: str, limit: int = 5, filters=None, vetor: Optional[List[float]] = None) -> List[Document]:
+        # Hits são resolvidos no próprio event loop; só a busca no Chroma vai para uma thread
+        if self._filtro_sem_cache(filters):
+            return await super().async_search(query, limit, filters)
+        busca = self._iniciar_busca(query, limit, filters, vetor)
+        if busca.falta_embedding:
+            t = time.perf_counter()
+            if not self._embedding_calculado(busca, await self.embedder.async_get_embedding(query), t):
+                return []
+        documentos = self._resultado_em_cache(busca)
+        if documentos is not None:
+            return documentos
+        t = time.perf_counter()
+        documentos = await asyncio.to_thread(self._buscar_no_chroma, query, busca.vetor, limit, filters)
+        return self._guardar_resultado(busca, documentos, t)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        buscas = list(self.ultimas_buscas)
+
+        def media(campo):
+            return round(sum(b[campo] for b in buscas) / len(buscas), 2) if buscas else 0.0
+
+        return {
+            "embeddings_consulta": {
+                "itens": len(self._embeddings_consulta),
+                "hits": self._embeddings_consulta.hits,
+                "misses": self._embeddings_consulta.misses,
+            },
+            "resultados": {
+                "itens": len(self._resultados),
+                "hits": self._resultados.hits,
+                "misses": self._resultados.misses,
+                "sem_cache": self._sem_cache,
+            },
+            "indice_lexico": self.indice_lexico.estatisticas() if self.indice_lexico is not None else None,
+            "geracao": self.geracao(),
+            "media_ultimas_buscas_ms": {"embed": media("embed_ms"), "busca": media("busca_ms"), "cache": media("cache_ms")},
+        }
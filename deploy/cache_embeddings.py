@@ -0,0 +1,232 @@
+#Cache persistente de embeddings (endereçado por conteúdo)
+#Evita chamar a API de embeddings de novo para textos que já foram embeddados
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from dataclasses import dataclass
+from hashlib import sha256
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from agno.knowledge.embedder.base import Embedder
+
+
+def normalizar_texto(texto: str) -> str:
+    # Mesma forma unicode e espaços colapsados: "Receita  líquida\n" == "Receita líquida"
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", texto)).strip()
+
+
+def hash_texto(texto: str) -> str:
+    return sha256(normalizar_texto(texto).encode()).hexdigest()
+
+
+# CACHE EM DISCO (SQLITE) =========================================
+class CacheEmbeddings:
+    """
+    Cache de embeddings em SQLite, com chave (modelo, dimensões, hash do texto normalizado).
+
+    Os vetores são gravados como float32 (4 bytes por dimensão). Quando o total dos vetores passa
+    de `tamanho_maximo_mb`, os vetores acessados há mais tempo são removidos.
+    """
+
+    def __init__(self, db_file: str = "tmp/embeddings_cache.db", tamanho_maximo_mb: float = 512):
+        Path(db_file).parent.mkdir(parents=True, exist_ok=True)
+        self.tamanho_maximo = int(tamanho_maximo_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                modelo TEXT NOT NULL,
+                dimensoes INTEGER NOT NULL,
+                hash_texto TEXT NOT NULL,
+                vetor BLOB NOT NULL,
+                ultimo_acesso REAL NOT NULL,
+                PRIMARY KEY (modelo, dimensoes, hash_texto)
+            ) WITHOUT ROWID"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_acesso ON embeddings (ultimo_acesso)")
+        # Total de bytes dos vetores mantido por triggers (vale também para outros processos no mesmo
+        # arquivo): o despejo consulta uma linha em vez de somar a tabela inteira a cada gravação
+        self._conn.executescript(
+            """BEGIN IMMEDIATE;
+            CREATE TABLE IF NOT EXISTS embeddings_meta (chave TEXT PRIMARY KEY, valor INTEGER NOT NULL);
+            INSERT OR IGNORE INTO embeddings_meta
+                SELECT 'bytes', COALESCE(SUM(LENGTH(vetor)), 0) FROM embeddings;
+            CREATE TRIGGER IF NOT EXISTS embeddings_bytes_insert AFTER INSERT ON embeddings BEGIN
+                UPDATE embeddings_meta SET valor = valor + LENGTH(new.vetor) WHERE chave = 'bytes';
+            END;
+            CREATE TRIGGER IF NOT EXISTS embeddings_bytes_update AFTER UPDATE OF vetor ON embeddings BEGIN
+                UPDATE embeddings_meta SET valor = valor + LENGTH(new.vetor) - LENGTH(old.vetor) WHERE chave = 'bytes';
+            END;
+            CREATE TRIGGER IF NOT EXISTS embeddings_bytes_delete AFTER DELETE ON embeddings BEGIN
+                UPDATE embeddings_meta SET valor = valor - LENGTH(old.vetor) WHERE chave = 'bytes';
+            END;
+            COMMIT;"""
+        )
+
+    def buscar(self, modelo: str, dimensoes: int, textos: List[str], contar: bool = True) -> Dict[str, List[float]]:
+        """Busca em lote. Retorna {hash_texto: vetor} apenas para os textos encontrados."""
+        hashes = list({hash_texto(t) for t in textos})
+        encontrados: Dict[str, List[float]] = {}
+        with self._lock:
+            # SQLite limita o número de parâmetros por query: consulta em blocos
+            for i in range(0, len(hashes), 500):
+                bloco = hashes[i:i + 500]
+                marcadores = ",".join("?" * len(bloco))
+                linhas = self._conn.execute(
+                    f"SELECT hash_texto, vetor FROM embeddings "
+                    f"WHERE modelo = ? AND dimensoes = ? AND hash_texto IN ({marcadores})",
+                    (modelo, dimensoes, *bloco),
+                ).fetchall()
+                for h, blob in linhas:
+                    encontrados[h] = array("f", blob).tolist()
+            if encontrados:
+                agora = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET ultimo_acesso = ? WHERE modelo = ? AND dimensoes = ? AND hash_texto = ?",
+                    [(agora, modelo, dimensoes, h) for h in encontrados],
+                )
+        if contar:
+            self.hits += len(encontrados)
+            self.misses += len(hashes) - len(encontrados)
+        return encontrados
+
+    def gravar(self, modelo: str, dimensoes: int, itens: List[Tuple[str, List[float]]]):
+        """Grava em lote uma lista de (texto, vetor). Vetores vazios (erro na API) são ignorados."""
+        agora = time.time()
+        linhas = [
+            (modelo, dimensoes, hash_texto(texto), array("f", vetor).tobytes(), agora)
+            for texto, vetor in itens
+            if vetor
+        ]
+        if not linhas:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            # Upsert em vez de INSERT OR REPLACE: o REPLACE apaga a linha antiga sem disparar o trigger de DELETE
+            self._conn.executemany(
+                "INSERT INTO embeddings VALUES (?, ?, ?, ?, ?) ON CONFLICT (modelo, dimensoes, hash_texto) "
+                "DO UPDATE SET vetor = excluded.vetor, ultimo_acesso = excluded.ultimo_acesso",
+                linhas,
+            )
+            self._conn.execute("COMMIT")
+            self._despejar()
+
+    def _despejar(self):
+        # Remove os vetores menos usados até voltar para 90% do tamanho máximo
+        tamanho = self._bytes()
+        if tamanho <= self.tamanho_maximo:
+            return
+        excesso = tamanho - int(self.tamanho_maximo * 0.9)
+        # Soma acumulada por ordem de acesso: apaga do mais antigo até cobrir o excesso (ROWS: um lote
+        # gravado junto tem o mesmo ultimo_acesso, e com RANGE todos teriam a soma do lote inteiro)
+        self._conn.execute(
+            """DELETE FROM embeddings WHERE (modelo, dimensoes, hash_texto) IN (
+                SELECT modelo, dimensoes, hash_texto FROM (
+                    SELECT modelo, dimensoes, hash_texto, LENGTH(vetor) AS tamanho,
+                           SUM(LENGTH(vetor)) OVER (
+                               ORDER BY ultimo_acesso, hash_texto ROWS UNBOUNDED PRECEDING
+                           ) AS acumulado
+                    FROM embeddings
+                ) WHERE acumulado - tamanho < ?
+            )""",
+            (excesso,),
+        )
+
+    def _bytes(self) -> int:
+        return self._conn.execute("SELECT valor FROM embeddings_meta WHERE chave = 'bytes'").fetchone()[0]
+
+    def estatisticas(self) -> Dict[str, int]:
+        with self._lock:
+            itens = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            tamanho = self._bytes()
+        return {"itens": itens, "bytes": tamanho, "hits": self.hits, "misses": self.misses}
+
+
+# EMBEDDER COM CACHE ==============================================
+@dataclass
+class EmbedderComCache(Embedder):
+    """
+    Embedder que consulta o `CacheEmbeddings` antes de chamar o embedder real.
+
+    Pode ser usado onde hoje se usa `OpenAIEmbedder(...)` (ChromaDb, Knowledge, pipeline de ingestão):
+    reingestões de documentos sem mudança e perguntas repetidas não chamam a API. Nos métodos
+    assíncronos o SQLite do cache é lido e gravado em uma thread, fora do event loop.
+    """
+
+    embedder: Optional[Embedder] = None
+    cache: Optional[CacheEmbeddings] = None
+
+    def __post_init__(self):
+        if self.embedder is None:
+            raise ValueError("embedder não informado")
+        self.cache = self.cache or CacheEmbeddings()
+        self.id = getattr(self.embedder, "id", type(self.embedder).__name__)
+        self.dimensions = self.embedder.dimensions
+        # Quem lê enable_batch (ex.: ChromaDb) decide entre lote e um texto por vez por aqui
+        self.enable_batch = self.embedder.enable_batch
+        self.batch_size = self.embedder.batch_size
+
+    def _buscar(self, texto: str) -> Optional[List[float]]:
+        return self.cache.buscar(self.id, self.dimensions, [texto]).get(hash_texto(texto))
+
+    def textos_sem_cache(self, textos: List[str]) -> List[str]:
+        """Textos que ainda vão precisar de uma chamada à API (usado pelo limitador do pipeline)."""
+        encontrados = self.cache.buscar(self.id, self.dimensions, textos, contar=False)
+        return [t for t in textos if hash_texto(t) not in encontrados]
+
+    def get_embedding(self, text: str) -> List[float]:
+        return self.get_embedding_and_usage(text)[0]
+
+    def get_embedding_and_usage(self, text: str) -> Tuple[List[float], Optional[Dict]]:
+        vetor = self._buscar(text)
+        if vetor is not None:
+            return vetor, None
+        vetor, usage = self.embedder.get_embedding_and_usage(text)
+        self.cache.gravar(self.id, self.dimensions, [(text, vetor)])
+        return vetor, usage
+
+    async def async_get_embedding(self, text: str) -> List[float]:
+        return (await self.async_get_embedding_and_usage(text))[0]
+
+    async def async_get_embedding_and_usage(self, text: str) -> Tuple[List[float], Optional[Dict]]:
+        vetor = await asyncio.to_thread(self._buscar, text)
+        if vetor is not None:
+            return vetor, None
+        vetor, usage = await self.embedder.async_get_embedding_and_usage(text)
+        await asyncio.to_thread(self.cache.gravar, self.id, self.dimensions, [(text, vetor)])
+        return vetor, usage
+
+    async def async_get_embeddings_batch_and_usage(
+        self, texts: List[str]
+    ) -> Tuple[List[List[float]], List[Optional[Dict]]]:
+        encontrados = await asyncio.to_thread(self.cache.buscar, self.id, self.dimensions, texts)
+        faltantes = list(dict.fromkeys(t for t in texts if hash_texto(t) not in encontrados))
+        if faltantes:
+            vetores, _ = await self.embedder.async_get_embeddings_batch_and_usage(faltantes)
+            await asyncio.to_thread(self.cache.gravar, self.id, self.dimensions, list(zip(faltantes, vetores)))
+            encontrados.update({hash_texto(t): v for t, v in zip(faltantes, vetores)})
+        return [encontrados.get(hash_texto(t), []) for t in texts], [None] * len(texts)
+
+    async def async_embed_lote(self, textos: List[str]) -> List[List[float]]:
+        """Versão usada pelo pipeline de ingestão: só os textos fora do cache vão para a API."""
+        from ingestao import embed_lote
+
+        encontrados = await asyncio.to_thread(self.cache.buscar, self.id, self.dimensions, textos)
+        faltantes = list(dict.fromkeys(t for t in textos if hash_texto(t) not in encontrados))
+        if faltantes:
+            vetores = await embed_lote(self.embedder, faltantes)
+            await asyncio.to_thread(self.cache.gravar, self.id, self.dimensions, list(zip(faltantes, vetores)))
+            encontrados.update({hash_texto(t): v for t, v in zip(faltantes, vetores)})
+        return [encontrados[hash_texto(t)] for t in textos]
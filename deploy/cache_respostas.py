@@ -0,0 +1,340 @@
+#Cache semântico de respostas do agente
+#Perguntas repetidas (mesmo texto ou mesmo sentido) são respondidas sem chamar o LLM
+#------------------------------------------
+
+#IMPORTACOES
+import json
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+import numpy as np
+from agno.os.auth import get_authentication_dependency, security
+from agno.os.settings import AgnoAPISettings
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def normalizar_pergunta(pergunta: str) -> str:
+    # "Receita líquida 2T25?" == "receita liquida  2t25"
+    texto = unicodedata.normalize("NFKD", pergunta.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r"[^\w\s]", " ", texto)
+    return re.sub(r"\s+", " ", texto).strip()
+
+
+def tokens_numericos(pergunta: str) -> set:
+    # "2T25" e "1T25" ficam muito próximos no embedding, mas são perguntas diferentes
+    return {t for t in normalizar_pergunta(pergunta).split() if any(c.isdigit() for c in t)}
+
+
+class CacheRespostas:
+    """
+    Cache de respostas em memória com dois níveis de busca:
+
+    1. Texto normalizado idêntico (sem acento, caixa ou pontuação).
+    2. Similaridade de cosseno entre embeddings acima de `limiar` (e mesmos números na pergunta).
+
+    Cada entrada pertence a um `escopo` (ex.: o user_id): a resposta de um usuário, que pode
+    trazer as memórias dele, nunca é servida para outro.
+
+    As entradas valem só para a versão atual da coleção (`versao()`, ex.: `manifesto.geracao`):
+    uma reingestão invalida tudo. Cada entrada expira em `ttl` segundos e, com o cache cheio,
+    a menos usada recentemente sai (LRU).
+    """
+
+    def __init__(
+        self,
+        embedder=None,
+        limiar: float = 0.95,
+        ttl: float = 3600,
+        max_itens: int = 1000,
+        versao: Callable[[], int] = lambda: 0,
+    ):
+        self.embedder = embedder
+        self.limiar = limiar
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self.versao = versao
+        self._versao_atual: Optional[int] = None
+        # escopo + chave normalizada -> (pergunta, resposta, criado_em, slot da matriz de vetores)
+        self._itens: "OrderedDict[str, Tuple[str, str, float, int]]" = OrderedDict()
+        self._vetores: Optional[np.ndarray] = None  # (max_itens, dimensões), linhas normalizadas
+        self._ocupados = np.zeros(max_itens, dtype=bool)  # slots com vetor válido
+        self._chave_do_slot: List[Optional[str]] = [None] * max_itens
+        self._livres = list(range(max_itens))
+        self.hits_exatos = 0
+        self.hits_semanticos = 0
+        self.misses = 0
+
+    # BUSCA =======================================================
+    def _validar_versao(self):
+        versao = self.versao()
+        if versao != self._versao_atual:
+            self._itens.clear()
+            self._ocupados[:] = False
+            self._chave_do_slot = [None] * self.max_itens
+            self._livres = list(range(self.max_itens))
+            self._versao_atual = versao
+
+    def _remover(self, chave: str):
+        _, _, _, slot = self._itens.pop(chave)
+        self._ocupados[slot] = False
+        self._chave_do_slot[slot] = None
+        self._livres.append(slot)
+
+    def _expirado(self, criado_em: float) -> bool:
+        return time.time() - criado_em > self.ttl
+
+    @staticmethod
+    def _chave(pergunta: str, escopo: str) -> str:
+        return f"{escopo}\x00{normalizar_pergunta(pergunta)}"
+
+    async def buscar(self, pergunta: str, escopo: str = "") -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Args:
+            pergunta: Texto da pergunta
+            escopo: Só entradas gravadas com o mesmo escopo servem (ex.: user_id)
+
+        Returns:
+            (resposta ou None, vetor da pergunta). O vetor pode ser passado para `gravar`
+            depois da execução, para não embeddar a pergunta duas vezes.
+        """
+        self._validar_versao()
+        chave = self._chave(pergunta, escopo)
+
+        item = self._itens.get(chave)
+        if item is not None:
+            if self._expirado(item[2]):
+                self._remover(chave)
+            else:
+                self._itens.move_to_end(chave)
+                self.hits_exatos += 1
+                return item[1], None
+
+        if self.embedder is None:
+            self.misses += 1
+            return None, None
+
+        vetor = np.asarray(await self.embedder.async_get_embedding(pergunta), dtype=np.float32)
+        if vetor.size == 0:
+            self.misses += 1
+            return None, None
+        vetor /= np.linalg.norm(vetor) or 1.0
+
+        if self._vetores is not None and self._ocupados.any():
+            similaridades = self._vetores @ vetor
+            similaridades[~self._ocupados] = -1.0
+            numeros = tokens_numericos(pergunta)
+            prefixo = f"{escopo}\x00"
+            for slot in np.argsort(similaridades)[::-1]:
+                if similaridades[slot] < self.limiar:
+                    break
+                chave_similar = self._chave_do_slot[slot]
+                if not chave_similar.startswith(prefixo):
+                    continue  # pergunta parecida, mas de outro usuário
+                pergunta_similar, resposta, criado_em, _ = self._itens[chave_similar]
+                if self._expirado(criado_em):
+                    self._remover(chave_similar)
+                    continue
+                if tokens_numericos(pergunta_similar) != numeros:
+                    continue
+                self._itens.move_to_end(chave_similar)
+                self.hits_semanticos += 1
+                return resposta, vetor
+
+        self.misses += 1
+        return None, vetor
+
+    # GRAVAÇÃO ====================================================
+    def gravar(self, pergunta: str, resposta: str, vetor: Optional[np.ndarray] = None, escopo: str = ""):
+        if not resposta:
+            return
+        self._validar_versao()
+        chave = self._chave(pergunta, escopo)
+        if chave in self._itens:
+            self._remover(chave)
+        if len(self._itens) >= self.max_itens:
+            self._remover(next(iter(self._itens)))  # LRU: a primeira é a menos usada
+
+        slot = self._livres.pop()
+        if vetor is not None:
+            if self._vetores is None:
+                self._vetores = np.zeros((self.max_itens, vetor.shape[0]), dtype=np.float32)
+            self._vetores[slot] = vetor
+            self._ocupados[slot] = True
+        self._chave_do_slot[slot] = chave
+        self._itens[chave] = (pergunta, resposta, time.time(), slot)
+
+    def estatisticas(self) -> Dict[str, float]:
+        consultas = self.hits_exatos + self.hits_semanticos + self.misses
+        return {
+            "itens": len(self._itens),
+            "hits_exatos": self.hits_exatos,
+            "hits_semanticos": self.hits_semanticos,
+            "misses": self.misses,
+            "taxa_hit": round((self.hits_exatos + self.hits_semanticos) / consultas, 3) if consultas else 0.0,
+            "versao_colecao": self._versao_atual,
+        }
+
+
+# INTEGRAÇÃO COM FASTAPI / AGENTOS ================================
+async def eventos_da_resposta(resposta: str, agent_id: str, session_id: Optional[str] = None):
+    """Gera os eventos SSE de uma resposta vinda do cache (mesmo formato do AgentOS)."""
+    base = {
+        "agent_id": agent_id,
+        "run_id": str(uuid4()),
+        "session_id": session_id or str(uuid4()),
+        "created_at": int(time.time()),
+    }
+    eventos = [
+        {"event": "RunStarted", **base},
+        {"event": "RunContent", "content": resposta, "content_type": "str", **base},
+        {"event": "RunCompleted", "content": resposta, "content_type": "str", "metrics": {"cache_hit": True}, **base},
+    ]
+    for evento in eventos:
+        yield f"event: {evento['event']}\ndata: {json.dumps(evento, separators=(',', ':'), ensure_ascii=False)}\n\n"
+
+
+class ColetorSSE:
+    """Lê um stream SSE (em pedaços de bytes) e reconstrói a resposta final do agente."""
+
+    def __init__(self):
+        self._buffer = ""
+        self._partes: List[str] = []
+        self._final: Optional[str] = None
+        self.erro = False
+
+    def alimentar(self, pedaco):
+        self._buffer += pedaco.decode() if isinstance(pedaco, bytes) else pedaco
+        *eventos, self._buffer = self._buffer.split("\n\n")
+        for evento in eventos:
+            dados = "\n".join(linha[5:].lstrip() for linha in evento.split("\n") if linha.startswith("data:"))
+            try:
+                dados = json.loads(dados)
+            except json.JSONDecodeError:
+                continue
+            tipo = dados.get("event", "")
+            if tipo == "RunContent" and isinstance(dados.get("content"), str):
+                self._partes.append(dados["content"])
+            elif tipo == "RunCompleted" and isinstance(dados.get("content"), str):
+                self._final = dados["content"]
+            elif tipo in ("RunError", "RunCancelled"):
+                self.erro = True
+
+    @property
+    def resposta(self) -> Optional[str]:
+        if self.erro:
+            return None
+        return self._final if self._final is not None else "".join(self._partes) or None
+
+
+# Campos do form que o atalho entende; qualquer outro (session_state, dependencies, metadata,
+# knowledge_filters...) muda a execução e a requisição segue para a rota do AgentOS
+CAMPOS_ATALHO = {"message", "stream", "user_id"}
+
+
+async def acesso_verificado(request: Request, settings: Optional[AgnoAPISettings] = None) -> bool:
+    """
+    True se a requisição passa pela mesma autenticação da rota do AgentOS, e um middleware pode
+    respondê-la sem chegar até a rota. False: a requisição deve seguir para a rota (que responde 401/403).
+
+    Com JWT (authorization=True ou JWT_* no ambiente) quem autentica e checa os escopos do recurso
+    (`require_resource_access`) é um middleware do AgentOS que roda depois deste: não dá para
+    verificar aqui, então nunca atalhamos.
+    """
+    settings = settings or AgnoAPISettings()
+    if settings.authorization_enabled or os.getenv("JWT_VERIFICATION_KEY") or os.getenv("JWT_JWKS_FILE"):
+        return False
+    if getattr(request.state, "authorization_enabled", False):
+        return False
+    try:
+        await get_authentication_dependency(settings)(request, await security(request))
+    except HTTPException:
+        return False
+    return True
+
+
+def escopo_do_atalho(request: Request, form) -> Optional[str]:
+    """
+    user_id da execução (o mesmo que a rota do AgentOS usaria), ou None se o form tem algo que o
+    atalho não reproduz (session_id, arquivos, session_state, dependencies, metadata...).
+    """
+    if not isinstance(form.get("message"), str) or set(form.keys()) - CAMPOS_ATALHO:
+        return None
+    for campo in ("session_id", "session_state", "dependencies", "metadata"):
+        if getattr(request.state, campo, None) is not None:
+            return None
+    user_id = getattr(request.state, "user_id", None) or form.get("user_id") or ""
+    return user_id if isinstance(user_id, str) else None
+
+
+def instalar_cache_agentos(app, agent_id: str, cache: CacheRespostas, settings: Optional[AgnoAPISettings] = None):
+    """
+    Coloca o cache na frente da rota `/agents/{agent_id}/runs` do AgentOS (via middleware).
+
+    Só entram no cache execuções autenticadas como a rota exige, sem `session_id`, sem arquivos e
+    sem outros campos além de message/stream/user_id. As respostas ficam separadas por user_id.
+
+    Args:
+        settings: Configuração do AgentOS (`agent_os.settings`), para a mesma checagem de OS_SECURITY_KEY
+    """
+    rota = f"/agents/{agent_id}/runs"
+
+    @app.middleware("http")
+    async def cache_de_respostas(request: Request, call_next):
+        if request.method != "POST" or request.url.path != rota:
+            return await call_next(request)
+
+        await request.body()  # guarda o corpo para a rota do AgentOS conseguir ler de novo
+        form = await request.form()
+        pergunta = form.get("message")
+        escopo = escopo_do_atalho(request, form)
+        if escopo is None or not await acesso_verificado(request, settings):
+            return await call_next(request)
+        stream = str(form.get("stream", "true")).lower() in ("true", "1")
+
+        resposta, vetor = await cache.buscar(pergunta, escopo)
+        if resposta is not None:
+            if stream:
+                return StreamingResponse(
+                    eventos_da_resposta(resposta, agent_id), media_type="text/event-stream", headers={"X-Cache": "HIT"}
+                )
+            return JSONResponse(
+                {"run_id": str(uuid4()), "agent_id": agent_id, "session_id": str(uuid4()), "content": resposta,
+                 "content_type": "str", "status": "COMPLETED", "metrics": {"cache_hit": True}},
+                headers={"X-Cache": "HIT"},
+            )
+
+        response = await call_next(request)
+        if response.status_code != 200:
+            return response
+
+        async def repassar_e_gravar():
+            coletor = ColetorSSE()
+            corpo = []
+            async for pedaco in response.body_iterator:
+                if stream:
+                    coletor.alimentar(pedaco)
+                else:
+                    corpo.append(pedaco if isinstance(pedaco, bytes) else pedaco.encode())
+                yield pedaco
+            if stream:
+                cache.gravar(pergunta, coletor.resposta, vetor, escopo)
+            else:
+                try:
+                    conteudo = json.loads(b"".join(corpo)).get("content")
+                except (json.JSONDecodeError, AttributeError):
+                    conteudo = None
+                if isinstance(conteudo, str):
+                    cache.gravar(pergunta, conteudo, vetor, escopo)
+
+        headers = dict(response.headers)
+        headers["X-Cache"] = "MISS"
+        return StreamingResponse(
+            repassar_e_gravar(), status_code=response.status_code, headers=headers, media_type=response.media_type
+        )
@@ -0,0 +1,446 @@
+#Gerador de carga para os apps do agente (exemplo1 e AgentOS do exemplo2)
+#Mistura de perguntas, sessões reaproveitadas, latência ponta a ponta, TTFT e histórico de resultados
+#------------------------------------------
+
+#IMPORTACOES
+import argparse
+import asyncio
+import json
+import math
+import random
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import uuid4
+
+import httpx
+
+# Mistura padrão: (pergunta, peso). Perguntas repetidas exercitam o cache de respostas e a
+# coalescência; as de valores, a ferramenta de fatos; as abertas, busca + LLM por inteiro.
+PERGUNTAS_PADRAO: List[Tuple[str, float]] = [
+    ("Qual foi a receita líquida no 2T25?", 5),
+    ("Qual a receita líquida do segundo trimestre de 2025?", 2),
+    ("Qual foi o lucro líquido no 2T25?", 4),
+    ("Qual a margem bruta no 2T25?", 3),
+    ("Quantos pares foram vendidos no mercado interno no 2T25?", 2),
+    ("Como foi o desempenho das exportações no trimestre?", 2),
+    ("Resuma os principais destaques do relatório.", 1),
+    ("Quais riscos a empresa menciona para os próximos trimestres?", 1),
+    ("Como evoluiu o EBITDA em relação ao 2T24?", 1),
+    ("Qual a posição de caixa ao fim do trimestre?", 1),
+]
+
+
+# MEDIDAS ===========================================================
+@dataclass
+class Resultado:
+    inicio: float
+    latencia: float = 0.0
+    ttft: Optional[float] = None
+    status: int = 0
+    erro: Optional[str] = None
+    bytes: int = 0
+    sessao_reaproveitada: bool = False
+    cache: Optional[str] = None
+    etapas: Dict[str, float] = field(default_factory=dict)
+
+
+def percentil(valores: Sequence[float], p: float) -> float:
+    """Percentil por posição mais próxima (nearest-rank), em cima dos valores ordenados."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, math.ceil(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def ler_server_timing(cabecalho: Optional[str]) -> Dict[str, float]:
+    """`embedding;dur=12.3, chroma;dur=4.1;desc="2x"` -> {"embedding": 12.3, "chroma": 4.1} (ms)."""
+    etapas = {}
+    for parte in (cabecalho or "").split(","):
+        nome, *atributos = [a.strip() for a in parte.split(";")]
+        for atributo in atributos:
+            if atributo.startswith("dur="):
+                try:
+                    etapas[nome] = float(atributo[4:])
+                except ValueError:
+                    pass
+    return etapas
+
+
+# ALVOS =============================================================
+class Usuario:
+    """Usuário virtual: reaproveita a mesma sessão por `runs_por_sessao` perguntas e depois abre outra."""
+
+    def __init__(self, runs_por_sessao: int, sem_sessao: float, rng: random.Random):
+        self.user_id = f"carga-{uuid4().hex[:8]}"
+        self.runs_por_sessao = runs_por_sessao
+        self.sem_sessao = sem_sessao
+        self.rng = rng
+        self.session_id: Optional[str] = None
+        self.runs = 0
+
+    def proxima_sessao(self) -> Tuple[Optional[str], bool]:
+        """(session_id, reaproveitada). Sem sessão = pergunta avulsa (pode vir do cache)."""
+        if self.rng.random() < self.sem_sessao:
+            return None, False
+        if self.session_id is None or self.runs >= self.runs_por_sessao:
+            self.session_id, self.runs = str(uuid4()), 0
+        self.runs += 1
+        return self.session_id, self.runs > 1
+
+
+class Alvo:
+    """
+    Monta a requisição de cada app.
+
+    - `agentos`: POST /agents/{agent_id}/runs (form), com session_id/user_id (exemplo2).
+    - `exemplo1`: POST /agente_pdf?pergunta=... (sem sessão: o endpoint não recebe session_id).
+    """
+
+    def __init__(self, tipo: str, url: str, agent_id: str = "agente_pdf", stream: bool = True):
+        self.tipo = tipo
+        self.url = url.rstrip("/")
+        self.agent_id = agent_id
+        self.stream = stream
+
+    def requisicao(self, pergunta: str, usuario: Usuario, session_id: Optional[str]) -> Dict[str, Any]:
+        if self.tipo == "exemplo1":
+            return {"method": "POST", "url": f"{self.url}/agente_pdf",
+                    "params": {"pergunta": pergunta, "stream": str(self.stream).lower()}}
+        dados = {"message": pergunta, "stream": str(self.stream).lower(), "user_id": usuario.user_id}
+        if session_id:
+            dados["session_id"] = session_id
+        return {"method": "POST", "url": f"{self.url}/agents/{self.agent_id}/runs", "data": dados}
+
+
+async def executar_uma(cliente: httpx.AsyncClient, alvo: Alvo, pergunta: str, usuario: Usuario) -> Resultado:
+    session_id, reaproveitada = usuario.proxima_sessao()
+    if alvo.tipo == "exemplo1":
+        reaproveitada = False
+    resultado = Resultado(inicio=time.perf_counter(), sessao_reaproveitada=reaproveitada)
+    try:
+        async with cliente.stream(**alvo.requisicao(pergunta, usuario, session_id)) as resposta:
+            resultado.status = resposta.status_code
+            resultado.cache = resposta.headers.get("x-cache")
+            resultado.etapas = ler_server_timing(resposta.headers.get("server-timing"))
+            if resposta.status_code != 200:
+                resultado.erro = f"http_{resposta.status_code}"
+                await resposta.aread()
+            elif alvo.stream:
+                # TTFT: primeiro RunContent com texto (o mesmo momento em que o usuário vê algo na tela)
+                async for linha in resposta.aiter_lines():
+                    resultado.bytes += len(linha) + 1
+                    if not linha.startswith("data:"):
+                        continue
+                    if resultado.ttft is None and '"RunContent"' in linha:
+                        try:
+                            evento = json.loads(linha[5:])
+                        except json.JSONDecodeError:
+                            continue
+                        if evento.get("content"):
+                            resultado.ttft = time.perf_counter() - resultado.inicio
+                    elif '"RunError"' in linha:
+                        resultado.erro = "run_error"
+            else:
+                corpo = await resposta.aread()
+                resultado.bytes = len(corpo)
+    except httpx.TimeoutException:
+        resultado.erro = "timeout"
+    except httpx.HTTPError as e:
+        resultado.erro = type(e).__name__
+    resultado.latencia = time.perf_counter() - resultado.inicio
+    return resultado
+
+
+# GERADOR ===========================================================
+class GeradorCarga:
+    """
+    Dispara perguntas contra um alvo por `duracao` segundos e devolve os resultados.
+
+    Modos:
+    - Fechado (`taxa=None`): `usuarios` clientes em loop, cada um espera a resposta (e o
+      `pensar` opcional) antes da próxima pergunta. Mede a capacidade com N usuários.
+    - Aberto (`taxa` req/s): chegadas de Poisson, independentes das respostas. Não esconde
+      a fila quando o servidor fica lento (coordinated omission); `max_em_voo` limita o cliente.
+    """
+
+    def __init__(
+        self,
+        alvo: Alvo,
+        perguntas: Sequence[Tuple[str, float]] = PERGUNTAS_PADRAO,
+        usuarios: int = 10,
+        taxa: Optional[float] = None,
+        duracao: float = 30.0,
+        aquecimento: float = 0.0,
+        runs_por_sessao: int = 3,
+        sem_sessao: float = 0.3,
+        pensar: float = 0.0,
+        max_em_voo: int = 1000,
+        timeout: float = 120.0,
+        semente: int = 42,
+    ):
+        self.alvo = alvo
+        self.perguntas = [p for p, _ in perguntas]
+        self.pesos = [w for _, w in perguntas]
+        self.usuarios = usuarios
+        self.taxa = taxa
+        self.duracao = duracao
+        self.aquecimento = aquecimento
+        self.runs_por_sessao = runs_por_sessao
+        self.sem_sessao = sem_sessao
+        self.pensar = pensar
+        self.max_em_voo = max_em_voo
+        self.timeout = timeout
+        self.rng = random.Random(semente)
+        self.resultados: List[Resultado] = []
+        self.descartadas = 0
+
+    def _sortear(self) -> str:
+        return self.rng.choices(self.perguntas, weights=self.pesos, k=1)[0]
+
+    def _guardar(self, resultado: Resultado, medir_de: float):
+        if resultado.inicio >= medir_de:  # o aquecimento não entra nas contas
+            self.resultados.append(resultado)
+
+    async def executar(self) -> List[Resultado]:
+        limites = httpx.Limits(max_connections=max(self.usuarios, self.max_em_voo), max_keepalive_connections=self.usuarios)
+        async with httpx.AsyncClient(timeout=self.timeout, limits=limites) as cliente:
+            inicio = time.perf_counter()
+            medir_de, fim = inicio + self.aquecimento, inicio + self.aquecimento + self.duracao
+            if self.taxa:
+                await self._aberto(cliente, medir_de, fim)
+            else:
+                await asyncio.gather(*(self._fechado(cliente, medir_de, fim) for _ in range(self.usuarios)))
+        return self.resultados
+
+    async def _fechado(self, cliente: httpx.AsyncClient, medir_de: float, fim: float):
+        usuario = Usuario(self.runs_por_sessao, self.sem_sessao, self.rng)
+        while time.perf_counter() < fim:
+            self._guardar(await executar_uma(cliente, self.alvo, self._sortear(), usuario), medir_de)
+            if self.pensar:
+                await asyncio.sleep(self.rng.expovariate(1 / self.pensar))
+
+    async def _aberto(self, cliente: httpx.AsyncClient, medir_de: float, fim: float):
+        usuarios = [Usuario(self.runs_por_sessao, self.sem_sessao, self.rng) for _ in range(self.usuarios)]
+        em_voo = set()
+
+        async def uma():
+            self._guardar(await executar_uma(cliente, self.alvo, self._sortear(), self.rng.choice(usuarios)), medir_de)
+
+        proxima = time.perf_counter()
+        while proxima < fim:
+            await asyncio.sleep(max(0.0, proxima - time.perf_counter()))
+            if len(em_voo) >= self.max_em_voo:
+                if proxima >= medir_de:
+                    self.descartadas += 1
+            else:
+                tarefa = asyncio.create_task(uma())
+                em_voo.add(tarefa)
+                tarefa.add_done_callback(em_voo.discard)
+            proxima += self.rng.expovariate(self.taxa)
+        if em_voo:
+            await asyncio.wait(em_voo)
+
+    def resumo(self) -> Dict[str, Any]:
+        return resumir(self.resultados, self.duracao, self.descartadas)
+
+
+def resumir(resultados: List[Resultado], duracao: float, descartadas: int = 0) -> Dict[str, Any]:
+    """Vazão, latência e TTFT (p50/p95/p99, em ms), taxa de erro e médias por etapa (Server-Timing)."""
+    ok = [r for r in resultados if r.erro is None]
+    erros: Dict[str, int] = {}
+    for r in resultados:
+        if r.erro is not None:
+            erros[r.erro] = erros.get(r.erro, 0) + 1
+    if descartadas:
+        erros["sem_vaga_no_cliente"] = descartadas
+    total = len(resultados) + descartadas
+    latencias = [r.latencia * 1000 for r in ok]
+    ttfts = [r.ttft * 1000 for r in ok if r.ttft is not None]
+    etapas: Dict[str, List[float]] = {}
+    for r in ok:
+        for nome, ms in r.etapas.items():
+            etapas.setdefault(nome, []).append(ms)
+
+    def quantis(valores: List[float]) -> Dict[str, float]:
+        return {f"p{p}": round(percentil(valores, p), 1) for p in (50, 95, 99)} | {"max": round(max(valores, default=0.0), 1)}
+
+    return {
+        "requisicoes": total,
+        "ok": len(ok),
+        "taxa_erro": round((total - len(ok)) / total, 4) if total else 0.0,
+        "erros": erros,
+        "vazao_rps": round(len(ok) / duracao, 2) if duracao else 0.0,
+        "latencia_ms": quantis(latencias),
+        "ttft_ms": quantis(ttfts),
+        "cache_hit": round(sum(1 for r in ok if r.cache == "HIT") / len(ok), 3) if ok else 0.0,
+        "sessoes_reaproveitadas": sum(1 for r in ok if r.sessao_reaproveitada),
+        "etapas_ms": {nome: round(sum(v) / len(v), 1) for nome, v in sorted(etapas.items())},
+    }
+
+
+# HISTÓRICO =========================================================
+# Métricas comparadas entre execuções: (caminho no resumo, maior é melhor?)
+COMPARADAS = [
+    (("vazao_rps",), True),
+    (("latencia_ms", "p50"), False),
+    (("latencia_ms", "p95"), False),
+    (("latencia_ms", "p99"), False),
+    (("ttft_ms", "p50"), False),
+    (("ttft_ms", "p95"), False),
+    (("taxa_erro",), False),
+]
+
+
+def _commit_atual() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def salvar(registro: Dict[str, Any], arquivo: str):
+    """Acrescenta uma linha JSON ao histórico (um arquivo por máquina/ambiente, versionável)."""
+    caminho = Path(arquivo)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    with open(caminho, "a", encoding="utf-8") as f:
+        f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+
+def ultimo_registro(arquivo: str, cenario: str) -> Optional[Dict[str, Any]]:
+    caminho = Path(arquivo)
+    if not caminho.exists():
+        return None
+    anterior = None
+    for linha in caminho.read_text(encoding="utf-8").splitlines():
+        try:
+            registro = json.loads(linha)
+        except json.JSONDecodeError:
+            continue
+        if registro.get("cenario") == cenario:
+            anterior = registro
+    return anterior
+
+
+def comparar(atual: Dict[str, Any], anterior: Dict[str, Any], tolerancia: float = 0.10) -> List[Dict[str, Any]]:
+    """Diferença de cada métrica em relação à execução anterior; `regressao` se piorou além da tolerância."""
+    linhas = []
+    for caminho, maior_melhor in COMPARADAS:
+        a, b = atual, anterior
+        for chave in caminho:
+            a, b = (a or {}).get(chave), (b or {}).get(chave)
+        if a is None or b is None:
+            continue
+        variacao = (a - b) / b if b else (0.0 if a == b else float("inf"))
+        piorou = variacao < -tolerancia if maior_melhor else variacao > tolerancia
+        if caminho == ("taxa_erro",):
+            piorou = a - b > 0.01  # taxa de erro: compara em pontos percentuais
+        linhas.append({"metrica": ".".join(caminho), "anterior": b, "atual": a, "variacao": round(variacao, 3), "regressao": piorou})
+    return linhas
+
+
+def imprimir(resumo: Dict[str, Any], comparacao: Optional[List[Dict[str, Any]]] = None):
+    print(f"\n📦 {resumo['requisicoes']} requisições, {resumo['ok']} ok, erro {resumo['taxa_erro']:.2%} {resumo['erros'] or ''}")
+    print(f"🚀 Vazão: {resumo['vazao_rps']} req/s   cache hit: {resumo['cache_hit']:.0%}   sessões reaproveitadas: {resumo['sessoes_reaproveitadas']}")
+    print(f"{'':<14}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for nome in ("latencia_ms", "ttft_ms"):
+        q = resumo[nome]
+        print(f"{nome:<14}{q['p50']:>10}{q['p95']:>10}{q['p99']:>10}{q['max']:>10}")
+    if resumo["etapas_ms"]:
+        print("🔢 Etapas (média do Server-Timing, ms): " + ", ".join(f"{k}={v}" for k, v in resumo["etapas_ms"].items()))
+    if comparacao:
+        print(f"\n{'métrica':<18}{'anterior':>12}{'atual':>12}{'variação':>10}")
+        for linha in comparacao:
+            marca = "  ❌ regressão" if linha["regressao"] else ""
+            print(f"{linha['metrica']:<18}{linha['anterior']:>12}{linha['atual']:>12}{linha['variacao']:>+10.1%}{marca}")
+
+
+def carregar_perguntas(arquivo: str) -> List[Tuple[str, float]]:
+    """Uma pergunta por linha (peso 1) ou JSONL com {"pergunta": ..., "peso": ...}."""
+    perguntas = []
+    for linha in Path(arquivo).read_text(encoding="utf-8").splitlines():
+        linha = linha.strip()
+        if not linha:
+            continue
+        if linha.startswith("{"):
+            item = json.loads(linha)
+            perguntas.append((item["pergunta"], float(item.get("peso", 1))))
+        else:
+            perguntas.append((linha, 1.0))
+    return perguntas
+
+
+# RUN ===========================================================
+if __name__ == "__main__":
+    # Ex.: servidor fake (python servidor_fake_openai.py) + OPENAI_BASE_URL=http://localhost:8001/v1 python exemplo2.py
+    #      python carga.py --alvo agentos --url http://localhost:10000 --usuarios 20 --duracao 60 --cenario base
+    parser = argparse.ArgumentParser(description="Gerador de carga para o agente de PDF")
+    parser.add_argument("--alvo", choices=["agentos", "exemplo1"], default="agentos")
+    parser.add_argument("--url", default="http://localhost:10000")
+    parser.add_argument("--agent-id", default="agente_pdf")
+    parser.add_argument("--sem-stream", action="store_true", help="respostas JSON em vez de SSE (sem TTFT)")
+    parser.add_argument("--usuarios", type=int, default=10, help="usuários simultâneos (modo fechado)")
+    parser.add_argument("--taxa", type=float, default=None, help="req/s com chegadas de Poisson (modo aberto)")
+    parser.add_argument("--duracao", type=float, default=30.0)
+    parser.add_argument("--aquecimento", type=float, default=5.0)
+    parser.add_argument("--runs-por-sessao", type=int, default=3)
+    parser.add_argument("--sem-sessao", type=float, default=0.3, help="fração de perguntas avulsas (sem session_id)")
+    parser.add_argument("--pensar", type=float, default=0.0, help="pausa média entre perguntas de um usuário (s)")
+    parser.add_argument("--perguntas", default=None, help="arquivo .txt ou .jsonl com a mistura de perguntas")
+    parser.add_argument("--fake", default=None, help="URL do servidor fake (inclui as estatísticas dele no resultado)")
+    parser.add_argument("--cenario", default="padrao", help="nome usado para comparar com execuções anteriores")
+    parser.add_argument("--resultados", default="benchmarks/resultados.jsonl")
+    parser.add_argument("--tolerancia", type=float, default=0.10)
+    parser.add_argument("--falhar-se-regredir", action="store_true", help="sai com código 1 se alguma métrica regredir")
+    args = parser.parse_args()
+
+    alvo = Alvo(args.alvo, args.url, args.agent_id, stream=not args.sem_stream)
+    gerador = GeradorCarga(
+        alvo,
+        perguntas=carregar_perguntas(args.perguntas) if args.perguntas else PERGUNTAS_PADRAO,
+        usuarios=args.usuarios,
+        taxa=args.taxa,
+        duracao=args.duracao,
+        aquecimento=args.aquecimento,
+        runs_por_sessao=args.runs_por_sessao,
+        sem_sessao=args.sem_sessao,
+        pensar=args.pensar,
+    )
+    fake_antes = httpx.get(f"{args.fake}/estatisticas").json() if args.fake else None
+    modo = f"{args.taxa} req/s (aberto)" if args.taxa else f"{args.usuarios} usuários (fechado)"
+    print(f"🚀 {args.alvo} em {args.url}: {modo}, {args.duracao:.0f}s + {args.aquecimento:.0f}s de aquecimento")
+    asyncio.run(gerador.executar())
+    resumo = gerador.resumo()
+
+    registro = {
+        "cenario": args.cenario,
+        "quando": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _commit_atual(),
+        "configuracao": {k: v for k, v in vars(args).items() if k not in ("resultados", "falhar_se_regredir", "tolerancia")},
+        **resumo,
+    }
+    if args.fake:
+        depois = httpx.get(f"{args.fake}/estatisticas").json()
+        registro["fake"] = {
+            "configuracao": httpx.get(f"{args.fake}/configuracao").json(),
+            "estatisticas": {k: depois[k] - fake_antes.get(k, 0) for k in depois},
+        }
+
+    anterior = ultimo_registro(args.resultados, args.cenario)
+    comparacao = comparar(resumo, anterior, args.tolerancia) if anterior else None
+    if anterior:
+        ignoradas = ("url", "fake", "cenario")
+        mudou = {k for k, v in registro["configuracao"].items() if k not in ignoradas and anterior["configuracao"].get(k) != v}
+        if mudou:
+            print(f"⚠️ Configuração diferente da execução anterior do cenário '{args.cenario}': {sorted(mudou)}")
+    imprimir(resumo, comparacao)
+    salvar(registro, args.resultados)
+    print(f"\n✅ Resultado salvo em {args.resultados} (cenário '{args.cenario}')")
+    if args.falhar_se_regredir and comparacao and any(l["regressao"] for l in comparacao):
+        sys.exit(1)
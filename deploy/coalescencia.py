@@ -0,0 +1,173 @@
+#Coalescência de execuções idênticas (single-flight)
+#Várias requisições com a mesma pergunta, ao mesmo tempo, compartilham UMA execução do agente
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from agno.exceptions import InputCheckError, OutputCheckError
+from agno.os.settings import AgnoAPISettings
+from agno.os.utils import format_sse_event
+from agno.run.agent import RunErrorEvent
+from fastapi import Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from cache_respostas import acesso_verificado, escopo_do_atalho, normalizar_pergunta
+
+
+class Voo:
+    """
+    Uma execução em andamento. Guarda todos os pedaços já produzidos para que quem chegar
+    depois receba o stream desde o início (mesmos eventos, na mesma ordem).
+    """
+
+    def __init__(self):
+        self.pedacos: List = []  # eventos SSE (stream) ou o resultado final (json)
+        self.terminou = False
+        self._novo = asyncio.Condition()
+
+    async def adicionar(self, pedaco):
+        async with self._novo:
+            self.pedacos.append(pedaco)
+            self._novo.notify_all()
+
+    async def terminar(self):
+        async with self._novo:
+            self.terminou = True
+            self._novo.notify_all()
+
+    async def ler(self) -> AsyncIterator[str]:
+        lidos = 0
+        while True:
+            async with self._novo:
+                await self._novo.wait_for(lambda: lidos < len(self.pedacos) or self.terminou)
+                novos = self.pedacos[lidos:]
+                acabou = self.terminou
+            for pedaco in novos:
+                yield pedaco
+            lidos += len(novos)
+            if acabou and lidos >= len(self.pedacos):
+                return
+
+
+class Coalescedor:
+    """
+    Single-flight para execuções do agente.
+
+    A chave é (modo, user_id, pergunta normalizada). A primeira requisição (líder) dispara a
+    execução em uma task separada, então ela continua mesmo se o cliente líder desconectar;
+    as seguintes só leem o mesmo stream. Quando a execução termina, a chave é liberada.
+    """
+
+    def __init__(self, agent):
+        self.agent = agent
+        self._em_voo: Dict[Tuple[str, str, str], Voo] = {}
+        self._tasks = set()
+        self.lideres = 0
+        self.seguidores = 0
+
+    def _decolar(self, chave, execucao) -> Voo:
+        voo = self._em_voo.get(chave)
+        if voo is not None:
+            self.seguidores += 1
+            return voo
+
+        voo = Voo()
+        self._em_voo[chave] = voo
+        self.lideres += 1
+
+        async def pilotar():
+            try:
+                await execucao(voo)
+            finally:
+                # Libera a chave antes de avisar o fim: quem chegar agora começa uma nova execução
+                self._em_voo.pop(chave, None)
+                await voo.terminar()
+
+        task = asyncio.create_task(pilotar())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return voo
+
+    def stream(self, pergunta: str, user_id: Optional[str] = None) -> AsyncIterator[str]:
+        """Eventos SSE da execução (compartilhada) para a pergunta."""
+        chave = ("stream", user_id or "", normalizar_pergunta(pergunta))
+
+        async def execucao(voo: Voo):
+            # Cópia do agente por execução, como o AgentOS faz (estado isolado)
+            agent = self.agent.deep_copy()
+            try:
+                async for evento in agent.arun(
+                    pergunta, stream=True, stream_events=True, session_id=str(uuid4()), user_id=user_id
+                ):
+                    await voo.adicionar(format_sse_event(evento))
+            except (InputCheckError, OutputCheckError) as e:
+                await voo.adicionar(format_sse_event(RunErrorEvent(
+                    content=str(e), error_type=e.type, error_id=e.error_id, additional_data=e.additional_data
+                )))
+            except Exception as e:
+                # Mesmo evento que o AgentOS manda quando o run falha
+                await voo.adicionar(format_sse_event(RunErrorEvent(content=str(e))))
+
+        return self._decolar(chave, execucao).ler()
+
+    async def executar(self, pergunta: str, user_id: Optional[str] = None) -> dict:
+        """Resultado (RunOutput.to_dict()) da execução (compartilhada) para a pergunta."""
+        chave = ("json", user_id or "", normalizar_pergunta(pergunta))
+
+        async def execucao(voo: Voo):
+            agent = self.agent.deep_copy()
+            try:
+                run_output = await agent.arun(pergunta, session_id=str(uuid4()), user_id=user_id)
+                await voo.adicionar(run_output.to_dict())
+            except Exception as e:
+                await voo.adicionar(e)
+
+        resultado = None
+        async for resultado in self._decolar(chave, execucao).ler():
+            pass
+        if isinstance(resultado, Exception):
+            raise resultado
+        return resultado
+
+    def estatisticas(self) -> Dict[str, int]:
+        return {"em_voo": len(self._em_voo), "lideres": self.lideres, "seguidores": self.seguidores}
+
+
+def instalar_coalescencia_agentos(app, coalescedor: Coalescedor, settings: Optional[AgnoAPISettings] = None):
+    """
+    Coloca o coalescedor na frente da rota `/agents/{agent_id}/runs` do AgentOS (via middleware).
+
+    Só são coalescidas execuções que passam pela mesma autenticação da rota e que não têm nada
+    além de message/stream/user_id (sem `session_id`, arquivos, knowledge_filters, session_state,
+    dependencies, metadata...): o coalescedor chama `agent.arun(pergunta, user_id)` e não
+    reproduziria esses campos. O resto segue para a rota normal do AgentOS.
+
+    Args:
+        settings: Configuração do AgentOS (`agent_os.settings`), para a mesma checagem de OS_SECURITY_KEY
+    """
+    rota = f"/agents/{coalescedor.agent.id}/runs"
+
+    @app.middleware("http")
+    async def coalescencia(request: Request, call_next):
+        if request.method != "POST" or request.url.path != rota:
+            return await call_next(request)
+
+        await request.body()  # guarda o corpo para a rota do AgentOS conseguir ler de novo
+        form = await request.form()
+        user_id = escopo_do_atalho(request, form)
+        if user_id is None or not await acesso_verificado(request, settings):
+            return await call_next(request)
+        pergunta = form["message"]
+        stream = str(form.get("stream", "true")).lower() in ("true", "1")
+
+        if stream:
+            return StreamingResponse(coalescedor.stream(pergunta, user_id or None), media_type="text/event-stream")
+        try:
+            return JSONResponse(await coalescedor.executar(pergunta, user_id or None))
+        except InputCheckError as e:
+            return JSONResponse(status_code=400, content={"detail": str(e)})
+        except Exception as e:
+            return JSONResponse(status_code=500, content={"detail": str(e)})
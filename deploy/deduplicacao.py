@@ -0,0 +1,182 @@
+#Deduplicação de chunks quase idênticos (MinHash + LSH)
+#Cabeçalhos, rodapés, avisos legais e tabelas repetidas em todas as páginas só são embeddados uma vez
+#------------------------------------------
+
+#IMPORTACOES
+import sqlite3
+import threading
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from indice_lexico import tokenizar
+
+_PRIMO = np.uint64(4294967311)  # primo > 2^32
+
+
+def shingles(texto: str, k: int = 5) -> Set[int]:
+    """Conjunto de k-gramas de palavras (normalizadas), como hashes de 32 bits."""
+    tokens = tokenizar(texto)
+    if len(tokens) < k:
+        return {zlib.crc32(" ".join(tokens).encode())} if tokens else set()
+    return {zlib.crc32(" ".join(tokens[i : i + k]).encode()) for i in range(len(tokens) - k + 1)}
+
+
+@dataclass
+class Representante:
+    chunk_id: str
+    fonte: str
+    pagina: int
+    assinatura: np.ndarray
+
+
+class Deduplicador:
+    """
+    Detecta chunks quase duplicados com MinHash (`num_perm` permutações) e LSH
+    (`bandas` bandas de num_perm/bandas linhas).
+
+    O primeiro chunk de cada grupo é o representante: é ele que vai para o embedding.
+    Os seguintes com similaridade de Jaccard estimada >= `limiar` são descartados e a
+    ocorrência (fonte, página) fica registrada para o representante. As assinaturas ficam
+    em SQLite, então a deduplicação vale entre páginas, entre PDFs e entre execuções.
+
+    Com 128 permutações em 16 bandas, pares com Jaccard ~0.7 ou mais quase sempre caem no
+    mesmo balde; o `limiar` é conferido na assinatura inteira.
+    """
+
+    def __init__(
+        self,
+        db_file: str = "tmp/deduplicacao.db",
+        limiar: float = 0.85,
+        num_perm: int = 128,
+        bandas: int = 16,
+        k_shingle: int = 5,
+    ):
+        assert num_perm % bandas == 0, "num_perm precisa ser múltiplo de bandas"
+        self.limiar = limiar
+        self.num_perm = num_perm
+        self.bandas = bandas
+        self.k_shingle = k_shingle
+        aleatorio = np.random.default_rng(2024)  # fixo: as assinaturas precisam ser as mesmas entre execuções
+        self._a = aleatorio.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = aleatorio.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._lock = threading.Lock()
+
+        Path(db_file).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS representantes (
+                chunk_id TEXT PRIMARY KEY,
+                fonte TEXT NOT NULL,
+                pagina INTEGER NOT NULL,
+                assinatura BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS ocorrencias (
+                chunk_id TEXT NOT NULL,
+                fonte TEXT NOT NULL,
+                pagina INTEGER NOT NULL,
+                similaridade REAL NOT NULL,
+                PRIMARY KEY (chunk_id, fonte, pagina)
+            );
+            CREATE INDEX IF NOT EXISTS idx_ocorrencias_pagina ON ocorrencias (fonte, pagina);
+            """
+        )
+        self._representantes: Dict[str, Representante] = {}
+        self._baldes: Dict[Tuple[int, bytes], List[str]] = defaultdict(list)
+        for chunk_id, fonte, pagina, blob in self._conn.execute("SELECT * FROM representantes"):
+            self._indexar(Representante(chunk_id, fonte, pagina, np.frombuffer(blob, dtype=np.uint32)))
+
+    # MINHASH =====================================================
+    def assinatura(self, texto: str) -> np.ndarray:
+        hashes = np.fromiter(shingles(texto, self.k_shingle), dtype=np.uint64)
+        if hashes.size == 0:
+            return np.zeros(self.num_perm, dtype=np.uint32)
+        permutados = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _PRIMO
+        return permutados.min(axis=1).astype(np.uint32)
+
+    def _chaves_lsh(self, assinatura: np.ndarray):
+        linhas = self.num_perm // self.bandas
+        for banda in range(self.bandas):
+            yield banda, assinatura[banda * linhas : (banda + 1) * linhas].tobytes()
+
+    def _indexar(self, representante: Representante):
+        self._representantes[representante.chunk_id] = representante
+        for chave in self._chaves_lsh(representante.assinatura):
+            self._baldes[chave].append(representante.chunk_id)
+
+    # DEDUPLICAÇÃO ================================================
+    def verificar(self, chunk_id: str, texto: str, fonte: str, pagina: int) -> Optional[Tuple[str, float]]:
+        """
+        Returns:
+            (ID do representante, similaridade estimada) se o chunk é quase duplicado de um
+            chunk já visto em outra página/fonte, ou None (o chunk passa a ser representante).
+        """
+        assinatura = self.assinatura(texto)
+        with self._lock:
+            existente = self._representantes.get(chunk_id)
+            if existente is not None and (existente.fonte, existente.pagina) == (fonte, pagina):
+                return None  # é o próprio representante (ex.: retomada de uma ingestão interrompida)
+
+            candidatos = {c for chave in self._chaves_lsh(assinatura) for c in self._baldes.get(chave, ())}
+            melhor, melhor_similaridade = None, 0.0
+            for candidato in candidatos:
+                similaridade = float(np.mean(self._representantes[candidato].assinatura == assinatura))
+                if similaridade > melhor_similaridade:
+                    melhor, melhor_similaridade = candidato, similaridade
+            if melhor is not None and melhor_similaridade >= self.limiar:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO ocorrencias VALUES (?, ?, ?, ?)", (melhor, fonte, pagina, melhor_similaridade)
+                )
+                return melhor, melhor_similaridade
+
+            representante = Representante(chunk_id, fonte, pagina, assinatura)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO representantes VALUES (?, ?, ?, ?)", (chunk_id, fonte, pagina, assinatura.tobytes())
+            )
+            self._indexar(representante)
+            return None
+
+    def esquecer_pagina(self, fonte: str, pagina: int):
+        """Apaga as ocorrências registradas para a página (ela vai ser reprocessada ou sumiu)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM ocorrencias WHERE fonte = ? AND pagina = ?", (fonte, pagina))
+
+    def esquecer(self, chunk_ids: List[str]):
+        """Remove representantes que saíram da coleção (o próximo chunk parecido vira representante)."""
+        with self._lock:
+            for chunk_id in chunk_ids:
+                representante = self._representantes.pop(chunk_id, None)
+                if representante is None:
+                    continue
+                for chave in self._chaves_lsh(representante.assinatura):
+                    balde = self._baldes.get(chave)
+                    if balde and chunk_id in balde:
+                        balde.remove(chunk_id)
+                self._conn.execute("DELETE FROM representantes WHERE chunk_id = ?", (chunk_id,))
+                self._conn.execute("DELETE FROM ocorrencias WHERE chunk_id = ?", (chunk_id,))
+
+    def proveniencia(self, chunk_ids: List[str]) -> Dict[str, Dict[str, str]]:
+        """
+        Metadados de proveniência para os representantes: onde mais o mesmo texto aparece.
+        Ex.: {"tambem_em": "2417_2T25 p.3; 2417_2T25 p.4", "ocorrencias": 3}
+        """
+        resultado = {}
+        with self._lock:
+            for chunk_id in chunk_ids:
+                linhas = self._conn.execute(
+                    "SELECT fonte, pagina FROM ocorrencias WHERE chunk_id = ? ORDER BY fonte, pagina", (chunk_id,)
+                ).fetchall()
+                nomes = [f"{fonte.rstrip('/').split('/')[-1].rsplit('.', 1)[0]} p.{pagina}" for fonte, pagina in linhas]
+                resultado[chunk_id] = {"tambem_em": "; ".join(nomes), "ocorrencias": len(linhas) + 1}
+        return resultado
+
+    def estatisticas(self) -> Dict[str, int]:
+        with self._lock:
+            ocorrencias = self._conn.execute("SELECT COUNT(*) FROM ocorrencias").fetchone()[0]
+        return {"representantes": len(self._representantes), "duplicatas_registradas": ocorrencias}
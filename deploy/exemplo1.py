@@ -1,18 +1,32 @@
 from agno.agent import Agent
-from agno.db.sqlite import SqliteDb
-from agno.models.openai import OpenAIChat
 from agno.knowledge.knowledge import Knowledge
 from agno.knowledge.reader.pdf_reader import PDFReader
 from agno.knowledge.embedder.openai import OpenAIEmbedder
-from agno.vectordb.chroma import ChromaDb
+from agno.os.utils import format_sse_event
+from agno.vectordb.search import SearchType
 
 from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
 import uvicorn
 import asyncio
+from dataclasses import asdict
 
 import os
 from dotenv import load_dotenv
 
+from admissao import ControleAdmissao
+from cache_busca import ChromaDbComCache
+from cache_embeddings import CacheEmbeddings, EmbedderComCache
+from cache_respostas import CacheRespostas, ColetorSSE, eventos_da_resposta
+from deduplicacao import Deduplicador
+from fatos_numericos import IndiceFatos, ferramenta_fatos
+from indice_lexico import IndiceBM25
+from ingestao import ingerir_pdf_incremental
+from manifesto import Manifesto
+from metricas import METRICAS, instalar_metricas
+from orcamento_contexto import OpenAIChatComOrcamento, OrcamentoContexto
+from sessoes import SqliteDbOtimizado
+
 # Carrega .env da raiz primeiro, depois do .venv
 load_dotenv()
 load_dotenv('.venv/.env')
@@ -21,28 +35,61 @@ load_dotenv('.venv/.env')
 # IMPORTANTE:
 # - Se você mudou embedder/modelo, apague a coleção antiga para não misturar embeddings incompatíveis.
 # - A linha abaixo força o uso do embedder da OpenAI (text-embedding-3-small) para indexar e buscar.
-vector_db = ChromaDb(
+# - O embedder passa por um cache em disco: textos já embeddados (chunks e perguntas) não chamam a API.
+# - A busca passa por um cache em memória (consulta -> embedding e consulta -> resultados),
+#   invalidado a cada escrita na coleção e pela geração do manifesto de ingestão.
+# - Busca híbrida: embedding + BM25 (índice léxico local, bom para "2T25", nomes de linhas e números).
+# - Para um relatório só, dá para trocar o Chroma por `VetoresMmap(collection="pdf_agent", embedder=...)`
+#   (vetores_mmap.py): busca exata em NumPy, carrega em milissegundos e é compartilhável entre processos.
+manifesto = Manifesto(db_file="tmp/ingestao_manifest.db")
+vector_db = ChromaDbComCache(
     collection="pdf_agent",
     path="tmp/chromadb",
     persistent_client=True,
-    embedder=OpenAIEmbedder(
-        id="text-embedding-3-small",
-        api_key=os.getenv("OPENAI_API_KEY"),
+    embedder=EmbedderComCache(
+        embedder=OpenAIEmbedder(
+            id="text-embedding-3-small",
+            api_key=os.getenv("OPENAI_API_KEY"),
+        ),
+        cache=CacheEmbeddings(db_file="tmp/embeddings_cache.db"),
     ),
+    versao=manifesto.geracao,
+    indice_lexico=IndiceBM25(db_file="tmp/indice_bm25.db"),
+    search_type=SearchType.hybrid,
 )
+vector_db.sincronizar_indice_lexico()
+
+# Fatos numéricos (linhas de tabelas e valores por período) extraídos na ingestão:
+# "receita líquida 2T25" é respondida por consulta direta, com o trecho de origem,
+# sem embedding da pergunta. Coleção ingerida antes do índice existir: extrai dos chunks.
+fatos = IndiceFatos(arquivo="tmp/fatos_numericos.npz")
+if not len(fatos):
+    fatos.indexar_colecao(vector_db)
 
 knowledge = Knowledge(vector_db=vector_db)
 
 
-db = SqliteDb(session_table="agent_session", db_file="tmp/agent.db")
+# Sessões: WAL + pool + um escritor com group commit; cada run em uma linha própria e
+# só os runs recentes são carregados (o histórico antigo é compactado em segundo plano)
+db = SqliteDbOtimizado(session_table="agent_session", db_file="tmp/agent.db")
+
+# Orçamento de contexto: chunks reordenados, sem redundância e cortados nos trechos relevantes;
+# histórico sem as chamadas de ferramenta e resumido/truncado até o limite de tokens
+orcamento = OrcamentoContexto(
+    max_tokens_knowledge=int(os.getenv("MAX_TOKENS_KNOWLEDGE", "1500")),
+    max_tokens_historico=int(os.getenv("MAX_TOKENS_HISTORICO", "1000")),
+)
 
 agent = Agent(
     name="Agente de PDF",
-    model=OpenAIChat(id="gpt-5-nano", api_key=os.getenv("OPENAI_API_KEY")),
+    model=OpenAIChatComOrcamento(id="gpt-5-nano", api_key=os.getenv("OPENAI_API_KEY"), orcamento=orcamento),
     db=db,
     knowledge=knowledge,
+    knowledge_retriever=orcamento.retriever(knowledge),
+    tools=[ferramenta_fatos(fatos)],
     instructions=[
         "Você deve chamar o usuário de senhor.",
+        "Para perguntas sobre valores (receita, lucro, margem, volume em um período), use primeiro a ferramenta consultar_numeros.",
         "Sempre use a ferramenta de busca na knowledge para responder perguntas sobre o PDF.",
         "Quando responder, inclua os números e o contexto exato (trecho curto) encontrados no PDF.",
     ],
@@ -57,19 +104,81 @@ agent = Agent(
 # FASTAPI ===========================================================
 app = FastAPI(title="Agente de PDF", description="API para responder perguntas sobre o PDF")
 
+# Controle de admissão: o endpoint é assíncrono (não ocupa uma thread por pergunta),
+# então o limite de perguntas simultâneas é definido aqui, e não pelo threadpool
+admissao = ControleAdmissao(
+    max_concorrentes=int(os.getenv("MAX_CONCORRENTES", "200")),
+    max_fila=int(os.getenv("MAX_FILA", "500")),
+    timeout_fila=float(os.getenv("TIMEOUT_FILA", "10")),
+    timeout_execucao=float(os.getenv("TIMEOUT_EXECUCAO", "120")),
+)
+
+# Cache de respostas: perguntas repetidas não passam pela busca nem pelo LLM
+# (invalidado quando a coleção muda, pela geração do manifesto de ingestão)
+cache_respostas = CacheRespostas(embedder=vector_db.embedder, versao=manifesto.geracao)
+
 @app.post("/agente_pdf")
-def agente_pdf(pergunta: str):
-    response = agent.run(pergunta)
+async def agente_pdf(pergunta: str, stream: bool = False):
+    resposta, vetor = await cache_respostas.buscar(pergunta)
+
+    # Streaming (SSE): mesmos eventos do AgentOS (RunContent, ToolCallStarted, RunCompleted...)
+    if stream:
+        if resposta is not None:
+            return StreamingResponse(eventos_da_resposta(resposta, agent.id), media_type="text/event-stream")
+
+        async def eventos():
+            coletor = ColetorSSE()
+            async for evento in agent.arun(pergunta, stream=True, stream_events=True):
+                sse = format_sse_event(evento)
+                coletor.alimentar(sse)
+                yield sse
+            cache_respostas.gravar(pergunta, coletor.resposta, vetor)
+
+        # A vaga é ocupada antes da resposta (503 se lotado) e liberada quando o stream termina
+        stream = await admissao.admitir_stream(eventos())
+        return StreamingResponse(stream, media_type="text/event-stream")
+
+    if resposta is not None:
+        return {"message": resposta}
+    response = await admissao.executar(agent.arun(pergunta))
     message = response.messages[-1]
+    cache_respostas.gravar(pergunta, message.content, vetor)
     return {"message": message.content}
 
+@app.get("/status")
+def status():
+    return {
+        "etapas": METRICAS.resumo(),
+        "admissao": admissao.estatisticas(),
+        "cache_respostas": cache_respostas.estatisticas(),
+        "cache_busca": vector_db.estatisticas(),
+        "fatos": fatos.estatisticas(),
+        "sessoes": db.estatisticas(),
+        "orcamento_contexto": orcamento.estatisticas(),
+    }
+
+# Consulta direta ao índice de fatos numéricos (sem LLM nem embedding)
+@app.get("/fatos")
+def buscar_fatos(pergunta: str, limite: int = 10):
+    return {"fatos": [asdict(f) for f in fatos.buscar(pergunta, limite)]}
+# Métricas por etapa: Server-Timing em cada resposta, rastros em /metrics/rastros,
+# Prometheus em /metrics e perfil por amostragem com `X-Perfil: 1` (se METRICAS_PERFIL=1)
+METRICAS.medidor("admissao_em_execucao", lambda: admissao.em_execucao, "Perguntas em execução")
+METRICAS.medidor("admissao_na_fila", lambda: admissao.na_fila, "Perguntas esperando vaga")
+instalar_metricas(app, permitir_perfil=os.getenv("METRICAS_PERFIL") == "1")
+
 # RUN ===========================================================
 if __name__ == "__main__":
-    asyncio.run(knowledge.add_content_async(
+    # Ingestão incremental: só embedda páginas novas/alteradas (manifesto em tmp/ingestao_manifest.db)
+    # e pula chunks quase idênticos a outros já gravados (cabeçalhos, rodapés, avisos legais)
+    asyncio.run(ingerir_pdf_incremental(
+        vector_db,
         url="https://s3.sa-east-1.amazonaws.com/static.grendene.aatb.com.br/releases/2417_2T25.pdf",
         metadata={"source": "Grendene", "type":"pdf", "description": "Relatório Trimestral 2T25"},
-        skip_if_exists=True,
-        reader=PDFReader()
+        reader=PDFReader(),
+        manifesto=manifesto,
+        deduplicador=Deduplicador(db_file="tmp/deduplicacao.db"),
+        fatos=fatos,
     ))
     uvicorn.run("exemplo1:app", host="0.0.0.0", port=8000, reload=True)
 
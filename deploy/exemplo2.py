@@ -1,21 +1,37 @@
 from agno.agent import Agent
-from agno.db.sqlite import SqliteDb
 from agno.models.openai import OpenAIChat
 from agno.knowledge.knowledge import Knowledge
 from agno.knowledge.reader.pdf_reader import PDFReader
 from agno.knowledge.embedder.openai import OpenAIEmbedder
 from agno.vectordb.chroma import ChromaDb
+from agno.vectordb.search import SearchType
 from agno.os import AgentOS
 
-import os
 import asyncio
+import os
+import subprocess
+import sys
+from contextlib import asynccontextmanager
+from dataclasses import asdict
 from dotenv import load_dotenv
+from fastapi.responses import JSONResponse
 
-# Tentar importar RateLimitError, mas não é obrigatório
-try:
-    from openai import RateLimitError
-except ImportError:
-    RateLimitError = None
+from cache_busca import ChromaDbComCache
+from cache_embeddings import CacheEmbeddings, EmbedderComCache
+from cache_respostas import CacheRespostas, instalar_cache_agentos
+from coalescencia import Coalescedor, instalar_coalescencia_agentos
+from deduplicacao import Deduplicador
+from fatos_numericos import IndiceFatos, ferramenta_fatos
+from fragmentos import ColecaoFragmentada, instalar_rotas_fragmentos
+from geracoes import IndiceSomenteLeitura, PublicadorGeracoes
+from indice_lexico import IndiceBM25
+from ingestao import LimitadorTokenBucket, ingerir_pdf_incremental
+from manifesto import Manifesto
+from memorias import MemoriaAdiada
+from metricas import METRICAS, instalar_metricas
+from orcamento_contexto import OpenAIChatComOrcamento, OrcamentoContexto
+from sessoes import SqliteDbOtimizado
+from tarefas_ingestao import FilaIngestao, instalar_rotas_ingestao, restaurar_snapshot
 
 # Carrega .env da raiz primeiro, depois do .venv
 load_dotenv()
@@ -25,30 +41,123 @@ load_dotenv('.venv/.env')
 if not os.getenv("OPENAI_API_KEY"):
     raise ValueError("OPENAI_API_KEY não encontrada. Verifique o arquivo .env na raiz do projeto ou em .venv/.env")
 
+# PROCESSOS =========================================================
+# Com WORKERS=1 (padrão) um processo faz tudo (PAPEL=unico). Com WORKERS>1, `python exemplo2.py`
+# sobe um processo escritor (PAPEL=escritor, na PORTA_ESCRITOR: ingestão, fragmentos e publicação
+# de gerações imutáveis do índice) e WORKERS processos leitores do uvicorn na PORT (PAPEL=leitor),
+# que leem a geração atual por memória mapeada e trocam sozinhos quando sai uma nova.
+WORKERS = int(os.getenv("WORKERS", "1"))
+PAPEL = os.getenv("PAPEL") or ("leitor" if WORKERS > 1 else "unico")
+
+# SNAPSHOT DO ÍNDICE ================================================
+# Com SNAPSHOT_INDICE apontando para um snapshot (POST /ingestao/snapshot), um servidor novo
+# (ex.: disco vazio no deploy) extrai o índice pronto antes de abrir a coleção e já sobe
+# respondendo; a ingestão em segundo plano só processa o que mudou desde o snapshot.
+SNAPSHOT_INDICE = os.getenv("SNAPSHOT_INDICE", "snapshots/indice.tar.gz")
+CAMINHOS_SNAPSHOT = [
+    "tmp/chromadb",
+    "tmp/fragmentos",
+    "tmp/fragmentos.db",
+    "tmp/ingestao_manifest.db",
+    "tmp/deduplicacao.db",
+    "tmp/fatos_numericos.npz",
+    "tmp/embeddings_cache.db",
+]
+if PAPEL != "leitor":
+    restaurar_snapshot(SNAPSHOT_INDICE)
+
 # RAG
-embedder = OpenAIEmbedder(
-    id="text-embedding-3-small",
-    api_key=os.getenv("OPENAI_API_KEY"),
-)
-vector_db = ChromaDb(
-    collection="pdf_agent",
-    path="tmp/chromadb",
-    persistent_client=True,
-    embedder=embedder
+# O embedder passa por um cache em disco: reiniciar o servidor ou reingerir um PDF sem mudanças
+# não chama a API de embeddings, e perguntas repetidas são embeddadas localmente.
+embedder = EmbedderComCache(
+    embedder=OpenAIEmbedder(
+        id="text-embedding-3-small",
+        api_key=os.getenv("OPENAI_API_KEY"),
+    ),
+    cache=CacheEmbeddings(db_file="tmp/embeddings_cache.db"),
 )
+# A busca (tool search_knowledge) também tem cache em memória: consulta -> embedding e
+# consulta -> resultados, invalidado a cada escrita na coleção e pela geração do manifesto.
+# A busca é híbrida: embedding + BM25 (índice léxico local, bom para "2T25" e números).
+manifesto = Manifesto(db_file="tmp/ingestao_manifest.db")
+
+def criar_fragmento(colecao: str) -> ChromaDbComCache:
+    fragmento = ChromaDbComCache(
+        collection=colecao,
+        path="tmp/chromadb",
+        persistent_client=True,
+        embedder=embedder,
+        versao=manifesto.geracao,
+        indice_lexico=IndiceBM25(db_file=f"tmp/fragmentos/{colecao}/indice_bm25.db"),
+        search_type=SearchType.hybrid,
+    )
+    fragmento.sincronizar_indice_lexico()
+    return fragmento
+
+# Fatos numéricos (linhas de tabelas e valores por período) extraídos na ingestão:
+# "receita líquida 2T25" é respondida por consulta direta, com o trecho de origem,
+# sem embedding da pergunta. Coleção ingerida antes do índice existir: extrai dos chunks.
+fatos = IndiceFatos(arquivo="tmp/fatos_numericos.npz")
+
+if PAPEL == "leitor":
+    # Geração publicada pelo escritor (vetores mapeados em memória + BM25 + fatos), somente leitura
+    vector_db = IndiceSomenteLeitura(diretorio="tmp/geracoes", embedder=embedder, fatos=fatos)
+else:
+    # Uma coleção por empresa (metadado "source"): perguntas filtradas por empresa só consultam
+    # o fragmento dela; sem filtro, a busca vai a todos em paralelo (com prazo) e o top-k é mesclado.
+    # Fragmentos entram e saem da busca pela API (/fragmentos) sem reiniciar o servidor.
+    vector_db = ColecaoFragmentada(
+        criar_fragmento,
+        embedder=embedder,
+        chaves=("source",),
+        prefixo="pdf_agent",
+        db_file="tmp/fragmentos.db",
+        prazo=float(os.getenv("PRAZO_BUSCA_FRAGMENTOS", "2")),
+        versao=manifesto.geracao,
+    )
+    # Coleção única de antes da fragmentação: anexada sem chave (entra em toda busca)
+    if not vector_db.registro() and ChromaDb(collection="pdf_agent", path="tmp/chromadb", persistent_client=True).exists():
+        vector_db.anexar("pdf_agent")
+    if not len(fatos):
+        for fragmento in vector_db.fragmentos().values():
+            fatos.indexar_colecao(fragmento)
+
 knowledge = Knowledge(vector_db=vector_db)
 
-db = SqliteDb(session_table="agent_session", db_file="tmp/agent.db")
+# Sessões: WAL + pool + um escritor com group commit; cada run em uma linha própria e
+# só os runs recentes são carregados (o histórico antigo é compactado em segundo plano)
+db = SqliteDbOtimizado(session_table="agent_session", db_file="tmp/agent.db")
+
+# Memórias do usuário: o run só enfileira a conversa (fila durável no mesmo SQLite) e a resposta
+# termina sem esperar o LLM de memória; workers processam a fila em lotes, com debounce por usuário
+memorias = MemoriaAdiada(
+    db_file="tmp/agent.db",
+    db=db,
+    model=OpenAIChat(id="gpt-5-nano", api_key=os.getenv("OPENAI_API_KEY")),
+    trabalhadores=int(os.getenv("MEMORIA_TRABALHADORES", "2")),
+    debounce=float(os.getenv("MEMORIA_DEBOUNCE", "5")),
+)
+
+# Orçamento de contexto: chunks reordenados, sem redundância e cortados nos trechos relevantes;
+# histórico sem as chamadas de ferramenta e resumido/truncado até o limite de tokens
+orcamento = OrcamentoContexto(
+    max_tokens_knowledge=int(os.getenv("MAX_TOKENS_KNOWLEDGE", "1500")),
+    max_tokens_historico=int(os.getenv("MAX_TOKENS_HISTORICO", "1000")),
+)
 
 agent = Agent(
     id="agente_pdf",
     name="Agente de PDF",
-    model=OpenAIChat(id="gpt-5-nano", api_key=os.getenv("OPENAI_API_KEY")),
+    model=OpenAIChatComOrcamento(id="gpt-5-nano", api_key=os.getenv("OPENAI_API_KEY"), orcamento=orcamento),
     db=db,
     knowledge=knowledge,
+    knowledge_retriever=orcamento.retriever(knowledge),
+    tools=[ferramenta_fatos(fatos)],
+    memory_manager=memorias,
     enable_user_memories=True,
     instructions=[
         "Você deve chamar o usuário de senhor.",
+        "Para perguntas sobre valores (receita, lucro, margem, volume em um período), use primeiro a ferramenta consultar_numeros.",
         "Sempre use a ferramenta de busca na knowledge para responder perguntas sobre o PDF.",
         "Quando responder, inclua os números e o contexto exato (trecho curto) encontrados no PDF.",
     ],
@@ -59,14 +168,6 @@ agent = Agent(
     debug_mode=True
 )
 
-# AGENTOS ===========================================================
-agent_os = AgentOS(
-    name="Agente de PDF",
-    agents=[agent]
-)
-
-app = agent_os.get_app()
-
 # FUNÇÃO HELPER PARA PROCESSAR PDF COM RETRY E LOTES ===========
 async def load_pdf_with_retry_and_batches(
     knowledge: Knowledge,
@@ -74,10 +175,20 @@ async def load_pdf_with_retry_and_batches(
     metadata: dict,
     reader: PDFReader,
     batch_size: int = 4,
-    max_retries: int = 5
+    max_retries: int = 5,
+    concorrencia: int = 4,
+    requisicoes_por_minuto: int = 3000,
+    tokens_por_minuto: int = 1_000_000,
 ):
     """
-    Carrega PDF processando em lotes menores com retry automático e tratamento de rate limit.
+    Carrega PDF processando em lotes concorrentes, com rate limit e retry por lote.
+    
+    Cada lote é embeddado e gravado no fragmento (coleção) do `source` do PDF assim que
+    fica pronto. Um erro 429 pausa todos os lotes pelo tempo do Retry-After e refaz apenas
+    o lote que falhou.
+    O manifesto (tmp/ingestao_manifest.db) guarda o que já foi gravado: uma execução
+    interrompida continua de onde parou e um PDF revisado só reprocessa as páginas alteradas.
+    Chunks quase idênticos (cabeçalhos, rodapés, avisos legais) são embeddados uma vez só.
     
     Args:
         knowledge: Instância do Knowledge
@@ -86,81 +197,178 @@ async def load_pdf_with_retry_and_batches(
         reader: Reader do PDF
         batch_size: Número de documentos por lote (padrão: 4)
         max_retries: Número máximo de tentativas por lote (padrão: 5)
+        concorrencia: Número de lotes processados em paralelo (padrão: 4)
+        requisicoes_por_minuto: Limite de requisições/min da API de embeddings
+        tokens_por_minuto: Limite de tokens/min da API de embeddings
     """
-    print(f"📄 Iniciando carregamento do PDF em lotes de {batch_size} documentos...")
-    
-    # Função auxiliar para retry com exponential backoff
-    async def retry_with_backoff(func, *args, **kwargs):
-        retry_delays = [2, 4, 8, 16, 60]  # Exponential backoff: 2s, 4s, 8s, 16s, 60s
-        
-        for attempt in range(max_retries):
-            try:
-                return await func(*args, **kwargs)
-            except Exception as e:
-                # Verificar se é erro 429 (rate limit)
-                error_str = str(e).lower()
-                is_rate_limit = (
-                    (RateLimitError and isinstance(e, RateLimitError)) or
-                    "429" in error_str or 
-                    "rate limit" in error_str or 
-                    "too many requests" in error_str
-                )
-                
-                if is_rate_limit:
-                    if attempt < max_retries - 1:
-                        delay = 60  # Wait 60s para erro 429 (conforme solicitado)
-                        print(f"⏳ Rate limit (429) detectado. Aguardando {delay}s antes de tentar novamente... (Tentativa {attempt + 1}/{max_retries})")
-                        await asyncio.sleep(delay)
-                        continue
-                    else:
-                        raise
-                else:
-                    # Outros erros: retry com exponential backoff normal
-                    if attempt < max_retries - 1:
-                        delay = retry_delays[min(attempt, len(retry_delays) - 1)]
-                        print(f"⚠️  Erro ao processar: {str(e)[:100]}. Aguardando {delay}s antes de tentar novamente... (Tentativa {attempt + 1}/{max_retries})")
-                        await asyncio.sleep(delay)
-                        continue
-                    else:
-                        raise
-        raise Exception(f"Falhou após {max_retries} tentativas")
-    
-    # Processar PDF com retry
-    try:
-        # Usar add_content_async com retry automático
-        await retry_with_backoff(
-            knowledge.add_content_async,
-            url=url,
-            metadata=metadata,
-            skip_if_exists=False,
-            reader=reader
-        )
-        print("✅ PDF carregado com sucesso! Base de conhecimento pronta.")
-    except Exception as e:
-        # Se falhar completamente, tentar processamento manual em lotes
-        print(f"⚠️  Método padrão falhou: {str(e)[:200]}")
-        print("🔄 Tentando processamento alternativo...")
-        raise e  # Por enquanto, apenas re-raise. Processamento em lotes manual seria mais complexo
+    fragmento = knowledge.vector_db.fragmento_para(metadata)
+    print(f"📄 Iniciando carregamento do PDF em lotes de {batch_size} documentos (fragmento {fragmento.collection_name})...")
+    resultado = await ingerir_pdf_incremental(
+        fragmento,
+        url=url,
+        metadata=metadata,
+        reader=reader,
+        manifesto=manifesto,
+        # Deduplicação por fragmento: um chunk nunca depende de outra coleção
+        deduplicador=Deduplicador(db_file=f"tmp/fragmentos/{fragmento.collection_name}/deduplicacao.db"),
+        fatos=fatos,
+        batch_size=batch_size,
+        concorrencia=concorrencia,
+        max_retries=max_retries,
+        limitador=LimitadorTokenBucket(requisicoes_por_minuto, tokens_por_minuto),
+    )
+    if resultado.lotes_falhos:
+        raise Exception(f"{resultado.lotes_falhos} lote(s) falharam: {resultado.erros[:3]}")
+    print("✅ PDF carregado com sucesso! Base de conhecimento pronta.")
+    return resultado
+
+# INGESTÃO EM SEGUNDO PLANO =========================================
+# O servidor sobe sem esperar o PDF: a ingestão roda em workers dentro do event loop do app,
+# com tarefas persistidas (submeter/status/cancelar pela API) e retomadas após um restart.
+PDF_INICIAL = {
+    "url": "https://s3.sa-east-1.amazonaws.com/static.grendene.aatb.com.br/releases/2417_2T25.pdf",
+    "metadata": {"source": "Grendene", "type": "pdf", "description": "Relatório Trimestral 2T25"},
+}
+
+fila_ingestao = FilaIngestao(
+    executar=lambda url, metadata: load_pdf_with_retry_and_batches(
+        knowledge=knowledge, url=url, metadata=metadata, reader=PDFReader(), batch_size=4, max_retries=5
+    ),
+    trabalhadores=int(os.getenv("INGESTAO_TRABALHADORES", "1")),
+    db_file="tmp/tarefas_ingestao.db",
+)
+
+# O escritor publica uma geração nova do índice para os leitores quando a coleção muda
+# (geração do manifesto ou fragmentos anexados/desanexados) e não há ingestão em andamento
+publicador = PublicadorGeracoes(diretorio="tmp/geracoes")
+
+@asynccontextmanager
+async def ciclo_de_vida(app):
+    if PAPEL == "leitor":
+        yield
+        return
+    fila_ingestao.iniciar()
+    # PDF do relatório: com o snapshot/manifesto em dia, a tarefa termina sem embeddar nada
+    fila_ingestao.submeter(**PDF_INICIAL)
+    vigia = None
+    if PAPEL == "escritor":
+        vigia = asyncio.create_task(publicador.vigiar(
+            vector_db,
+            assinatura=lambda: [manifesto.geracao(), sorted(vector_db.fragmentos())],
+            ocupado=lambda: fila_ingestao.ocupada,
+            arquivo_fatos=str(fatos.arquivo),
+        ))
+    yield
+    if vigia is not None:
+        vigia.cancel()
+    await fila_ingestao.parar()
+
+# AGENTOS ===========================================================
+agent_os = AgentOS(
+    name="Agente de PDF",
+    agents=[agent],
+    lifespan=ciclo_de_vida,
+)
+
+app = agent_os.get_app()
+
+# COALESCÊNCIA DE EXECUÇÕES =========================================
+# Perguntas iguais que chegam ao mesmo tempo (sem session_id) compartilham uma única execução;
+# todos recebem o mesmo stream de eventos. Instalada antes do cache para ficar "dentro" dele.
+coalescedor = Coalescedor(agent)
+instalar_coalescencia_agentos(app, coalescedor, agent_os.settings)
+
+# CACHE DE RESPOSTAS ================================================
+# Perguntas repetidas (texto igual ou parecido) são respondidas sem busca nem LLM.
+# O cache é invalidado quando a coleção muda (geração do manifesto de ingestão).
+cache_respostas = CacheRespostas(
+    embedder=embedder,
+    limiar=float(os.getenv("CACHE_LIMIAR", "0.95")),
+    ttl=float(os.getenv("CACHE_TTL", "3600")),
+    max_itens=int(os.getenv("CACHE_MAX_ITENS", "1000")),
+    versao=vector_db.geracao,
+)
+instalar_cache_agentos(app, agent.id, cache_respostas, agent_os.settings)
+
+@app.get("/cache/estatisticas")
+def estatisticas_cache():
+    return {
+        "respostas": cache_respostas.estatisticas(),
+        "embeddings": embedder.cache.estatisticas(),
+        "busca": vector_db.estatisticas(),
+        "coalescencia": coalescedor.estatisticas(),
+    }
+
+# Tokens economizados pelo orçamento de contexto (knowledge + histórico)
+@app.get("/orcamento/estatisticas")
+def estatisticas_orcamento():
+    return orcamento.estatisticas()
+
+# Fila de memórias: profundidade, atraso (lag) da mensagem mais antiga e lotes processados
+@app.get("/memorias/estatisticas")
+def estatisticas_memorias():
+    return memorias.estatisticas()
+
+# Consulta direta ao índice de fatos numéricos (sem LLM nem embedding)
+@app.get("/fatos")
+def buscar_fatos(pergunta: str, limite: int = 10):
+    return {"fatos": [asdict(f) for f in fatos.buscar(pergunta, limite)], "estatisticas": fatos.estatisticas()}
+
+# Geração do índice: a publicada (escritor) ou a que este worker está lendo (leitor)
+@app.get("/geracoes")
+def geracao_indice():
+    if PAPEL == "leitor":
+        return vector_db.estatisticas()
+    return {"publicada": publicador.atual()}
+
+if PAPEL == "leitor":
+    # Readiness probe dos leitores: prontos quando já abriram uma geração com chunks
+    @app.get("/prontidao")
+    def prontidao():
+        chunks = vector_db.get_count()
+        return JSONResponse({"pronto": chunks > 0, **vector_db.estatisticas()}, status_code=200 if chunks > 0 else 503)
+else:
+    # Fragmentos da knowledge: anexar/desanexar em tempo de execução
+    instalar_rotas_fragmentos(app, vector_db)
+
+    # Tarefas de ingestão, readiness probe (/prontidao) e snapshot do índice (/ingestao/snapshot)
+    instalar_rotas_ingestao(
+        app,
+        fila_ingestao,
+        contar_chunks=vector_db.get_count,
+        snapshot=SNAPSHOT_INDICE,
+        caminhos_snapshot=CAMINHOS_SNAPSHOT,
+    )
+
+# MÉTRICAS ==========================================================
+# Tempo por etapa (embedding, busca, sessão, memória, LLM e primeiro token) em cada requisição:
+# cabeçalho Server-Timing, rastros em /metricas/rastros e histogramas para o Prometheus em /metricas
+# (o /metrics é do AgentOS). Instalado por último para ficar por fora do cache e da coalescência.
+# Com METRICAS_PERFIL=1, o cabeçalho `X-Perfil: 1` gera um perfil por amostragem da requisição
+# (/metricas/perfis/{id}). Com WORKERS>1 cada leitor tem o próprio registro: o scrape mostra o processo que atendeu.
+METRICAS.medidor("memorias_fila", lambda: memorias.estatisticas()["profundidade"], "Runs esperando extração de memórias")
+if PAPEL != "leitor":
+    METRICAS.medidor("ingestao_fila", lambda: fila_ingestao.contagem().get("na_fila", 0), "Tarefas de ingestão na fila")
+instalar_metricas(app, caminho="/metricas", permitir_perfil=os.getenv("METRICAS_PERFIL") == "1")
+
 
 # RUN ===========================================================
 if __name__ == "__main__":
-    # Carregar PDF de forma assíncrona com retry e tratamento de erros
-    try:
-        asyncio.run(load_pdf_with_retry_and_batches(
-            knowledge=knowledge,
-            url="https://s3.sa-east-1.amazonaws.com/static.grendene.aatb.com.br/releases/2417_2T25.pdf",
-            metadata={"source": "Grendene", "type":"pdf", "description": "Relatório Trimestral 2T25"},
-            reader=PDFReader(),
-            batch_size=4,
-            max_retries=5
-        ))
-    except Exception as e:
-        print(f"❌ ERRO ao carregar PDF: {str(e)}")
-        print(f"⚠️  Tipo do erro: {type(e).__name__}")
-        print("⚠️  O servidor será iniciado, mas a base de conhecimento pode estar vazia.")
-        # Não interrompe o servidor, mas avisa sobre o problema
-    
-    # Iniciar servidor
+    # O PDF é ingerido em segundo plano (ciclo_de_vida): o servidor atende logo e
+    # GET /prontidao responde 503 até a coleção ter chunks
     port = int(os.getenv("PORT", "10000"))
-    print(f"🚀 Iniciando servidor na porta {port}...")
-    agent_os.serve(app="exemplo2:app", host="0.0.0.0", port=port, reload=False)
\ No newline at end of file
+    if PAPEL == "leitor":
+        # Escritor em um processo à parte (ingestão + publicação); os leitores atendem na PORT
+        porta_escritor = os.getenv("PORTA_ESCRITOR", str(port + 1))
+        escritor = subprocess.Popen(
+            [sys.executable, __file__], env={**os.environ, "PAPEL": "escritor", "PORT": porta_escritor}
+        )
+        print(f"✍️  Escritor (ingestão) na porta {porta_escritor}, pid {escritor.pid}")
+        print(f"🚀 Iniciando {WORKERS} workers leitores na porta {port}...")
+        try:
+            agent_os.serve(app="exemplo2:app", host="0.0.0.0", port=port, reload=False, workers=WORKERS)
+        finally:
+            escritor.terminate()
+    else:
+        print(f"🚀 Iniciando servidor na porta {port}...")
+        agent_os.serve(app="exemplo2:app", host="0.0.0.0", port=port, reload=False)
@@ -1,33 +1,19 @@
 #1 - IMPORTS
-import requests
 import json
-from pprint import pprint
+
+from cliente_agente import (ClienteSincrono, Erro, Retry, RunCompleted, RunContent, RunStarted,
+                            ToolCallCompleted, ToolCallStarted)
 
 AGENT_ID = "agente_pdf"
-ENDPOINT = f"http://localhost:7777/agents/{AGENT_ID}/runs"
+BASE_URL = "http://localhost:7777"
 
 #2 - Conexão com AGNO (server)
+# Um cliente para o processo inteiro: a conexão keep-alive é reaproveitada entre as mensagens,
+# o SSE é lido por um parser incremental (eventos tipados) e 429/503 têm retry com Retry-After
+cliente = ClienteSincrono(base_url=BASE_URL, agent_id=AGENT_ID)
+
 def get_response_stream(message: str):
-    response = requests.post(
-        url=ENDPOINT,
-        data={
-            "message": message,
-            "stream": "true"
-        },
-        stream=True
-    )
-    
-    #2.1 - Streaming (processamento)
-    for line in response.iter_lines():
-        if line:
-            # Parse Server-Sent Events
-            if line.startswith(b'data: '):
-                data = line[6:] # Remove 'data: ' prefix
-                try:
-                    event = json.loads(data)
-                    yield event
-                except json.JSONDecodeError:
-                    continue
+    return cliente.executar(message)
 
 #3 - Printa a resposta
 """
@@ -41,38 +27,34 @@ RunCompleted
 """
 def print_streaming_response(message: str):
     for event in get_response_stream(message):
-        event_type = event.get("event", "")
-
         # Início da execução
-        if event_type == "RunStarted":
+        if isinstance(event, RunStarted):
             print("Execução iniciada...")
             print("-"*50)
 
         # Conteúdo da resposta
-        elif event_type == "RunContent":
-            content = event.get("content", "")
-            if content:
-                print(content, end="", flush=True)
+        elif isinstance(event, RunContent):
+            if event.content:
+                print(event.content, end="", flush=True)
 
         # Tool call iniciado
-        elif event_type == "ToolCallStarted":
-            tool = event.get("tool", {})
-            tool_name = tool.get("tool_name", "Unknown")
-            tool_args = tool.get("tool_args", {})
-            print(f"TOOL INICIADA: {tool_name}")
-            print(f"ARGUMENTOS: {json.dumps(tool_args, indent=2)}")
+        elif isinstance(event, ToolCallStarted):
+            print(f"TOOL INICIADA: {event.tool_name or 'Unknown'}")
+            print(f"ARGUMENTOS: {json.dumps(event.tool_args, indent=2)}")
 
-        elif event_type == "ToolCallCompleted":
-            tool_name = event.get("tool", {}).get("tool_name")
-            print(f"TOOL CONCLUÍDA: {tool_name}")
+        elif isinstance(event, ToolCallCompleted):
+            print(f"TOOL CONCLUÍDA: {event.tool_name}")
             print("-"*50)
 
-        elif event_type == "RunCompleted":
+        elif isinstance(event, RunCompleted):
             print("Execução concluída!")
-            metrics = event.get("metrics", {})
-            if metrics:
-                print(f"MÉTRICAS: {json.dumps(metrics, indent=2)}")
+            if event.metrics:
+                print(f"MÉTRICAS: {json.dumps(event.metrics, indent=2)}")
             print("-"*50)
+
+        # Eventos do cliente: nova tentativa (429/503) ou falha definitiva
+        elif isinstance(event, (Retry, Erro)):
+            print(event.content)
         
 #4 - RUN (loop)
 if __name__ == "__main__":
@@ -0,0 +1,330 @@
+#Índice de fatos numéricos (tabelas e números rotulados do PDF)
+#"receita líquida 2T25" vira uma consulta em dicionário, com o trecho exato de onde o número saiu
+#------------------------------------------
+
+#IMPORTACOES
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+# 2T25, 1S25, 9M25, 12M24 (e anos, só em cabeçalhos de tabela)
+_PERIODO = re.compile(r"^(?:[1-4][ts]|9m|12m)\d{2}$")
+_ANO = re.compile(r"^(?:19|20)\d{2}$")
+_NUMERO = re.compile(r"\(?-?\d{1,3}(?:\.\d{3})+(?:,\d+)?\)?%?|\(?-?\d+(?:,\d+)?\)?%?")
+_VARIACAO = re.compile(r"^(?:var\.?|variacao|var%|δ|delta|a/a|t/t|p\.p\.?)$")
+_PALAVRAS_VAZIAS = {"a", "o", "as", "os", "de", "da", "do", "das", "dos", "e", "em", "no", "na", "nos", "nas",
+                    "qual", "quais", "foi", "foram", "valor", "quanto", "r", "no", "ao", "para", "pelo", "pela"}
+
+
+@dataclass
+class Fato:
+    item: str          # rótulo normalizado da linha (ex.: "receita liquida")
+    periodo: str       # "2t25", "1s25", "2025"...
+    valor: float
+    valor_texto: str   # como está no PDF (ex.: "612,3" ou "(12,5)")
+    unidade: str       # "R$ milhões", "%", ... ou ""
+    fonte: str
+    pagina: int
+    trecho: str        # linha de onde o número saiu
+
+
+def _termos(texto: str) -> List[str]:
+    # Como o `tokenizar` do índice léxico, mas mantendo períodos inteiros ("2t25", "1s25")
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.findall(r"\w+(?:[.,]\d+)*", texto)
+
+
+def _periodo(token: str) -> Optional[str]:
+    t = token.lower()
+    return t if _PERIODO.match(t) else None
+
+
+def _valor(texto: str) -> Optional[float]:
+    negativo = texto.startswith("(") or texto.startswith("-")
+    limpo = texto.strip("()%-").replace(".", "").replace(",", ".")
+    try:
+        valor = float(limpo)
+    except ValueError:
+        return None
+    return -valor if negativo else valor
+
+
+def _unidade_da_linha(linha: str) -> Optional[str]:
+    # "(R$ milhões)", "R$ 612,3 milhões", "em R$ mil", "milhões de pares"...
+    tokens = set(_termos(linha))
+    moeda = "R$" if "r$" in linha.lower() else ""
+    if tokens & {"bilhoes", "bilhao", "bi"}:
+        escala = "bilhões"
+    elif tokens & {"milhoes", "milhao", "mm", "mi"}:
+        escala = "milhões"
+    elif tokens & {"mil", "milhares"}:
+        escala = "mil"
+    else:
+        escala = ""
+    if "pares" in tokens and escala:
+        return f"{escala} de pares"
+    return f"{moeda} {escala}".strip() or None
+
+
+def extrair_fatos(texto: str, fonte: str, pagina: int) -> List[Fato]:
+    """
+    Extrai fatos numéricos do texto de uma página.
+
+    - Tabelas: uma linha de cabeçalho com 2+ períodos ("2T25 2T24 Var. 1S25 1S24 Var.") define
+      as colunas; cada linha seguinte "Rótulo n1 n2 ..." vira um fato por coluna de período.
+    - Frases: "Receita líquida de R$ 612,3 milhões no 2T25" vira (receita liquida, 2t25, 612,3).
+    """
+    fatos: List[Fato] = []
+    colunas: List[str] = []  # períodos e marcadores de variação ("var") do último cabeçalho
+    unidade_pagina = ""
+    for linha in (l.strip() for l in texto.splitlines()):
+        if not linha:
+            continue
+        unidade = _unidade_da_linha(linha)
+        tokens = linha.split()
+        normalizados = [(_termos(t) or [t.lower()])[0] for t in tokens]
+        periodos = [t for t in normalizados if _PERIODO.match(t) or _ANO.match(t)]
+
+        # Cabeçalho de tabela: vários períodos e nenhum outro número
+        numeros_fora = [t for t in normalizados if _NUMERO.fullmatch(t) and not _ANO.match(t)]
+        if len(periodos) >= 2 and not numeros_fora:
+            colunas = [t if (_PERIODO.match(t) or _ANO.match(t)) else "var" for t in normalizados
+                       if _PERIODO.match(t) or _ANO.match(t) or _VARIACAO.match(t)]
+            if unidade:
+                unidade_pagina = unidade
+            continue
+        if unidade and not _NUMERO.search(linha):
+            unidade_pagina = unidade  # título da tabela, ex.: "(R$ milhões)"
+            continue
+
+        # Rótulo = texto antes do primeiro número (ou período)
+        primeiro = next((i for i, t in enumerate(tokens) if _NUMERO.fullmatch(t.strip("R$")) or _periodo(normalizados[i])), None)
+        if primeiro is None or primeiro == 0:
+            continue
+        rotulo = " ".join(_termos(" ".join(tokens[:primeiro])))
+        rotulo = re.sub(r"^(?:a|o|as|os)\s+|(?:\s+(?:r|de|do|da|em|no|na|foi|foram))+$", "", rotulo).strip()
+        if not re.search(r"[a-z]{3,}", rotulo) or len(rotulo) > 80:
+            continue
+        resto = tokens[primeiro:]
+        unidade_linha = unidade or unidade_pagina
+
+        periodos_linha = [p for p in (_periodo(t) for t in normalizados[primeiro:]) if p]
+        valores = [t for t in resto if _NUMERO.fullmatch(t) and not _periodo(t.lower())]
+        if len(periodos_linha) == 1:
+            # Frase com período explícito: o primeiro número depois do período
+            depois = resto[normalizados[primeiro:].index(periodos_linha[0]) + 1:]
+            numero = next((t for t in depois if _NUMERO.fullmatch(t)), None) or (valores[0] if valores else None)
+            if numero and _valor(numero) is not None:
+                fatos.append(Fato(rotulo, periodos_linha[0], _valor(numero), numero,
+                                  "%" if numero.endswith("%") else unidade_linha, fonte, pagina, linha))
+            continue
+
+        if colunas and len(valores) >= len([c for c in colunas if c != "var"]):
+            # Linha de tabela: com a mesma quantidade de colunas mapeia direto; senão, só os períodos
+            alvo = colunas if len(valores) == len(colunas) else [c for c in colunas if c != "var"]
+            for coluna, numero in zip(alvo, valores):
+                valor = _valor(numero)
+                if coluna == "var" or valor is None:
+                    continue
+                fatos.append(Fato(rotulo, coluna, valor, numero, "%" if numero.endswith("%") else unidade_linha,
+                                  fonte, pagina, linha))
+    return fatos
+
+
+class IndiceFatos:
+    """
+    Fatos numéricos em formato colunar (um `.npz` com uma coluna por campo e tabelas de
+    strings), carregado em dicionários para consulta em microssegundos.
+
+    A ingestão substitui os fatos de cada página processada (`substituir_pagina`) e grava
+    o arquivo no fim (`salvar`). A busca casa os termos da pergunta com os rótulos das linhas
+    (Jaccard entre tokens) e filtra pelo período, se a pergunta tiver um (ex.: "2T25").
+    """
+
+    def __init__(self, arquivo: str = "tmp/fatos_numericos.npz", limiar: float = 0.5):
+        self.arquivo = Path(arquivo)
+        self.limiar = limiar
+        self._lock = threading.Lock()
+        self._por_pagina: Dict[Tuple[str, int], List[Fato]] = {}
+        self._por_token: Dict[str, Set[str]] = defaultdict(set)
+        self._por_item: Dict[str, List[Fato]] = defaultdict(list)
+        self._carregar()
+
+    def __len__(self):
+        return sum(len(l) for l in self._por_pagina.values())
+
+    # ARQUIVO =====================================================
+    def _carregar(self):
+        if not self.arquivo.exists():
+            return
+        with np.load(self.arquivo) as dados:
+            tabelas = {nome: dados[f"t_{nome}"].tolist() for nome in ["item", "periodo", "unidade", "fonte", "trecho"]}
+            colunas = {nome: dados[nome].tolist() for nome in ["item", "periodo", "valor", "valor_texto", "unidade", "fonte", "pagina", "trecho"]}
+        for i in range(len(colunas["valor"])):
+            fato = Fato(
+                item=tabelas["item"][colunas["item"][i]],
+                periodo=tabelas["periodo"][colunas["periodo"][i]],
+                valor=colunas["valor"][i],
+                valor_texto=colunas["valor_texto"][i],
+                unidade=tabelas["unidade"][colunas["unidade"][i]],
+                fonte=tabelas["fonte"][colunas["fonte"][i]],
+                pagina=colunas["pagina"][i],
+                trecho=tabelas["trecho"][colunas["trecho"][i]],
+            )
+            self._por_pagina.setdefault((fato.fonte, fato.pagina), []).append(fato)
+        self._reindexar()
+
+    def recarregar(self, arquivo: Optional[str] = None):
+        """Relê o índice do disco (ex.: o arquivo de uma geração publicada por outro processo)."""
+        novo = IndiceFatos(arquivo or self.arquivo, self.limiar)
+        with self._lock:
+            self.arquivo = novo.arquivo
+            self._por_pagina, self._por_token, self._por_item = novo._por_pagina, novo._por_token, novo._por_item
+
+    def salvar(self):
+        """Grava as colunas (strings repetidas viram códigos inteiros) em um .npz, com troca atômica."""
+        with self._lock:
+            fatos = [f for lista in self._por_pagina.values() for f in lista]
+            tabelas: Dict[str, Dict[str, int]] = {n: {} for n in ["item", "periodo", "unidade", "fonte", "trecho"]}
+
+            def codigos(campo: str, dtype):
+                tabela = tabelas[campo]
+                return np.array([tabela.setdefault(getattr(f, campo), len(tabela)) for f in fatos], dtype=dtype)
+
+            colunas = {
+                "item": codigos("item", np.int32),
+                "periodo": codigos("periodo", np.int16),
+                "unidade": codigos("unidade", np.int16),
+                "fonte": codigos("fonte", np.int16),
+                "trecho": codigos("trecho", np.int32),
+                "valor": np.array([f.valor for f in fatos], dtype=np.float64),
+                "valor_texto": np.array([f.valor_texto for f in fatos], dtype=str),
+                "pagina": np.array([f.pagina for f in fatos], dtype=np.int32),
+            }
+            for nome, tabela in tabelas.items():
+                colunas[f"t_{nome}"] = np.array(list(tabela), dtype=str)
+
+            self.arquivo.parent.mkdir(parents=True, exist_ok=True)
+            temporario = self.arquivo.with_suffix(".tmp.npz")
+            np.savez_compressed(temporario, **colunas)
+            os.replace(temporario, self.arquivo)
+
+    # ESCRITA =====================================================
+    def _reindexar(self):
+        self._por_token = defaultdict(set)
+        self._por_item = defaultdict(list)
+        for lista in self._por_pagina.values():
+            for fato in lista:
+                self._por_item[fato.item].append(fato)
+                for token in fato.item.split():
+                    self._por_token[token].add(fato.item)
+
+    def substituir_pagina(self, fonte: str, pagina: int, texto: str) -> int:
+        """Extrai os fatos do texto da página e troca os antigos. Retorna quantos foram extraídos."""
+        fatos = extrair_fatos(texto, fonte, pagina)
+        with self._lock:
+            if fatos:
+                self._por_pagina[(fonte, pagina)] = fatos
+            else:
+                self._por_pagina.pop((fonte, pagina), None)
+            self._reindexar()
+        return len(fatos)
+
+    def remover_paginas(self, fonte: str, paginas: Iterable[int]):
+        with self._lock:
+            for pagina in paginas:
+                self._por_pagina.pop((fonte, pagina), None)
+            self._reindexar()
+
+    def indexar_colecao(self, vector_db, lote: int = 1000) -> int:
+        """Extrai os fatos de uma coleção do Chroma já ingerida (agrupando os chunks por nome e página)."""
+        if not vector_db.exists():
+            return 0
+        colecao = vector_db.client.get_collection(name=vector_db.collection_name)
+        paginas: Dict[Tuple[str, int], List[str]] = defaultdict(list)
+        for inicio in range(0, colecao.count(), lote):
+            resultado = colecao.get(offset=inicio, limit=lote, include=["documents", "metadatas"])
+            for texto, meta in zip(resultado["documents"], resultado["metadatas"]):
+                paginas[(str(meta.get("name", "")), int(meta.get("page", 0)))].append(texto)
+        total = sum(self.substituir_pagina(fonte, pagina, "\n".join(textos)) for (fonte, pagina), textos in paginas.items())
+        self.salvar()
+        return total
+
+    # BUSCA =======================================================
+    def buscar(self, pergunta: str, limite: int = 10) -> List[Fato]:
+        tokens = _termos(pergunta)
+        periodos = {t for t in tokens if _PERIODO.match(t) or _ANO.match(t)}
+        termos = {t for t in tokens if t not in periodos and t not in _PALAVRAS_VAZIAS}
+        if not termos:
+            return []
+        with self._lock:
+            candidatos = {item for termo in termos for item in self._por_token.get(termo, ())}
+            pontuados = []
+            for item in candidatos:
+                palavras = set(item.split())
+                jaccard = len(termos & palavras) / len(termos | palavras)
+                if jaccard >= self.limiar:
+                    pontuados.append((jaccard, item))
+            pontuados.sort(reverse=True)
+            resultado: List[Fato] = []
+            for _, item in pontuados:
+                for fato in self._por_item[item]:
+                    if periodos and fato.periodo not in periodos:
+                        continue
+                    resultado.append(fato)
+                if len(resultado) >= limite:
+                    break
+        # Tabelas repetidas (ex.: resumo na capa e no anexo) geram o mesmo fato: mostra uma vez
+        vistos, unicos = set(), []
+        for fato in resultado:
+            chave = (fato.item, fato.periodo, fato.valor, fato.unidade)
+            if chave not in vistos:
+                vistos.add(chave)
+                unicos.append(fato)
+        return unicos[:limite]
+
+    def estatisticas(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "fatos": sum(len(l) for l in self._por_pagina.values()),
+                "itens": len(self._por_item),
+                "paginas": len(self._por_pagina),
+            }
+
+
+def ferramenta_fatos(indice: IndiceFatos):
+    """Cria a tool do agente que consulta o índice de fatos numéricos."""
+
+    def consultar_numeros(pergunta: str) -> str:
+        """
+        Busca números exatos do PDF (linhas de tabelas e valores citados no texto), com página
+        e trecho de origem. Use ANTES da busca na knowledge para perguntas sobre valores, por
+        exemplo "receita líquida 2T25" ou "margem EBITDA 1S25". Se não encontrar nada, use a
+        busca na knowledge.
+
+        Args:
+            pergunta: Nome da linha/indicador e, se houver, o período (ex.: "lucro líquido 2T25")
+        """
+        inicio = time.perf_counter()
+        fatos = indice.buscar(pergunta)
+        if not fatos:
+            return "Nenhum número encontrado no índice de fatos. Use a busca na knowledge."
+        return json.dumps(
+            {
+                "fatos": [asdict(f) for f in fatos],
+                "tempo_us": round((time.perf_counter() - inicio) * 1e6, 1),
+            },
+            ensure_ascii=False,
+        )
+
+    return consultar_numeros
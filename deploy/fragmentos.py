@@ -0,0 +1,479 @@
+#Knowledge fragmentada em várias coleções
+#Um fragmento (coleção própria) por valor de metadado (ex.: empresa); a busca vai em paralelo só aos fragmentos do filtro
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from hashlib import md5
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from agno.knowledge.document import Document
+from agno.knowledge.embedder import Embedder
+from agno.utils.log import log_debug, logger
+from agno.vectordb.base import VectorDb
+from agno.vectordb.chroma.chromadb import reciprocal_rank_fusion
+from agno.vectordb.search import SearchType
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from cache_busca import LRU
+from metricas import medir, registrar
+
+
+def nome_colecao(prefixo: str, valores: Sequence[Any]) -> str:
+    """Nome de coleção válido no Chroma (3-63 caracteres, [a-z0-9._-]) para os valores das chaves."""
+    partes = [prefixo]
+    for valor in valores:
+        texto = unicodedata.normalize("NFKD", str(valor)).encode("ascii", "ignore").decode()
+        partes.append(re.sub(r"[^a-z0-9]+", "_", texto.lower()).strip("_") or "vazio")
+    nome = "__".join(partes)
+    if len(nome) > 63:
+        nome = f"{nome[:54]}_{md5(nome.encode()).hexdigest()[:8]}"
+    return nome
+
+
+def pontuacao(doc: Document, posicao: int) -> float:
+    """Pontuação comparável entre fragmentos (maior é melhor) para busca vetorial ou por palavra-chave."""
+    meta = doc.meta_data or {}
+    if "distances" in meta:  # vetorial: distância de cosseno (mesmo embedder em todo fragmento)
+        return 1.0 - float(meta["distances"])
+    if "bm25" in meta:
+        return float(meta["bm25"])
+    return 1.0 / (60 + posicao)
+
+
+def fundir_fragmentos(documentos: List[Document], k: int = 60) -> List[Document]:
+    """
+    RRF único sobre todos os fragmentos (busca híbrida).
+
+    O `rrf_score` de cada fragmento só depende da posição dentro dele: ordenar por ele intercala
+    o 1º de cada fragmento, depois o 2º... qualquer que seja a relevância. Aqui as duas pernas
+    são refeitas com as pontuações brutas, que valem entre fragmentos: todos os resultados
+    vetoriais ordenados pela distância e todos os léxicos pelo BM25, e o RRF é calculado de novo.
+    """
+    por_chave = {_chave_documento(doc): doc for doc in reversed(documentos)}  # fica o primeiro visto
+    vetoriais = sorted(
+        (doc for doc in documentos if "distances" in doc.meta_data), key=lambda d: float(d.meta_data["distances"])
+    )
+    lexicos = sorted((doc for doc in documentos if "bm25" in doc.meta_data), key=lambda d: -float(d.meta_data["bm25"]))
+    # Sem pontuação bruta (ex.: híbrida do Agno, sem índice léxico): entram pelo rrf_score do fragmento
+    outros = sorted(
+        (doc for doc in documentos if "distances" not in doc.meta_data and "bm25" not in doc.meta_data),
+        key=lambda d: -float(d.meta_data.get("rrf_score", 0.0)),
+    )
+    listas = []
+    for lista in (vetoriais, lexicos, outros):
+        chaves = list(dict.fromkeys(_chave_documento(doc) for doc in lista))  # sem repetidos, na melhor posição
+        listas.append([(chave, 0.0) for chave in chaves])
+    fundidos = reciprocal_rank_fusion(listas, k=k)
+    resultado = []
+    for chave, score in fundidos:
+        doc = por_chave[chave]
+        doc.meta_data["rrf_score"] = round(score, 6)
+        resultado.append(doc)
+    return resultado
+
+
+def _chave_documento(doc: Document) -> str:
+    # O mesmo texto (ex.: aviso legal) pode estar em mais de um fragmento
+    return doc.id or md5(doc.content.encode()).hexdigest()
+
+
+class ColecaoFragmentada(VectorDb):
+    """
+    Vector DB que divide a knowledge em fragmentos: uma coleção por combinação de valores das
+    `chaves` de metadados (ex.: `source="Grendene"` -> coleção `pdf_agent__grendene`).
+
+    - Escrita: `fragmento_para(metadata)` devolve (e cria, se preciso) o fragmento dos metadados;
+      a ingestão grava direto nele. Uma ingestão com problema só afeta aquele fragmento.
+    - Busca: o roteador escolhe os fragmentos compatíveis com os filtros da consulta
+      (`{"source": "Grendene"}` -> um fragmento; sem filtro -> todos), embedda a consulta uma
+      vez, busca em paralelo com prazo de `prazo` segundos e mescla o top-k. Fragmentos que
+      estouram o prazo ficam de fora daquela resposta (contados em `estatisticas()`).
+    - Registro (SQLite): `anexar`/`desanexar` incluem ou tiram um fragmento da busca em tempo de
+      execução, sem reiniciar o servidor; desanexar não apaga os dados.
+
+    Args:
+        criar_fragmento: `(nome_da_colecao) -> ChromaDbComCache` (path, embedder e BM25 do fragmento)
+        embedder: Embedder das consultas (o mesmo dos fragmentos)
+        chaves: Campos de metadados que definem o fragmento
+        prefixo: Prefixo dos nomes das coleções
+        db_file: SQLite do registro de fragmentos
+        prazo: Prazo (segundos) da busca em cada fragmento
+        search_type: Tipo de busca dos fragmentos (keyword não precisa de embedding da consulta)
+    """
+
+    def __init__(
+        self,
+        criar_fragmento: Callable[[str], VectorDb],
+        embedder: Embedder,
+        chaves: Sequence[str] = ("source",),
+        prefixo: str = "pdf_agent",
+        db_file: str = "tmp/fragmentos.db",
+        prazo: float = 2.0,
+        search_type: SearchType = SearchType.hybrid,
+        versao: Callable[[], int] = lambda: 0,
+        id: Optional[str] = None,
+        name: Optional[str] = None,
+        description: Optional[str] = None,
+    ):
+        super().__init__(id=id or f"fragmentado-{prefixo}", name=name or prefixo, description=description)
+        self.criar_fragmento = criar_fragmento
+        self.embedder = embedder
+        self.chaves = tuple(chaves)
+        self.prefixo = prefixo
+        self.prazo = prazo
+        self.search_type = search_type
+        self.versao = versao
+        self._lock = threading.RLock()
+        self._fragmentos: Dict[str, VectorDb] = {}
+        self._valores: Dict[str, Dict[str, Any]] = {}
+        self._geracao_local = 0
+        self._embeddings_consulta = LRU(2048)
+        self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="fragmentos")
+        self._latencias: Dict[str, deque] = {}
+        self._estatisticas = {"buscas": 0, "fragmentos_consultados": 0, "fora_do_prazo": 0, "erros": 0}
+
+        Path(db_file).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fragmentos (
+                colecao TEXT PRIMARY KEY,
+                valores TEXT NOT NULL,
+                ativo INTEGER NOT NULL,
+                criado REAL NOT NULL
+            )
+            """
+        )
+        for colecao, valores in self._conn.execute("SELECT colecao, valores FROM fragmentos WHERE ativo = 1").fetchall():
+            self._abrir(colecao, json.loads(valores))
+
+    # REGISTRO ====================================================
+    def _abrir(self, colecao: str, valores: Dict[str, Any]) -> VectorDb:
+        fragmento = self._fragmentos.get(colecao)
+        if fragmento is None:
+            fragmento = self.criar_fragmento(colecao)
+            self._fragmentos[colecao] = fragmento
+            self._valores[colecao] = valores
+            self._latencias[colecao] = deque(maxlen=200)
+            self.invalidar()
+        return fragmento
+
+    def fragmento_para(self, metadata: Optional[Dict[str, Any]]) -> VectorDb:
+        """Fragmento (criado e anexado se ainda não existir) dos chunks com estes metadados."""
+        metadata = metadata or {}
+        faltando = [c for c in self.chaves if c not in metadata]
+        if faltando:
+            raise ValueError(f"Metadados sem as chaves do fragmento: {faltando}")
+        valores = {c: metadata[c] for c in self.chaves}
+        colecao = nome_colecao(self.prefixo, valores.values())
+        with self._lock:
+            if colecao in self._fragmentos:
+                return self._fragmentos[colecao]
+        return self.anexar(colecao, valores)
+
+    def anexar(self, colecao: str, valores: Optional[Dict[str, Any]] = None) -> VectorDb:
+        """
+        Inclui a coleção na busca (ex.: uma coleção legada ou vinda de outro servidor/snapshot).
+
+        Args:
+            colecao: Nome da coleção no Chroma
+            valores: Valores das chaves que o roteador usa; vazio = fragmento entra em toda busca
+        """
+        with self._lock:
+            linha = self._conn.execute("SELECT valores FROM fragmentos WHERE colecao = ?", (colecao,)).fetchone()
+            if valores is None:
+                valores = json.loads(linha[0]) if linha else {}
+            self._conn.execute(
+                "INSERT INTO fragmentos VALUES (?, ?, 1, ?) ON CONFLICT(colecao) DO UPDATE SET valores = excluded.valores, ativo = 1",
+                (colecao, json.dumps(valores, ensure_ascii=False, default=str), time.time()),
+            )
+            return self._abrir(colecao, valores)
+
+    def desanexar(self, colecao: str) -> bool:
+        """Tira o fragmento da busca (a coleção continua no disco e pode ser anexada de novo)."""
+        with self._lock:
+            self._conn.execute("UPDATE fragmentos SET ativo = 0 WHERE colecao = ?", (colecao,))
+            if self._fragmentos.pop(colecao, None) is None:
+                return False
+            self._valores.pop(colecao, None)
+            self._latencias.pop(colecao, None)
+            self.invalidar()
+        return True
+
+    def fragmentos(self) -> Dict[str, VectorDb]:
+        with self._lock:
+            return dict(self._fragmentos)
+
+    def registro(self) -> List[Dict[str, Any]]:
+        linhas = self._conn.execute("SELECT colecao, valores, ativo, criado FROM fragmentos ORDER BY criado").fetchall()
+        return [{"colecao": c, "valores": json.loads(v), "ativo": bool(a), "criado": cr} for c, v, a, cr in linhas]
+
+    # INVALIDAÇÃO =================================================
+    def invalidar(self):
+        self._geracao_local += 1
+
+    def geracao(self) -> Tuple[int, int]:
+        """Muda quando a coleção muda (`versao()`) ou quando um fragmento entra/sai da busca."""
+        return self.versao(), self._geracao_local
+
+    # ROTEADOR ====================================================
+    def rotear(self, filters: Optional[Any]) -> List[str]:
+        """Fragmentos cujos valores não contradizem os filtros (filtros que não são dict: todos)."""
+        with self._lock:
+            fragmentos = list(self._valores.items())
+        if not isinstance(filters, dict) or not filters:
+            return [colecao for colecao, _ in fragmentos]
+        return [
+            colecao for colecao, valores in fragmentos
+            if all(filters[chave] == valor for chave, valor in valores.items() if chave in filters)
+        ]
+
+    def _mesclar(self, resultados: Dict[str, List[Document]], limit: int) -> List[Document]:
+        documentos = []
+        for colecao, docs in resultados.items():
+            for doc in docs:
+                doc.meta_data = {**(doc.meta_data or {}), "fragmento": colecao}
+                documentos.append(doc)
+        if any("rrf_score" in doc.meta_data for doc in documentos):
+            fragmento = next(iter(self.fragmentos().values()), None)
+            return fundir_fragmentos(documentos, k=getattr(fragmento, "hybrid_rrf_k", 60))[:limit]
+
+        candidatos = []
+        for docs in resultados.values():
+            for posicao, doc in enumerate(docs):
+                candidatos.append((pontuacao(doc, posicao), posicao, doc))
+        candidatos.sort(key=lambda x: (-x[0], x[1]))
+        mesclados, vistos = [], set()
+        for _, _, doc in candidatos:
+            chave = _chave_documento(doc)
+            if chave in vistos:
+                continue
+            vistos.add(chave)
+            mesclados.append(doc)
+            if len(mesclados) == limit:
+                break
+        return mesclados
+
+    def _registrar(self, colecao: str, segundos: Optional[float]):
+        with self._lock:
+            self._estatisticas["fragmentos_consultados"] += 1
+            if segundos is None:
+                self._estatisticas["fora_do_prazo"] += 1
+            elif colecao in self._latencias:
+                self._latencias[colecao].append(segundos * 1000)
+
+    def _precisa_embedding(self) -> bool:
+        return self.search_type != SearchType.keyword
+
+    # BUSCA =======================================================
+    # search e async_search só diferem na chamada ao embedder e em como os fragmentos rodam
+    # (threads ou tasks); o resto fica nos passos abaixo
+    def _vetor_em_cache(self, query: str) -> Tuple[Optional[List[float]], bool]:
+        """(embedding da consulta, se ainda falta calcular)."""
+        if not self._precisa_embedding():
+            return None, False
+        vetor = self._embeddings_consulta.buscar(query)
+        return vetor, vetor is None
+
+    def _guardar_vetor(self, query: str, vetor: Optional[List[float]]) -> bool:
+        if not vetor:
+            logger.error(f"Erro ao gerar o embedding da consulta: {query}")
+            return False
+        self._embeddings_consulta.gravar(query, vetor)
+        return True
+
+    def _juntar(self, pendentes: Dict[Any, str], concluidos, atrasados, inicio: float, limit: int) -> List[Document]:
+        """Mescla o que os fragmentos devolveram no prazo (`asyncio.Task` ou `Future`: mesma interface)."""
+        for pendente in atrasados:
+            pendente.cancel()  # thread já começada termina em segundo plano e o resultado é descartado
+            self._registrar(pendentes[pendente], None)
+        resultados = {}
+        for pendente in concluidos:
+            colecao = pendentes[pendente]
+            if pendente.exception() is not None:
+                logger.warning(f"Busca no fragmento {colecao} falhou: {pendente.exception()}")
+                self._estatisticas["erros"] += 1
+                continue
+            resultados[colecao] = pendente.result()
+            self._registrar(colecao, time.perf_counter() - inicio)
+        self._estatisticas["buscas"] += 1
+        registrar("fragmentos", time.perf_counter() - inicio, inicio)
+        if atrasados:
+            log_debug(f"Fragmentos fora do prazo ({self.prazo}s): {[pendentes[p] for p in atrasados]}")
+        return self._mesclar(resultados, limit)
+
+    async def async_search(self, query: str, limit: int = 5, filters: Optional[Any] = None) -> List[Document]:
+        alvos = self.rotear(filters)
+        if not alvos:
+            return []
+        vetor, calcular = self._vetor_em_cache(query)
+        if calcular:
+            with medir("embedding"):
+                vetor = await self.embedder.async_get_embedding(query)
+            if not self._guardar_vetor(query, vetor):
+                return []
+
+        fragmentos = self.fragmentos()
+        inicio = time.perf_counter()
+        tarefas = {
+            asyncio.ensure_future(fragmentos[c].async_search(query, limit, filters, vetor=vetor)): c
+            for c in alvos if c in fragmentos
+        }
+        if not tarefas:
+            return []
+        concluidas, atrasadas = await asyncio.wait(list(tarefas), timeout=self.prazo)
+        return self._juntar(tarefas, concluidas, atrasadas, inicio, limit)
+
+    def search(self, query: str, limit: int = 5, filters: Optional[Any] = None) -> List[Document]:
+        alvos = self.rotear(filters)
+        if not alvos:
+            return []
+        vetor, calcular = self._vetor_em_cache(query)
+        if calcular:
+            with medir("embedding"):
+                vetor = self.embedder.get_embedding(query)
+            if not self._guardar_vetor(query, vetor):
+                return []
+
+        fragmentos = self.fragmentos()
+        inicio = time.perf_counter()
+        futuros = {
+            self._executor.submit(fragmentos[c].search, query, limit, filters, vetor=vetor): c
+            for c in alvos if c in fragmentos
+        }
+        if not futuros:
+            return []
+        concluidos, atrasados = wait(list(futuros), timeout=self.prazo)
+        return self._juntar(futuros, concluidos, atrasados, inicio, limit)
+
+    def get_supported_search_types(self) -> List[str]:
+        return [SearchType.vector.value, SearchType.keyword.value, SearchType.hybrid.value]
+
+    # API DO AGNO (VectorDb) ======================================
+    # Escritas pela Knowledge vão para o fragmento dos metadados (filters); o resto vale para todos.
+    def create(self) -> None:
+        pass
+
+    async def async_create(self) -> None:
+        pass
+
+    def exists(self) -> bool:
+        return any(f.exists() for f in self.fragmentos().values())
+
+    async def async_exists(self) -> bool:
+        return self.exists()
+
+    def get_count(self) -> int:
+        return sum(f.get_count() for f in self.fragmentos().values())
+
+    def insert(self, content_hash: str, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> None:
+        self.fragmento_para(filters).insert(content_hash, documents, filters)
+
+    async def async_insert(self, content_hash: str, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> None:
+        await self.fragmento_para(filters).async_insert(content_hash, documents, filters)
+
+    def upsert(self, content_hash: str, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> None:
+        self.fragmento_para(filters).upsert(content_hash, documents, filters)
+
+    async def async_upsert(self, content_hash: str, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> None:
+        await self.fragmento_para(filters).async_upsert(content_hash, documents, filters)
+
+    def upsert_available(self) -> bool:
+        return True
+
+    def name_exists(self, name: str) -> bool:
+        return any(f.name_exists(name) for f in self.fragmentos().values())
+
+    async def async_name_exists(self, name: str) -> bool:
+        return self.name_exists(name)
+
+    def id_exists(self, id: str) -> bool:
+        return any(f.id_exists(id) for f in self.fragmentos().values())
+
+    def content_hash_exists(self, content_hash: str) -> bool:
+        return any(f.content_hash_exists(content_hash) for f in self.fragmentos().values())
+
+    def delete_by_id(self, id: str) -> bool:
+        return any([f.delete_by_id(id) for f in self.fragmentos().values()])
+
+    def delete_by_name(self, name: str) -> bool:
+        return any([f.delete_by_name(name) for f in self.fragmentos().values()])
+
+    def delete_by_content_id(self, content_id: str) -> bool:
+        return any([f.delete_by_content_id(content_id) for f in self.fragmentos().values()])
+
+    def delete_by_metadata(self, metadata: Dict[str, Any]) -> bool:
+        return any([self.fragmentos()[c].delete_by_metadata(metadata) for c in self.rotear(metadata)])
+
+    def update_metadata(self, content_id: str, metadata: Dict[str, Any]) -> None:
+        for fragmento in self.fragmentos().values():
+            fragmento.update_metadata(content_id, metadata)
+
+    def drop(self) -> None:
+        for fragmento in self.fragmentos().values():
+            fragmento.drop()
+
+    async def async_drop(self) -> None:
+        await asyncio.to_thread(self.drop)
+
+    def delete(self) -> bool:
+        return any([f.delete() for f in self.fragmentos().values()])
+
+    def optimize(self) -> None:
+        pass
+
+    # MÉTRICAS ====================================================
+    def estatisticas(self) -> Dict[str, Any]:
+        por_fragmento = {}
+        for colecao, fragmento in self.fragmentos().items():
+            latencias = sorted(self._latencias.get(colecao) or [0.0])
+            por_fragmento[colecao] = {
+                "valores": self._valores.get(colecao),
+                "chunks": fragmento.get_count(),
+                "p50_ms": round(latencias[len(latencias) // 2], 2),
+                "p95_ms": round(latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))], 2),
+            }
+        return {**self._estatisticas, "prazo_s": self.prazo, "geracao": self.geracao(), "fragmentos": por_fragmento}
+
+
+# ENDPOINTS =======================================================
+class PedidoAnexar(BaseModel):
+    valores: Optional[Dict[str, Any]] = None
+
+
+def instalar_rotas_fragmentos(app: FastAPI, colecao: ColecaoFragmentada):
+    """
+    Rotas de administração dos fragmentos:
+
+    - GET /fragmentos: registro (ativos e desanexados) e estatísticas da busca
+    - POST /fragmentos/{nome}: anexa a coleção `nome` à busca
+    - DELETE /fragmentos/{nome}: desanexa (os dados ficam no disco)
+    """
+
+    @app.get("/fragmentos")
+    def listar():
+        return {"registro": colecao.registro(), "estatisticas": colecao.estatisticas()}
+
+    @app.post("/fragmentos/{nome}")
+    def anexar(nome: str, pedido: Optional[PedidoAnexar] = None):
+        fragmento = colecao.anexar(nome, pedido.valores if pedido else None)
+        return {"colecao": nome, "chunks": fragmento.get_count()}
+
+    @app.delete("/fragmentos/{nome}")
+    def desanexar(nome: str):
+        if not colecao.desanexar(nome):
+            return JSONResponse({"detail": "Fragmento não está anexado"}, status_code=404)
+        return {"colecao": nome, "ativo": False}
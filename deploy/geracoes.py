@@ -0,0 +1,445 @@
+#Gerações imutáveis do índice para servir com vários processos
+#Um processo escritor (ingestão) publica gerações; N workers leem a atual por memória mapeada e trocam sozinhos
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from agno.knowledge.document import Document
+from agno.knowledge.embedder import Embedder
+from agno.utils.log import logger
+from agno.vectordb.base import VectorDb
+from agno.vectordb.chroma.chromadb import reciprocal_rank_fusion
+from agno.vectordb.search import SearchType
+
+from cache_busca import LRU
+from fatos_numericos import IndiceFatos
+from indice_lexico import IndiceBM25
+from metricas import medir
+from vetores_mmap import VetoresMmap
+
+# Lote: (ids, embeddings, documentos, metadados)
+Lote = Tuple[List[str], List[List[float]], List[str], List[Dict[str, Any]]]
+
+
+def exportar_colecoes(vector_db, lote: int = 1000) -> Iterable[Lote]:
+    """Chunks (com embeddings) de um ChromaDb ou de todos os fragmentos ativos de uma ColecaoFragmentada."""
+    fragmentos = vector_db.fragmentos() if hasattr(vector_db, "fragmentos") else {vector_db.collection_name: vector_db}
+    for nome, fragmento in fragmentos.items():
+        if not fragmento.exists():
+            continue
+        colecao = fragmento.client.get_collection(name=fragmento.collection_name)
+        for inicio in range(0, colecao.count(), lote):
+            r = colecao.get(offset=inicio, limit=lote, include=["embeddings", "documents", "metadatas"])
+            metadados = [{**(m or {}), "fragmento": nome} for m in r["metadatas"]]
+            yield r["ids"], r["embeddings"], r["documents"], metadados
+
+
+class PublicadorGeracoes:
+    """
+    Lado escritor: grava gerações imutáveis do índice em `diretorio/g-<n>/` e aponta
+    `diretorio/ATUAL` para a mais nova (troca atômica com os.replace).
+
+    Cada geração tem os vetores em memória mapeada (VetoresMmap, congelada com journal DELETE),
+    uma cópia do índice de fatos numéricos e um `geracao.json` com a assinatura do que foi
+    exportado. Uma geração publicada nunca é alterada; as `manter` mais recentes ficam no disco
+    (workers que ainda mapeiam uma geração apagada continuam lendo até trocar: no Linux o
+    arquivo só some quando o último mapeamento fecha).
+
+    Args:
+        diretorio: Diretório das gerações
+        manter: Gerações antigas mantidas no disco
+    """
+
+    def __init__(self, diretorio: str = "tmp/geracoes", manter: int = 3):
+        self.diretorio = Path(diretorio)
+        self.manter = manter
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+
+    def atual(self) -> Optional[Dict[str, Any]]:
+        """Conteúdo do geracao.json da geração publicada (None se ainda não houver)."""
+        return ler_geracao_atual(self.diretorio)
+
+    def publicar(self, lotes: Iterable[Lote], assinatura: Any = None, arquivo_fatos: Optional[str] = None) -> Dict[str, Any]:
+        inicio = time.perf_counter()
+        anterior = self.atual()
+        numero = (anterior["numero"] + 1) if anterior else 1
+        nome = f"g-{numero:06d}"
+        destino = self.diretorio / nome
+        shutil.rmtree(destino, ignore_errors=True)  # sobra de uma publicação interrompida
+
+        vetores = VetoresMmap(collection="vetores", path=str(destino), embedder=Embedder())
+        for ids, embeddings, documentos, metadados in lotes:
+            vetores.gravar(list(ids), embeddings, list(documentos), list(metadados))
+        vetores.finalizar()
+        if arquivo_fatos and Path(arquivo_fatos).exists():
+            shutil.copy2(arquivo_fatos, destino / "fatos_numericos.npz")
+
+        info = {
+            "numero": numero,
+            "nome": nome,
+            "chunks": vetores.get_count(),
+            "assinatura": assinatura,
+            "publicada_em": time.time(),
+        }
+        (destino / "geracao.json").write_text(json.dumps(info, default=str))
+        temporario = self.diretorio / "ATUAL.tmp"
+        temporario.write_text(nome)
+        os.replace(temporario, self.diretorio / "ATUAL")
+
+        for antiga in sorted(self.diretorio.glob("g-*"))[: -(self.manter + 1)]:
+            shutil.rmtree(antiga, ignore_errors=True)
+        info["segundos"] = round(time.perf_counter() - inicio, 2)
+        print(f"📦 Geração {nome} publicada: {info['chunks']} chunks em {info['segundos']}s")
+        return info
+
+    async def vigiar(
+        self,
+        vector_db,
+        assinatura: Callable[[], Any],
+        ocupado: Callable[[], bool] = lambda: False,
+        arquivo_fatos: Optional[str] = None,
+        intervalo: float = 5.0,
+    ):
+        """
+        Publica uma geração nova sempre que `assinatura()` mudar (ex.: geração do manifesto +
+        fragmentos ativos) e nenhuma ingestão estiver em andamento (`ocupado()`). Rodar no lifespan.
+        """
+        while True:
+            try:
+                atual = self.atual()
+                valor = json.loads(json.dumps(assinatura(), default=str))
+                if not ocupado() and (atual is None or atual.get("assinatura") != valor):
+                    await asyncio.to_thread(self.publicar, exportar_colecoes(vector_db), valor, arquivo_fatos)
+            except Exception as e:
+                logger.error(f"Falha ao publicar geração do índice: {e}")
+            await asyncio.sleep(intervalo)
+
+
+def ler_geracao_atual(diretorio) -> Optional[Dict[str, Any]]:
+    ponteiro = Path(diretorio) / "ATUAL"
+    if not ponteiro.exists():
+        return None
+    arquivo = Path(diretorio) / ponteiro.read_text().strip() / "geracao.json"
+    return json.loads(arquivo.read_text()) if arquivo.exists() else None
+
+
+class IndiceSomenteLeitura(VectorDb):
+    """
+    Lado leitor (cada worker do uvicorn): busca na geração atual, aberta em modo somente
+    leitura. A matriz de vetores é mapeada em memória, então N workers compartilham as mesmas
+    páginas do page cache; o BM25 da geração é montado em memória na troca.
+
+    A cada busca (no máximo uma vez a cada `intervalo` segundos) o ponteiro ATUAL é relido; se
+    mudou, a geração nova é aberta em uma thread (montar o BM25 e recarregar os fatos leva tempo,
+    e `geracao()` é chamada de dentro do event loop, pelo cache de respostas) e publicada com uma
+    única atribuição. Até lá, e nas buscas em andamento, vale a geração antiga. Só uma troca
+    por vez (lock); a primeira abertura, sem geração nenhuma ainda, é síncrona.
+
+    Args:
+        diretorio: Diretório das gerações (o mesmo do PublicadorGeracoes)
+        embedder: Embedder das consultas
+        fatos: Índice de fatos recarregado com o arquivo de cada geração
+        intervalo: Segundos entre verificações do ponteiro
+        search_type: vector, keyword (só BM25) ou hybrid (RRF dos dois)
+    """
+
+    def __init__(
+        self,
+        diretorio: str = "tmp/geracoes",
+        embedder: Optional[Embedder] = None,
+        fatos: Optional[IndiceFatos] = None,
+        intervalo: float = 1.0,
+        search_type: SearchType = SearchType.hybrid,
+        hybrid_rrf_k: int = 60,
+        id: Optional[str] = None,
+        name: Optional[str] = None,
+        description: Optional[str] = None,
+    ):
+        super().__init__(id=id or f"geracoes-{diretorio}", name=name or "geracoes", description=description)
+        self.diretorio = Path(diretorio)
+        self.embedder = embedder
+        self.fatos = fatos
+        self.intervalo = intervalo
+        self.search_type = search_type
+        self.hybrid_rrf_k = hybrid_rrf_k
+        self._estado: Optional[Tuple[Dict[str, Any], VetoresMmap, IndiceBM25]] = None
+        self._verificado = 0.0
+        self._trocando = threading.Lock()
+        self._embeddings_consulta = LRU(2048)
+        self.trocas = 0
+
+    # GERAÇÕES ====================================================
+    def _abrir(self, info: Dict[str, Any]) -> Tuple[Dict[str, Any], VetoresMmap, IndiceBM25]:
+        pasta = self.diretorio / info["nome"]
+        vetores = VetoresMmap(collection="vetores", path=str(pasta), embedder=self.embedder, somente_leitura=True)
+        lexico = IndiceBM25(db_file=":memory:")
+        if vetores.exists():
+            conn = sqlite3.connect(f"file:{pasta / 'vetores' / 'itens.db'}?mode=ro", uri=True)
+            lexico.adicionar(conn.execute("SELECT id, conteudo FROM itens WHERE vivo = 1"))
+            conn.close()
+        if self.fatos is not None and (pasta / "fatos_numericos.npz").exists():
+            self.fatos.recarregar(str(pasta / "fatos_numericos.npz"))
+        return info, vetores, lexico
+
+    def atualizar(self, forcar: bool = False):
+        """
+        Troca para a geração publicada, se for outra.
+
+        Args:
+            forcar: Verifica agora (sem esperar o `intervalo`) e faz a troca nesta thread
+        """
+        agora = time.monotonic()
+        if not forcar and agora - self._verificado < self.intervalo:
+            return
+        self._verificado = agora
+        try:
+            info = ler_geracao_atual(self.diretorio)
+        except (OSError, ValueError):
+            return  # publicação no meio do caminho: fica na geração atual
+        if info is None or (self._estado is not None and self._estado[0]["nome"] == info["nome"]):
+            return
+        if forcar or self._estado is None:
+            self._trocar(info)
+        elif not self._trocando.locked():
+            threading.Thread(target=self._trocar, args=(info,), name="troca-geracao", daemon=True).start()
+
+    def _trocar(self, info: Dict[str, Any]):
+        with self._trocando:
+            if self._estado is not None and self._estado[0]["nome"] == info["nome"]:
+                return  # outra thread já trocou
+            try:
+                estado = self._abrir(info)
+            except Exception as e:
+                logger.error(f"Falha ao abrir a geração {info['nome']}: {e}")
+                return
+            self._estado = estado  # publicação: uma atribuição
+            self.trocas += 1
+
+    def geracao(self) -> int:
+        self.atualizar()
+        return self._estado[0]["numero"] if self._estado else 0
+
+    # BUSCA =======================================================
+    def buscar_por_vetor(self, vetor: List[float], limit: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        self.atualizar()
+        if self._estado is None:
+            return []
+        return self._estado[1].buscar_por_vetor(vetor, limit, filters)
+
+    def _buscar(self, query: str, vetor: Optional[List[float]], limit: int, filters) -> List[Document]:
+        self.atualizar()
+        if self._estado is None:
+            return []
+        _, vetores, lexico = self._estado  # a mesma geração do começo ao fim da busca
+        filtros = filters if isinstance(filters, dict) else None
+        if self.search_type == SearchType.vector:
+            return vetores.buscar_por_vetor(vetor, limit, filtros)
+
+        lexicos = lexico.buscar(query, limit * 4 if filtros else limit * 2)
+        if self.search_type == SearchType.keyword:
+            documentos = vetores.obter([i for i, _ in lexicos])
+            resultado = [documentos[i] for i, _ in lexicos if i in documentos and _atende(documentos[i], filtros)]
+            return resultado[:limit]
+
+        por_vetor = vetores.buscar_por_vetor(vetor, limit * 2, filtros)
+        documentos = {doc.id: doc for doc in por_vetor}
+        documentos.update({i: d for i, d in vetores.obter([i for i, _ in lexicos if i not in documentos]).items() if _atende(d, filtros)})
+        lexicos = [(i, s) for i, s in lexicos if i in documentos]
+        fundidos = reciprocal_rank_fusion([[(doc.id, 0.0) for doc in por_vetor], lexicos[: limit * 2]], k=self.hybrid_rrf_k)
+        resultado = []
+        for chunk_id, score in fundidos[:limit]:
+            documentos[chunk_id].meta_data["rrf_score"] = round(score, 6)
+            resultado.append(documentos[chunk_id])
+        return resultado
+
+    def _vetor_em_cache(self, query: str) -> Tuple[bool, Optional[List[float]]]:
+        if self.search_type == SearchType.keyword:
+            return True, None
+        vetor = self._embeddings_consulta.buscar(query)
+        return vetor is not None, vetor
+
+    def search(self, query: str, limit: int = 5, filters: Optional[Any] = None) -> List[Document]:
+        pronto, vetor = self._vetor_em_cache(query)
+        if not pronto:
+            with medir("embedding"):
+                vetor = self.embedder.get_embedding(query)
+            if not vetor:
+                logger.error(f"Erro ao gerar o embedding da consulta: {query}")
+                return []
+            self._embeddings_consulta.gravar(query, vetor)
+        with medir("indice"):
+            return self._buscar(query, vetor, limit, filters)
+
+    async def async_search(self, query: str, limit: int = 5, filters: Optional[Any] = None) -> List[Document]:
+        pronto, vetor = self._vetor_em_cache(query)
+        if not pronto:
+            with medir("embedding"):
+                vetor = await self.embedder.async_get_embedding(query)
+            if not vetor:
+                logger.error(f"Erro ao gerar o embedding da consulta: {query}")
+                return []
+            self._embeddings_consulta.gravar(query, vetor)
+        with medir("indice"):
+            return await asyncio.to_thread(self._buscar, query, vetor, limit, filters)
+
+    def get_supported_search_types(self) -> List[str]:
+        return [SearchType.vector.value, SearchType.keyword.value, SearchType.hybrid.value]
+
+    # API DO AGNO (VectorDb) ======================================
+    # Somente leitura: a ingestão roda no processo escritor, que publica a próxima geração.
+    def _somente_leitura(self, *args, **kwargs):
+        raise PermissionError("Índice somente leitura: a ingestão roda no processo escritor")
+
+    insert = upsert = drop = delete = _somente_leitura
+    delete_by_id = delete_by_name = delete_by_metadata = delete_by_content_id = update_metadata = _somente_leitura
+
+    async def async_insert(self, *args, **kwargs) -> None:
+        self._somente_leitura()
+
+    async def async_upsert(self, *args, **kwargs) -> None:
+        self._somente_leitura()
+
+    async def async_drop(self) -> None:
+        self._somente_leitura()
+
+    def create(self) -> None:
+        pass
+
+    async def async_create(self) -> None:
+        pass
+
+    def exists(self) -> bool:
+        self.atualizar()
+        return self._estado is not None
+
+    async def async_exists(self) -> bool:
+        return self.exists()
+
+    def get_count(self) -> int:
+        self.atualizar()
+        return self._estado[1].get_count() if self._estado else 0
+
+    def _existe(self, campo: str, valor: str) -> bool:
+        self.atualizar()
+        return self._estado is not None and self._estado[1]._existe(f"{campo} = ?", (valor,))
+
+    def name_exists(self, name: str) -> bool:
+        return self._existe("name", name)
+
+    async def async_name_exists(self, name: str) -> bool:
+        return self.name_exists(name)
+
+    def id_exists(self, id: str) -> bool:
+        return self._existe("id", id)
+
+    def content_hash_exists(self, content_hash: str) -> bool:
+        return self._existe("content_hash", content_hash)
+
+    def optimize(self) -> None:
+        pass
+
+    def estatisticas(self) -> Dict[str, Any]:
+        self.atualizar()
+        info = self._estado[0] if self._estado else {}
+        return {
+            "geracao": info.get("nome"),
+            "chunks": self._estado[1].get_count() if self._estado else 0,
+            "publicada_ha_s": round(time.time() - info["publicada_em"], 1) if info else None,
+            "trocas": self.trocas,
+            "pid": os.getpid(),
+        }
+
+
+def _atende(doc: Document, filtros: Optional[Dict[str, Any]]) -> bool:
+    return not filtros or all((doc.meta_data or {}).get(k) == v for k, v in filtros.items())
+
+
+# BENCHMARK =======================================================
+# Vazão de busca (consultas/s) com 1, 2, 4... processos leitores sobre a mesma geração
+# mapeada em memória, e uma troca de geração publicada no meio da medição:
+#   python geracoes.py [n_vetores] [dimensões] [segundos por medição]
+# Cada processo usa uma thread de BLAS, como um worker do uvicorn; com N núcleos livres a
+# vazão deve crescer ~N vezes.
+_DIR_BENCHMARK = "tmp/benchmark_geracoes"
+
+
+def _lotes_sinteticos(n: int, dims: int, semente: int) -> Iterable[Lote]:
+    rng = np.random.default_rng(semente)
+    for inicio in range(0, n, 1000):
+        fim = min(n, inicio + 1000)
+        yield (
+            [f"chunk-{semente}-{i}" for i in range(inicio, fim)],
+            rng.standard_normal((fim - inicio, dims)).astype(np.float32),
+            [f"Trecho {i} do relatório" for i in range(inicio, fim)],
+            [{"page": i // 10, "source": "benchmark"} for i in range(inicio, fim)],
+        )
+
+
+def _leitor(dims: int, segundos: float, largada, saida):
+    indice = IndiceSomenteLeitura(diretorio=_DIR_BENCHMARK, embedder=Embedder(), intervalo=0.2, search_type=SearchType.vector)
+    consultas = np.random.default_rng(os.getpid()).standard_normal((256, dims)).astype(np.float32)
+    indice.buscar_por_vetor(consultas[0])
+    largada.wait()  # todos começam juntos, já com a geração aberta
+    feitas, fim = 0, time.perf_counter() + segundos
+    while time.perf_counter() < fim:
+        indice.buscar_por_vetor(consultas[feitas % len(consultas)], limit=5)
+        feitas += 1
+    saida.put((feitas, indice.trocas, indice.geracao()))
+
+
+def _medir(processos: int, dims: int, segundos: float, publicar_em: Optional[float] = None) -> Tuple[float, List[Tuple[int, int, int]]]:
+    import multiprocessing
+
+    contexto = multiprocessing.get_context("spawn")
+    saida = contexto.Queue()
+    largada = contexto.Barrier(processos + 1)
+    filhos = [contexto.Process(target=_leitor, args=(dims, segundos, largada, saida)) for _ in range(processos)]
+    for filho in filhos:
+        filho.start()
+    largada.wait()
+    if publicar_em is not None:
+        time.sleep(publicar_em)
+        n = ler_geracao_atual(_DIR_BENCHMARK)["chunks"]
+        PublicadorGeracoes(_DIR_BENCHMARK).publicar(_lotes_sinteticos(n, dims, semente=2), assinatura="benchmark-2")
+    resultados = [saida.get() for _ in filhos]
+    for filho in filhos:
+        filho.join()
+    return sum(r[0] for r in resultados) / segundos, resultados
+
+
+if __name__ == "__main__":
+    import sys
+
+    os.environ.update(OMP_NUM_THREADS="1", OPENBLAS_NUM_THREADS="1", MKL_NUM_THREADS="1")
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    dims = int(sys.argv[2]) if len(sys.argv) > 2 else 512
+    segundos = float(sys.argv[3]) if len(sys.argv) > 3 else 3.0
+    nucleos = os.cpu_count() or 1
+
+    shutil.rmtree(_DIR_BENCHMARK, ignore_errors=True)
+    print(f"🏗️  Publicando geração com {n} vetores de {dims} dimensões ({nucleos} núcleo(s) na máquina)...")
+    PublicadorGeracoes(_DIR_BENCHMARK).publicar(_lotes_sinteticos(n, dims, semente=1), assinatura="benchmark-1")
+
+    niveis = sorted({1, 2, 4, 8, nucleos} & set(range(1, max(nucleos, 2) + 1)))
+    print(f"{'processos':>9} {'consultas/s':>12} {'speedup':>8} {'eficiência':>11}")
+    base = None
+    for processos in niveis:
+        vazao, _ = _medir(processos, dims, segundos)
+        base = base or vazao
+        print(f"{processos:>9} {vazao:>12.0f} {vazao / base:>7.2f}x {vazao / base / processos:>10.0%}")
+
+    processos = niveis[-1]
+    print(f"\n🔁 Troca de geração com {processos} processo(s) lendo...")
+    vazao, resultados = _medir(processos, dims, segundos * 3, publicar_em=segundos * 0.3)
+    trocaram = sum(1 for _, trocas, numero in resultados if trocas >= 2 and numero == 2)
+    print(f"   {vazao:.0f} consultas/s; {trocaram}/{processos} processo(s) passaram para a geração 2 sem reiniciar")
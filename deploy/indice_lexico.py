@@ -0,0 +1,232 @@
+#Índice léxico (BM25) ao lado da coleção do Chroma
+#Perguntas sobre relatórios têm muitos termos exatos ("2T25", nomes de linhas, números)
+#que a busca só por embedding às vezes perde
+#------------------------------------------
+
+#IMPORTACOES
+import heapq
+import math
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+
+def tokenizar(texto: str) -> List[str]:
+    # Sem acento e em minúsculas; números ficam inteiros ("1.234,5", "2t25", "15,3%")
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.findall(r"\d+(?:[.,]\d+)*|\w+", texto)
+
+
+class IndiceBM25:
+    """
+    Índice invertido com ranking BM25, persistido em SQLite e mantido em memória.
+
+    O índice é atualizado pela ingestão (junto com o upsert/delete no Chroma) e guarda só
+    os IDs dos chunks: o conteúdo continua vindo do Chroma. No disco, cada chunk ganha um
+    número inteiro e as postings são (termo, número, frequência) em uma tabela WITHOUT ROWID.
+
+    Args:
+        db_file: Arquivo SQLite do índice
+        k1, b: Parâmetros do BM25
+    """
+
+    def __init__(self, db_file: str = "tmp/indice_bm25.db", k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        Path(db_file).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                doc INTEGER PRIMARY KEY,
+                chunk_id TEXT NOT NULL UNIQUE,
+                tamanho INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                termo TEXT NOT NULL,
+                doc INTEGER NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (termo, doc)
+            ) WITHOUT ROWID;
+            """
+        )
+        self._carregar()
+
+    def _carregar(self):
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._tamanhos: Dict[int, int] = {}
+        self._chunk_id: Dict[int, str] = {}
+        self._doc: Dict[str, int] = {}
+        for doc, chunk_id, tamanho in self._conn.execute("SELECT doc, chunk_id, tamanho FROM docs"):
+            self._tamanhos[doc] = tamanho
+            self._chunk_id[doc] = chunk_id
+            self._doc[chunk_id] = doc
+        for termo, doc, tf in self._conn.execute("SELECT termo, doc, tf FROM postings"):
+            self._postings[termo][doc] = tf
+        self._soma_tamanhos = sum(self._tamanhos.values())
+
+    def __len__(self):
+        return len(self._tamanhos)
+
+    # ESCRITA =====================================================
+    def adicionar(self, chunks: Iterable[Tuple[str, str]]):
+        """Indexa (chunk_id, texto). IDs já indexados são ignorados (o ID é o hash do conteúdo)."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            for chunk_id, texto in chunks:
+                if chunk_id in self._doc:
+                    continue
+                frequencias = Counter(tokenizar(texto))
+                tamanho = sum(frequencias.values())
+                doc = self._conn.execute(
+                    "INSERT INTO docs (chunk_id, tamanho) VALUES (?, ?)", (chunk_id, tamanho)
+                ).lastrowid
+                self._conn.executemany(
+                    "INSERT INTO postings VALUES (?, ?, ?)", [(t, doc, tf) for t, tf in frequencias.items()]
+                )
+                for termo, tf in frequencias.items():
+                    self._postings[termo][doc] = tf
+                self._tamanhos[doc] = tamanho
+                self._chunk_id[doc] = chunk_id
+                self._doc[chunk_id] = doc
+                self._soma_tamanhos += tamanho
+            self._conn.execute("COMMIT")
+
+    def remover(self, chunk_ids: Iterable[str]):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            for chunk_id in chunk_ids:
+                doc = self._doc.pop(chunk_id, None)
+                if doc is None:
+                    continue
+                termos = [r[0] for r in self._conn.execute("SELECT termo FROM postings WHERE doc = ?", (doc,))]
+                self._conn.execute("DELETE FROM postings WHERE doc = ?", (doc,))
+                self._conn.execute("DELETE FROM docs WHERE doc = ?", (doc,))
+                for termo in termos:
+                    postings = self._postings.get(termo)
+                    if postings is not None:
+                        postings.pop(doc, None)
+                        if not postings:
+                            del self._postings[termo]
+                self._soma_tamanhos -= self._tamanhos.pop(doc)
+                del self._chunk_id[doc]
+            self._conn.execute("COMMIT")
+
+    def limpar(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM docs")
+            self._carregar()
+
+    def reconstruir(self, colecao, lote: int = 1000):
+        """Refaz o índice a partir de uma coleção do Chroma (ex.: coleção ingerida antes do índice existir)."""
+        self.limpar()
+        total = colecao.count()
+        for inicio in range(0, total, lote):
+            resultado = colecao.get(offset=inicio, limit=lote, include=["documents"])
+            self.adicionar(zip(resultado["ids"], resultado["documents"]))
+
+    # BUSCA =======================================================
+    def buscar(self, consulta: str, limite: int = 10) -> List[Tuple[str, float]]:
+        """Returns: [(chunk_id, score)] em ordem decrescente de score."""
+        with self._lock:
+            n = len(self._tamanhos)
+            if n == 0:
+                return []
+            media = self._soma_tamanhos / n
+            scores: Dict[int, float] = defaultdict(float)
+            for termo in set(tokenizar(consulta)):
+                postings = self._postings.get(termo)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc, tf in postings.items():
+                    norma = self.k1 * (1 - self.b + self.b * self._tamanhos[doc] / media)
+                    scores[doc] += idf * tf * (self.k1 + 1) / (tf + norma)
+            melhores = heapq.nlargest(limite, scores.items(), key=lambda x: x[1])
+            return [(self._chunk_id[doc], score) for doc, score in melhores]
+
+    def estatisticas(self) -> Dict[str, int]:
+        return {"chunks": len(self._tamanhos), "termos": len(self._postings)}
+
+
+# AVALIAÇÃO OFFLINE ===============================================
+# Compara busca só por embedding (baseline), só BM25 e híbrida (RRF) em recall@k e latência:
+#   python indice_lexico.py relatorio.pdf [n_consultas] [k]
+# As consultas são geradas dos próprios chunks: um trecho curto em volta de um número
+# (ex.: "receita liquida de 1.234,5 no 2t25"). Um acerto é qualquer chunk que contenha o trecho.
+def _consultas_sinteticas(textos: List[str], n: int, janela: int = 6) -> List[str]:
+    import random
+
+    aleatorio = random.Random(42)
+    consultas = []
+    for texto in aleatorio.sample(textos, min(len(textos), n * 3)):
+        tokens = tokenizar(texto)
+        numeros = [i for i, t in enumerate(tokens) if any(c.isdigit() for c in t)]
+        if not numeros or len(tokens) < janela:
+            continue
+        centro = aleatorio.choice(numeros)
+        inicio = max(0, min(centro - janela // 2, len(tokens) - janela))
+        consultas.append(" ".join(tokens[inicio:inicio + janela]))
+        if len(consultas) == n:
+            break
+    return consultas
+
+
+if __name__ == "__main__":
+    import asyncio
+    import os
+    import shutil
+    import sys
+    import time
+
+    from agno.knowledge.embedder.openai import OpenAIEmbedder
+    from agno.vectordb.search import SearchType
+
+    from cache_busca import ChromaDbComCache
+    from ingestao import ingerir_pdf
+
+    pdf = sys.argv[1]
+    n_consultas = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    shutil.rmtree("tmp/avaliacao_bm25", ignore_errors=True)
+    vector_db = ChromaDbComCache(
+        collection="avaliacao_bm25",
+        path="tmp/avaliacao_bm25/chromadb",
+        persistent_client=True,
+        embedder=OpenAIEmbedder(id="text-embedding-3-small", api_key=os.getenv("OPENAI_API_KEY")),
+        indice_lexico=IndiceBM25(db_file="tmp/avaliacao_bm25/indice.db"),
+    )
+    asyncio.run(ingerir_pdf(vector_db, url=pdf, metadata={"source": "avaliacao"}))
+
+    colecao = vector_db.client.get_collection(name=vector_db.collection_name)
+    textos = colecao.get(include=["documents"])["documents"]
+    normalizados = [" ".join(tokenizar(t)) for t in textos]
+    consultas = _consultas_sinteticas(textos, n_consultas)
+    print(f"📊 {len(textos)} chunks, {len(consultas)} consultas, k={k}")
+
+    print(f"{'modo':10} {'recall@k':>9} {'média (ms)':>11} {'p95 (ms)':>9}")
+    for modo in [SearchType.vector, SearchType.keyword, SearchType.hybrid]:
+        vector_db.search_type = modo
+        vector_db._embeddings_consulta.limpar()  # sem cache: cada modo paga o próprio embedding
+        vector_db.invalidar()
+        acertos, tempos = 0, []
+        for consulta in consultas:
+            inicio = time.perf_counter()
+            documentos = vector_db.search(consulta, limit=k)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+            relevantes = {i for i, t in enumerate(normalizados) if consulta in t}
+            achados = {normalizados.index(" ".join(tokenizar(d.content))) for d in documentos}
+            acertos += bool(relevantes & achados)
+        tempos.sort()
+        media = sum(tempos) / len(tempos)
+        p95 = tempos[int(len(tempos) * 0.95) - 1]
+        print(f"{modo.value:10} {acertos / len(consultas):>9.3f} {media:>11.2f} {p95:>9.2f}")
@@ -0,0 +1,605 @@
+#Pipeline de ingestão de PDFs em lotes
+#Embeddings concorrentes com controle de rate limit (requisições/min e tokens/min)
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+import io
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from hashlib import md5, sha256
+from typing import Any, AsyncIterable, Callable, Dict, List, Optional, Union
+
+import httpx
+from agno.knowledge.document import Document
+from agno.knowledge.reader.pdf_reader import PDFReader
+
+from deduplicacao import Deduplicador
+from fatos_numericos import IndiceFatos
+from leitor_streaming import baixar_para_arquivo, ler_paginas_streaming
+from manifesto import Manifesto
+
+# Tentar importar RateLimitError, mas não é obrigatório
+try:
+    from openai import RateLimitError
+except ImportError:
+    RateLimitError = None
+
+
+# LIMITADOR (TOKEN BUCKET) ========================================
+class LimitadorTokenBucket:
+    """
+    Token bucket compartilhado por todos os lotes em paralelo.
+
+    Controla dois baldes ao mesmo tempo: requisições por minuto e tokens por minuto.
+    Quando a API devolve 429, `pausar` bloqueia todos os lotes até o fim do Retry-After.
+    """
+
+    def __init__(self, requisicoes_por_minuto: int = 3000, tokens_por_minuto: int = 1_000_000):
+        self.rpm = requisicoes_por_minuto
+        self.tpm = tokens_por_minuto
+        self.requisicoes = float(requisicoes_por_minuto)
+        self.tokens = float(tokens_por_minuto)
+        self.ultima_recarga = time.monotonic()
+        self.pausado_ate = 0.0
+        self._lock = asyncio.Lock()
+
+    def _recarregar(self):
+        agora = time.monotonic()
+        decorrido = agora - self.ultima_recarga
+        self.ultima_recarga = agora
+        self.requisicoes = min(self.rpm, self.requisicoes + decorrido * self.rpm / 60)
+        self.tokens = min(self.tpm, self.tokens + decorrido * self.tpm / 60)
+
+    async def adquirir(self, tokens: int):
+        """Espera até haver 1 requisição e `tokens` tokens disponíveis nos baldes."""
+        # Um lote maior que o balde inteiro nunca caberia: limita ao tamanho do balde
+        tokens = min(tokens, self.tpm)
+        while True:
+            async with self._lock:
+                self._recarregar()
+                espera_pausa = self.pausado_ate - time.monotonic()
+                if espera_pausa <= 0 and self.requisicoes >= 1 and self.tokens >= tokens:
+                    self.requisicoes -= 1
+                    self.tokens -= tokens
+                    return
+                falta_req = max(0.0, 1 - self.requisicoes) * 60 / self.rpm
+                falta_tok = max(0.0, tokens - self.tokens) * 60 / self.tpm
+                espera = max(espera_pausa, falta_req, falta_tok, 0.01)
+            await asyncio.sleep(espera)
+
+    def pausar(self, segundos: float):
+        """Pausa todos os lotes (usado quando a API responde 429)."""
+        self.pausado_ate = max(self.pausado_ate, time.monotonic() + segundos)
+
+
+# FUNÇÕES AUXILIARES ==============================================
+def estimar_tokens(texto: str) -> int:
+    # Aproximação usada pela OpenAI: ~4 caracteres por token
+    return max(1, len(texto) // 4)
+
+
+def eh_rate_limit(e: Exception) -> bool:
+    """Verifica se a exceção é um erro 429 (rate limit)."""
+    error_str = str(e).lower()
+    return bool(
+        (RateLimitError and isinstance(e, RateLimitError)) or
+        getattr(e, "status_code", None) == 429 or
+        "429" in error_str or
+        "rate limit" in error_str or
+        "too many requests" in error_str
+    )
+
+
+def retry_after(e: Exception) -> Optional[float]:
+    """Lê o header Retry-After da resposta de erro (se existir)."""
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    valor = headers.get("retry-after")
+    try:
+        return float(valor) if valor is not None else None
+    except ValueError:
+        return None
+
+
+def id_chunk(conteudo: str) -> str:
+    # Mesmo ID usado pelo ChromaDb do Agno (md5 do conteúdo)
+    return md5(conteudo.replace("\x00", "\ufffd").encode()).hexdigest()
+
+
+async def embed_lote(embedder, textos: List[str]) -> List[List[float]]:
+    """
+    Gera os embeddings de um lote de textos em UMA chamada à API.
+
+    Diferente de `OpenAIEmbedder.async_get_embeddings_batch_and_usage`, não engole erros:
+    o 429 precisa subir para o pipeline decidir quanto tempo esperar.
+    Se o embedder oferecer `async_embed_lote` (ex.: embedder com cache), ele é usado.
+    """
+    if hasattr(embedder, "async_embed_lote"):
+        return await embedder.async_embed_lote(textos)
+
+    req: Dict[str, Any] = {
+        "input": textos,
+        "model": embedder.id,
+        "encoding_format": "float",
+    }
+    if embedder.id.startswith("text-embedding-3"):
+        req["dimensions"] = embedder.dimensions
+    if embedder.request_params:
+        req.update(embedder.request_params)
+
+    # max_retries=0: quem decide o retry (e o tempo de espera) é o pipeline
+    client = embedder.aclient.with_options(max_retries=0)
+    response = await client.embeddings.create(**req)
+    return [data.embedding for data in response.data]
+
+
+def upsert_lote(vector_db, documentos: List[Document], content_hash: str, filtros: Optional[Dict[str, Any]] = None):
+    """
+    Grava no vector_db documentos que JÁ têm embedding.
+
+    O `vector_db.upsert` do Agno chama o embedder de novo para cada documento,
+    por isso o upsert é feito direto na coleção do Chroma (ou com `VetoresMmap.gravar`).
+    """
+    vector_db.create()  # idempotente: só cria se não existir
+
+    ids, textos, embeddings, metadados = [], [], [], []
+    vistos = set()
+    for doc in documentos:
+        conteudo = doc.content.replace("\x00", "\ufffd")
+        doc_id = id_chunk(conteudo)
+        # O Chroma rejeita IDs repetidos no mesmo upsert (ex.: rodapés idênticos)
+        if doc_id in vistos:
+            continue
+        vistos.add(doc_id)
+
+        metadata = dict(doc.meta_data or {})
+        if filtros:
+            metadata.update(filtros)
+        if doc.name is not None:
+            metadata["name"] = doc.name
+        if doc.content_id is not None:
+            metadata["content_id"] = doc.content_id
+        metadata["content_hash"] = content_hash
+
+        ids.append(doc_id)
+        textos.append(conteudo)
+        embeddings.append(doc.embedding)
+        metadados.append(metadata)
+
+    if not ids:
+        return
+    gravar = getattr(vector_db, "gravar", None)
+    if gravar is not None:
+        # VetoresMmap: já aceita vetores prontos
+        gravar(ids, embeddings, textos, metadados, content_hash)
+    else:
+        colecao = vector_db.client.get_collection(name=vector_db.collection_name)
+        metadados = [vector_db._flatten_metadata(m) for m in metadados]
+        colecao.upsert(ids=ids, embeddings=embeddings, documents=textos, metadatas=metadados)
+    _apos_escrita(vector_db, adicionados=zip(ids, textos))
+
+
+def remover_chunks(vector_db, ids: List[str]):
+    """Apaga do vector_db os chunks com os IDs informados."""
+    if not ids or not vector_db.exists():
+        return
+    if hasattr(vector_db, "remover_ids"):
+        vector_db.remover_ids(ids)
+    else:
+        vector_db.client.get_collection(name=vector_db.collection_name).delete(ids=ids)
+    _apos_escrita(vector_db, removidos=ids)
+
+
+def atualizar_metadados(vector_db, metadados_por_id: Dict[str, Dict[str, Any]]):
+    """Mescla metadados nos chunks já gravados (IDs que não existem são ignorados)."""
+    if not metadados_por_id or not vector_db.exists():
+        return
+    ids = list(metadados_por_id)
+    if hasattr(vector_db, "atualizar_metadados"):
+        vector_db.atualizar_metadados(ids, [metadados_por_id[i] for i in ids])
+    else:
+        colecao = vector_db.client.get_collection(name=vector_db.collection_name)
+        colecao.update(ids=ids, metadatas=[vector_db._flatten_metadata(metadados_por_id[i]) for i in ids])
+    _apos_escrita(vector_db)
+
+
+def _apos_escrita(vector_db, adicionados=(), removidos=()):
+    # Escrevemos direto na coleção: mantém o índice léxico (se houver) e avisa o
+    # ChromaDbComCache (se for o caso) que os resultados mudaram
+    indice = getattr(vector_db, "indice_lexico", None)
+    if indice is not None:
+        indice.adicionar(adicionados)
+        indice.remover(removidos)
+    invalidar = getattr(vector_db, "invalidar", None)
+    if invalidar is not None:
+        invalidar()
+
+
+# PIPELINE ========================================================
+async def _iterar(itens):
+    # Aceita lista ou async iterable com o mesmo loop
+    if isinstance(itens, list):
+        for item in itens:
+            yield item
+    else:
+        async for item in itens:
+            yield item
+
+
+@dataclass
+class ResultadoIngestao:
+    chunks: int = 0
+    lotes_ok: int = 0
+    lotes_falhos: int = 0
+    tentativas_429: int = 0
+    paginas_puladas: int = 0
+    chunks_removidos: int = 0
+    chunks_duplicados: int = 0
+    tokens_economizados: int = 0
+    segundos: float = 0.0
+    erros: List[str] = field(default_factory=list)
+
+
+async def ingerir_documentos(
+    documentos: Union[List[Document], AsyncIterable[Document]],
+    vector_db,
+    embedder=None,
+    content_hash: str = "",
+    filtros: Optional[Dict[str, Any]] = None,
+    batch_size: int = 16,
+    concorrencia: int = 4,
+    limitador: Optional[LimitadorTokenBucket] = None,
+    max_retries: int = 5,
+    ao_gravar: Optional[Callable[[List[Document]], None]] = None,
+) -> ResultadoIngestao:
+    """
+    Gera embeddings em lotes concorrentes e grava cada lote no vector_db assim que fica pronto.
+
+    Args:
+        documentos: Chunks gerados pelo reader (lista ou async iterable, ex.: leitor em streaming)
+        vector_db: ChromaDb de destino
+        embedder: Embedder usado (padrão: vector_db.embedder)
+        content_hash: Hash do conteúdo (gravado nos metadados, como o Agno faz)
+        filtros: Metadados extras aplicados a todos os chunks
+        batch_size: Número de chunks por requisição de embedding
+        concorrencia: Número máximo de lotes em paralelo
+        limitador: Token bucket compartilhado (requisições/min e tokens/min)
+        max_retries: Número máximo de tentativas por lote (contando a primeira; mínimo 1)
+        ao_gravar: Chamado (em uma thread) com cada lote logo após o upsert, ex.: para checkpoint
+    """
+    if max_retries < 1:
+        raise ValueError(f"max_retries é o número de tentativas por lote (mínimo 1), recebido: {max_retries}")
+    embedder = embedder or vector_db.embedder
+    limitador = limitador or LimitadorTokenBucket()
+    resultado = ResultadoIngestao()
+    semaforo = asyncio.Semaphore(concorrencia)
+    lock_upsert = asyncio.Lock()  # o cliente do Chroma não é seguro para escritas concorrentes
+    inicio = time.perf_counter()
+
+    if isinstance(documentos, list):
+        print(f"📄 {len(documentos)} chunks em lotes de até {batch_size} (concorrência: {concorrencia})")
+
+    async def processar_lote(numero: int, lote: List[Document]):
+        try:
+            await _processar_lote(numero, lote)
+        finally:
+            semaforo.release()
+
+    async def _processar_lote(numero: int, lote: List[Document]):
+        textos = [doc.content for doc in lote]
+        # Com embedder de cache, só os textos fora do cache consomem o limite da API
+        pendentes = await asyncio.to_thread(embedder.textos_sem_cache, textos) if hasattr(embedder, "textos_sem_cache") else textos
+        tokens = sum(estimar_tokens(t) for t in pendentes)
+
+        for attempt in range(max_retries):
+            if pendentes:
+                await limitador.adquirir(tokens)
+            try:
+                embeddings = await embed_lote(embedder, textos)
+                break
+            except Exception as e:
+                if attempt == max_retries - 1:
+                    raise
+                if eh_rate_limit(e):
+                    # Retry-After do servidor ou backoff exponencial com jitter
+                    resultado.tentativas_429 += 1
+                    delay = retry_after(e) or min(60, 2 ** (attempt + 1)) * random.uniform(0.5, 1.5)
+                    limitador.pausar(delay)
+                    print(f"⏳ Lote {numero}: rate limit (429). Aguardando {delay:.1f}s... (Tentativa {attempt + 1}/{max_retries})")
+                else:
+                    delay = min(60, 2 ** (attempt + 1)) * random.uniform(0.5, 1.5)
+                    print(f"⚠️  Lote {numero}: {str(e)[:100]}. Aguardando {delay:.1f}s... (Tentativa {attempt + 1}/{max_retries})")
+                    await asyncio.sleep(delay)
+
+        for doc, embedding in zip(lote, embeddings):
+            doc.embedding = embedding
+
+        async with lock_upsert:
+            await asyncio.to_thread(upsert_lote, vector_db, lote, content_hash, filtros)
+            if ao_gravar:
+                await asyncio.to_thread(ao_gravar, lote)
+        resultado.chunks += len(lote)
+        resultado.lotes_ok += 1
+
+    # O semáforo é adquirido aqui (e não dentro do lote) para dar backpressure:
+    # com uma fonte em streaming, não se lê mais chunks do que os lotes conseguem processar
+    tarefas = []
+
+    async def disparar(lote: List[Document]):
+        await semaforo.acquire()
+        tarefas.append(asyncio.create_task(processar_lote(len(tarefas) + 1, lote)))
+
+    lote: List[Document] = []
+    async for doc in _iterar(documentos):
+        lote.append(doc)
+        if len(lote) == batch_size:
+            await disparar(lote)
+            lote = []
+    if lote:
+        await disparar(lote)
+
+    for n, saida in enumerate(await asyncio.gather(*tarefas, return_exceptions=True), start=1):
+        if isinstance(saida, BaseException):
+            resultado.lotes_falhos += 1
+            resultado.erros.append(f"Lote {n}: {str(saida)[:200]}")
+
+    resultado.segundos = time.perf_counter() - inicio
+    print(f"✅ {resultado.lotes_ok}/{len(tarefas)} lotes gravados em {resultado.segundos:.1f}s ({resultado.tentativas_429} respostas 429)")
+    for erro in resultado.erros:
+        print(f"❌ {erro}")
+    return resultado
+
+
+async def baixar_pdf(url: str, timeout: float = 120) -> bytes:
+    """Baixa o PDF (ou lê do disco, se `url` for um caminho local)."""
+    if not url.startswith(("http://", "https://")):
+        with open(url, "rb") as f:
+            return f.read()
+    async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
+        response = await client.get(url)
+        response.raise_for_status()
+        return response.content
+
+
+async def ler_pdf(url: str, reader: Optional[PDFReader] = None) -> tuple:
+    """Baixa e lê o PDF. Retorna (bytes do arquivo, chunks)."""
+    reader = reader or PDFReader()
+    dados = await baixar_pdf(url)
+    nome = url.rstrip("/").split("/")[-1].rsplit(".", 1)[0]
+    documentos = await reader.async_read(io.BytesIO(dados), name=nome)
+    return dados, documentos
+
+
+async def ingerir_pdf(
+    vector_db,
+    url: str,
+    metadata: Optional[Dict[str, Any]] = None,
+    reader: Optional[PDFReader] = None,
+    **kwargs,
+) -> ResultadoIngestao:
+    """
+    Baixa, lê e ingere um PDF com o pipeline em lotes.
+
+    Args:
+        vector_db: ChromaDb de destino
+        url: URL (ou caminho local) do PDF
+        metadata: Metadados aplicados a todos os chunks
+        reader: Reader do PDF (padrão: PDFReader())
+        **kwargs: Repassados para `ingerir_documentos` (batch_size, concorrencia, limitador...)
+    """
+    _, documentos = await ler_pdf(url, reader)
+    content_hash = sha256(url.encode()).hexdigest()
+    return await ingerir_documentos(documentos, vector_db, content_hash=content_hash, filtros=metadata, **kwargs)
+
+
+# INGESTÃO INCREMENTAL (COM MANIFESTO) ============================
+def agrupar_por_pagina(documentos: List[Document]) -> Dict[int, List[Document]]:
+    paginas: Dict[int, List[Document]] = {}
+    for doc in documentos:
+        paginas.setdefault(int(doc.meta_data.get("page", 0)), []).append(doc)
+    return paginas
+
+
+def hash_pagina(chunks: List[Document]) -> str:
+    return sha256("\x1e".join(doc.content for doc in chunks).encode()).hexdigest()
+
+
+async def ingerir_pdf_incremental(
+    vector_db,
+    url: str,
+    metadata: Optional[Dict[str, Any]] = None,
+    reader: Optional[PDFReader] = None,
+    manifesto: Optional[Manifesto] = None,
+    streaming: bool = False,
+    deduplicador: Optional[Deduplicador] = None,
+    fatos: Optional[IndiceFatos] = None,
+    **kwargs,
+) -> ResultadoIngestao:
+    """
+    Ingere um PDF usando o manifesto para fazer só o trabalho que falta.
+
+    - PDF idêntico e já completo: nada é feito (nem leitura das páginas).
+    - Execução interrompida: as páginas já gravadas são puladas e o resto continua.
+    - PDF revisado: só as páginas com texto diferente são embeddadas e gravadas; os chunks
+      antigos dessas páginas (e de páginas que sumiram) são apagados da coleção.
+
+    Args:
+        vector_db: ChromaDb de destino
+        url: URL (ou caminho local) do PDF
+        metadata: Metadados aplicados a todos os chunks
+        reader: Reader do PDF (padrão: PDFReader())
+        manifesto: Manifesto de ingestão (padrão: tmp/ingestao_manifest.db)
+        streaming: Extrai as páginas em paralelo (processos) e já envia os chunks para o
+            embedding enquanto as páginas seguintes ainda estão sendo lidas (numeração decidida
+            nas primeiras páginas: ver `ler_paginas_streaming`)
+        deduplicador: Descarta chunks quase idênticos a outros já vistos (cabeçalhos, rodapés,
+            avisos legais); o representante recebe nos metadados onde mais o texto aparece
+        fatos: Índice de fatos numéricos (linhas de tabelas, valores por período) atualizado
+            com as páginas novas/alteradas, antes do embedding
+        **kwargs: Repassados para `ingerir_documentos` (batch_size, concorrencia, limitador...)
+    """
+    manifesto = manifesto or Manifesto()
+    reader = reader or PDFReader()
+    nome = url.rstrip("/").split("/")[-1].rsplit(".", 1)[0]
+
+    if streaming:
+        caminho, hash_fonte = await baixar_para_arquivo(url)
+    else:
+        dados = await baixar_pdf(url)
+        hash_fonte = sha256(dados).hexdigest()
+    if manifesto.fonte_completa(url, hash_fonte):
+        print("✅ PDF sem mudanças desde a última ingestão. Nada a fazer.")
+        return ResultadoIngestao()
+    manifesto.marcar_fonte(url, hash_fonte, "em_andamento")
+
+    if streaming:
+        paginas = ler_paginas_streaming(caminho, nome=nome, reader=reader)
+    else:
+        documentos = await reader.async_read(io.BytesIO(dados), name=nome)
+        paginas = list(agrupar_por_pagina(documentos).items())
+
+    hashes_antigos = manifesto.hashes_paginas(url)
+    hashes_novos: Dict[int, str] = {}
+    # Checkpoint por página: quando o último chunk da página é gravado, a página entra no manifesto
+    faltando: Dict[int, set] = {}
+    ids_pagina: Dict[int, set] = {}
+    duplicados = {"chunks": 0, "tokens": 0, "bytes_texto": 0}
+    com_duplicata: set = set()
+
+    def deduplicar(pagina: int, chunks: List[Document]) -> List[Document]:
+        # A página passa a referenciar o representante no manifesto (o chunk dele não é
+        # apagado enquanto alguma página ainda depende dele)
+        deduplicador.esquecer_pagina(url, pagina)
+        unicos = []
+        for doc in chunks:
+            chunk_id = id_chunk(doc.content)
+            duplicata = deduplicador.verificar(chunk_id, doc.content, url, pagina)
+            if duplicata is None:
+                unicos.append(doc)
+                continue
+            ids_pagina[pagina].discard(chunk_id)
+            ids_pagina[pagina].add(duplicata[0])
+            com_duplicata.add(duplicata[0])
+            duplicados["chunks"] += 1
+            duplicados["tokens"] += estimar_tokens(doc.content)
+            duplicados["bytes_texto"] += len(doc.content.encode())
+        # Se o mesmo texto aparece duas vezes na página, o ID continua sendo da página
+        ids_pagina[pagina].update(id_chunk(doc.content) for doc in unicos)
+        return unicos
+
+    def checkpoint(lote: List[Document]):
+        for doc in lote:
+            pagina = int(doc.meta_data.get("page", 0))
+            pendentes = faltando.get(pagina)
+            if pendentes is None:
+                continue
+            pendentes.discard(id_chunk(doc.content))
+            if not pendentes:
+                del faltando[pagina]
+                manifesto.concluir_pagina(url, pagina, hashes_novos[pagina], ids_pagina[pagina])
+
+    async def chunks_alterados():
+        # Filtra, página a página, só o que mudou desde a última ingestão
+        async for pagina, chunks in _iterar(paginas):
+            hashes_novos[pagina] = hash_pagina(chunks)
+            if hashes_antigos.get(pagina) == hashes_novos[pagina]:
+                continue
+            ids_pagina[pagina] = {id_chunk(doc.content) for doc in chunks}
+            if fatos is not None:
+                # Antes da deduplicação: uma tabela repetida ainda é fato da página
+                fatos.substituir_pagina(nome, pagina, "\n".join(doc.content for doc in chunks))
+            if deduplicador is not None:
+                chunks = deduplicar(pagina, chunks)
+            if not chunks:
+                manifesto.concluir_pagina(url, pagina, hashes_novos[pagina], ids_pagina[pagina])
+                continue
+            faltando[pagina] = {id_chunk(doc.content) for doc in chunks}
+            for doc in chunks:
+                yield doc
+
+    try:
+        resultado = await ingerir_documentos(
+            chunks_alterados(), vector_db, content_hash=hash_fonte, filtros=metadata, ao_gravar=checkpoint, **kwargs
+        )
+    finally:
+        if streaming and caminho != url:
+            os.remove(caminho)
+
+    alteradas = len(ids_pagina)
+    sumidas = [p for p in hashes_antigos if p not in hashes_novos]
+    resultado.paginas_puladas = len(hashes_novos) - alteradas
+    print(f"📑 {len(hashes_novos)} páginas: {alteradas} novas/alteradas, {len(sumidas)} removidas")
+
+    manifesto.remover_paginas(url, sumidas)
+    # Só agora, com todas as páginas concluídas: um chunk que perdeu a referência em uma página
+    # pode ter sido reaproveitado por outra (ex.: página inserida, as seguintes deslocadas).
+    # Inclui o que ficou pendente de uma execução interrompida desta fonte.
+    obsoletos = manifesto.remocoes_pendentes(url)
+    if obsoletos:
+        await asyncio.to_thread(remover_chunks, vector_db, obsoletos)
+        manifesto.confirmar_remocoes(url, obsoletos)
+        resultado.chunks_removidos = len(obsoletos)
+        print(f"🧹 {len(obsoletos)} chunks obsoletos removidos da coleção")
+
+    if deduplicador is not None:
+        for pagina in sumidas:
+            deduplicador.esquecer_pagina(url, pagina)
+        deduplicador.esquecer(obsoletos)
+        com_duplicata.difference_update(obsoletos)
+        if com_duplicata:
+            proveniencia = deduplicador.proveniencia(sorted(com_duplicata))
+            await asyncio.to_thread(atualizar_metadados, vector_db, proveniencia)
+        resultado.chunks_duplicados = duplicados["chunks"]
+        resultado.tokens_economizados = duplicados["tokens"]
+        if duplicados["chunks"]:
+            total = resultado.chunks + duplicados["chunks"]
+            dimensoes = getattr(vector_db.embedder, "dimensions", None) or 1536
+            mb = (duplicados["chunks"] * dimensoes * 4 + duplicados["bytes_texto"]) / 1e6
+            print(
+                f"🧬 {duplicados['chunks']} de {total} chunks eram quase duplicados "
+                f"({duplicados['chunks'] / total:.0%}): ~{duplicados['tokens']} tokens de embedding "
+                f"e ~{mb:.1f} MB de índice economizados"
+            )
+
+    if fatos is not None and (alteradas or sumidas):
+        fatos.remover_paginas(nome, sumidas)
+        fatos.salvar()
+        print(f"🔢 Índice de fatos numéricos: {fatos.estatisticas()}")
+
+    if alteradas or sumidas:
+        manifesto.incrementar_geracao()
+    if resultado.lotes_falhos == 0:
+        manifesto.marcar_fonte(url, hash_fonte, "completa")
+    return resultado
+
+
+# RUN (teste local) ===============================================
+# Para testar contra o servidor fake (que injeta 429), em outro terminal:
+#   python servidor_fake_openai.py
+# e depois:
+#   OPENAI_BASE_URL=http://localhost:8001/v1 OPENAI_API_KEY=fake python ingestao.py caminho/do/arquivo.pdf
+if __name__ == "__main__":
+    import sys
+
+    from agno.knowledge.embedder.openai import OpenAIEmbedder
+    from agno.vectordb.chroma import ChromaDb
+
+    vector_db = ChromaDb(
+        collection="pdf_agent_teste",
+        path="tmp/chromadb",
+        persistent_client=True,
+        embedder=OpenAIEmbedder(id="text-embedding-3-small", api_key=os.getenv("OPENAI_API_KEY")),
+    )
+    # Rodar duas vezes seguidas: a segunda não embedda nada (manifesto)
+    resultado = asyncio.run(ingerir_pdf_incremental(
+        vector_db,
+        url=sys.argv[1],
+        metadata={"source": "teste", "type": "pdf"},
+        batch_size=8,
+        concorrencia=8,
+        limitador=LimitadorTokenBucket(requisicoes_por_minuto=500, tokens_por_minuto=200_000),
+    ))
+    print(resultado)
@@ -0,0 +1,267 @@
+#Leitor de PDF em streaming
+#Extrai o texto das páginas em paralelo (vários processos) e entrega página por página
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+import mmap
+import multiprocessing
+import os
+import re
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha256
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+from agno.knowledge.document import Document
+from agno.knowledge.reader.pdf_reader import PDFReader, _clean_page_numbers
+from pypdf import PdfReader
+
+
+# DOWNLOAD EM STREAMING ===========================================
+async def baixar_para_arquivo(url: str, timeout: float = 120) -> Tuple[str, str]:
+    """
+    Grava o PDF em um arquivo temporário sem carregar tudo em memória.
+
+    Returns:
+        (caminho do arquivo, sha256 do conteúdo). Se `url` for um caminho local, o próprio
+        arquivo é usado.
+    """
+    hasher = sha256()
+    if not url.startswith(("http://", "https://")):
+        with open(url, "rb") as f:
+            for bloco in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(bloco)
+        return url, hasher.hexdigest()
+
+    fd, caminho = tempfile.mkstemp(suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+                async for bloco in response.aiter_bytes(1024 * 1024):
+                    hasher.update(bloco)
+                    f.write(bloco)
+    return caminho, hasher.hexdigest()
+
+
+# WORKERS (rodam em outros processos) =============================
+# Cada processo abre o PDF uma vez (memory-mapped) e reaproveita entre as tarefas
+_pdfs_abertos: Dict[str, PdfReader] = {}
+
+
+def _abrir(caminho: str) -> PdfReader:
+    if caminho not in _pdfs_abertos:
+        with open(caminho, "rb") as f:
+            _pdfs_abertos[caminho] = PdfReader(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    return _pdfs_abertos[caminho]
+
+
+def _contar_paginas(caminho: str) -> int:
+    return len(_abrir(caminho).pages)
+
+
+def _extrair_paginas(caminho: str, inicio: int, fim: int) -> List[Tuple[int, str]]:
+    pdf = _abrir(caminho)
+    return [(i, pdf.pages[i].extract_text() or "") for i in range(inicio, fim)]
+
+
+# NUMERAÇÃO IMPRESSA ==============================================
+# Mesma regra do `_clean_page_numbers` do PDFReader, mas decidida em uma amostra do começo do
+# PDF e aplicada página a página (o PDFReader precisa do documento inteiro antes de decidir)
+_NUMERO_IMPRESSO = re.compile(r"^\s*(\d+)\s*|\s*(\d+)\s*$")
+
+
+def _numero_impresso(texto: str) -> Optional[int]:
+    encontrado = _NUMERO_IMPRESSO.search(texto)
+    return int(encontrado.group(1) or encontrado.group(2)) if encontrado else None
+
+
+def _decidir_numeracao(amostra: List[str], reader: PDFReader) -> Tuple[bool, Optional[int]]:
+    """
+    (sem números impressos, deslocamento) para as páginas da amostra.
+
+    Sem números impressos, o PDFReader só envolve o texto em quebras de linha; com números que
+    não formam sequência (deslocamento None), o texto fica como está.
+    """
+    if all(n is None or n > 5 for n in map(_numero_impresso, amostra)):
+        return True, None
+    _, deslocamento = _clean_page_numbers(
+        page_content_list=list(amostra),
+        extra_content=[""] * len(amostra),
+        page_start_numbering_format=reader.page_start_numbering_format,
+        page_end_numbering_format=reader.page_end_numbering_format,
+    )
+    return False, deslocamento
+
+
+def _limpar_pagina(texto: str, indice: int, sem_numeros: bool, deslocamento: Optional[int], reader: PDFReader) -> str:
+    # Igual ao PDFReader.async_read, inclusive o conteúdo extra vazio (muda as quebras de linha)
+    if sem_numeros:
+        return f"\n{texto}\n"
+    if deslocamento is None:
+        return texto
+    numero = indice + deslocamento
+    texto = re.sub(rf"^\s*{numero}\s*|\s*{numero}\s*$", "", texto)
+    inicio = reader.page_start_numbering_format.format(page_nr=numero) + "\n" if reader.page_start_numbering_format else ""
+    fim = "\n" + reader.page_end_numbering_format.format(page_nr=numero) if reader.page_end_numbering_format else ""
+    return inicio + texto + "\n" + fim
+
+
+# LEITOR ==========================================================
+async def ler_paginas_streaming(
+    caminho: str,
+    nome: Optional[str] = None,
+    reader: Optional[PDFReader] = None,
+    paginas_por_tarefa: int = 4,
+    processos: Optional[int] = None,
+    paginas_amostra: int = 16,
+) -> AsyncIterator[Tuple[int, List[Document]]]:
+    """
+    Gera (número da página, chunks da página), em ordem, à medida que as páginas são extraídas.
+
+    A extração do texto (pypdf) roda em um pool de processos, no máximo duas tarefas por processo
+    à frente do consumidor: o embedding das primeiras páginas começa enquanto as seguintes ainda
+    estão sendo lidas, e só essa janela de páginas fica em memória.
+
+    Numeração e limpeza são as do `PDFReader` (número impresso removido do texto e usado como
+    número da página quando forma sequência; físico se não), mas decididas nas primeiras
+    `paginas_amostra` páginas em vez do documento inteiro. Para PDFs com até `paginas_amostra`
+    páginas o resultado é idêntico ao do `PDFReader`; nos maiores, só difere se o começo do PDF
+    indicar uma numeração diferente da que o documento inteiro indicaria. Com
+    `reader.split_on_pages=False` o documento é um só, então tudo é lido antes de entregar.
+
+    Args:
+        caminho: Caminho local do PDF (use `baixar_para_arquivo` para URLs)
+        nome: Nome dos documentos (padrão: nome do arquivo)
+        reader: Reader cuja numeração e estratégia de chunking serão usadas (padrão: PDFReader())
+        paginas_por_tarefa: Quantas páginas cada tarefa do pool extrai
+        processos: Tamanho do pool (padrão: número de núcleos)
+        paginas_amostra: Páginas do começo usadas para decidir a numeração
+    """
+    reader = reader or PDFReader()
+    nome = nome or Path(caminho).stem.replace(" ", "_")
+    loop = asyncio.get_running_loop()
+    processos = processos or os.cpu_count() or 1
+
+    def documentos(numero: int, texto: str, id: Optional[str] = None, meta: Optional[dict] = None) -> List[Document]:
+        documento = Document(name=nome, id=id or f"{nome}_{numero}", meta_data={"page": numero} if meta is None else meta, content=texto)
+        return reader.chunk_document(documento) if reader.chunk else [documento]
+
+    # spawn: um fork herdaria as threads do servidor (event loop, workers do SQLite) e os locks delas
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processos, mp_context=contexto) as pool:
+        total = await loop.run_in_executor(pool, _contar_paginas, caminho)
+        inicios = iter(range(0, total, paginas_por_tarefa))
+        janela: deque = deque()
+
+        def disparar():
+            inicio = next(inicios, None)
+            if inicio is not None:
+                janela.append(loop.run_in_executor(pool, _extrair_paginas, caminho, inicio, min(inicio + paginas_por_tarefa, total)))
+
+        for _ in range(processos * 2):
+            disparar()
+
+        async def paginas_em_ordem():
+            while janela:
+                extraidas = await janela.popleft()
+                disparar()
+                for indice, texto in extraidas:
+                    yield indice, texto
+
+        extraidas = paginas_em_ordem()
+        if not reader.split_on_pages:
+            textos = [texto async for _, texto in extraidas]
+            textos, _ = _clean_page_numbers(
+                page_content_list=textos,
+                extra_content=[""] * len(textos),
+                page_start_numbering_format=reader.page_start_numbering_format,
+                page_end_numbering_format=reader.page_end_numbering_format,
+            )
+            yield 0, documentos(0, "\n".join(textos), id=nome, meta={})
+            return
+
+        amostra: List[Tuple[int, str]] = []
+        async for pagina in extraidas:
+            amostra.append(pagina)
+            if len(amostra) >= paginas_amostra:
+                break
+        sem_numeros, deslocamento = _decidir_numeracao([texto for _, texto in amostra], reader)
+        primeira = deslocamento if deslocamento is not None else 1
+
+        async def todas():
+            for pagina in amostra:
+                yield pagina
+            async for pagina in extraidas:
+                yield pagina
+
+        async for indice, texto in todas():
+            texto = _limpar_pagina(texto, indice, sem_numeros, deslocamento, reader)
+            yield indice + primeira, documentos(indice + primeira, texto)
+
+
+async def ler_chunks_streaming(caminho: str, **kwargs) -> AsyncIterator[Document]:
+    """Mesma coisa que `ler_paginas_streaming`, mas entrega os chunks um a um."""
+    async for _, chunks in ler_paginas_streaming(caminho, **kwargs):
+        for chunk in chunks:
+            yield chunk
+
+
+# BENCHMARK =======================================================
+# Compara o PDFReader (monolítico) com o leitor em streaming para os PDFs de uma pasta:
+#   python leitor_streaming.py pasta_com_pdfs
+# Cada medição roda em um processo separado para o pico de memória (RSS) não se misturar.
+def _medir(modo: str, caminho: str) -> dict:
+    import resource
+    import time
+
+    inicio = time.perf_counter()
+    primeiro_chunk = None
+    chunks = 0
+    if modo == "monolitico":
+        documentos = PDFReader().read(caminho)
+        chunks = len(documentos)
+        primeiro_chunk = time.perf_counter() - inicio
+    else:
+        async def consumir():
+            nonlocal primeiro_chunk, chunks
+            async for _ in ler_chunks_streaming(caminho):
+                if primeiro_chunk is None:
+                    primeiro_chunk = time.perf_counter() - inicio
+                chunks += 1
+        asyncio.run(consumir())
+    total = time.perf_counter() - inicio
+    # ru_maxrss está em KB no Linux; no modo streaming vale o maior entre o processo principal e o pool
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_filhos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {
+        "modo": modo,
+        "chunks": chunks,
+        "primeiro_chunk_s": round(primeiro_chunk or total, 3),
+        "total_s": round(total, 3),
+        "pico_rss_mb": round(max(rss, rss_filhos) / 1024, 1),
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import subprocess
+    import sys
+
+    if sys.argv[1] == "--medir":
+        print(json.dumps(_medir(sys.argv[2], sys.argv[3])))
+        sys.exit(0)
+
+    pdfs = sorted(Path(sys.argv[1]).glob("*.pdf"))
+    print(f"{'arquivo':30} {'modo':12} {'chunks':>7} {'1º chunk (s)':>13} {'total (s)':>10} {'pico RSS (MB)':>14}")
+    for pdf in pdfs:
+        for modo in ["monolitico", "streaming"]:
+            saida = subprocess.run(
+                [sys.executable, __file__, "--medir", modo, str(pdf)], capture_output=True, text=True, check=True
+            )
+            r = json.loads(saida.stdout.strip().splitlines()[-1])
+            print(f"{pdf.name[:30]:30} {modo:12} {r['chunks']:>7} {r['primeiro_chunk_s']:>13} {r['total_s']:>10} {r['pico_rss_mb']:>14}")
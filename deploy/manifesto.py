@@ -0,0 +1,187 @@
+#Manifesto de ingestão
+#Guarda o hash de cada fonte, de cada página e os IDs dos chunks gravados no vector_db
+#------------------------------------------
+
+#IMPORTACOES
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+
+class Manifesto:
+    """
+    Registro (em SQLite) do que já foi ingerido.
+
+    - fontes: hash do arquivo inteiro e status ("em_andamento" ou "completa")
+    - paginas: hash do texto de cada página já gravada
+    - chunks: IDs dos chunks de cada página (para apagar os que ficaram obsoletos)
+    - remocoes: chunks que perderam a última referência e ainda precisam sair do vector_db.
+      Ficam gravados até a remoção ser confirmada: uma execução interrompida não deixa órfãos,
+      e um chunk que volta a ser usado por outra página (ex.: página inserida no meio do PDF,
+      as seguintes deslocadas) sai da lista antes de ser apagado
+    - geracao: contador incrementado sempre que a coleção muda (usado para invalidar caches)
+    """
+
+    def __init__(self, db_file: str = "tmp/ingestao_manifest.db"):
+        Path(db_file).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS fontes (
+                fonte TEXT PRIMARY KEY,
+                hash_fonte TEXT NOT NULL,
+                status TEXT NOT NULL,
+                atualizado_em REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS paginas (
+                fonte TEXT NOT NULL,
+                pagina INTEGER NOT NULL,
+                hash_pagina TEXT NOT NULL,
+                PRIMARY KEY (fonte, pagina)
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                fonte TEXT NOT NULL,
+                pagina INTEGER NOT NULL,
+                chunk_id TEXT NOT NULL,
+                PRIMARY KEY (fonte, pagina, chunk_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_chunks_id ON chunks (chunk_id);
+            CREATE TABLE IF NOT EXISTS remocoes (
+                fonte TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                PRIMARY KEY (fonte, chunk_id)
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                chave TEXT PRIMARY KEY,
+                valor INTEGER NOT NULL
+            );
+            """
+        )
+
+    # FONTES ======================================================
+    def fonte_completa(self, fonte: str, hash_fonte: str) -> bool:
+        """True se a fonte já foi ingerida por completo com este mesmo conteúdo."""
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT hash_fonte, status FROM fontes WHERE fonte = ?", (fonte,)
+            ).fetchone()
+        return linha is not None and linha[0] == hash_fonte and linha[1] == "completa"
+
+    def marcar_fonte(self, fonte: str, hash_fonte: str, status: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fontes VALUES (?, ?, ?, ?)", (fonte, hash_fonte, status, time.time())
+            )
+
+    # PÁGINAS =====================================================
+    def hashes_paginas(self, fonte: str) -> Dict[int, str]:
+        with self._lock:
+            linhas = self._conn.execute(
+                "SELECT pagina, hash_pagina FROM paginas WHERE fonte = ?", (fonte,)
+            ).fetchall()
+        return dict(linhas)
+
+    def concluir_pagina(self, fonte: str, pagina: int, hash_pagina: str, chunk_ids: Set[str]) -> List[str]:
+        """
+        Marca a página como gravada e troca seus chunks pelos novos.
+
+        Os chunks antigos que ficaram sem referência vão para as remoções pendentes da fonte
+        (apagar do vector_db só no fim, com `remocoes_pendentes`: uma página concluída depois
+        ainda pode voltar a usá-los). Os novos saem das remoções pendentes.
+
+        Returns:
+            IDs que ficaram sem referência neste momento.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            antigos = {
+                r[0] for r in self._conn.execute(
+                    "SELECT chunk_id FROM chunks WHERE fonte = ? AND pagina = ?", (fonte, pagina)
+                )
+            }
+            self._conn.execute("DELETE FROM chunks WHERE fonte = ? AND pagina = ?", (fonte, pagina))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunks VALUES (?, ?, ?)", [(fonte, pagina, c) for c in chunk_ids]
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO paginas VALUES (?, ?, ?)", (fonte, pagina, hash_pagina)
+            )
+            self._conn.executemany("DELETE FROM remocoes WHERE chunk_id = ?", [(c,) for c in chunk_ids])
+            obsoletos = self._sem_referencia(antigos - chunk_ids)
+            self._agendar_remocao(fonte, obsoletos)
+            self._conn.execute("COMMIT")
+        return obsoletos
+
+    def remover_paginas(self, fonte: str, paginas: List[int]) -> List[str]:
+        """Remove páginas que não existem mais na nova versão do PDF (os chunks sem referência vão para as remoções pendentes)."""
+        if not paginas:
+            return []
+        with self._lock:
+            self._conn.execute("BEGIN")
+            antigos: Set[str] = set()
+            for pagina in paginas:
+                antigos.update(
+                    r[0] for r in self._conn.execute(
+                        "SELECT chunk_id FROM chunks WHERE fonte = ? AND pagina = ?", (fonte, pagina)
+                    )
+                )
+                self._conn.execute("DELETE FROM chunks WHERE fonte = ? AND pagina = ?", (fonte, pagina))
+                self._conn.execute("DELETE FROM paginas WHERE fonte = ? AND pagina = ?", (fonte, pagina))
+            obsoletos = self._sem_referencia(antigos)
+            self._agendar_remocao(fonte, obsoletos)
+            self._conn.execute("COMMIT")
+        return obsoletos
+
+    def remocoes_pendentes(self, fonte: str) -> List[str]:
+        """
+        IDs da fonte que devem ser apagados do vector_db agora (sem referência em nenhuma página).
+
+        Chunks que voltaram a ser referenciados desde que foram agendados saem da lista. Depois de
+        apagar, chamar `confirmar_remocoes`.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            agendados = {r[0] for r in self._conn.execute("SELECT chunk_id FROM remocoes WHERE fonte = ?", (fonte,))}
+            obsoletos = self._sem_referencia(agendados)
+            vivos = agendados.difference(obsoletos)
+            self._conn.executemany("DELETE FROM remocoes WHERE fonte = ? AND chunk_id = ?", [(fonte, c) for c in vivos])
+            self._conn.execute("COMMIT")
+        return obsoletos
+
+    def confirmar_remocoes(self, fonte: str, ids: List[str]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM remocoes WHERE fonte = ? AND chunk_id = ?", [(fonte, c) for c in ids])
+
+    def _agendar_remocao(self, fonte: str, ids: List[str]):
+        self._conn.executemany("INSERT OR IGNORE INTO remocoes VALUES (?, ?)", [(fonte, c) for c in ids])
+
+    def _sem_referencia(self, ids: Set[str]) -> List[str]:
+        # O mesmo chunk (ex.: rodapé) pode estar em várias páginas/fontes: só apaga se ninguém mais usa
+        return [
+            c for c in ids
+            if self._conn.execute("SELECT 1 FROM chunks WHERE chunk_id = ? LIMIT 1", (c,)).fetchone() is None
+        ]
+
+    # GERAÇÃO =====================================================
+    def geracao(self) -> int:
+        with self._lock:
+            linha = self._conn.execute("SELECT valor FROM meta WHERE chave = 'geracao'").fetchone()
+        return linha[0] if linha else 0
+
+    def incrementar_geracao(self) -> int:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO meta VALUES ('geracao', 1) ON CONFLICT(chave) DO UPDATE SET valor = valor + 1"
+            )
+            return self._conn.execute("SELECT valor FROM meta WHERE chave = 'geracao'").fetchone()[0]
+
+    def estatisticas(self, fonte: Optional[str] = None) -> Dict[str, int]:
+        filtro, params = ("WHERE fonte = ?", (fonte,)) if fonte else ("", ())
+        with self._lock:
+            paginas = self._conn.execute(f"SELECT COUNT(*) FROM paginas {filtro}", params).fetchone()[0]
+            chunks = self._conn.execute(f"SELECT COUNT(DISTINCT chunk_id) FROM chunks {filtro}", params).fetchone()[0]
+        return {"paginas": paginas, "chunks": chunks, "geracao": self.geracao()}
@@ -0,0 +1,240 @@
+#Extração de memórias do usuário fora do caminho da resposta
+#O run só enfileira a conversa (SQLite); um pool de workers chama o LLM de memória depois
+#------------------------------------------
+
+#IMPORTACOES
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+from agno.memory import MemoryManager
+from agno.models.message import Message
+
+from metricas import medir
+
+
+class MemoriaAdiada(MemoryManager):
+    """
+    MemoryManager que não chama o LLM durante o run.
+
+    Com `enable_user_memories=True`, o Agno chama `create_user_memories` a cada run e espera a
+    resposta (MemoryUpdateStarted -> MemoryUpdateCompleted) antes do RunCompleted. Aqui a chamada
+    só grava as mensagens em uma fila durável (tabela `fila_memorias` no mesmo SQLite das sessões)
+    e retorna. Os workers processam a fila em segundo plano:
+
+    - Debounce por usuário: um usuário só é processado quando fica `debounce` segundos sem novas
+      mensagens (ou quando a mais antiga passa de `espera_maxima`).
+    - Lote: todas as mensagens pendentes do usuário (até `max_lote` runs) vão em uma única chamada
+      ao LLM de memória, em vez de uma por run.
+    - Falhas: o lote volta para a fila com backoff exponencial; depois de `tentativas` falhas fica
+      com status "falhou".
+    - Vários processos (WORKERS>1) dividem a mesma fila: cada lote reservado tem dono e prazo
+      (`lease` segundos). Um usuário com lote em andamento não é reservado por mais ninguém, e o
+      lote de um processo que morreu volta para a fila quando o prazo vence.
+
+    Args:
+        db_file: SQLite da fila (o mesmo das sessões, ex.: tmp/agent.db)
+        trabalhadores: Threads que processam a fila
+        debounce: Segundos sem mensagens novas do usuário antes de processar
+        espera_maxima: Atraso máximo (segundos) de uma mensagem na fila, mesmo sem silêncio
+        max_lote: Máximo de runs do mesmo usuário por chamada ao LLM
+        tentativas: Tentativas por lote antes de desistir
+        lease: Segundos que um lote reservado fica com o worker antes de poder ser retomado por outro
+        **kwargs: Repassados para o MemoryManager (model, db, additional_instructions...)
+    """
+
+    def __init__(
+        self,
+        db_file: str = "tmp/agent.db",
+        trabalhadores: int = 2,
+        debounce: float = 5.0,
+        espera_maxima: float = 60.0,
+        max_lote: int = 20,
+        tentativas: int = 3,
+        lease: float = 300.0,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.lease = lease
+        self._dono = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.debounce = debounce
+        self.espera_maxima = espera_maxima
+        self.max_lote = max_lote
+        self.tentativas = tentativas
+        Path(db_file).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS fila_memorias (
+                id INTEGER PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                agent_id TEXT,
+                team_id TEXT,
+                mensagens TEXT NOT NULL,
+                criado REAL NOT NULL,
+                proxima REAL NOT NULL,
+                tentativas INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'pendente',
+                dono TEXT,
+                lease_ate REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_fila_memorias_usuario ON fila_memorias (status, user_id, criado);
+            """
+        )
+        colunas = {linha[1] for linha in self._conn.execute("PRAGMA table_info(fila_memorias)")}
+        if "dono" not in colunas:  # fila criada antes do lease
+            self._conn.execute("ALTER TABLE fila_memorias ADD COLUMN dono TEXT")
+            self._conn.execute("ALTER TABLE fila_memorias ADD COLUMN lease_ate REAL")
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._estatisticas = {"enfileirados": 0, "lotes": 0, "runs_processados": 0, "falhas": 0, "ultimo_lote_s": 0.0}
+        for i in range(trabalhadores):
+            threading.Thread(target=self._trabalhar, name=f"memorias-{i}", daemon=True).start()
+
+    # FILA ========================================================
+    @medir("memoria")
+    def _enfileirar(self, message, messages, agent_id, team_id, user_id) -> str:
+        if message:
+            messages = [Message(role="user", content=message)]
+        if not messages:
+            raise ValueError("You must provide either a message or a list of messages")
+        conteudo = [{"role": m.role, "content": m.get_content_string()} for m in messages]
+        agora = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO fila_memorias (user_id, agent_id, team_id, mensagens, criado, proxima) VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id or "default", agent_id, team_id, json.dumps(conteudo, ensure_ascii=False), agora, agora),
+            )
+            self._estatisticas["enfileirados"] += 1
+        self._acordar.set()
+        return "Memórias agendadas para processamento em segundo plano"
+
+    def create_user_memories(
+        self,
+        message: Optional[str] = None,
+        messages: Optional[List[Message]] = None,
+        agent_id: Optional[str] = None,
+        team_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+    ) -> str:
+        return self._enfileirar(message, messages, agent_id, team_id, user_id)
+
+    async def acreate_user_memories(
+        self,
+        message: Optional[str] = None,
+        messages: Optional[List[Message]] = None,
+        agent_id: Optional[str] = None,
+        team_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+    ) -> str:
+        # Um INSERT no SQLite local: não vale a ida e volta para uma thread
+        return self._enfileirar(message, messages, agent_id, team_id, user_id)
+
+    def _reservar(self) -> Optional[List[sqlite3.Row]]:
+        """
+        Escolhe um usuário pronto (debounce vencido) sem lote em andamento em nenhum worker e marca
+        as mensagens dele como "processando", com este processo como dono até `lease_ate`.
+        Lotes "processando" com o prazo vencido (o dono morreu) contam como pendentes.
+        """
+        agora = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")  # também exclui workers de outros processos
+            try:
+                usuario = self._conn.execute(
+                    """
+                    SELECT user_id FROM fila_memorias
+                    WHERE (status = 'pendente' OR (status = 'processando' AND COALESCE(lease_ate, 0) < :agora))
+                      AND proxima <= :agora
+                      AND user_id NOT IN (
+                          SELECT user_id FROM fila_memorias WHERE status = 'processando' AND lease_ate >= :agora
+                      )
+                    GROUP BY user_id
+                    HAVING MAX(criado) <= :debounce OR MIN(criado) <= :espera
+                    ORDER BY MIN(criado) LIMIT 1
+                    """,
+                    {"agora": agora, "debounce": agora - self.debounce, "espera": agora - self.espera_maxima},
+                ).fetchone()
+                if usuario is None:
+                    return None
+                lote = self._conn.execute(
+                    "SELECT id, agent_id, team_id, mensagens, criado, tentativas FROM fila_memorias "
+                    "WHERE (status = 'pendente' OR (status = 'processando' AND COALESCE(lease_ate, 0) < ?)) "
+                    "AND user_id = ? AND proxima <= ? ORDER BY id LIMIT ?",
+                    (agora, usuario[0], agora, self.max_lote),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE fila_memorias SET status = 'processando', dono = ?, lease_ate = ? WHERE id = ?",
+                    [(self._dono, agora + self.lease, item[0]) for item in lote],
+                )
+            finally:
+                self._conn.execute("COMMIT")
+        return [(usuario[0], *item) for item in lote]
+
+    def _trabalhar(self):
+        while not self._parar.is_set():
+            # Sem model/db (ex.: fila de um processo anterior, antes do primeiro run configurar o agente)
+            lote = self._reservar() if self.model is not None and self.db is not None else None
+            if not lote:
+                self._acordar.wait(timeout=min(self.debounce, 1.0) or 0.1)
+                self._acordar.clear()
+                continue
+            self._processar(lote)
+
+    def _processar(self, lote):
+        user_id = lote[0][0]
+        ids = [item[1] for item in lote]
+        mensagens = [Message(**m) for item in lote for m in json.loads(item[4])]
+        inicio = time.perf_counter()
+        try:
+            MemoryManager.create_user_memories(
+                self, messages=mensagens, agent_id=lote[0][2], team_id=lote[0][3], user_id=user_id
+            )
+        except Exception as e:
+            tentativas = max(item[6] for item in lote) + 1
+            status = "falhou" if tentativas >= self.tentativas else "pendente"
+            with self._lock:
+                self._conn.executemany(
+                    "UPDATE fila_memorias SET status = ?, tentativas = ?, proxima = ?, dono = NULL, lease_ate = NULL "
+                    "WHERE id = ? AND dono = ?",
+                    [(status, tentativas, time.time() + 2 ** tentativas, i, self._dono) for i in ids],
+                )
+                self._estatisticas["falhas"] += 1
+            print(f"⚠️  Memórias de {user_id}: {str(e)[:100]} (tentativa {tentativas}/{self.tentativas})")
+            return
+        with self._lock:
+            # Só o que ainda é deste worker (com o prazo vencido, outro processo pode ter retomado o lote)
+            self._conn.executemany("DELETE FROM fila_memorias WHERE id = ? AND dono = ?", [(i, self._dono) for i in ids])
+            self._estatisticas["lotes"] += 1
+            self._estatisticas["runs_processados"] += len(ids)
+            self._estatisticas["ultimo_lote_s"] = round(time.perf_counter() - inicio, 3)
+
+    # MÉTRICAS ====================================================
+    def estatisticas(self) -> Dict[str, Any]:
+        """Profundidade da fila, atraso da mensagem mais antiga (lag) e contadores dos workers."""
+        with self._lock:
+            pendentes, usuarios, mais_antiga = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT user_id), MIN(criado) FROM fila_memorias WHERE status != 'falhou'"
+            ).fetchone()
+            falhados = self._conn.execute("SELECT COUNT(*) FROM fila_memorias WHERE status = 'falhou'").fetchone()[0]
+            contadores = dict(self._estatisticas)
+        lotes = contadores["lotes"] or 1
+        return {
+            "profundidade": pendentes,
+            "usuarios_pendentes": usuarios,
+            "lag_s": round(time.time() - mais_antiga, 1) if mais_antiga else 0.0,
+            "falhados": falhados,
+            "runs_por_lote": round(contadores["runs_processados"] / lotes, 1),
+            **contadores,
+        }
+
+    def parar(self):
+        self._parar.set()
+        self._acordar.set()
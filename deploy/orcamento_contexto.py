@@ -0,0 +1,290 @@
+#Orçamento de tokens para o contexto do agente
+#Chunks da knowledge e histórico entram no prompt só até um limite de tokens
+#------------------------------------------
+
+#IMPORTACOES
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+
+from agno.models.message import Message
+from agno.models.openai import OpenAIChat
+
+from cache_respostas import normalizar_pergunta
+from ingestao import estimar_tokens
+from metricas import medir, registrar
+
+# Tokenizador local (tiktoken); se o encoding não puder ser carregado (ex.: sem rede no primeiro
+# uso, quando o arquivo é baixado), ~4 caracteres por token
+try:
+    import tiktoken
+
+    _codificador = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _codificador = None
+
+_PALAVRAS_VAZIAS = {"a", "o", "as", "os", "de", "da", "do", "das", "dos", "e", "em", "no", "na", "nos", "nas",
+                    "qual", "quais", "foi", "foram", "que", "como", "para", "por", "um", "uma", "com", "se"}
+_META_MANTIDOS = ("page", "source", "tambem_em")
+
+
+def contar_tokens(texto: str) -> int:
+    if not texto:
+        return 0
+    if _codificador is not None:
+        return len(_codificador.encode(texto, disallowed_special=()))
+    return estimar_tokens(texto)
+
+
+def _cortar(texto: str, tokens: int) -> str:
+    """Primeiros `tokens` tokens do texto."""
+    if contar_tokens(texto) <= tokens:
+        return texto
+    if _codificador is not None:
+        return _codificador.decode(_codificador.encode(texto, disallowed_special=())[:tokens]) + " …"
+    return texto[: tokens * 4] + " …"
+
+
+def _trigramas(texto: str) -> Set[str]:
+    palavras = normalizar_pergunta(texto).split()
+    return {" ".join(palavras[i : i + 3]) for i in range(max(1, len(palavras) - 2))}
+
+
+class OrcamentoContexto:
+    """
+    Limita os tokens que a knowledge e o histórico colocam no prompt.
+
+    Knowledge (`retriever`, usado como `knowledge_retriever` do Agent): busca `fator_busca` vezes
+    mais chunks, reordena pelos termos da pergunta (números como "2T25" e "612,3" pesam mais),
+    descarta chunks redundantes (trigramas com Jaccard >= `limiar_redundancia` com um já escolhido),
+    reduz chunks longos aos trechos em volta dos termos encontrados e para em `max_tokens_knowledge`.
+
+    Histórico (`OpenAIChatComOrcamento`): runs anteriores perdem as chamadas de ferramenta (o
+    resultado da busca já virou resposta); se ainda passar de `max_tokens_historico`, as respostas
+    mais antigas são resumidas aos primeiros `tokens_resumo` tokens e, por fim, descartadas.
+
+    A economia de cada run (tokens antes/depois) fica em `run.metadata["orcamento_contexto"]`
+    e o total em `estatisticas()`.
+
+    Args:
+        max_tokens_knowledge: Tokens de chunks por busca
+        max_tokens_historico: Tokens das mensagens de runs anteriores
+        max_tokens_trecho: Chunks maiores que isso são reduzidos aos trechos relevantes
+        tokens_resumo: Tamanho das respostas antigas resumidas
+        fator_busca: Quantos candidatos buscar por chunk devolvido
+        limiar_redundancia: Jaccard de trigramas a partir do qual um chunk é redundante
+    """
+
+    def __init__(
+        self,
+        max_tokens_knowledge: int = 1500,
+        max_tokens_historico: int = 1000,
+        max_tokens_trecho: int = 250,
+        tokens_resumo: int = 60,
+        fator_busca: int = 2,
+        limiar_redundancia: float = 0.6,
+    ):
+        self.max_tokens_knowledge = max_tokens_knowledge
+        self.max_tokens_historico = max_tokens_historico
+        self.max_tokens_trecho = max_tokens_trecho
+        self.tokens_resumo = tokens_resumo
+        self.fator_busca = fator_busca
+        self.limiar_redundancia = limiar_redundancia
+        self._lock = threading.Lock()
+        self._por_run: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self._totais = {"runs": 0, "buscas": 0, "chunks_redundantes": 0, "tokens_antes": 0, "tokens_depois": 0}
+
+    # CONTABILIDADE ===============================================
+    def _registrar(self, run_id: Optional[str], parte: str, antes: int, depois: int, acumular: bool):
+        with self._lock:
+            run = self._por_run.get(run_id)
+            if run is None:
+                run = self._por_run[run_id] = {"knowledge_antes": 0, "knowledge_depois": 0, "historico_antes": 0, "historico_depois": 0}
+                self._totais["runs"] += 1
+                while len(self._por_run) > 1000:
+                    self._por_run.popitem(last=False)
+            # O histórico é o mesmo em cada chamada ao modelo do run: conta uma vez só
+            if not acumular and run[f"{parte}_antes"]:
+                return
+            run[f"{parte}_antes"] += antes
+            run[f"{parte}_depois"] += depois
+            self._totais["tokens_antes"] += antes
+            self._totais["tokens_depois"] += depois
+
+    def relatorio(self, run_id: str) -> Dict[str, int]:
+        with self._lock:
+            run = dict(self._por_run.get(run_id) or {})
+        if run:
+            run["economizados"] = run["knowledge_antes"] - run["knowledge_depois"] + run["historico_antes"] - run["historico_depois"]
+        return run
+
+    def estatisticas(self) -> Dict[str, int]:
+        with self._lock:
+            totais = dict(self._totais)
+        totais["tokens_economizados"] = totais["tokens_antes"] - totais["tokens_depois"]
+        totais["tokenizador"] = "tiktoken" if _codificador is not None else "aproximado"
+        return totais
+
+    # KNOWLEDGE ===================================================
+    def _trecho(self, conteudo: str, termos: Set[str]) -> str:
+        """Reduz o chunk às frases/linhas com termos da pergunta (e a vizinha de cada lado)."""
+        if contar_tokens(conteudo) <= self.max_tokens_trecho:
+            return conteudo
+        frases = [f for f in re.split(r"(?<=[.;:!?])\s+|\n+", conteudo) if f.strip()]
+        relevantes = [i for i, f in enumerate(frases) if termos & set(normalizar_pergunta(f).split())]
+        if not relevantes:
+            return _cortar(conteudo, self.max_tokens_trecho)
+        manter = sorted({j for i in relevantes for j in (i - 1, i, i + 1) if 0 <= j < len(frases)})
+        partes, anterior = [], None
+        for j in manter:
+            if anterior is not None and j != anterior + 1:
+                partes.append("…")
+            partes.append(frases[j].strip())
+            anterior = j
+        return _cortar(" ".join(partes), self.max_tokens_trecho)
+
+    def selecionar(self, consulta: str, documentos: List[Dict[str, Any]], limite: int, run_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Escolhe, deduplica e corta os chunks (dicts do `Document.to_dict()`) dentro do orçamento."""
+        termos = {t for t in normalizar_pergunta(consulta).split() if t not in _PALAVRAS_VAZIAS}
+        numeros = {t for t in termos if any(c.isdigit() for c in t)}
+
+        pontuados = []
+        for posicao, doc in enumerate(documentos):
+            palavras = set(normalizar_pergunta(doc.get("content") or "").split())
+            cobertura = len(termos & palavras) / len(termos) if termos else 0.0
+            pontuados.append((1 / (posicao + 1) + cobertura + (1.0 if numeros & palavras else 0.0), posicao, doc))
+        pontuados.sort(key=lambda x: (-x[0], x[1]))
+
+        escolhidos: List[Dict[str, Any]] = []
+        vistos: List[Set[str]] = []
+        usados = redundantes = 0
+        for _, _, doc in pontuados:
+            if len(escolhidos) == limite or usados >= self.max_tokens_knowledge:
+                break
+            conteudo = doc.get("content") or ""
+            trigramas = _trigramas(conteudo)
+            if any(len(trigramas & v) / len(trigramas | v) >= self.limiar_redundancia for v in vistos):
+                redundantes += 1
+                continue
+            trecho = self._trecho(conteudo, termos)
+            restante = self.max_tokens_knowledge - usados
+            if contar_tokens(trecho) > restante:
+                if restante < 50:
+                    break
+                trecho = _cortar(trecho, restante)
+            vistos.append(trigramas)
+            usados += contar_tokens(trecho)
+            meta = {k: v for k, v in (doc.get("meta_data") or {}).items() if k in _META_MANTIDOS}
+            escolhidos.append({"name": doc.get("name"), "content": trecho, "meta_data": meta})
+
+        # "Antes" = o que o Agno teria colocado no prompt: os `limite` primeiros chunks, completos
+        antes = sum(contar_tokens(str(doc)) for doc in documentos[:limite])
+        self._registrar(run_id, "knowledge", antes, sum(contar_tokens(str(d)) for d in escolhidos), acumular=True)
+        with self._lock:
+            self._totais["buscas"] += 1
+            self._totais["chunks_redundantes"] += redundantes
+        return escolhidos
+
+    def retriever(self, knowledge):
+        """`knowledge_retriever` para o Agent (search_knowledge e add_knowledge_to_context)."""
+
+        async def buscar_com_orcamento(agent, query: str, num_documents: Optional[int] = None, filters=None, run_context=None, **kwargs):
+            limite = num_documents or knowledge.max_results
+            documentos = await knowledge.async_search(query=query, max_results=limite * self.fator_busca, filters=filters)
+            if not documentos:
+                return None
+            run_id = run_context.run_id if run_context is not None else None
+            return self.selecionar(query, [d.to_dict() for d in documentos], limite, run_id)
+
+        return buscar_com_orcamento
+
+    # HISTÓRICO ===================================================
+    def ajustar_historico(self, mensagens: List[Message], run_id: Optional[str] = None) -> List[Message]:
+        """Mensagens para o modelo com o histórico (from_history) dentro de `max_tokens_historico`."""
+        historico = [m for m in mensagens if m.from_history]
+        if not historico:
+            return mensagens
+        antes = sum(contar_tokens(m.get_content_string()) for m in historico)
+
+        # 1. Sem a parte de ferramentas dos runs anteriores (chamada + resultado)
+        novas = [m for m in mensagens if not (m.from_history and (m.role == "tool" or m.tool_calls))]
+        historico = [m for m in novas if m.from_history]
+        total = sum(contar_tokens(m.get_content_string()) for m in historico)
+
+        # 2. Respostas antigas resumidas (da mais antiga para a mais nova)
+        if total > self.max_tokens_historico:
+            for i, m in enumerate(novas):
+                if total <= self.max_tokens_historico:
+                    break
+                if m.from_history and m.role == "assistant":
+                    conteudo = m.get_content_string()
+                    resumo = _cortar(conteudo, self.tokens_resumo)
+                    total -= contar_tokens(conteudo) - contar_tokens(resumo)
+                    novas[i] = m.model_copy(update={"content": resumo})
+
+        # 3. Ainda acima: descarta os runs mais antigos, a pergunta junto com as respostas dela
+        #    (uma resposta sem a pergunta no começo do histórico confunde o modelo)
+        while total > self.max_tokens_historico:
+            indices = [i for i, m in enumerate(novas) if m.from_history]
+            if not indices:
+                break
+            fim = 1
+            while fim < len(indices) and novas[indices[fim]].role != "user":
+                fim += 1
+            for i in reversed(indices[:fim]):
+                total -= contar_tokens(novas.pop(i).get_content_string())
+
+        self._registrar(run_id, "historico", antes, max(total, 0), acumular=False)
+        return novas
+
+
+@dataclass
+class OpenAIChatComOrcamento(OpenAIChat):
+    """OpenAIChat que aplica o `OrcamentoContexto` ao histórico antes de cada chamada."""
+
+    orcamento: Optional[OrcamentoContexto] = None
+
+    def _ajustar(self, messages: List[Message], run_response) -> List[Message]:
+        if self.orcamento is None:
+            return messages
+        run_id = getattr(run_response, "run_id", None)
+        ajustadas = self.orcamento.ajustar_historico(messages, run_id)
+        if run_response is not None:
+            run_response.metadata = {**(run_response.metadata or {}), "orcamento_contexto": self.orcamento.relatorio(run_id)}
+        return ajustadas
+
+    @medir("llm")
+    def invoke(self, messages: List[Message], *args, run_response=None, **kwargs):
+        return super().invoke(self._ajustar(messages, run_response), *args, run_response=run_response, **kwargs)
+
+    async def ainvoke(self, messages: List[Message], *args, run_response=None, **kwargs):
+        with medir("llm"):  # o decorador não serve em corrotina: mediria só a criação dela
+            return await super().ainvoke(self._ajustar(messages, run_response), *args, run_response=run_response, **kwargs)
+
+    # Streaming: tempo até o primeiro pedaço (llm_primeiro_token) e até o fim do stream (llm)
+    def invoke_stream(self, messages: List[Message], *args, run_response=None, **kwargs):
+        inicio = time.perf_counter()
+        primeiro = True
+        try:
+            for pedaco in super().invoke_stream(self._ajustar(messages, run_response), *args, run_response=run_response, **kwargs):
+                if primeiro:
+                    registrar("llm_primeiro_token", time.perf_counter() - inicio, inicio)
+                    primeiro = False
+                yield pedaco
+        finally:
+            registrar("llm", time.perf_counter() - inicio, inicio)
+
+    async def ainvoke_stream(self, messages: List[Message], *args, run_response=None, **kwargs):
+        inicio = time.perf_counter()
+        primeiro = True
+        try:
+            async for pedaco in super().ainvoke_stream(self._ajustar(messages, run_response), *args, run_response=run_response, **kwargs):
+                if primeiro:
+                    registrar("llm_primeiro_token", time.perf_counter() - inicio, inicio)
+                    primeiro = False
+                yield pedaco
+        finally:
+            registrar("llm", time.perf_counter() - inicio, inicio)
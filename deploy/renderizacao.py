@@ -0,0 +1,253 @@
+#Renderização incremental de respostas em streaming no Streamlit
+#Tokens bufferizados, no máximo N quadros por segundo; blocos de markdown prontos são desenhados uma vez só
+#------------------------------------------
+
+#IMPORTACOES
+import time
+from typing import Dict, List, Tuple
+
+import streamlit as st
+
+
+# BLOCOS ============================================================
+def ultimo_corte(texto: str, dentro_de_codigo: bool = False) -> Tuple[int, bool]:
+    """
+    Posição do fim do último bloco de markdown completo em `texto` (uma linha em branco fora
+    de bloco de código ```), e se o texto depois dele começa dentro de um bloco de código.
+
+    Returns:
+        (corte, dentro_de_codigo no corte). corte = 0: nenhum bloco completo ainda.
+    """
+    corte, cerca_no_corte = 0, dentro_de_codigo
+    posicao = 0
+    for linha in texto.splitlines(keepends=True):
+        posicao += len(linha)
+        if not linha.endswith("\n"):
+            break  # linha incompleta: ainda pode virar cerca ou ganhar texto
+        conteudo = linha.strip()
+        if conteudo.startswith("```") or conteudo.startswith("~~~"):
+            dentro_de_codigo = not dentro_de_codigo
+        elif not conteudo and not dentro_de_codigo:
+            corte, cerca_no_corte = posicao, dentro_de_codigo
+    return corte, cerca_no_corte
+
+
+# RENDERIZADOR ======================================================
+class RenderizadorMarkdown:
+    """
+    Desenha uma resposta em streaming sem redesenhar o texto inteiro a cada token.
+
+    - `adicionar` só guarda o token (O(1)); `atualizar` desenha no máximo `fps` vezes por segundo.
+    - Blocos completos (parágrafos, listas, tabelas, blocos de código fechados) vão para um
+      elemento próprio e são desenhados uma última vez; só o bloco em aberto é redesenhado.
+      O custo por quadro fica proporcional ao tamanho do último bloco, e não da resposta toda.
+    - `fps=0` e `blocos=False` reproduzem o comportamento antigo (texto inteiro a cada token),
+      útil para comparar.
+
+    Args:
+        container: Onde desenhar (ex.: `st.container()` dentro do `st.chat_message`)
+        fps: Máximo de quadros por segundo (0 = sem limite)
+        blocos: Separa os blocos completos em elementos próprios
+        cursor: Indicador de digitação no fim do bloco em aberto
+    """
+
+    def __init__(self, container=None, fps: float = 15, blocos: bool = True, cursor: str = "▌"):
+        self.container = container if container is not None else st.container()
+        self.fps = fps
+        self.blocos = blocos
+        self.cursor = cursor
+        self._partes: List[str] = []     # tudo o que já foi desenhado (para o texto final)
+        self._pendentes: List[str] = []  # tokens ainda não desenhados
+        self._aberto = ""                # bloco em aberto (pode mudar)
+        self._codigo = False             # o bloco em aberto começa dentro de ```?
+        self._elemento = None            # st.empty do bloco em aberto
+        self._ultimo_quadro = 0.0
+        self.quadros = 0
+        self.blocos_finalizados = 0
+        self.caracteres_enviados = 0     # soma do tamanho de tudo o que foi mandado ao navegador
+
+    @property
+    def texto(self) -> str:
+        return "".join(self._partes) + "".join(self._pendentes)
+
+    def adicionar(self, texto: str):
+        if texto:
+            self._pendentes.append(texto)
+
+    def atualizar(self, forcar: bool = False) -> bool:
+        """Desenha os tokens pendentes se já passou um quadro desde o último desenho."""
+        if not self._pendentes:
+            return False
+        agora = time.perf_counter()
+        if not forcar and self.fps and agora - self._ultimo_quadro < 1 / self.fps:
+            return False
+        self._ultimo_quadro = agora
+        novo = "".join(self._pendentes)
+        self._pendentes.clear()
+        self._partes.append(novo)
+        self._aberto += novo
+        if self.blocos:
+            self._fechar_blocos()
+        self._desenhar(self._aberto + self.cursor)
+        return True
+
+    def finalizar(self) -> str:
+        """Desenha o que faltou, sem o cursor, e devolve o texto completo."""
+        self.atualizar(forcar=True)
+        self._desenhar(self._aberto)
+        return "".join(self._partes)
+
+    def _fechar_blocos(self):
+        corte, codigo = ultimo_corte(self._aberto, self._codigo)
+        if not corte:
+            return
+        pronto, self._aberto, self._codigo = self._aberto[:corte], self._aberto[corte:], codigo
+        # O elemento do bloco em aberto recebe o texto pronto uma última vez e fica para trás;
+        # o que sobrou ganha um elemento novo, logo abaixo
+        self._desenhar(pronto)
+        self._elemento = None
+        self.blocos_finalizados += 1
+
+    def _desenhar(self, texto: str):
+        if self._elemento is None:
+            if not texto.strip(self.cursor + " \n"):
+                return
+            self._elemento = self.container.empty()
+        self._elemento.markdown(texto)
+        self.quadros += 1
+        self.caracteres_enviados += len(texto)
+
+
+# RUN ===========================================================
+if __name__ == "__main__":
+    # Mede o exemplo4 de verdade, sem navegador: um servidor SSE falso manda uma resposta longa em
+    # markdown no ritmo de um LLM, o Streamlit roda headless, e um cliente websocket faz o papel do
+    # navegador (decodifica os ForwardMsg e remonta o texto visível). Compara o jeito antigo
+    # (RENDER_FPS=0, RENDER_BLOCOS=0) com o novo.
+    import asyncio
+    import json
+    import os
+    import subprocess
+    import sys
+    import threading
+
+    import uvicorn
+    import websockets
+    from fastapi import FastAPI
+    from fastapi.responses import StreamingResponse
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    n_tokens = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    tokens_por_s = float(sys.argv[2]) if len(sys.argv) > 2 else 200
+    porta_sse, porta_st = 8931, 8932
+
+    # Resposta longa: parágrafos, lista, tabela e bloco de código (com linha em branco dentro)
+    modelo = (
+        ["Parágrafo"] + [f" palavra{i}" for i in range(40)] + ["\n\n"]
+        + [t for i in range(6) for t in (f"- item {i}", " com", " texto", "\n")] + ["\n"]
+        + ["| a | b |\n", "|---|---|\n", "| 1 | 2 |\n", "\n"]
+        + ["```python\n", "def f(x):\n", "    y = x\n", "\n", "    return y\n", "```\n", "\n"]
+    )
+    tokens = [modelo[i % len(modelo)] for i in range(n_tokens)]
+    resposta = "".join(tokens)
+    emissoes: List[Tuple[float, int]] = []  # (instante, tamanho acumulado) de cada token
+    # O Streamlit tira espaços das pontas do markdown: comparamos só caracteres visíveis
+    visivel = lambda texto: len("".join(texto.split()))
+
+    app = FastAPI()
+
+    @app.post("/agents/{agent_id}/runs")
+    async def runs(agent_id: str):
+        async def gerar():
+            emissoes.clear()
+            acumulado = 0
+            for token in tokens:
+                acumulado += visivel(token)
+                emissoes.append((time.perf_counter(), acumulado))
+                yield f"event: RunContent\ndata: {json.dumps({'event': 'RunContent', 'content': token})}\n\n"
+                await asyncio.sleep(1 / tokens_por_s)
+            yield f"event: RunCompleted\ndata: {json.dumps({'event': 'RunCompleted', 'content': resposta})}\n\n"
+        return StreamingResponse(gerar(), media_type="text/event-stream")
+
+    servidor = uvicorn.Server(uvicorn.Config(app, port=porta_sse, log_level="warning"))
+    threading.Thread(target=servidor.run, daemon=True).start()
+
+    def cpu(pid: int) -> float:
+        with open(f"/proc/{pid}/stat") as f:
+            campos = f.read().rsplit(")", 1)[1].split()
+        return (int(campos[11]) + int(campos[12])) / os.sysconf("SC_CLK_TCK")
+
+    async def navegador() -> Dict:
+        """Faz o papel do navegador: pede a execução e acompanha o texto visível da resposta."""
+        visiveis: Dict[Tuple[int, ...], str] = {}
+        exibicoes: List[Tuple[float, int]] = []
+        bytes_recebidos = mensagens = 0
+        for _ in range(100):
+            try:
+                ws = await websockets.connect(f"ws://127.0.0.1:{porta_st}/_stcore/stream",
+                                              subprotocols=["streamlit"], max_size=None)
+                break
+            except OSError:
+                await asyncio.sleep(0.2)
+        async with ws:
+            pedido = BackMsg()
+            pedido.rerun_script.query_string = ""
+            await ws.send(pedido.SerializeToString())
+            while True:
+                bruto = await ws.recv()
+                agora = time.perf_counter()
+                bytes_recebidos += len(bruto)
+                mensagens += 1
+                msg = ForwardMsg()
+                msg.ParseFromString(bruto)
+                if msg.HasField("script_finished"):
+                    break
+                if msg.HasField("delta") and msg.delta.new_element.HasField("markdown"):
+                    corpo = msg.delta.new_element.markdown.body.rstrip("▌")
+                    caminho = tuple(msg.metadata.delta_path)
+                    if corpo.strip() and corpo.strip() in resposta:  # ignora a mensagem do usuário
+                        visiveis[caminho] = corpo
+                        exibicoes.append((agora, sum(visivel(v) for v in visiveis.values())))
+        return {"exibicoes": exibicoes, "bytes": bytes_recebidos, "mensagens": mensagens}
+
+    def medir_modo(nome: str, fps: str, blocos: str) -> Dict:
+        ambiente = dict(os.environ, AGENTE_URL=f"http://127.0.0.1:{porta_sse}", RENDER_FPS=fps,
+                        RENDER_BLOCOS=blocos, PERGUNTA_AUTOMATICA="explique tudo")
+        processo = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", os.path.join(os.path.dirname(__file__) or ".", "exemplo4.py"),
+             "--server.headless", "true", "--server.port", str(porta_st), "--server.enableXsrfProtection", "false",
+             "--browser.gatherUsageStats", "false"],
+            env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            time.sleep(2)
+            cpu_antes = cpu(processo.pid)
+            resultado = asyncio.run(navegador())
+            resultado["cpu"] = cpu(processo.pid) - cpu_antes
+        finally:
+            processo.terminate()
+            processo.wait()
+
+        # Latência de cada token: do envio pelo servidor até o texto visível alcançar aquele tamanho
+        latencias, j = [], 0
+        exibicoes = resultado["exibicoes"]
+        for instante, acumulado in emissoes:
+            while j < len(exibicoes) and exibicoes[j][1] < acumulado:
+                j += 1
+            if j < len(exibicoes):
+                latencias.append(exibicoes[j][0] - instante)
+        latencias.sort()
+        p = lambda q: latencias[min(len(latencias) - 1, int(q * len(latencias)))] * 1000 if latencias else float("nan")
+        completo = exibicoes[-1][1] >= visivel(resposta) if exibicoes else False
+        return {"modo": nome, "cpu_s": resultado["cpu"], "p50_ms": p(0.5), "p95_ms": p(0.95), "max_ms": p(1.0),
+                "quadros": len(exibicoes), "mensagens_ws": resultado["mensagens"],
+                "kb_ws": resultado["bytes"] / 1024, "completo": completo}
+
+    print(f"📥 Resposta de {n_tokens} tokens ({len(resposta)} caracteres) a {tokens_por_s:.0f} tokens/s")
+    linhas = [medir_modo("antigo (texto inteiro por token)", "0", "0"), medir_modo("novo (15 fps + blocos)", "15", "1")]
+    print(f"\n{'modo':<34} {'CPU (s)':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'quadros':>8} {'KB ws':>9} {'ok':>4}")
+    for l in linhas:
+        print(f"{l['modo']:<34} {l['cpu_s']:>8.2f} {l['p50_ms']:>8.1f} {l['p95_ms']:>8.1f} {l['max_ms']:>8.1f} "
+              f"{l['quadros']:>8} {l['kb_ws']:>9.0f} {'✅' if l['completo'] else '❌':>4}")
+    servidor.should_exit = True
@@ -0,0 +1,230 @@
+#Servidor fake compatível com a API da OpenAI (para testes locais sem gastar cota)
+#Gera embeddings determinísticos, respostas de chat (com streaming e chamada de ferramenta) e injeta erros 429
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+import json
+import math
+import os
+import random
+import time
+from hashlib import sha256
+from typing import Any, Dict, List, Optional, Union
+from uuid import uuid4
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict
+import uvicorn
+
+# CONFIGURAÇÃO (variáveis de ambiente; dá para mudar em execução com PUT /configuracao) ==========
+configuracao = {
+    "latencia_ms": float(os.getenv("FAKE_LATENCIA_MS", "150")),        # latência por requisição de embeddings
+    "taxa_429": float(os.getenv("FAKE_TAXA_429", "0.2")),               # probabilidade de responder 429 (embeddings)
+    "retry_after": os.getenv("FAKE_RETRY_AFTER", "1"),                  # valor do header Retry-After
+    "taxa_429_chat": float(os.getenv("FAKE_TAXA_429_CHAT", os.getenv("FAKE_TAXA_429", "0.2"))),
+    "ttft_ms": float(os.getenv("FAKE_TTFT_MS", "300")),                 # tempo até o primeiro token do chat
+    "tokens_por_s": float(os.getenv("FAKE_TOKENS_POR_S", "80")),        # velocidade de geração
+    "tokens_resposta": int(os.getenv("FAKE_TOKENS_RESPOSTA", "60")),    # tamanho da resposta
+    "ferramentas": os.getenv("FAKE_FERRAMENTAS", "1") == "1",           # chama search_knowledge_base antes de responder
+}
+
+app = FastAPI(title="OpenAI Fake", description="Servidor local compatível com a API da OpenAI para testes")
+
+# Contadores simples para conferir o comportamento dos clientes
+estatisticas = {"requisicoes": 0, "respostas_429": 0, "textos_embeddados": 0, "chats": 0, "chats_stream": 0,
+                "chamadas_ferramenta": 0, "tokens_gerados": 0}
+
+
+class EmbeddingRequest(BaseModel):
+    input: Union[str, List[str]]
+    model: str = "text-embedding-3-small"
+    dimensions: Optional[int] = None
+    encoding_format: str = "float"
+
+
+def vetor_fake(texto: str, dimensoes: int) -> List[float]:
+    # Mesmo texto -> mesmo vetor (determinístico), já normalizado
+    rng = random.Random(sha256(texto.encode()).digest())
+    vetor = [rng.gauss(0, 1) for _ in range(dimensoes)]
+    norma = math.sqrt(sum(v * v for v in vetor)) or 1.0
+    return [v / norma for v in vetor]
+
+
+def resposta_429() -> JSONResponse:
+    estatisticas["respostas_429"] += 1
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": configuracao["retry_after"]},
+        content={"error": {"message": "Rate limit reached (fake)", "type": "requests", "code": "rate_limit_exceeded"}},
+    )
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: EmbeddingRequest):
+    estatisticas["requisicoes"] += 1
+    await asyncio.sleep(configuracao["latencia_ms"] / 1000)
+    if random.random() < configuracao["taxa_429"]:
+        return resposta_429()
+
+    textos = [request.input] if isinstance(request.input, str) else request.input
+    dimensoes = request.dimensions or 1536
+    estatisticas["textos_embeddados"] += len(textos)
+    tokens = sum(max(1, len(t) // 4) for t in textos)
+    return {
+        "object": "list",
+        "data": [
+            {"object": "embedding", "index": i, "embedding": vetor_fake(texto, dimensoes)}
+            for i, texto in enumerate(textos)
+        ],
+        "model": request.model,
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+# CHAT ==============================================================
+class ChatRequest(BaseModel):
+    model_config = ConfigDict(extra="allow")  # temperature, tool_choice, etc. são ignorados
+
+    model: str = "gpt-5-nano"
+    messages: List[Dict[str, Any]]
+    stream: bool = False
+    tools: Optional[List[Dict[str, Any]]] = None
+    stream_options: Optional[Dict[str, Any]] = None
+
+
+def _texto(mensagem: Dict[str, Any]) -> str:
+    conteudo = mensagem.get("content") or ""
+    if isinstance(conteudo, list):  # partes (texto, imagem...)
+        return " ".join(p.get("text", "") for p in conteudo if isinstance(p, dict))
+    return str(conteudo)
+
+
+def _chamada_ferramenta(request: ChatRequest) -> Optional[Dict[str, Any]]:
+    """Primeira volta de uma pergunta com a ferramenta de busca disponível: pede a busca na knowledge."""
+    if not configuracao["ferramentas"] or not request.tools:
+        return None
+    nomes = {t.get("function", {}).get("name") for t in request.tools}
+    if "search_knowledge_base" not in nomes:
+        return None
+    for mensagem in reversed(request.messages):
+        if mensagem.get("role") == "tool":
+            return None  # a busca já voltou: agora é responder
+        if mensagem.get("role") == "user":
+            pergunta = _texto(mensagem)
+            return {
+                "id": f"call_{uuid4().hex[:24]}",
+                "type": "function",
+                "function": {"name": "search_knowledge_base", "arguments": json.dumps({"query": pergunta[:200]})},
+            }
+    return None
+
+
+def _resposta(request: ChatRequest) -> List[str]:
+    """Tokens da resposta: palavras do resultado da ferramenta (ou da pergunta), determinísticas por conversa."""
+    pergunta = next((_texto(m) for m in reversed(request.messages) if m.get("role") == "user"), "")
+    contexto = next((_texto(m) for m in reversed(request.messages) if m.get("role") == "tool"), "") or pergunta
+    palavras = [p for p in contexto.split() if p.isprintable()] or ["ok"]
+    rng = random.Random(sha256(pergunta.encode()).digest())
+    inicio = rng.randrange(len(palavras))
+    tokens = ["Senhor,"] + [palavras[(inicio + i) % len(palavras)] for i in range(configuracao["tokens_resposta"] - 1)]
+    return [t if i == 0 else " " + t for i, t in enumerate(tokens)]
+
+
+def _uso(request: ChatRequest, gerados: int) -> Dict[str, int]:
+    prompt = sum(max(1, len(_texto(m)) // 4) for m in request.messages)
+    return {"prompt_tokens": prompt, "completion_tokens": gerados, "total_tokens": prompt + gerados}
+
+
+def _pedaco(id: str, modelo: str, delta: Dict[str, Any], fim: Optional[str] = None) -> str:
+    corpo = {
+        "id": id, "object": "chat.completion.chunk", "created": int(time.time()), "model": modelo,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": fim}],
+    }
+    return f"data: {json.dumps(corpo, ensure_ascii=False)}\n\n"
+
+
+async def _stream_chat(request: ChatRequest, id: str):
+    await asyncio.sleep(configuracao["ttft_ms"] / 1000)
+    chamada = _chamada_ferramenta(request)
+    gerados = 0
+    if chamada is not None:
+        estatisticas["chamadas_ferramenta"] += 1
+        yield _pedaco(id, request.model, {"role": "assistant", "tool_calls": [{"index": 0, **chamada}]})
+        yield _pedaco(id, request.model, {}, "tool_calls")
+    else:
+        intervalo = 1 / configuracao["tokens_por_s"] if configuracao["tokens_por_s"] > 0 else 0
+        for i, token in enumerate(_resposta(request)):
+            if i:
+                await asyncio.sleep(intervalo)
+            yield _pedaco(id, request.model, {"role": "assistant", "content": token} if i == 0 else {"content": token})
+            gerados += 1
+        estatisticas["tokens_gerados"] += gerados
+        yield _pedaco(id, request.model, {}, "stop")
+    if (request.stream_options or {}).get("include_usage"):
+        corpo = {"id": id, "object": "chat.completion.chunk", "created": int(time.time()), "model": request.model,
+                 "choices": [], "usage": _uso(request, gerados)}
+        yield f"data: {json.dumps(corpo)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat(request: ChatRequest):
+    estatisticas["requisicoes"] += 1
+    estatisticas["chats"] += 1
+    if random.random() < configuracao["taxa_429_chat"]:
+        await asyncio.sleep(configuracao["latencia_ms"] / 1000)
+        return resposta_429()
+
+    id = f"chatcmpl-{uuid4().hex[:24]}"
+    if request.stream:
+        estatisticas["chats_stream"] += 1
+        return StreamingResponse(_stream_chat(request, id), media_type="text/event-stream")
+
+    chamada = _chamada_ferramenta(request)
+    if chamada is not None:
+        estatisticas["chamadas_ferramenta"] += 1
+        await asyncio.sleep(configuracao["ttft_ms"] / 1000)
+        mensagem, fim, gerados = {"role": "assistant", "content": None, "tool_calls": [chamada]}, "tool_calls", 0
+    else:
+        tokens = _resposta(request)
+        velocidade = configuracao["tokens_por_s"]
+        await asyncio.sleep(configuracao["ttft_ms"] / 1000 + (len(tokens) / velocidade if velocidade > 0 else 0))
+        mensagem, fim, gerados = {"role": "assistant", "content": "".join(tokens)}, "stop", len(tokens)
+        estatisticas["tokens_gerados"] += gerados
+    return {
+        "id": id, "object": "chat.completion", "created": int(time.time()), "model": request.model,
+        "choices": [{"index": 0, "message": mensagem, "finish_reason": fim}],
+        "usage": _uso(request, gerados),
+    }
+
+
+# CONTROLE ==========================================================
+@app.get("/estatisticas")
+def read_estatisticas():
+    return estatisticas
+
+
+@app.get("/configuracao")
+def read_configuracao():
+    return configuracao
+
+
+@app.put("/configuracao")
+def atualizar_configuracao(valores: Dict[str, Any]):
+    """Muda latência, taxa de 429, velocidade de geração... sem reiniciar (ex.: entre cenários do teste de carga)."""
+    desconhecidas = set(valores) - set(configuracao)
+    if desconhecidas:
+        return JSONResponse(status_code=422, content={"detail": f"Chaves desconhecidas: {sorted(desconhecidas)}"})
+    for chave, valor in valores.items():
+        if isinstance(configuracao[chave], bool):
+            configuracao[chave] = valor if isinstance(valor, bool) else str(valor).lower() in ("1", "true")
+        else:
+            configuracao[chave] = type(configuracao[chave])(valor)
+    return configuracao
+
+
+# RUN ===========================================================
+if __name__ == "__main__":
+    uvicorn.run("servidor_fake_openai:app", host="0.0.0.0", port=int(os.getenv("PORT", "8001")))
@@ -0,0 +1,546 @@
+#Armazenamento de sessões do agente em SQLite, ajustado para concorrência
+#WAL + pool de conexões + um único escritor com group commit + runs em tabela própria
+#------------------------------------------
+
+#IMPORTACOES
+import atexit
+import json
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from hashlib import blake2b
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from agno.db.base import SessionType
+from agno.db.sqlite import SqliteDb
+from agno.db.utils import CustomJSONEncoder, deserialize_session_json_fields, serialize_session_json_fields
+from agno.session import AgentSession
+from sqlalchemy import create_engine, event, select, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.pool import QueuePool
+
+from cache_busca import LRU
+from metricas import medir
+
+# Campos mantidos quando um run antigo é compactado (o resto: eventos, tools, referências,
+# mensagens de sistema/tool com o contexto da knowledge...)
+_CAMPOS_COMPACTADOS = {
+    "run_id", "agent_id", "agent_name", "session_id", "user_id", "parent_run_id", "input",
+    "content", "content_type", "status", "created_at", "model", "model_provider", "metrics", "metadata",
+}
+
+
+def _pragmas(conexao, _):
+    cursor = conexao.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")  # com WAL: seguro contra corrupção, fsync só no checkpoint
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.execute("PRAGMA cache_size=-65536")  # 64 MB por conexão
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
+
+def compactar_run(run: Dict[str, Any]) -> Dict[str, Any]:
+    """Versão enxuta de um run: entrada, resposta e o diálogo (usuário/assistente) sem tools nem contexto."""
+    compacto = {k: v for k, v in run.items() if k in _CAMPOS_COMPACTADOS}
+    compacto["messages"] = [
+        {"role": m.get("role"), "content": m.get("content"), "created_at": m.get("created_at")}
+        for m in run.get("messages") or []
+        if m.get("role") in ("user", "assistant") and m.get("content")
+    ]
+    return compacto
+
+
+class SqliteDbOtimizado(SqliteDb):
+    """
+    `SqliteDb` do Agno para muitas perguntas simultâneas.
+
+    - Conexões: pool do SQLAlchemy com WAL, `synchronous=NORMAL` e `busy_timeout` (leitores não
+      bloqueiam o escritor nem uns aos outros).
+    - Escrita: todas as gravações vão para uma fila; uma única thread escritora junta o que chegar
+      em `janela_commit_ms` (até `max_lote` itens) e grava tudo em uma transação (group commit).
+      Ninguém disputa o lock de escrita, então não há "database is locked".
+    - Sessões compactas: cada run fica em uma linha da tabela `<session_table>_runs` (JSON com
+      zlib) e a linha da sessão guarda só os metadados. `get_session` carrega os últimos
+      `runs_carregados` runs (o agente usa `num_history_runs`), e a gravação só reescreve os runs
+      que mudaram, em vez do blob inteiro da sessão.
+    - Compactação em segundo plano: runs além dos `manter_completos` mais recentes de cada sessão
+      perdem eventos, tools e contexto da knowledge (`compactar_run`).
+
+    Com `aguardar_commit=False` (padrão), `upsert_session` retorna sem esperar o commit; a leitura
+    da mesma sessão enxerga a versão pendente (read-your-writes). O risco é perder no máximo
+    uma janela de commit se o processo morrer.
+
+    Args:
+        db_file: Arquivo SQLite (o mesmo do SqliteDb padrão pode ser reaproveitado)
+        tamanho_pool: Conexões mantidas abertas para leitura
+        runs_carregados: Quantos runs recentes `get_session` devolve
+        manter_completos: Runs recentes por sessão que não são compactados
+        janela_commit_ms: Tempo que o escritor espera por mais gravações antes do commit
+        max_lote: Máximo de itens por transação
+        aguardar_commit: `upsert_session` só retorna depois do commit
+        intervalo_compactacao: Segundos entre rodadas de compactação (0 desliga a thread)
+    """
+
+    def __init__(
+        self,
+        db_file: str = "tmp/agent.db",
+        session_table: Optional[str] = None,
+        tamanho_pool: int = 8,
+        runs_carregados: int = 10,
+        manter_completos: int = 20,
+        janela_commit_ms: float = 2.0,
+        max_lote: int = 256,
+        aguardar_commit: bool = False,
+        intervalo_compactacao: float = 60.0,
+        **kwargs,
+    ):
+        caminho = Path(db_file).resolve()
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        engine = create_engine(
+            f"sqlite:///{caminho}",
+            poolclass=QueuePool,
+            pool_size=tamanho_pool,
+            max_overflow=tamanho_pool,
+            connect_args={"check_same_thread": False, "timeout": 30},
+        )
+        event.listen(engine, "connect", _pragmas)
+        super().__init__(db_engine=engine, db_file=db_file, session_table=session_table, **kwargs)
+
+        assert runs_carregados <= manter_completos, "runs carregados não podem estar compactados"
+        self.runs_carregados = runs_carregados
+        self.manter_completos = manter_completos
+        self.janela_commit = janela_commit_ms / 1000
+        self.max_lote = max_lote
+        self.aguardar_commit = aguardar_commit
+        self.tabela_runs = f"{self.session_table_name}_runs"
+        with self.db_engine.begin() as conn:
+            conn.execute(text(
+                f"""CREATE TABLE IF NOT EXISTS {self.tabela_runs} (
+                    seq INTEGER PRIMARY KEY,
+                    run_id TEXT NOT NULL UNIQUE,
+                    session_id TEXT NOT NULL,
+                    compactado INTEGER NOT NULL DEFAULT 0,
+                    dados BLOB NOT NULL
+                )"""
+            ))
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{self.tabela_runs}_sessao ON {self.tabela_runs} (session_id, seq)"))
+
+        self._lock = threading.Lock()
+        self._pendentes: Dict[str, Dict[str, Any]] = {}  # session_id -> última versão ainda não gravada
+        self._assinaturas = LRU(max_itens=100_000)       # run_id -> hash (blake2b) do JSON gravado
+        self._estatisticas = {"lotes": 0, "sessoes": 0, "runs_gravados": 0, "runs_iguais": 0, "maior_lote": 0, "compactados": 0}
+        self._fila: "queue.Queue" = queue.Queue()
+        self._escritor = threading.Thread(target=self._escrever, name="sqlite-escritor", daemon=True)
+        self._escritor.start()
+        self._parar = threading.Event()
+        if intervalo_compactacao > 0:
+            threading.Thread(target=self._compactar_periodicamente, args=(intervalo_compactacao,), daemon=True).start()
+        atexit.register(self.flush)
+
+    # ESCRITOR (GROUP COMMIT) =====================================
+    def _enfileirar(self, tipo: str, carga) -> Future:
+        futuro: Future = Future()
+        self._fila.put((tipo, carga, futuro))
+        return futuro
+
+    def _executar(self, funcao: Callable, *args, **kwargs):
+        """Roda uma escrita do SqliteDb original na thread escritora (e espera o resultado)."""
+        return self._enfileirar("funcao", lambda: funcao(*args, **kwargs)).result()
+
+    def flush(self):
+        """Espera tudo que já está na fila ser gravado."""
+        if self._escritor.is_alive():
+            self._enfileirar("funcao", lambda: None).result()
+
+    def _escrever(self):
+        while True:
+            lote = [self._fila.get()]
+            prazo = time.monotonic() + self.janela_commit
+            while len(lote) < self.max_lote:
+                restante = prazo - time.monotonic()
+                try:
+                    lote.append(self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._gravar_lote([item for item in lote if item[0] != "funcao"])
+                erro = None
+            except Exception as e:
+                print(f"⚠️  Sessões: falha ao gravar lote de {len(lote)} itens: {e}")
+                erro = e
+            # Escritas do SqliteDb original (memórias, deleções...) rodam depois, na mesma thread
+            for tipo, carga, futuro in lote:
+                if tipo == "funcao":
+                    try:
+                        futuro.set_result(carga())
+                    except Exception as e:
+                        futuro.set_exception(e)
+                elif erro is not None:
+                    futuro.set_exception(erro)
+                else:
+                    futuro.set_result(None)
+
+    def _gravar_lote(self, lote):
+        if not lote:
+            return
+        sessoes: Dict[str, Dict[str, Any]] = {}
+        runs: Dict[str, Dict[str, Any]] = {}
+        compactacoes = []
+        for tipo, carga, _ in lote:
+            if tipo == "sessao":
+                sessoes[carga["session_id"]] = carga  # a versão mais nova da sessão vence
+                for run in carga.get("runs") or []:
+                    runs[run["run_id"]] = run
+            elif tipo == "compactar":
+                compactacoes.extend(carga)
+
+        tabela = self._get_table(table_type="sessions", create_table_if_not_found=True)
+        agora = int(time.time())
+        with self.db_engine.begin() as conn:
+            for session_id, dados in sessoes.items():
+                self._migrar_runs_legados(conn, tabela, session_id)
+                linha = serialize_session_json_fields({**dados, "runs": None})
+                valores = {
+                    "agent_id": linha.get("agent_id"),
+                    "user_id": linha.get("user_id"),
+                    "agent_data": linha.get("agent_data"),
+                    "session_data": linha.get("session_data"),
+                    "metadata": linha.get("metadata"),
+                    "summary": linha.get("summary"),
+                    "runs": None,
+                }
+                stmt = sqlite.insert(tabela).values(
+                    session_id=session_id,
+                    session_type=SessionType.AGENT.value,
+                    created_at=linha.get("created_at") or agora,
+                    updated_at=agora,
+                    **valores,
+                ).on_conflict_do_update(index_elements=["session_id"], set_=dict(valores, updated_at=agora))
+                conn.execute(stmt)
+
+            gravar = []
+            assinaturas = []
+            for run_id, run in runs.items():
+                bruto = json.dumps(run, cls=CustomJSONEncoder)
+                # Hash criptográfico: com um checksum (crc32) uma colisão faria um run alterado não ser gravado
+                assinatura = blake2b(bruto.encode(), digest_size=16).digest()
+                if self._assinaturas.buscar(run_id) == assinatura:
+                    self._estatisticas["runs_iguais"] += 1
+                    continue
+                gravar.append({"run_id": run_id, "session_id": run.get("session_id"), "dados": zlib.compress(bruto.encode(), 1)})
+                assinaturas.append((run_id, assinatura))
+            if gravar:
+                conn.execute(
+                    text(
+                        f"INSERT INTO {self.tabela_runs} (run_id, session_id, dados) VALUES (:run_id, :session_id, :dados) "
+                        "ON CONFLICT(run_id) DO UPDATE SET dados = excluded.dados, compactado = 0"
+                    ),
+                    gravar,
+                )
+            if compactacoes:
+                # Só se o run não foi reescrito desde a leitura da compactação
+                conn.execute(
+                    text(f"UPDATE {self.tabela_runs} SET dados = :novo, compactado = 1 WHERE seq = :seq AND dados = :antigo"),
+                    compactacoes,
+                )
+
+        # Só depois do commit: se a transação falhar, o próximo lote precisa regravar esses runs
+        for run_id, assinatura in assinaturas:
+            self._assinaturas.gravar(run_id, assinatura)
+        with self._lock:
+            for session_id, dados in sessoes.items():
+                if self._pendentes.get(session_id) is dados:
+                    del self._pendentes[session_id]
+        self._estatisticas["lotes"] += 1
+        self._estatisticas["sessoes"] += len(sessoes)
+        self._estatisticas["runs_gravados"] += len(gravar)
+        self._estatisticas["compactados"] += len(compactacoes)
+        self._estatisticas["maior_lote"] = max(self._estatisticas["maior_lote"], len(lote))
+
+    def _migrar_runs_legados(self, conn, tabela, session_id: str):
+        # Sessão gravada pelo SqliteDb padrão: os runs estão no JSON da linha; vão para a tabela de runs
+        legado = conn.execute(
+            select(tabela.c.runs).where(tabela.c.session_id == session_id, tabela.c.runs.isnot(None))
+        ).scalar()
+        while isinstance(legado, str):
+            legado = json.loads(legado)
+        if not legado:
+            return
+        conn.execute(
+            text(f"INSERT OR IGNORE INTO {self.tabela_runs} (run_id, session_id, dados) VALUES (:run_id, :session_id, :dados)"),
+            [
+                {"run_id": r["run_id"], "session_id": session_id, "dados": zlib.compress(json.dumps(r, cls=CustomJSONEncoder).encode(), 1)}
+                for r in legado
+            ],
+        )
+
+    # SESSÕES =====================================================
+    @medir("sessao_gravacao")
+    def upsert_session(self, session, deserialize: Optional[bool] = True):
+        if not isinstance(session, AgentSession):
+            return self._executar(super().upsert_session, session, deserialize)
+        dados = session.to_dict()
+        with self._lock:
+            self._pendentes[session.session_id] = dados
+        futuro = self._enfileirar("sessao", dados)
+        if self.aguardar_commit:
+            futuro.result()
+        return session if deserialize else dados
+
+    @medir("sessao_leitura")
+    def get_session(
+        self,
+        session_id: str,
+        session_type: SessionType,
+        user_id: Optional[str] = None,
+        deserialize: Optional[bool] = True,
+    ) -> Optional[Union[AgentSession, Dict[str, Any]]]:
+        if session_type != SessionType.AGENT:
+            return super().get_session(session_id, session_type, user_id, deserialize)
+
+        with self._lock:
+            pendente = self._pendentes.get(session_id)
+        if pendente is not None and user_id in (None, pendente.get("user_id")):
+            bruto = json.loads(json.dumps(pendente, cls=CustomJSONEncoder))  # cópia: o chamador pode alterar
+            bruto["runs"] = (bruto.get("runs") or [])[-self.runs_carregados:]
+        else:
+            tabela = self._get_table(table_type="sessions")
+            if tabela is None:
+                return None
+            with self.db_engine.connect() as conn:
+                stmt = select(tabela).where(tabela.c.session_id == session_id)
+                if user_id is not None:
+                    stmt = stmt.where(tabela.c.user_id == user_id)
+                linha = conn.execute(stmt).fetchone()
+                if linha is None:
+                    return None
+                recentes = conn.execute(
+                    text(f"SELECT dados FROM {self.tabela_runs} WHERE session_id = :s ORDER BY seq DESC LIMIT :n"),
+                    {"s": session_id, "n": self.runs_carregados},
+                ).fetchall()
+            bruto = deserialize_session_json_fields(dict(linha._mapping))
+            if recentes:
+                bruto["runs"] = [json.loads(zlib.decompress(dados)) for (dados,) in reversed(recentes)]
+            else:
+                legado = bruto.get("runs")
+                while isinstance(legado, str):
+                    legado = json.loads(legado)
+                bruto["runs"] = (legado or [])[-self.runs_carregados:]
+
+        bruto["runs"] = bruto["runs"] or None  # AgentSession.from_dict não aceita lista vazia
+        if not deserialize:
+            return bruto
+        return AgentSession.from_dict(bruto)
+
+    def historico(self, session_id: str) -> List[Dict[str, Any]]:
+        """Todos os runs da sessão, do mais antigo ao mais novo (os antigos podem estar compactados)."""
+        self.flush()
+        with self.db_engine.connect() as conn:
+            linhas = conn.execute(
+                text(f"SELECT dados FROM {self.tabela_runs} WHERE session_id = :s ORDER BY seq"), {"s": session_id}
+            ).fetchall()
+        return [json.loads(zlib.decompress(dados)) for (dados,) in linhas]
+
+    def _apagar_runs(self, session_ids: List[str]):
+        with self.db_engine.begin() as conn:
+            conn.execute(
+                text(f"DELETE FROM {self.tabela_runs} WHERE session_id IN (SELECT value FROM json_each(:ids))"),
+                {"ids": json.dumps(session_ids)},
+            )
+
+    def delete_session(self, session_id: str) -> bool:
+        def apagar():
+            self._apagar_runs([session_id])
+            return SqliteDb.delete_session(self, session_id)
+
+        with self._lock:
+            self._pendentes.pop(session_id, None)
+        return self._enfileirar("funcao", apagar).result()
+
+    def delete_sessions(self, session_ids: List[str]) -> None:
+        def apagar():
+            self._apagar_runs(session_ids)
+            SqliteDb.delete_sessions(self, session_ids)
+
+        with self._lock:
+            for session_id in session_ids:
+                self._pendentes.pop(session_id, None)
+        return self._enfileirar("funcao", apagar).result()
+
+    # MEMÓRIAS (também pela thread escritora) =====================
+    def upsert_user_memory(self, memory, deserialize: Optional[bool] = True):
+        return self._executar(super().upsert_user_memory, memory, deserialize)
+
+    def upsert_memories(self, memories, deserialize: Optional[bool] = True, preserve_updated_at: bool = False):
+        return self._executar(super().upsert_memories, memories, deserialize, preserve_updated_at)
+
+    def delete_user_memory(self, memory_id: str, user_id: Optional[str] = None):
+        return self._executar(super().delete_user_memory, memory_id, user_id)
+
+    def delete_user_memories(self, memory_ids: List[str], user_id: Optional[str] = None) -> None:
+        return self._executar(super().delete_user_memories, memory_ids, user_id)
+
+    # COMPACTAÇÃO =================================================
+    def compactar_agora(self, lote: int = 500) -> int:
+        """Compacta os runs antigos de todas as sessões. Returns: quantos runs foram compactados."""
+        with self.db_engine.connect() as conn:
+            sessoes = [
+                r[0]
+                for r in conn.execute(
+                    text(
+                        f"SELECT session_id FROM {self.tabela_runs} WHERE compactado = 0 "
+                        "GROUP BY session_id HAVING COUNT(*) > :n"
+                    ),
+                    {"n": self.manter_completos},
+                )
+            ]
+        total = 0
+        for session_id in sessoes:
+            with self.db_engine.connect() as conn:
+                antigos = conn.execute(
+                    text(
+                        f"SELECT seq, dados FROM {self.tabela_runs} WHERE session_id = :s AND seq < ("
+                        f"  SELECT MIN(seq) FROM (SELECT seq FROM {self.tabela_runs} WHERE session_id = :s ORDER BY seq DESC LIMIT :n)"
+                        ") AND compactado = 0 LIMIT :lote"
+                    ),
+                    {"s": session_id, "n": self.manter_completos, "lote": lote},
+                ).fetchall()
+            if not antigos:
+                continue
+            alteracoes = [
+                {
+                    "seq": seq,
+                    "antigo": dados,
+                    "novo": zlib.compress(json.dumps(compactar_run(json.loads(zlib.decompress(dados))), cls=CustomJSONEncoder).encode(), 6),
+                }
+                for seq, dados in antigos
+            ]
+            self._enfileirar("compactar", alteracoes).result()
+            total += len(alteracoes)
+        return total
+
+    def _compactar_periodicamente(self, intervalo: float):
+        while not self._parar.wait(intervalo):
+            try:
+                compactados = self.compactar_agora()
+                if compactados:
+                    print(f"🗜️  Sessões: {compactados} runs antigos compactados")
+            except Exception as e:
+                print(f"⚠️  Sessões: falha na compactação: {e}")
+
+    def estatisticas(self) -> Dict[str, int]:
+        with self._lock:
+            pendentes = len(self._pendentes)
+        return {**self._estatisticas, "fila": self._fila.qsize(), "pendentes": pendentes}
+
+    def close(self) -> None:
+        self._parar.set()
+        self.flush()
+        super().close()
+
+
+# BENCHMARK =======================================================
+# Clientes simultâneos fazendo o ciclo de um run (ler sessão -> novo run -> gravar sessão),
+# com o SqliteDb padrão e com o SqliteDbOtimizado, em sessões que já têm histórico:
+#   python sessoes.py [clientes=32] [runs_por_cliente=20] [runs_iniciais=30]
+def _run_sintetico(session_id: str, numero: int):
+    from uuid import uuid4
+
+    from agno.models.message import Message
+    from agno.run.agent import RunInput, RunOutput
+
+    contexto = "Trecho do relatório: receita líquida de R$ 612,3 milhões no 2T25. " * 40  # ~2,8 KB de knowledge
+    return RunOutput(
+        run_id=str(uuid4()),
+        agent_id="agente_pdf",
+        session_id=session_id,
+        user_id="benchmark",
+        input=RunInput(input_content=f"Pergunta {numero}: qual foi a receita líquida no 2T25?"),
+        content="Senhor, a receita líquida foi de R$ 612,3 milhões no 2T25. " * 10,
+        messages=[
+            Message(role="system", content="Você deve chamar o usuário de senhor. " + contexto),
+            Message(role="user", content=f"Pergunta {numero}: qual foi a receita líquida no 2T25?"),
+            Message(role="tool", content=contexto, tool_call_id="busca"),
+            Message(role="assistant", content="Senhor, a receita líquida foi de R$ 612,3 milhões no 2T25. " * 10),
+        ],
+        created_at=int(time.time()),
+    )
+
+
+def _medir(db, sessoes: List[str], clientes: int, runs_por_cliente: int) -> Dict[str, float]:
+    from concurrent.futures import ThreadPoolExecutor
+
+    tempos: List[float] = []
+    erros: List[str] = []
+
+    def cliente(indice: int):
+        for numero in range(runs_por_cliente):
+            session_id = sessoes[(indice + numero) % len(sessoes)]
+            inicio = time.perf_counter()
+            try:
+                sessao = db.get_session(session_id=session_id, session_type=SessionType.AGENT)
+                sessao.upsert_run(_run_sintetico(session_id, numero))
+                db.upsert_session(sessao)
+            except Exception as e:
+                erros.append(str(e).splitlines()[0][:80])
+                continue
+            tempos.append((time.perf_counter() - inicio) * 1000)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(clientes) as executor:
+        list(executor.map(cliente, range(clientes)))
+    if hasattr(db, "flush"):
+        db.flush()
+    segundos = time.perf_counter() - inicio
+    tempos.sort()
+    return {
+        "runs/s": len(tempos) / segundos,
+        "p50": tempos[len(tempos) // 2] if tempos else float("nan"),
+        "p95": tempos[int(len(tempos) * 0.95)] if tempos else float("nan"),
+        "p99": tempos[int(len(tempos) * 0.99)] if tempos else float("nan"),
+        "erros": len(erros),
+        "exemplo_erro": erros[0] if erros else "",
+    }
+
+
+if __name__ == "__main__":
+    import os
+    import shutil
+    import sys
+
+    clientes = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    runs_por_cliente = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    runs_iniciais = int(sys.argv[3]) if len(sys.argv) > 3 else 30
+
+    shutil.rmtree("tmp/benchmark_sessoes", ignore_errors=True)
+    sessoes = [f"sessao-{i}" for i in range(clientes)]
+    print(f"📊 {clientes} clientes x {runs_por_cliente} runs, sessões com {runs_iniciais} runs de histórico")
+    print(f"{'store':18} {'runs/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'erros':>6} {'arquivo (MB)':>13}")
+    for nome, criar in [
+        ("SqliteDb", lambda: SqliteDb(session_table="agent_session", db_file="tmp/benchmark_sessoes/padrao.db")),
+        ("SqliteDbOtimizado", lambda: SqliteDbOtimizado(
+            session_table="agent_session", db_file="tmp/benchmark_sessoes/otimizado.db", intervalo_compactacao=0
+        )),
+    ]:
+        db = criar()
+        for session_id in sessoes:
+            sessao = AgentSession(session_id=session_id, agent_id="agente_pdf", user_id="benchmark", session_data={}, created_at=int(time.time()))
+            for numero in range(runs_iniciais):
+                sessao.upsert_run(_run_sintetico(session_id, numero))
+            db.upsert_session(sessao)
+        if isinstance(db, SqliteDbOtimizado):
+            db.flush()
+            db.compactar_agora()
+        r = _medir(db, sessoes, clientes, runs_por_cliente)
+        tamanho = sum(os.path.getsize(p) for p in Path("tmp/benchmark_sessoes").glob(f"{Path(db.db_file).stem}.db*")) / 1e6
+        print(f"{nome:18} {r['runs/s']:>8.0f} {r['p50']:>9.1f} {r['p95']:>9.1f} {r['p99']:>9.1f} {r['erros']:>6} {tamanho:>13.1f}")
+        if r["exemplo_erro"]:
+            print(f"   ⚠️  {r['exemplo_erro']}")
+        if isinstance(db, SqliteDbOtimizado):
+            print(f"   {db.estatisticas()}")
+        db.close()
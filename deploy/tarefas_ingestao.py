@@ -0,0 +1,307 @@
+#Ingestão em segundo plano dentro do servidor
+#Fila de tarefas (submeter/status/cancelar), prontidão do índice e snapshot para subir rápido
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+import json
+import os
+import sqlite3
+import tarfile
+import tempfile
+import time
+from dataclasses import asdict, dataclass, is_dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from uuid import uuid4
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+@dataclass
+class Tarefa:
+    id: str
+    url: str
+    metadata: Dict[str, Any]
+    status: str  # na_fila, executando, concluida, falhou, cancelada
+    criado: float
+    iniciado: Optional[float] = None
+    terminado: Optional[float] = None
+    resultado: Optional[Dict[str, Any]] = None
+    erro: Optional[str] = None
+
+
+class FilaIngestao:
+    """
+    Pool de workers assíncronos que executa ingestões de PDFs no event loop do servidor.
+
+    As tarefas ficam em SQLite: depois de um restart, as que estavam na fila ou em execução voltam
+    para a fila (o manifesto de ingestão faz a retomada continuar de onde parou). A mesma URL não
+    entra duas vezes na fila enquanto uma tarefa dela estiver pendente.
+
+    Args:
+        executar: `async (url, metadata) -> resultado` (ex.: ingerir_pdf_incremental com os
+            parâmetros do app); o resultado (dataclass ou dict) fica no status da tarefa
+        trabalhadores: Tarefas executadas ao mesmo tempo
+        db_file: SQLite das tarefas
+    """
+
+    def __init__(
+        self,
+        executar: Callable[[str, Dict[str, Any]], Awaitable[Any]],
+        trabalhadores: int = 1,
+        db_file: str = "tmp/tarefas_ingestao.db",
+    ):
+        self.executar = executar
+        self.trabalhadores = trabalhadores
+        Path(db_file).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tarefas (
+                id TEXT PRIMARY KEY,
+                dados TEXT NOT NULL,
+                status TEXT NOT NULL,
+                criado REAL NOT NULL
+            )
+            """
+        )
+        self._fila: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._workers: List[asyncio.Task] = []
+        self._em_execucao: Dict[str, asyncio.Task] = {}
+        self._cancelados: set = set()
+        self._liberada = asyncio.Event()  # limpo enquanto pausada (ex.: durante o snapshot)
+        self._liberada.set()
+
+    # PERSISTÊNCIA ================================================
+    def _gravar(self, tarefa: Tarefa):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO tarefas VALUES (?, ?, ?, ?)",
+            (tarefa.id, json.dumps(asdict(tarefa), ensure_ascii=False, default=str), tarefa.status, tarefa.criado),
+        )
+
+    def status(self, tarefa_id: str) -> Optional[Tarefa]:
+        linha = self._conn.execute("SELECT dados FROM tarefas WHERE id = ?", (tarefa_id,)).fetchone()
+        return Tarefa(**json.loads(linha[0])) if linha else None
+
+    def listar(self, limite: int = 50) -> List[Tarefa]:
+        linhas = self._conn.execute("SELECT dados FROM tarefas ORDER BY criado DESC LIMIT ?", (limite,)).fetchall()
+        return [Tarefa(**json.loads(l[0])) for l in linhas]
+
+    def contagem(self) -> Dict[str, int]:
+        return dict(self._conn.execute("SELECT status, COUNT(*) FROM tarefas GROUP BY status").fetchall())
+
+    # CICLO DE VIDA ===============================================
+    def iniciar(self):
+        """Sobe os workers (no lifespan do app) e recoloca na fila o que ficou pendente."""
+        self._fila = asyncio.Queue()
+        self._loop = asyncio.get_running_loop()
+        pendentes = self._conn.execute(
+            "SELECT dados FROM tarefas WHERE status IN ('na_fila', 'executando') ORDER BY criado"
+        ).fetchall()
+        for (dados,) in pendentes:
+            tarefa = Tarefa(**json.loads(dados))
+            tarefa.status = "na_fila"
+            self._gravar(tarefa)
+            self._fila.put_nowait(tarefa.id)
+        self._workers = [asyncio.create_task(self._trabalhar()) for _ in range(self.trabalhadores)]
+        if pendentes:
+            print(f"📥 {len(pendentes)} tarefa(s) de ingestão retomada(s)")
+
+    async def parar(self):
+        # Cancelar o worker cancela a ingestão que ele espera; a tarefa fica "executando" e volta no restart
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    def _no_loop(self, funcao, *args):
+        """Roda `funcao` no loop dos workers: asyncio.Queue e Task.cancel não são thread-safe."""
+        try:
+            mesmo_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            mesmo_loop = False
+        if mesmo_loop:
+            funcao(*args)
+        else:
+            self._loop.call_soon_threadsafe(funcao, *args)
+
+    def pausar(self) -> bool:
+        """
+        Impede que os workers comecem tarefas novas até `retomar()` (as submetidas esperam na fila).
+        Chamar no loop dos workers. Returns: False se há ingestão em andamento ou já está pausada.
+        """
+        if self.ocupada or not self._liberada.is_set():
+            return False
+        self._liberada.clear()
+        return True
+
+    def retomar(self):
+        self._liberada.set()
+
+    def _interromper(self, tarefa_id: str):
+        task = self._em_execucao.get(tarefa_id)
+        if task is not None:
+            # O worker grava o status quando a ingestão sair no próximo await
+            self._cancelados.add(tarefa_id)
+            task.cancel()
+
+    # TAREFAS =====================================================
+    def submeter(self, url: str, metadata: Optional[Dict[str, Any]] = None) -> Tarefa:
+        for (dados,) in self._conn.execute("SELECT dados FROM tarefas WHERE status IN ('na_fila', 'executando')"):
+            existente = Tarefa(**json.loads(dados))
+            if existente.url == url:
+                return existente
+        tarefa = Tarefa(id=str(uuid4()), url=url, metadata=metadata or {}, status="na_fila", criado=time.time())
+        self._gravar(tarefa)
+        self._no_loop(self._fila.put_nowait, tarefa.id)
+        return tarefa
+
+    def cancelar(self, tarefa_id: str) -> Optional[Tarefa]:
+        tarefa = self.status(tarefa_id)
+        if tarefa is None or tarefa.status not in ("na_fila", "executando"):
+            return tarefa
+        if tarefa_id in self._em_execucao:
+            self._no_loop(self._interromper, tarefa_id)
+        else:
+            tarefa.status, tarefa.terminado = "cancelada", time.time()
+            self._gravar(tarefa)
+        return tarefa
+
+    async def _trabalhar(self):
+        while True:
+            tarefa_id = await self._fila.get()
+            await self._liberada.wait()
+            # Sem await entre a espera e o registro da execução: quem pausa vê a fila ocupada
+            tarefa = self.status(tarefa_id)
+            if tarefa is None or tarefa.status != "na_fila":
+                continue  # cancelada enquanto esperava
+            tarefa.status, tarefa.iniciado = "executando", time.time()
+            self._gravar(tarefa)
+            execucao = asyncio.create_task(self.executar(tarefa.url, tarefa.metadata))
+            self._em_execucao[tarefa.id] = execucao
+            try:
+                resultado = await execucao
+                tarefa.status = "concluida"
+                tarefa.resultado = asdict(resultado) if is_dataclass(resultado) else resultado
+            except asyncio.CancelledError:
+                if tarefa.id not in self._cancelados:
+                    raise  # shutdown (parar): a tarefa volta para a fila no restart
+                tarefa.status = "cancelada"
+            except Exception as e:
+                tarefa.status, tarefa.erro = "falhou", f"{type(e).__name__}: {str(e)[:300]}"
+            finally:
+                self._em_execucao.pop(tarefa.id, None)
+                self._cancelados.discard(tarefa.id)
+            tarefa.terminado = time.time()
+            self._gravar(tarefa)
+            print(f"📥 Ingestão {tarefa.id[:8]} ({tarefa.url.rsplit('/', 1)[-1]}): {tarefa.status} em {tarefa.terminado - tarefa.iniciado:.1f}s")
+
+    @property
+    def ocupada(self) -> bool:
+        return bool(self._em_execucao)
+
+
+# SNAPSHOT DO ÍNDICE ==============================================
+# Um .tar.gz com tudo que o servidor precisa para responder sem reingerir: coleção do Chroma,
+# BM25, fatos numéricos, manifesto, deduplicação e cache de embeddings. Arquivos SQLite são
+# copiados pela API de backup (cópia consistente, sem o -wal/-shm).
+def criar_snapshot(arquivo: str, caminhos: List[str]) -> Dict[str, Any]:
+    inicio = time.perf_counter()
+    Path(arquivo).parent.mkdir(parents=True, exist_ok=True)
+    temporario = f"{arquivo}.tmp"
+    with tarfile.open(temporario, "w:gz", compresslevel=1) as tar, tempfile.TemporaryDirectory() as pasta:
+        for caminho in caminhos:
+            raiz = Path(caminho)
+            if not raiz.exists():
+                continue
+            for item in sorted([raiz] if raiz.is_file() else raiz.rglob("*")):
+                if item.is_dir() or item.name.endswith(("-wal", "-shm")):
+                    continue
+                if item.suffix in (".db", ".sqlite3"):
+                    copia = Path(pasta) / item.name
+                    origem, destino = sqlite3.connect(item), sqlite3.connect(copia)
+                    origem.backup(destino)
+                    origem.close()
+                    destino.close()
+                    tar.add(copia, arcname=str(item))
+                    copia.unlink()
+                else:
+                    tar.add(item, arcname=str(item))
+    os.replace(temporario, arquivo)
+    return {"arquivo": arquivo, "mb": round(os.path.getsize(arquivo) / 1e6, 1), "segundos": round(time.perf_counter() - inicio, 1)}
+
+
+def restaurar_snapshot(arquivo: str, marcador: str = "tmp/chromadb") -> bool:
+    """Extrai o snapshot se o índice local (`marcador`) ainda não existe. Returns: se restaurou."""
+    if not arquivo or Path(marcador).exists() or not Path(arquivo).exists():
+        return False
+    inicio = time.perf_counter()
+    with tarfile.open(arquivo, "r:gz") as tar:
+        tar.extractall(".", filter="data")
+    print(f"♻️  Snapshot do índice restaurado de {arquivo} em {time.perf_counter() - inicio:.1f}s")
+    return True
+
+
+# ENDPOINTS =======================================================
+class PedidoIngestao(BaseModel):
+    url: str
+    metadata: Dict[str, Any] = {}
+
+
+def instalar_rotas_ingestao(
+    app: FastAPI,
+    fila: FilaIngestao,
+    contar_chunks: Callable[[], int],
+    snapshot: Optional[str] = None,
+    caminhos_snapshot: Optional[List[str]] = None,
+):
+    """
+    Rotas da ingestão em segundo plano:
+
+    - POST /ingestao/tarefas: submete um PDF (202 + id da tarefa)
+    - GET /ingestao/tarefas[/{id}]: status
+    - DELETE /ingestao/tarefas/{id}: cancela
+    - GET /prontidao: readiness probe (200 com o índice carregado, 503 enquanto estiver vazio)
+    - POST /ingestao/snapshot: grava o snapshot do índice (409 se houver ingestão em andamento);
+      a fila fica pausada durante a gravação, então tarefas submetidas nesse meio tempo esperam
+    """
+
+    # async: submeter e cancelar mexem na fila e nas tasks do loop (o threadpool não pode)
+    @app.post("/ingestao/tarefas", status_code=202)
+    async def submeter(pedido: PedidoIngestao):
+        return asdict(fila.submeter(pedido.url, pedido.metadata))
+
+    @app.get("/ingestao/tarefas")
+    def listar(limite: int = 50):
+        return [asdict(t) for t in fila.listar(limite)]
+
+    @app.get("/ingestao/tarefas/{tarefa_id}")
+    def status(tarefa_id: str):
+        tarefa = fila.status(tarefa_id)
+        return asdict(tarefa) if tarefa else JSONResponse({"detail": "Tarefa não encontrada"}, status_code=404)
+
+    @app.delete("/ingestao/tarefas/{tarefa_id}")
+    async def cancelar(tarefa_id: str):
+        tarefa = fila.cancelar(tarefa_id)
+        return asdict(tarefa) if tarefa else JSONResponse({"detail": "Tarefa não encontrada"}, status_code=404)
+
+    @app.get("/prontidao")
+    def prontidao():
+        chunks = contar_chunks()
+        corpo = {"pronto": chunks > 0, "chunks": chunks, "tarefas": fila.contagem(), "ingerindo": fila.ocupada}
+        return JSONResponse(corpo, status_code=200 if chunks > 0 else 503)
+
+    if snapshot:
+
+        @app.post("/ingestao/snapshot")
+        async def gravar_snapshot():
+            if not fila.pausar():
+                return JSONResponse({"detail": "Ingestão ou snapshot em andamento; tente de novo depois"}, status_code=409)
+            try:
+                return await asyncio.to_thread(criar_snapshot, snapshot, caminhos_snapshot or ["tmp"])
+            finally:
+                fila.retomar()
@@ -0,0 +1,677 @@
+#Vector DB em memória mapeada (NumPy)
+#Alternativa ao ChromaDb para coleções pequenas (um relatório): sem HNSW, busca exata com produto de matrizes
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from hashlib import md5
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from agno.knowledge.document import Document
+from agno.knowledge.embedder import Embedder
+from agno.utils.log import log_info, logger
+from agno.utils.string import generate_id
+from agno.vectordb.base import VectorDb
+
+
+class VetoresMmap(VectorDb):
+    """
+    Vector DB em um diretório com dois arquivos:
+
+    - `vetores-<n>.bin`: matriz (linhas x dimensões) float32 ou float16, lida via np.memmap.
+      Os vetores são normalizados na gravação, então o produto escalar é o cosseno.
+    - `itens.db` (SQLite): ID, conteúdo, metadados e se a linha está viva.
+
+    Upsert e delete não reescrevem a matriz: a linha antiga vira lápide (tombstone) e a nova
+    vai para o fim. `compactar()` reescreve só as linhas vivas em um arquivo novo (troca
+    atômica); é chamado sozinho quando as lápides passam de `limite_lapides`.
+
+    Vários processos podem abrir a mesma coleção com `somente_leitura=True` (ex.: workers do
+    uvicorn): a matriz é compartilhada pelo page cache do SO e cada leitor recarrega o estado
+    quando a geração gravada no SQLite muda. Só um processo deve escrever.
+
+    Args:
+        collection: Nome da coleção (subdiretório de `path`)
+        path: Diretório base
+        embedder: Embedder das consultas e dos documentos (padrão: OpenAIEmbedder)
+        dtype: "float32" ou "float16" (metade do disco/RAM, ~3 casas de precisão; cada consulta
+            converte a matriz para float32 por bloco, então é mais lenta que float32 — use
+            `buscar_por_vetores` com várias consultas juntas para diluir a conversão)
+        somente_leitura: Abre sem permissão de escrita
+        limite_lapides: Fração de linhas mortas que dispara a compactação
+    """
+
+    def __init__(
+        self,
+        collection: str,
+        path: str = "tmp/vetores",
+        embedder: Optional[Embedder] = None,
+        dtype: str = "float32",
+        somente_leitura: bool = False,
+        limite_lapides: float = 0.3,
+        bloco: int = 65536,
+        id: Optional[str] = None,
+        name: Optional[str] = None,
+        description: Optional[str] = None,
+    ):
+        super().__init__(id=id or generate_id(f"{path}#{collection}"), name=name or collection, description=description)
+        if embedder is None:
+            from agno.knowledge.embedder.openai import OpenAIEmbedder
+
+            embedder = OpenAIEmbedder()
+        self.collection_name = collection
+        self.embedder = embedder
+        self.dtype = np.dtype(dtype)
+        self.somente_leitura = somente_leitura
+        self.limite_lapides = limite_lapides
+        self.bloco = bloco
+        self.diretorio = Path(path) / collection
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._matriz: Optional[np.memmap] = None
+        self._arquivo: Optional[str] = None
+        self._vivos = np.zeros(0, dtype=bool)
+        self._n = 0
+        self._geracao = -1
+
+    # ARQUIVOS ====================================================
+    def _conexao(self) -> sqlite3.Connection:
+        if self._conn is None:
+            caminho = self.diretorio / "itens.db"
+            if self.somente_leitura:
+                self._conn = sqlite3.connect(
+                    f"file:{caminho}?mode=ro", uri=True, check_same_thread=False, isolation_level=None
+                )
+            else:
+                self._conn = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+        return self._conn
+
+    def _meta(self, chave: str, padrao=None):
+        linha = self._conexao().execute("SELECT valor FROM meta WHERE chave = ?", (chave,)).fetchone()
+        return json.loads(linha[0]) if linha else padrao
+
+    def _gravar_meta(self, **valores):
+        self._conexao().executemany(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?)", [(k, json.dumps(v)) for k, v in valores.items()]
+        )
+
+    def _abrir_matriz(self, arquivo: str, capacidade: int, dims: int):
+        modo = "r" if self.somente_leitura else "r+"
+        self._matriz = np.memmap(self.diretorio / arquivo, dtype=self.dtype, mode=modo, shape=(capacidade, dims))
+        self._arquivo = arquivo
+
+    def _recarregar(self, forcar: bool = False):
+        """Relê o estado do SQLite se outro processo (ou a compactação) mudou a coleção."""
+        if not self.exists():
+            return
+        geracao = self._meta("geracao", 0)
+        if geracao == self._geracao and not forcar:
+            return
+        conn = self._conexao()
+        for tentativa in range(5):
+            conn.execute("BEGIN")  # meta e itens do mesmo instante (o escritor pode estar gravando)
+            try:
+                meta = {chave: json.loads(valor) for chave, valor in conn.execute("SELECT chave, valor FROM meta")}
+                linhas = [r[0] for r in conn.execute("SELECT linha FROM itens WHERE vivo = 1")]
+            finally:
+                conn.execute("COMMIT")
+            capacidade = meta.get("capacidade", 0)
+            self.dtype = np.dtype(meta.get("dtype", self.dtype.name))
+            try:
+                if meta.get("dims") and capacidade:
+                    self._abrir_matriz(meta["arquivo"], capacidade, meta["dims"])
+                break
+            except FileNotFoundError:
+                # A compactação (de outro processo) trocou o arquivo entre a leitura do meta e a
+                # abertura: relê o meta, que já aponta para o arquivo novo
+                if tentativa == 4:
+                    raise
+        self._n = meta.get("n", 0)
+        self._vivos = np.zeros(capacidade, dtype=bool)
+        self._vivos[linhas] = True
+        self._geracao = meta.get("geracao", 0)
+
+    def _crescer(self, necessario: int, dims: int):
+        # Dobra a capacidade do arquivo (leitores com o mapeamento antigo continuam válidos)
+        capacidade = self._meta("capacidade", 0)
+        if necessario <= capacidade:
+            return
+        nova = max(1024, capacidade)
+        while nova < necessario:
+            nova *= 2
+        arquivo = self._meta("arquivo") or "vetores-0.bin"
+        if self._matriz is not None:
+            self._matriz.flush()
+        with open(self.diretorio / arquivo, "ab") as f:
+            f.truncate(nova * dims * self.dtype.itemsize)
+        self._abrir_matriz(arquivo, nova, dims)
+        vivos = np.zeros(nova, dtype=bool)
+        vivos[: len(self._vivos)] = self._vivos
+        self._vivos = vivos
+        self._gravar_meta(capacidade=nova, arquivo=arquivo, dims=dims)
+
+    def _verificar_escrita(self):
+        if self.somente_leitura:
+            raise PermissionError(f"Coleção '{self.collection_name}' aberta em modo somente leitura")
+
+    # CRIAÇÃO =====================================================
+    def create(self) -> None:
+        if self.exists():
+            self._recarregar()
+            return
+        self._verificar_escrita()
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self._conexao().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS itens (
+                linha INTEGER NOT NULL,
+                id TEXT NOT NULL,
+                vivo INTEGER NOT NULL,
+                conteudo TEXT NOT NULL,
+                metadados TEXT NOT NULL,
+                name TEXT,
+                content_id TEXT,
+                content_hash TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_itens_linha ON itens (linha);
+            CREATE INDEX IF NOT EXISTS idx_itens_id ON itens (id, vivo);
+            CREATE TABLE IF NOT EXISTS meta (
+                chave TEXT PRIMARY KEY,
+                valor TEXT NOT NULL
+            );
+            """
+        )
+        with self._lock:
+            self._gravar_meta(geracao=0, n=0, capacidade=0, dtype=self.dtype.name)
+        self._recarregar(forcar=True)
+
+    async def async_create(self) -> None:
+        await asyncio.to_thread(self.create)
+
+    def exists(self) -> bool:
+        return (self.diretorio / "itens.db").exists()
+
+    async def async_exists(self) -> bool:
+        return self.exists()
+
+    def get_count(self) -> int:
+        self._recarregar()
+        return int(self._vivos[: self._n].sum())
+
+    # ESCRITA =====================================================
+    def gravar(
+        self,
+        ids: List[str],
+        embeddings: List[List[float]],
+        conteudos: List[str],
+        metadados: List[Dict[str, Any]],
+        content_hash: Optional[str] = None,
+    ):
+        """Grava vetores já calculados (upsert por ID). Usado pela ingestão em lotes."""
+        self._verificar_escrita()
+        if not ids:
+            return
+        self.create()
+        vetores = np.asarray(embeddings, dtype=np.float32)
+        if vetores.ndim != 2 or len(vetores) != len(ids):
+            raise ValueError(f"Esperados {len(ids)} embeddings com o mesmo número de dimensões")
+        vetores /= np.linalg.norm(vetores, axis=1, keepdims=True).clip(min=1e-12)
+        with self._lock:
+            dims = self._meta("dims")
+            if dims and vetores.shape[1] != dims:
+                raise ValueError(
+                    f"Embeddings com {vetores.shape[1]} dimensões, mas a coleção '{self.collection_name}' tem {dims}"
+                )
+            self._crescer(self._n + len(ids), vetores.shape[1])
+            inicio = self._n
+            self._matriz[inicio : inicio + len(ids)] = vetores.astype(self.dtype)
+            self._matriz.flush()
+
+            conn = self._conexao()
+            conn.execute("BEGIN")
+            antigas = self._lapidar(conn, "id IN (SELECT value FROM json_each(?))", (json.dumps(ids),))
+            conn.executemany(
+                "INSERT INTO itens VALUES (?, ?, 1, ?, ?, ?, ?, ?)",
+                [
+                    (inicio + i, doc_id, conteudo, json.dumps(meta, default=str), meta.get("name"), meta.get("content_id"), content_hash)
+                    for i, (doc_id, conteudo, meta) in enumerate(zip(ids, conteudos, metadados))
+                ],
+            )
+            self._n = inicio + len(ids)
+            self._gravar_meta(n=self._n, geracao=self._meta("geracao", 0) + 1)
+            conn.execute("COMMIT")
+            self._vivos[antigas] = False
+            self._vivos[inicio : self._n] = True
+            self._geracao = self._meta("geracao")
+        self._compactar_se_preciso()
+
+    def _lapidar(self, conn, condicao: str, params: Tuple) -> List[int]:
+        linhas = [r[0] for r in conn.execute(f"SELECT linha FROM itens WHERE vivo = 1 AND {condicao}", params)]
+        conn.execute(f"UPDATE itens SET vivo = 0 WHERE vivo = 1 AND {condicao}", params)
+        return linhas
+
+    def remover(self, condicao: str, params: Tuple = ()) -> int:
+        """Marca como lápide as linhas vivas que atendem à condição SQL. Retorna quantas."""
+        self._verificar_escrita()
+        if not self.exists():
+            return 0
+        with self._lock:
+            conn = self._conexao()
+            conn.execute("BEGIN")
+            linhas = self._lapidar(conn, condicao, params)
+            if linhas:
+                self._gravar_meta(geracao=self._meta("geracao", 0) + 1)
+            conn.execute("COMMIT")
+            self._vivos[linhas] = False
+            self._geracao = self._meta("geracao")
+        self._compactar_se_preciso()
+        return len(linhas)
+
+    def remover_ids(self, ids: List[str]) -> int:
+        return self.remover("id IN (SELECT value FROM json_each(?))", (json.dumps(list(ids)),))
+
+    def _compactar_se_preciso(self):
+        mortas = self._n - int(self._vivos[: self._n].sum())
+        if self._n and mortas / self._n > self.limite_lapides:
+            self.compactar()
+
+    def compactar(self):
+        """Reescreve só as linhas vivas em um arquivo novo e apaga as lápides do SQLite."""
+        self._verificar_escrita()
+        with self._lock:
+            if self._matriz is None:
+                return
+            vivas = np.flatnonzero(self._vivos[: self._n])
+            dims = self._matriz.shape[1]
+            capacidade = max(1024, 1 << max(len(vivas) - 1, 1).bit_length())
+            geracao = self._meta("geracao", 0) + 1
+            arquivo = f"vetores-{geracao}.bin"
+            nova = np.memmap(self.diretorio / arquivo, dtype=self.dtype, mode="w+", shape=(capacidade, dims))
+            for i in range(0, len(vivas), self.bloco):
+                parte = vivas[i : i + self.bloco]
+                nova[i : i + len(parte)] = self._matriz[parte]
+            nova.flush()
+            del nova
+
+            conn = self._conexao()
+            conn.execute("BEGIN")
+            conn.execute("DELETE FROM itens WHERE vivo = 0")
+            conn.executemany(
+                "UPDATE itens SET linha = ? WHERE linha = ? AND vivo = 1",
+                [(nova_linha, int(antiga)) for nova_linha, antiga in enumerate(vivas)],
+            )
+            antigo = self._meta("arquivo")
+            self._gravar_meta(n=len(vivas), capacidade=capacidade, arquivo=arquivo, geracao=geracao)
+            conn.execute("COMMIT")
+            # Leitores com o arquivo antigo mapeado continuam lendo até recarregar (o SO mantém o inode)
+            if antigo and antigo != arquivo:
+                (self.diretorio / antigo).unlink(missing_ok=True)
+            self._recarregar(forcar=True)
+        log_info(f"Coleção '{self.collection_name}' compactada: {len(vivas)} linhas vivas")
+
+    # BUSCA =======================================================
+    def _linhas_permitidas(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        if not filters:
+            return None
+        if not isinstance(filters, dict):
+            logger.warning("VetoresMmap só aceita filtros de igualdade em dicionário. Nenhum filtro aplicado.")
+            return None
+        condicoes = " AND ".join("json_extract(metadados, ?) = ?" for _ in filters)
+        params = [p for chave, valor in filters.items() for p in (f"$.{chave}", valor)]
+        linhas = [r[0] for r in self._conexao().execute(f"SELECT linha FROM itens WHERE vivo = 1 AND {condicoes}", params)]
+        mascara = np.zeros(len(self._vivos), dtype=bool)
+        mascara[linhas] = True
+        return mascara
+
+    def buscar_por_vetores(
+        self, consultas: np.ndarray, limit: int = 5, filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Top-k exato para várias consultas de uma vez (matriz consultas x dimensões).
+
+        A matriz é percorrida em blocos de `bloco` linhas (float16 é convertido por bloco),
+        então o pico de memória não depende do tamanho da coleção.
+
+        Returns:
+            Para cada consulta, [(linha, similaridade)] em ordem decrescente.
+        """
+        with self._lock:
+            self._recarregar()
+            if self._matriz is None or self._n == 0:
+                return [[] for _ in range(len(consultas))]
+            consultas = np.asarray(consultas, dtype=np.float32)
+            consultas = consultas / np.linalg.norm(consultas, axis=1, keepdims=True).clip(min=1e-12)
+            permitidas = self._vivos[: self._n]
+            mascara = self._linhas_permitidas(filters)
+            if mascara is not None:
+                permitidas = permitidas & mascara[: self._n]
+
+            melhores_s = np.full((len(consultas), 0), -np.inf, dtype=np.float32)
+            melhores_i = np.zeros((len(consultas), 0), dtype=np.int64)
+            for inicio in range(0, self._n, self.bloco):
+                fim = min(inicio + self.bloco, self._n)
+                vivas = permitidas[inicio:fim]
+                if not vivas.any():
+                    continue
+                scores = consultas @ np.asarray(self._matriz[inicio:fim], dtype=np.float32).T
+                scores[:, ~vivas] = -np.inf
+                scores = np.concatenate([melhores_s, scores], axis=1)
+                indices = np.concatenate([melhores_i, np.broadcast_to(np.arange(inicio, fim), (len(consultas), fim - inicio))], axis=1)
+                k = min(limit, scores.shape[1])
+                topo = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                melhores_s = np.take_along_axis(scores, topo, axis=1)
+                melhores_i = np.take_along_axis(indices, topo, axis=1)
+
+            resultado = []
+            for s, i in zip(melhores_s, melhores_i):
+                ordem = np.argsort(-s)
+                resultado.append([(int(i[o]), float(s[o])) for o in ordem if np.isfinite(s[o])])
+            return resultado
+
+    def _documentos(self, achados: List[Tuple[int, float]]) -> List[Document]:
+        if not achados:
+            return []
+        linhas = {linha: score for linha, score in achados}
+        registros = {
+            r[0]: r
+            for r in self._conexao().execute(
+                "SELECT linha, id, conteudo, metadados, name, content_id FROM itens "
+                "WHERE vivo = 1 AND linha IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(linhas)),),
+            )
+        }
+        documentos = []
+        for linha, score in achados:
+            if linha not in registros:
+                continue
+            _, doc_id, conteudo, metadados, name, content_id = registros[linha]
+            meta = json.loads(metadados)
+            meta.pop("name", None)
+            meta.pop("content_id", None)
+            meta["distances"] = 1 - score  # mesmo campo que o ChromaDb devolve (distância de cosseno)
+            documentos.append(Document(id=doc_id, name=name, meta_data=meta, content=conteudo, content_id=content_id))
+        return documentos
+
+    def buscar_por_vetor(self, vetor: List[float], limit: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        return self._documentos(self.buscar_por_vetores(np.asarray([vetor]), limit, filters)[0])
+
+    def obter(self, ids: List[str]) -> Dict[str, Document]:
+        """Documentos (vivos) dos IDs informados, sem busca (ex.: candidatos do BM25)."""
+        if not ids or not self.exists():
+            return {}
+        documentos = {}
+        for doc_id, conteudo, metadados, name, content_id in self._conexao().execute(
+            "SELECT id, conteudo, metadados, name, content_id FROM itens WHERE vivo = 1 AND id IN (SELECT value FROM json_each(?))",
+            (json.dumps(ids),),
+        ):
+            meta = json.loads(metadados)
+            meta.pop("name", None)
+            meta.pop("content_id", None)
+            documentos[doc_id] = Document(id=doc_id, name=name, meta_data=meta, content=conteudo, content_id=content_id)
+        return documentos
+
+    def search(self, query: str, limit: int = 5, filters: Optional[Any] = None) -> List[Document]:
+        vetor = self.embedder.get_embedding(query)
+        if not vetor:
+            logger.error(f"Erro ao gerar o embedding da consulta: {query}")
+            return []
+        documentos = self.buscar_por_vetor(vetor, limit, filters)
+        log_info(f"Found {len(documentos)} documents")
+        return documentos
+
+    async def async_search(self, query: str, limit: int = 5, filters: Optional[Any] = None) -> List[Document]:
+        vetor = await self.embedder.async_get_embedding(query)
+        if not vetor:
+            logger.error(f"Erro ao gerar o embedding da consulta: {query}")
+            return []
+        return await asyncio.to_thread(self.buscar_por_vetor, vetor, limit, filters)
+
+    def get_supported_search_types(self) -> List[str]:
+        return ["vector"]
+
+    # API DO AGNO (VectorDb) ======================================
+    def _preparar(self, documents: List[Document], filters: Optional[Dict[str, Any]]):
+        ids, conteudos, metadados = [], [], []
+        vistos = set()
+        for doc in documents:
+            conteudo = doc.content.replace("\x00", "\ufffd")
+            doc_id = md5(conteudo.encode()).hexdigest()  # mesmo ID do ChromaDb do Agno
+            if doc_id in vistos:
+                continue
+            vistos.add(doc_id)
+            meta = dict(doc.meta_data or {})
+            if filters:
+                meta.update(filters)
+            if doc.name is not None:
+                meta["name"] = doc.name
+            if doc.content_id is not None:
+                meta["content_id"] = doc.content_id
+            ids.append(doc_id)
+            conteudos.append(conteudo)
+            metadados.append(meta)
+        return ids, conteudos, metadados
+
+    def upsert(self, content_hash: str, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> None:
+        ids, conteudos, metadados = self._preparar(documents, filters)
+        embeddings = [self.embedder.get_embedding(c) for c in conteudos]
+        self.gravar(ids, embeddings, conteudos, metadados, content_hash)
+
+    async def async_upsert(self, content_hash: str, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> None:
+        ids, conteudos, metadados = self._preparar(documents, filters)
+        embeddings = await asyncio.gather(*[self.embedder.async_get_embedding(c) for c in conteudos])
+        await asyncio.to_thread(self.gravar, ids, list(embeddings), conteudos, metadados, content_hash)
+
+    def upsert_available(self) -> bool:
+        return True
+
+    def insert(self, content_hash: str, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> None:
+        self.upsert(content_hash, documents, filters)
+
+    async def async_insert(self, content_hash: str, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> None:
+        await self.async_upsert(content_hash, documents, filters)
+
+    def _existe(self, condicao: str, params: Tuple) -> bool:
+        if not self.exists():
+            return False
+        return self._conexao().execute(f"SELECT 1 FROM itens WHERE vivo = 1 AND {condicao} LIMIT 1", params).fetchone() is not None
+
+    def name_exists(self, name: str) -> bool:
+        return self._existe("name = ?", (name,))
+
+    async def async_name_exists(self, name: str) -> bool:
+        return self.name_exists(name)
+
+    def id_exists(self, id: str) -> bool:
+        return self._existe("id = ?", (id,))
+
+    def content_hash_exists(self, content_hash: str) -> bool:
+        return self._existe("content_hash = ?", (content_hash,))
+
+    def delete_by_id(self, id: str) -> bool:
+        return self.remover("id = ?", (id,)) > 0
+
+    def delete_by_name(self, name: str) -> bool:
+        return self.remover("name = ?", (name,)) > 0
+
+    def delete_by_content_id(self, content_id: str) -> bool:
+        return self.remover("content_id = ?", (content_id,)) > 0
+
+    def delete_by_metadata(self, metadata: Dict[str, Any]) -> bool:
+        if not metadata:
+            return False
+        condicoes = " AND ".join("json_extract(metadados, ?) = ?" for _ in metadata)
+        params = tuple(p for chave, valor in metadata.items() for p in (f"$.{chave}", valor))
+        return self.remover(condicoes, params) > 0
+
+    def update_metadata(self, content_id: str, metadata: Dict[str, Any]) -> None:
+        self._verificar_escrita()
+        with self._lock:
+            self._conexao().execute(
+                "UPDATE itens SET metadados = json_patch(metadados, ?) WHERE vivo = 1 AND content_id = ?",
+                (json.dumps(metadata, default=str), content_id),
+            )
+
+    def atualizar_metadados(self, ids: List[str], metadados: List[Dict[str, Any]]):
+        """Mescla metadados nas linhas vivas dos IDs informados."""
+        self._verificar_escrita()
+        with self._lock:
+            self._conexao().executemany(
+                "UPDATE itens SET metadados = json_patch(metadados, ?) WHERE vivo = 1 AND id = ?",
+                [(json.dumps(meta, default=str), doc_id) for doc_id, meta in zip(ids, metadados)],
+            )
+
+    def drop(self) -> None:
+        self._verificar_escrita()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._matriz = None
+            shutil.rmtree(self.diretorio, ignore_errors=True)
+            self._vivos = np.zeros(0, dtype=bool)
+            self._n = 0
+            self._geracao = -1
+
+    async def async_drop(self) -> None:
+        await asyncio.to_thread(self.drop)
+
+    def delete(self) -> bool:
+        self.drop()
+        return True
+
+    def optimize(self) -> None:
+        self.compactar()
+
+    def finalizar(self):
+        """
+        Congela a coleção: compacta, faz o checkpoint do WAL e volta ao journal DELETE, para que
+        leitores `somente_leitura` de outros processos abram só o `.db` (sem -wal/-shm).
+        """
+        self._verificar_escrita()
+        with self._lock:
+            if not self.exists():
+                return
+            if self._n > self.get_count():
+                self.compactar()
+            if self._matriz is not None:
+                self._matriz.flush()
+            conn = self._conexao()
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.close()
+            self._conn = None
+
+    def estatisticas(self) -> Dict[str, Any]:
+        self._recarregar()
+        vivas = int(self._vivos[: self._n].sum())
+        arquivo = self.diretorio / self._arquivo if self._arquivo else None
+        return {
+            "linhas": self._n,
+            "vivas": vivas,
+            "lapides": self._n - vivas,
+            "dtype": self.dtype.name,
+            "mb_arquivo": round(os.path.getsize(arquivo) / 1e6, 2) if arquivo and arquivo.exists() else 0.0,
+            "geracao": self._geracao,
+        }
+
+
+# BENCHMARK =======================================================
+# Compara ChromaDb (SQLite + HNSW) com VetoresMmap (float32 e float16) em tempo de carga
+# (abrir + 1ª consulta), latência por consulta (p50/p99) e pico de memória (RSS):
+#   python vetores_mmap.py [n_vetores] [dimensões] [n_consultas]
+# A montagem e cada medição rodam em processos separados, como em leitor_streaming.py
+# (no Linux o pico de RSS do processo pai é herdado pelos filhos).
+_DIR_BENCHMARK = "tmp/benchmark_vetores"
+
+
+def _medir(modo: str, dims: int, n_consultas: int) -> dict:
+    import resource
+    import time
+
+    consultas = np.random.default_rng(1).standard_normal((n_consultas, dims)).astype(np.float32)
+    inicio = time.perf_counter()
+    if modo == "chroma":
+        import chromadb
+        from chromadb.config import Settings
+
+        client = chromadb.PersistentClient(path=f"{_DIR_BENCHMARK}/chroma", settings=Settings(anonymized_telemetry=False))
+        colecao = client.get_collection("benchmark")
+
+        def consultar(v):
+            return colecao.query(query_embeddings=[v.tolist()], n_results=5, include=["documents", "metadatas", "distances"])
+    else:
+        db = VetoresMmap(collection=modo, path=_DIR_BENCHMARK, embedder=Embedder(), somente_leitura=True)
+
+        def consultar(v):
+            return db.buscar_por_vetor(v, limit=5)
+
+    consultar(consultas[0])
+    carga = time.perf_counter() - inicio
+
+    tempos = []
+    for v in consultas:
+        t = time.perf_counter()
+        consultar(v)
+        tempos.append((time.perf_counter() - t) * 1000)
+    tempos.sort()
+    return {
+        "modo": modo,
+        "carga_ms": round(carga * 1000, 1),
+        "p50_ms": round(tempos[len(tempos) // 2], 3),
+        "p99_ms": round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.99))], 3),
+        "pico_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _montar(n: int, dims: int):
+    import chromadb
+    from chromadb.config import Settings
+
+    shutil.rmtree(_DIR_BENCHMARK, ignore_errors=True)
+    vetores = np.random.default_rng(0).standard_normal((n, dims)).astype(np.float32)
+    ids = [f"chunk-{i}" for i in range(n)]
+    textos = [f"Trecho {i} do relatório" for i in range(n)]
+    metadados = [{"page": i // 10, "source": "benchmark"} for i in range(n)]
+
+    client = chromadb.PersistentClient(path=f"{_DIR_BENCHMARK}/chroma", settings=Settings(anonymized_telemetry=False))
+    colecao = client.create_collection("benchmark", metadata={"hnsw:space": "cosine"})
+    for dtype in ["float32", "float16"]:
+        db = VetoresMmap(collection=dtype, path=_DIR_BENCHMARK, embedder=Embedder(), dtype=dtype)
+        for i in range(0, n, 1000):
+            db.gravar(ids[i : i + 1000], vetores[i : i + 1000], textos[i : i + 1000], metadados[i : i + 1000])
+    for i in range(0, n, 1000):
+        colecao.add(ids=ids[i : i + 1000], embeddings=vetores[i : i + 1000].tolist(), documents=textos[i : i + 1000], metadatas=metadados[i : i + 1000])
+
+
+if __name__ == "__main__":
+    import subprocess
+    import sys
+
+    if sys.argv[1:2] == ["--medir"]:
+        print(json.dumps(_medir(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))))
+        sys.exit(0)
+    if sys.argv[1:2] == ["--montar"]:
+        _montar(int(sys.argv[2]), int(sys.argv[3]))
+        sys.exit(0)
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    dims = int(sys.argv[2]) if len(sys.argv) > 2 else 1536
+    n_consultas = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    print(f"🏗️  Montando coleções com {n} vetores de {dims} dimensões...")
+    subprocess.run([sys.executable, __file__, "--montar", str(n), str(dims)], check=True)
+
+    print(f"{'modo':10} {'carga (ms)':>11} {'p50 (ms)':>9} {'p99 (ms)':>9} {'pico RSS (MB)':>14}")
+    for modo in ["chroma", "float32", "float16"]:
+        saida = subprocess.run(
+            [sys.executable, __file__, "--medir", modo, str(dims), str(n_consultas)], capture_output=True, text=True, check=True
+        )
+        r = json.loads(saida.stdout.strip().splitlines()[-1])
+        print(f"{modo:10} {r['carga_ms']:>11} {r['p50_ms']:>9} {r['p99_ms']:>9} {r['pico_rss_mb']:>14}")
@@ -0,0 +1,12 @@
+#Configuração dos testes
+#Os módulos ficam soltos em deploy/ e aula_3/ (importados como `from modulo import X`)
+#------------------------------------------
+
+#IMPORTACOES
+import sys
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+for pasta in ("deploy", "aula_3"):
+    if str(RAIZ / pasta) not in sys.path:
+        sys.path.insert(0, str(RAIZ / pasta))
@@ -0,0 +1,75 @@
+#Testes do controle de admissão (deploy/admissao.py)
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from admissao import ControleAdmissao
+
+
+async def eventos(quantos: int = 3):
+    for i in range(quantos):
+        yield f"data: {i}\n\n"
+
+
+def test_stream_nunca_lido_libera_a_vaga_no_prazo():
+    async def cenario():
+        admissao = ControleAdmissao(max_concorrentes=1, timeout_fila=0.05)
+        await admissao.admitir_stream(eventos())  # cliente desconectou antes da primeira leitura
+        durante = admissao.em_execucao
+        await asyncio.sleep(0.1)
+        return durante, admissao.em_execucao
+
+    assert asyncio.run(cenario()) == (1, 0)
+
+
+def test_vaga_liberada_quando_o_stream_e_fechado_no_meio():
+    async def cenario():
+        admissao = ControleAdmissao(max_concorrentes=1)
+        stream = await admissao.admitir_stream(eventos())
+        await stream.__anext__()
+        durante = admissao.em_execucao
+        await stream.aclose()
+        return durante, admissao.em_execucao
+
+    assert asyncio.run(cenario()) == (1, 0)
+
+
+def test_fila_cheia_rejeita_com_503_antes_da_resposta():
+    async def cenario():
+        admissao = ControleAdmissao(max_concorrentes=1, max_fila=0)
+        primeiro = await admissao.admitir_stream(eventos())
+        await primeiro.__anext__()
+        with pytest.raises(HTTPException) as rejeicao:
+            await admissao.admitir_stream(eventos())
+        await primeiro.aclose()
+        return rejeicao.value, admissao.estatisticas()
+
+    rejeicao, estatisticas = asyncio.run(cenario())
+    assert rejeicao.status_code == 503 and rejeicao.headers["Retry-After"] == "1"
+    assert "fila de espera cheia" in rejeicao.detail
+    assert estatisticas["rejeitadas"] == 1 and estatisticas["em_execucao"] == 0
+
+
+def test_timeout_fecha_o_stream_de_origem():
+    fechado = asyncio.Event()
+
+    async def lento():
+        try:
+            yield "data: 0\n\n"
+            await asyncio.sleep(3600)
+        finally:
+            fechado.set()
+
+    async def cenario():
+        admissao = ControleAdmissao(max_concorrentes=1, timeout_execucao=0.05)
+        recebidos = [evento async for evento in await admissao.admitir_stream(lento())]
+        return recebidos, fechado.is_set(), admissao.estatisticas()
+
+    recebidos, origem_fechada, estatisticas = asyncio.run(cenario())
+    assert recebidos[0] == "data: 0\n\n" and recebidos[-1].startswith("event: RunError")
+    assert origem_fechada
+    assert estatisticas["expiradas"] == 1 and estatisticas["em_execucao"] == 0
@@ -0,0 +1,85 @@
+#Testes do cache da camada de busca (deploy/cache_busca.py)
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+from hashlib import md5
+from typing import List
+
+import pytest
+from agno.knowledge.document import Document
+from agno.knowledge.embedder.base import Embedder
+
+from cache_busca import ChromaDbComCache
+
+
+class EmbedderFake(Embedder):
+    """Embedding determinístico a partir do texto (sem API)."""
+
+    def __init__(self):
+        super().__init__(dimensions=8)
+        self.chamadas = 0
+
+    def get_embedding(self, text: str) -> List[float]:
+        self.chamadas += 1
+        digest = md5(text.encode()).digest()
+        return [b / 255 for b in digest[:8]]
+
+    def get_embedding_and_usage(self, text: str):
+        return self.get_embedding(text), None
+
+    async def async_get_embedding(self, text: str) -> List[float]:
+        return self.get_embedding(text)
+
+
+@pytest.fixture
+def colecao(tmp_path):
+    db = ChromaDbComCache(collection="teste", path=str(tmp_path / "chroma"), persistent_client=True, embedder=EmbedderFake())
+    db.create()
+    db.insert("hash", [Document(content=f"trecho {i}", name="relatorio", meta_data={"page": i}) for i in range(6)])
+    return db
+
+
+def test_hit_devolve_copias_que_o_chamador_pode_alterar(colecao):
+    primeiro = colecao.search("trecho 3", limit=3)
+    for doc in primeiro:
+        doc.meta_data["rrf_score"] = 99.0
+
+    segundo = colecao.search("trecho 3", limit=3)
+    for doc in segundo:
+        doc.meta_data["alterado"] = True
+    terceiro = colecao.search("trecho 3", limit=3)
+
+    assert colecao.estatisticas()["resultados"]["hits"] == 2
+    assert [d.content for d in terceiro] == [d.content for d in primeiro]
+    assert all("rrf_score" not in d.meta_data and "alterado" not in d.meta_data for d in terceiro)
+
+
+def test_filtro_em_expressao_nao_usa_o_cache(colecao):
+    from agno.filters import EQ
+
+    colecao.search("trecho 1", limit=2, filters=[EQ("page", 1)])
+    colecao.search("trecho 1", limit=2, filters=[EQ("page", 2)])
+
+    resultados = colecao.estatisticas()["resultados"]
+    assert resultados["hits"] == 0 and resultados["itens"] == 0
+    assert resultados["sem_cache"] == 2
+
+
+def test_filtro_em_dicionario_entra_na_chave(colecao):
+    assert [d.meta_data["page"] for d in colecao.search("trecho 1", limit=1, filters={"page": 4})] == [4]
+    assert [d.meta_data["page"] for d in colecao.search("trecho 1", limit=1, filters={"page": 5})] == [5]
+
+
+def test_async_search_usa_os_mesmos_caches_que_o_search(colecao):
+    chamadas = colecao.embedder.chamadas
+    sincrono = colecao.search("trecho 2", limit=2)
+    assincrono = asyncio.run(colecao.async_search("trecho 2", limit=2))
+    novo = asyncio.run(colecao.async_search("trecho 4", limit=2, filters={"page": 4}))
+
+    assert [d.id for d in assincrono] == [d.id for d in sincrono]
+    assert [d.meta_data["page"] for d in novo] == [4]
+    estatisticas = colecao.estatisticas()
+    assert estatisticas["resultados"]["hits"] == 1
+    assert estatisticas["embeddings_consulta"]["hits"] == 1
+    assert colecao.embedder.chamadas - chamadas == 2  # "trecho 2" uma vez só e "trecho 4"
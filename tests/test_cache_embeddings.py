@@ -0,0 +1,88 @@
+#Testes do cache persistente de embeddings (deploy/cache_embeddings.py)
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+import sqlite3
+import threading
+from typing import List
+
+from agno.knowledge.embedder.base import Embedder
+
+from cache_embeddings import CacheEmbeddings, EmbedderComCache
+
+
+def bytes_reais(caminho) -> int:
+    with sqlite3.connect(caminho) as conn:
+        return conn.execute("SELECT COALESCE(SUM(LENGTH(vetor)), 0) FROM embeddings").fetchone()[0]
+
+
+def test_texto_normalizado_acha_o_mesmo_vetor(tmp_path):
+    cache = CacheEmbeddings(db_file=str(tmp_path / "cache.db"))
+    cache.gravar("modelo", 3, [("Receita  líquida\n", [0.1, 0.2, 0.3])])
+
+    (vetor,) = cache.buscar("modelo", 3, ["Receita líquida"]).values()
+
+    assert [round(v, 5) for v in vetor] == [0.1, 0.2, 0.3]
+    assert cache.buscar("outro_modelo", 3, ["Receita líquida"]) == {}
+
+
+def test_total_de_bytes_acompanha_insercao_substituicao_e_despejo(tmp_path):
+    caminho = str(tmp_path / "cache.db")
+    cache = CacheEmbeddings(db_file=caminho, tamanho_maximo_mb=10 * 4 * 256 / 1024 / 1024)  # 10 vetores
+    cache.gravar("modelo", 256, [(f"texto {i}", [float(i)] * 256) for i in range(8)])
+    cache.gravar("modelo", 256, [("texto 0", [9.0] * 256)])  # substitui, não soma
+    assert cache.estatisticas()["bytes"] == bytes_reais(caminho) == 8 * 1024
+
+    cache.buscar("modelo", 256, ["texto 0"])  # o mais recente: não pode sair no despejo
+    cache.gravar("modelo", 256, [(f"novo {i}", [1.0] * 256) for i in range(4)])
+
+    estatisticas = cache.estatisticas()
+    assert estatisticas["bytes"] == bytes_reais(caminho) <= 9 * 1024
+    assert cache.buscar("modelo", 256, ["texto 0"], contar=False)
+    assert not cache.buscar("modelo", 256, ["texto 1"], contar=False)
+
+    # O total sobrevive à reabertura (e é recalculado para um arquivo sem a tabela de meta)
+    assert CacheEmbeddings(db_file=caminho).estatisticas()["bytes"] == estatisticas["bytes"]
+
+
+class EmbedderContado(Embedder):
+    def __init__(self):
+        super().__init__(dimensions=2)
+        self.textos: List[str] = []
+
+    async def async_get_embeddings_batch_and_usage(self, texts):
+        self.textos += texts
+        return [[float(len(t)), 1.0] for t in texts], [None] * len(texts)
+
+
+def test_embedder_so_chama_a_api_para_textos_fora_do_cache(tmp_path):
+    real = EmbedderContado()
+    embedder = EmbedderComCache(embedder=real, cache=CacheEmbeddings(db_file=str(tmp_path / "cache.db")))
+
+    asyncio.run(embedder.async_get_embeddings_batch_and_usage(["a", "bb", "a"]))
+    vetores, _ = asyncio.run(embedder.async_get_embeddings_batch_and_usage(["bb", "ccc"]))
+
+    assert real.textos == ["a", "bb", "ccc"]
+    assert vetores == [[2.0, 1.0], [3.0, 1.0]]
+
+
+def test_embedder_repassa_o_lote_e_le_o_cache_fora_do_event_loop(tmp_path):
+    real = EmbedderContado()
+    real.enable_batch, real.batch_size = True, 7
+    cache = CacheEmbeddings(db_file=str(tmp_path / "cache.db"))
+    embedder = EmbedderComCache(embedder=real, cache=cache)
+    assert (embedder.enable_batch, embedder.batch_size) == (True, 7)
+
+    threads = []
+    buscar, gravar = cache.buscar, cache.gravar
+    cache.buscar = lambda *args, **kwargs: threads.append(threading.current_thread()) or buscar(*args, **kwargs)
+    cache.gravar = lambda *args, **kwargs: threads.append(threading.current_thread()) or gravar(*args, **kwargs)
+
+    async def cenario():
+        await embedder.async_get_embeddings_batch_and_usage(["a", "bb"])
+        await embedder.async_get_embedding("bb")
+        await embedder.async_embed_lote(["a", "bb"])
+
+    asyncio.run(cenario())
+    assert len(threads) == 4 and threading.main_thread() not in threads
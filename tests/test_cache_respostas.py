@@ -0,0 +1,76 @@
+#Testes do cache semântico de respostas (deploy/cache_respostas.py)
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+
+from agno.os.settings import AgnoAPISettings
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from cache_respostas import CacheRespostas, instalar_cache_agentos
+
+
+class EmbedderPorAssunto:
+    """Perguntas sobre receita caem no mesmo vetor; o resto, em outro."""
+
+    async def async_get_embedding(self, texto):
+        return [1.0, 0.0] if "receita" in texto.lower() else [0.0, 1.0]
+
+
+def test_hit_exato_e_semantico_so_no_escopo_de_quem_gravou():
+    async def cenario():
+        cache = CacheRespostas(embedder=EmbedderPorAssunto())
+        resposta, vetor = await cache.buscar("Qual foi a receita no 2T25?", "ana")
+        assert resposta is None
+        cache.gravar("Qual foi a receita no 2T25?", "612,3 milhões", vetor, "ana")
+
+        return [
+            (await cache.buscar("qual foi a RECEITA no 2t25", "ana"))[0],  # mesmo texto normalizado
+            (await cache.buscar("Me diga a receita do 2T25", "ana"))[0],  # mesmo sentido
+            (await cache.buscar("Qual foi a receita no 2T25?", "bia"))[0],  # outro usuário
+            (await cache.buscar("Me diga a receita do 1T25", "ana"))[0],  # outro trimestre
+        ], cache.estatisticas()
+
+    respostas, estatisticas = asyncio.run(cenario())
+    assert respostas == ["612,3 milhões", "612,3 milhões", None, None]
+    assert (estatisticas["hits_exatos"], estatisticas["hits_semanticos"], estatisticas["misses"]) == (1, 1, 3)
+
+
+def test_nova_geracao_da_colecao_invalida_o_cache():
+    geracao = [1]
+    cache = CacheRespostas(versao=lambda: geracao[0])
+    cache.gravar("Qual foi a receita?", "612,3 milhões")
+    assert asyncio.run(cache.buscar("Qual foi a receita?"))[0] == "612,3 milhões"
+
+    geracao[0] = 2  # reingestão
+
+    assert asyncio.run(cache.buscar("Qual foi a receita?"))[0] is None
+    assert cache.estatisticas()["itens"] == 0
+
+
+def test_hit_so_para_requisicao_autenticada():
+    app = FastAPI()
+    chamadas = []
+
+    @app.post("/agents/agente/runs")
+    async def rota(request: Request):
+        chamadas.append(request.headers.get("Authorization"))
+        return JSONResponse({"content": "612,3 milhões"})
+
+    instalar_cache_agentos(app, "agente", CacheRespostas(), settings=AgnoAPISettings(os_security_key="segredo"))
+    cliente = TestClient(app)
+    pedido = {"message": "Qual foi a receita?", "stream": "false"}
+    autenticado = {"Authorization": "Bearer segredo"}
+
+    primeira = cliente.post("/agents/agente/runs", data=pedido, headers=autenticado)
+    segunda = cliente.post("/agents/agente/runs", data=pedido, headers=autenticado)
+    sem_chave = cliente.post("/agents/agente/runs", data=pedido)
+    chave_errada = cliente.post("/agents/agente/runs", data=pedido, headers={"Authorization": "Bearer outra"})
+
+    assert primeira.headers["X-Cache"] == "MISS" and segunda.headers["X-Cache"] == "HIT"
+    assert segunda.json()["content"] == "612,3 milhões"
+    # Sem a chave o atalho não responde: a requisição segue para a rota (que devolve o 401)
+    assert "X-Cache" not in sem_chave.headers and "X-Cache" not in chave_errada.headers
+    assert chamadas == ["Bearer segredo", None, "Bearer outra"]
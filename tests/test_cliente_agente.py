@@ -0,0 +1,97 @@
+#Testes do cliente do AgentOS (deploy/cliente_agente.py): parser SSE e política de retry
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+import json
+
+import httpx
+
+from cliente_agente import ClienteAgente, Erro, Evento, ParserSSE, Retry, RunCompleted, RunContent
+
+
+def sse(evento: str, **dados) -> bytes:
+    return f"event: {evento}\ndata: {json.dumps({'event': evento, **dados})}\n\n".encode()
+
+
+# PARSER SSE ========================================================
+def test_evento_partido_em_varios_pedacos():
+    corpo = sse("RunContent", content="Olá, senhor") + sse("RunCompleted", content="Olá, senhor")
+    parser = ParserSSE()
+    eventos = []
+    for i in range(len(corpo)):
+        eventos += parser.alimentar(corpo[i:i + 1])
+    eventos += parser.finalizar()
+
+    assert [type(e) for e in eventos] == [RunContent, RunCompleted]
+    assert eventos[0].content == "Olá, senhor"
+
+
+def test_crlf_varios_data_comentarios_e_evento_desconhecido():
+    corpo = (
+        b": keep-alive\r\n\r\n"
+        b"event: RunContent\r\ndata: {\"content\":\r\ndata: \"a\"}\r\n\r\n"
+        b"id: 7\nevent: Novo\ndata: {\"x\": 1}\n\n"
+        b"data: [DONE]\n\n"
+    )
+    parser = ParserSSE()
+    eventos = parser.alimentar(corpo[:20]) + parser.alimentar(corpo[20:]) + parser.finalizar()
+
+    assert [e.event for e in eventos] == ["RunContent", "Novo"]
+    assert eventos[0].content == "a"
+    assert type(eventos[1]) is Evento and eventos[1].dados == {"x": 1}
+
+
+def test_ultimo_evento_sem_linha_em_branco_sai_no_finalizar():
+    parser = ParserSSE()
+    assert parser.alimentar(b'event: RunCompleted\ndata: {"content": "fim"}') == []
+    (evento,) = parser.finalizar()
+    assert isinstance(evento, RunCompleted) and evento.content == "fim"
+
+
+# RETRY =============================================================
+def executar(respostas):
+    """Roda uma execução contra um transporte falso; `respostas` é consumida a cada POST."""
+    chamadas = []
+
+    def tratar(request: httpx.Request) -> httpx.Response:
+        chamadas.append(request)
+        resposta = respostas.pop(0)
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+    async def cenario():
+        cliente = ClienteAgente("http://agentos", backoff_base=0.0, backoff_max=0.0)
+        await cliente.fechar()
+        cliente._http = httpx.AsyncClient(base_url="http://agentos", transport=httpx.MockTransport(tratar))
+        async with cliente:
+            return [evento async for evento in cliente.executar("pergunta")]
+
+    return asyncio.run(cenario()), chamadas
+
+
+def test_retry_em_erro_de_conexao_e_status_recuperavel():
+    eventos, chamadas = executar([
+        httpx.ConnectError("recusada"),
+        httpx.Response(503, headers={"Retry-After": "0"}),
+        httpx.Response(200, stream=httpx.ByteStream(sse("RunCompleted", content="ok"))),
+    ])
+
+    assert len(chamadas) == 3
+    assert [type(e) for e in eventos] == [Retry, Retry, RunCompleted]
+
+
+def test_timeout_de_leitura_depois_do_envio_nao_repete_o_post():
+    eventos, chamadas = executar([httpx.ReadTimeout("sem resposta"), httpx.Response(200, stream=httpx.ByteStream(sse("RunCompleted")))])
+
+    assert len(chamadas) == 1
+    assert [type(e) for e in eventos] == [Erro]
+    assert "ReadTimeout" in eventos[0].content
+
+
+def test_conexao_caida_sem_eventos_nao_repete_o_post():
+    eventos, chamadas = executar([httpx.RemoteProtocolError("fechou"), httpx.Response(200, stream=httpx.ByteStream(sse("RunCompleted")))])
+
+    assert len(chamadas) == 1
+    assert [type(e) for e in eventos] == [Erro]
@@ -0,0 +1,87 @@
+#Testes da coalescência de execuções idênticas (deploy/coalescencia.py)
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+
+from agno.run.agent import RunContentEvent
+
+from coalescencia import Coalescedor
+
+
+class Resultado:
+    def __init__(self, content):
+        self.content = content
+
+    def to_dict(self):
+        return {"content": self.content}
+
+
+class AgenteFake:
+    """Agente que só termina quando o teste libera, para as requisições se sobreporem."""
+
+    id = "agente"
+
+    def __init__(self):
+        self.execucoes = []
+        self.liberar = asyncio.Event()
+
+    def deep_copy(self):
+        return self
+
+    def arun(self, pergunta, stream=False, **kwargs):
+        self.execucoes.append((pergunta, kwargs.get("user_id")))
+        return self._stream() if stream else self._resultado()
+
+    async def _stream(self):
+        yield RunContentEvent(content="A receita foi ")
+        await self.liberar.wait()
+        yield RunContentEvent(content="612,3 milhões")
+
+    async def _resultado(self):
+        await self.liberar.wait()
+        return Resultado("612,3 milhões")
+
+
+def test_streams_identicos_em_voo_viram_uma_execucao():
+    async def cenario():
+        agente = AgenteFake()
+        coalescedor = Coalescedor(agente)
+
+        async def ler(pergunta, user_id=None):
+            return [evento async for evento in coalescedor.stream(pergunta, user_id)]
+
+        perguntas = ["Qual foi a receita?", "qual foi a receita", "Qual foi a  RECEITA?!", "Qual foi a receita?"]
+        leitores = [asyncio.create_task(ler(p)) for p in perguntas]
+        outro_usuario = asyncio.create_task(ler("Qual foi a receita?", "bia"))
+        await asyncio.sleep(0.05)
+        em_voo = coalescedor.estatisticas()["em_voo"]
+        agente.liberar.set()
+        return await asyncio.gather(*leitores), await outro_usuario, agente.execucoes, em_voo, coalescedor.estatisticas()
+
+    streams, do_outro, execucoes, em_voo, estatisticas = asyncio.run(cenario())
+
+    assert len(execucoes) == 2  # uma para os quatro pedidos iguais, outra para o outro usuário
+    assert all(s == streams[0] for s in streams) and len(streams[0]) == 2
+    assert "612,3 milh" in streams[0][1] and do_outro == streams[0]
+    assert em_voo == 2
+    assert estatisticas == {"em_voo": 0, "lideres": 2, "seguidores": 3}
+
+
+def test_execucoes_json_iguais_compartilham_o_resultado_e_a_chave_e_liberada():
+    async def cenario():
+        agente = AgenteFake()
+        coalescedor = Coalescedor(agente)
+        pedidos = [asyncio.create_task(coalescedor.executar("Qual foi a receita?")) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        agente.liberar.set()
+        resultados = await asyncio.gather(*pedidos)
+
+        # Terminada a execução, a mesma pergunta dispara uma nova
+        depois = await coalescedor.executar("Qual foi a receita?")
+        return resultados, depois, len(agente.execucoes)
+
+    resultados, depois, execucoes = asyncio.run(cenario())
+    assert resultados == [{"content": "612,3 milhões"}] * 5
+    assert depois == {"content": "612,3 milhões"}
+    assert execucoes == 2
@@ -0,0 +1,79 @@
+#Testes da mescla de resultados entre fragmentos (deploy/fragmentos.py)
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+from hashlib import md5
+from typing import List
+
+from agno.knowledge.document import Document
+from agno.knowledge.embedder.base import Embedder
+from agno.vectordb.search import SearchType
+
+from cache_busca import ChromaDbComCache
+from fragmentos import ColecaoFragmentada, fundir_fragmentos
+
+
+class EmbedderFake(Embedder):
+    def __init__(self):
+        super().__init__(dimensions=8)
+        self.chamadas = 0
+
+    def get_embedding(self, text: str) -> List[float]:
+        self.chamadas += 1
+        return [b / 255 for b in md5(text.encode()).digest()[:8]]
+
+    def get_embedding_and_usage(self, text: str):
+        return self.get_embedding(text), None
+
+    async def async_get_embedding(self, text: str) -> List[float]:
+        return self.get_embedding(text)
+
+
+def documento(id: str, **meta) -> Document:
+    return Document(id=id, content=id, meta_data=meta)
+
+
+def test_hibrida_ordena_pela_relevancia_e_nao_pela_posicao_no_fragmento():
+    # Cada fragmento já fundiu as suas pernas: o rrf_score local é o mesmo para o 1º de cada um
+    relevantes = [documento(f"a{i}", distances=0.1 + i / 100, bm25=9 - i, rrf_score=0.03 - i / 1000) for i in range(3)]
+    irrelevantes = [documento(f"b{i}", distances=0.8 + i / 100, rrf_score=0.03 - i / 1000) for i in range(3)]
+
+    fundidos = fundir_fragmentos(relevantes + irrelevantes)
+
+    assert [d.id for d in fundidos[:3]] == ["a0", "a1", "a2"]
+
+
+def test_mesmo_texto_em_dois_fragmentos_aparece_uma_vez():
+    a = documento("x", distances=0.2, rrf_score=0.01)
+    b = documento("x", distances=0.3, bm25=1.0, rrf_score=0.02)
+    assert [d.id for d in fundir_fragmentos([a, b])] == ["x"]
+
+
+def test_search_e_async_search_devolvem_o_mesmo_e_embeddam_a_consulta_uma_vez(tmp_path):
+    embedder = EmbedderFake()
+
+    def criar_fragmento(nome):
+        fragmento = ChromaDbComCache(collection=nome, path=str(tmp_path / "chroma"), persistent_client=True, embedder=embedder)
+        fragmento.create()
+        return fragmento
+
+    colecao = ColecaoFragmentada(
+        criar_fragmento=criar_fragmento,
+        embedder=embedder,
+        db_file=str(tmp_path / "fragmentos.db"),
+        search_type=SearchType.vector,
+    )
+    for empresa in ("Grendene", "Vulcabras"):
+        colecao.insert("hash", [Document(content=f"{empresa} trecho {i}") for i in range(4)], filters={"source": empresa})
+    chamadas = embedder.chamadas
+
+    sincrono = colecao.search("trecho 1", limit=3)
+    assincrono = asyncio.run(colecao.async_search("trecho 1", limit=3))
+    so_um = asyncio.run(colecao.async_search("trecho 1", limit=3, filters={"source": "Vulcabras"}))
+
+    assert [d.id for d in assincrono] == [d.id for d in sincrono]
+    assert {d.meta_data["fragmento"] for d in so_um} == {"pdf_agent__vulcabras"}
+    assert embedder.chamadas - chamadas == 1
+    estatisticas = colecao.estatisticas()
+    assert (estatisticas["buscas"], estatisticas["fragmentos_consultados"], estatisticas["fora_do_prazo"]) == (3, 5, 0)
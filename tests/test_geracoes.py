@@ -0,0 +1,40 @@
+#Testes da troca de geração do índice somente leitura (deploy/geracoes.py)
+#------------------------------------------
+
+#IMPORTACOES
+import threading
+import time
+
+import geracoes
+from geracoes import IndiceSomenteLeitura
+
+
+def test_troca_em_segundo_plano_sem_bloquear_quem_pergunta(tmp_path, monkeypatch):
+    publicada = {"nome": "g1", "numero": 1}
+    aberturas = []
+
+    def abrir(self, info):
+        aberturas.append(info["nome"])
+        time.sleep(0.3)  # BM25 + fatos da geração
+        return dict(info), None, None
+
+    monkeypatch.setattr(geracoes, "ler_geracao_atual", lambda diretorio: dict(publicada))
+    monkeypatch.setattr(IndiceSomenteLeitura, "_abrir", abrir)
+    indice = IndiceSomenteLeitura(str(tmp_path), intervalo=0)
+
+    assert indice.geracao() == 1  # primeira abertura: síncrona
+
+    publicada.update(nome="g2", numero=2)
+    inicio = time.perf_counter()
+    chamadas = [threading.Thread(target=indice.geracao) for _ in range(8)]
+    for chamada in chamadas:
+        chamada.start()
+    for chamada in chamadas:
+        chamada.join()
+    assert indice.geracao() == 1  # ainda a antiga enquanto a nova é montada
+    assert time.perf_counter() - inicio < 0.2
+
+    time.sleep(0.5)
+    assert indice.geracao() == 2
+    assert aberturas == ["g1", "g2"]  # uma montagem só, apesar das 8 chamadas
+    assert indice.trocas == 2
@@ -0,0 +1,80 @@
+#Testes do pipeline de ingestão em lotes (deploy/ingestao.py) contra o servidor fake da OpenAI
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+import random
+
+import httpx
+import pytest
+from agno.knowledge.document import Document
+from agno.knowledge.embedder.openai import OpenAIEmbedder
+from agno.vectordb.chroma import ChromaDb
+from openai import AsyncOpenAI
+
+import servidor_fake_openai
+from cache_embeddings import CacheEmbeddings, EmbedderComCache
+from ingestao import LimitadorTokenBucket, ingerir_documentos
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    """Servidor fake em processo (sem rede): sem latência e com 30% de respostas 429."""
+    monkeypatch.setitem(servidor_fake_openai.configuracao, "latencia_ms", 0)
+    monkeypatch.setitem(servidor_fake_openai.configuracao, "taxa_429", 0.3)
+    monkeypatch.setitem(servidor_fake_openai.configuracao, "retry_after", "0.01")
+    for chave in servidor_fake_openai.estatisticas:
+        monkeypatch.setitem(servidor_fake_openai.estatisticas, chave, 0)
+    random.seed(7)
+    return servidor_fake_openai.estatisticas
+
+
+def embedder_fake() -> OpenAIEmbedder:
+    cliente = AsyncOpenAI(
+        api_key="fake",
+        base_url="http://fake/v1",
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=servidor_fake_openai.app)),
+    )
+    return OpenAIEmbedder(id="text-embedding-3-small", dimensions=32, async_client=cliente)
+
+
+def documentos(n: int):
+    return [Document(content=f"Receita líquida do trecho {i}", name="relatorio", meta_data={"page": i // 4 + 1}) for i in range(n)]
+
+
+def ingerir(vector_db, embedder, **kwargs):
+    return asyncio.run(ingerir_documentos(
+        documentos(40), vector_db, embedder=embedder, batch_size=8, concorrencia=3,
+        limitador=LimitadorTokenBucket(), **kwargs,
+    ))
+
+
+def test_todos_os_lotes_gravados_apesar_dos_429(tmp_path, fake):
+    vector_db = ChromaDb(collection="teste", path=str(tmp_path / "chroma"), persistent_client=True, embedder=embedder_fake())
+
+    resultado = ingerir(vector_db, vector_db.embedder, max_retries=20, filtros={"source": "teste"})
+
+    assert (resultado.chunks, resultado.lotes_ok, resultado.lotes_falhos) == (40, 5, 0)
+    assert resultado.tentativas_429 == fake["respostas_429"] > 0
+    colecao = vector_db.client.get_collection(name="teste")
+    assert colecao.count() == 40
+    assert colecao.get(limit=1, include=["metadatas"])["metadatas"][0]["source"] == "teste"
+
+
+def test_reingestao_com_cache_nao_chama_a_api(tmp_path, fake):
+    servidor_fake_openai.configuracao["taxa_429"] = 0.0  # restaurado pelo monkeypatch da fixture
+    vector_db = ChromaDb(collection="teste", path=str(tmp_path / "chroma"), persistent_client=True, embedder=embedder_fake())
+    embedder = EmbedderComCache(embedder=vector_db.embedder, cache=CacheEmbeddings(db_file=str(tmp_path / "cache.db")))
+
+    ingerir(vector_db, embedder)
+    textos_embeddados = fake["textos_embeddados"]
+    segunda = ingerir(vector_db, embedder)
+
+    assert textos_embeddados == 40
+    assert fake["textos_embeddados"] == 40 and segunda.chunks == 40
+
+
+def test_max_retries_precisa_de_ao_menos_uma_tentativa(tmp_path):
+    vector_db = ChromaDb(collection="teste", path=str(tmp_path / "chroma"), persistent_client=True, embedder=embedder_fake())
+    with pytest.raises(ValueError):
+        ingerir(vector_db, vector_db.embedder, max_retries=0)
@@ -0,0 +1,95 @@
+#Testes do leitor de PDF em streaming (deploy/leitor_streaming.py)
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+
+from agno.knowledge.reader.pdf_reader import PDFReader
+
+from ingestao import agrupar_por_pagina, hash_pagina
+from leitor_streaming import ler_paginas_streaming
+
+
+def gerar_pdf(caminho, paginas):
+    """PDF mínimo com uma linha de texto por página (sem depender de biblioteca de escrita)."""
+    objetos = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    filhos = []
+    for i, texto in enumerate(paginas):
+        conteudo = f"BT /F1 12 Tf 72 720 Td ({texto}) Tj ET"
+        objetos.append(f"<< /Length {len(conteudo)} >>\nstream\n{conteudo}\nendstream")
+        objetos.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+            f"/Contents {len(objetos)} 0 R >>"
+        )
+        filhos.append(f"{len(objetos)} 0 R")
+    objetos[1] = f"<< /Type /Pages /Kids [{' '.join(filhos)}] /Count {len(paginas)} >>"
+
+    saida = b"%PDF-1.4\n"
+    posicoes = []
+    for numero, objeto in enumerate(objetos, start=1):
+        posicoes.append(len(saida))
+        saida += f"{numero} 0 obj\n{objeto}\nendobj\n".encode()
+    xref = len(saida)
+    saida += f"xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n".encode()
+    saida += "".join(f"{p:010d} 00000 n \n" for p in posicoes).encode()
+    saida += f"trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    caminho.write_bytes(saida)
+
+
+async def comparar(caminho, **kwargs):
+    reader = PDFReader()
+    monolitico = agrupar_por_pagina(await reader.async_read(str(caminho), name="relatorio"))
+    ordem = []
+    streaming = {}
+    async for pagina, chunks in ler_paginas_streaming(
+        str(caminho), nome="relatorio", reader=reader, paginas_por_tarefa=2, processos=2, **kwargs
+    ):
+        ordem.append(pagina)
+        streaming[pagina] = chunks
+    assert ordem == sorted(ordem)  # em ordem, à medida que são extraídas
+    return monolitico, streaming
+
+
+def test_paginas_com_numeracao_impressa_iguais_ao_pdf_reader(tmp_path):
+    # Capa sem número e o número impresso no fim de cada página: o PDFReader remove e renumera
+    caminho = tmp_path / "relatorio.pdf"
+    gerar_pdf(caminho, ["Capa do relatorio"] + [f"Receita do trimestre parte {i} {i}" for i in range(1, 6)])
+
+    monolitico, streaming = asyncio.run(comparar(caminho))
+
+    assert sorted(streaming) == sorted(monolitico)
+    for pagina, chunks in monolitico.items():
+        assert hash_pagina(streaming[pagina]) == hash_pagina(chunks)
+
+
+def test_paginas_sem_numeracao_iguais_ao_pdf_reader(tmp_path):
+    caminho = tmp_path / "relatorio.pdf"
+    gerar_pdf(caminho, [f"Texto da pagina {letra}" for letra in "abcde"])
+
+    monolitico, streaming = asyncio.run(comparar(caminho))
+
+    assert sorted(streaming) == sorted(monolitico) == [1, 2, 3, 4, 5]
+    for pagina, chunks in monolitico.items():
+        assert hash_pagina(streaming[pagina]) == hash_pagina(chunks)
+
+
+def test_pdf_maior_que_a_amostra_usa_a_numeracao_do_comeco(tmp_path):
+    caminho = tmp_path / "relatorio.pdf"
+    gerar_pdf(caminho, ["Capa do relatorio"] + [f"Resultado da parte {i} {i}" for i in range(1, 30)])
+
+    monolitico, streaming = asyncio.run(comparar(caminho, paginas_amostra=6))
+
+    assert sorted(streaming) == sorted(monolitico)
+    for pagina, chunks in monolitico.items():
+        assert hash_pagina(streaming[pagina]) == hash_pagina(chunks)
+
+
+def test_numeros_sem_sequencia_ficam_no_texto_como_no_pdf_reader(tmp_path):
+    caminho = tmp_path / "relatorio.pdf"
+    gerar_pdf(caminho, ["Tabela 3", "Nota 1", "Quadro 4", "Anexo 2"])
+
+    monolitico, streaming = asyncio.run(comparar(caminho))
+
+    assert sorted(streaming) == sorted(monolitico) == [1, 2, 3, 4]
+    for pagina, chunks in monolitico.items():
+        assert hash_pagina(streaming[pagina]) == hash_pagina(chunks)
@@ -0,0 +1,126 @@
+#Testes do livro razão (aula_3/livro_razao.py)
+#------------------------------------------
+
+#IMPORTACOES
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from livro_razao import ChaveReutilizada, ContaInexistente, LivroRazao, SaldoInsuficiente
+
+
+@pytest.fixture
+def livro(tmp_path):
+    livro = LivroRazao(tmp_path, saldos_iniciais={"a": 100, "b": 0})
+    yield livro
+    livro.fechar()
+
+
+def test_sem_atualizacao_perdida(tmp_path):
+    livro = LivroRazao(tmp_path, saldos_iniciais={"a": 0})
+    with ThreadPoolExecutor(32) as pool:
+        list(pool.map(lambda _: livro.movimentar([("a", 1)]), range(2000)))
+    livro.fechar()
+    assert livro.saldo("a") == 2000
+    assert livro.estatisticas()["fsyncs"] < 2000  # group commit: menos fsyncs que transações
+
+
+def test_saldo_insuficiente_e_conta_inexistente(livro):
+    with pytest.raises(SaldoInsuficiente):
+        livro.movimentar([("a", -101)])
+    with pytest.raises(ContaInexistente):
+        livro.movimentar([("x", 1)])
+    assert livro.saldo("a") == 100
+
+
+def test_lote_atomico(livro):
+    with pytest.raises(SaldoInsuficiente):
+        livro.movimentar([("b", 50), ("a", -200)])
+    assert livro.saldos() == {"a": 100, "b": 0}
+    resultado = livro.movimentar([("a", -30), ("b", 30)])
+    assert resultado.saldos == [70, 30]
+
+
+def test_idempotencia(livro):
+    primeiro = livro.movimentar([("a", -10)], chave="k1")
+    repetido = livro.movimentar([("a", -10)], chave="k1")
+    assert repetido.repetida and repetido.seq == primeiro.seq
+    assert livro.saldo("a") == 90
+    with pytest.raises(ChaveReutilizada):
+        livro.movimentar([("a", -20)], chave="k1")
+
+
+def test_recuperacao_com_snapshot(tmp_path):
+    livro = LivroRazao(tmp_path, saldos_iniciais={"a": 0}, snapshot_a_cada=10)
+    for _ in range(25):
+        livro.movimentar([("a", 1)], chave=None)
+    livro.movimentar([("a", 5)], chave="k")
+    livro.fechar()
+    assert livro.estatisticas()["snapshots"] >= 2
+
+    reaberto = LivroRazao(tmp_path)
+    assert reaberto.saldo("a") == 30
+    assert reaberto.estatisticas()["recuperadas"] < 26  # só o que veio depois do snapshot
+    assert reaberto.movimentar([("a", 5)], chave="k").repetida
+    reaberto.fechar()
+
+
+def test_linha_cortada_no_inicio_do_segmento_nao_perde_transacao_nova(tmp_path):
+    livro = LivroRazao(tmp_path, saldos_iniciais={"x": 100})
+    livro.movimentar([("x", 5)])
+    livro.fechar()
+    # Queda no meio da escrita da primeira linha de um segmento novo
+    (tmp_path / "wal-000000000003.log").write_bytes(b"0badc0de {\"seq\":3,\"mo")
+
+    reaberto = LivroRazao(tmp_path)
+    assert reaberto.saldo("x") == 105
+    assert reaberto.movimentar([("x", 7)]).seq == 3
+    reaberto.fechar()
+
+    de_novo = LivroRazao(tmp_path)
+    assert de_novo.saldo("x") == 112
+    de_novo.fechar()
+
+
+def test_buraco_na_sequencia_descarta_o_resto(tmp_path):
+    livro = LivroRazao(tmp_path, saldos_iniciais={"x": 100})
+    livro.fechar()
+    orfao = LivroRazao(tmp_path)  # escreve seq 2 e 3 em wal-2
+    orfao.movimentar([("x", 1)])
+    orfao.movimentar([("x", 1)])
+    orfao.fechar()
+    segmento = tmp_path / "wal-000000000002.log"
+    linhas = segmento.read_bytes().splitlines(keepends=True)
+    segmento.write_bytes(linhas[1])  # some o seq 2: sobra só o 3
+
+    reaberto = LivroRazao(tmp_path)
+    assert reaberto.saldo("x") == 100
+    assert reaberto.movimentar([("x", 10)]).seq == 2
+    reaberto.fechar()
+    assert LivroRazao(tmp_path).saldo("x") == 110
+
+
+def test_erro_no_snapshot_nao_trava_o_escritor(tmp_path, monkeypatch):
+    livro = LivroRazao(tmp_path, saldos_iniciais={"a": 0}, snapshot_a_cada=1)
+    monkeypatch.setattr("livro_razao.json.dump", lambda *a, **k: (_ for _ in ()).throw(OSError("disco cheio")))
+    for _ in range(3):
+        futuro = livro.enviar([("a", 1)])
+        assert futuro.result(timeout=5).saldos
+    livro.fechar()
+    assert LivroRazao(tmp_path).saldo("a") == 3
+
+
+def test_erro_ao_apagar_segmento_antigo_nao_trava_o_escritor(tmp_path, monkeypatch):
+    livro = LivroRazao(tmp_path, saldos_iniciais={"a": 0}, snapshot_a_cada=1)
+
+    def falhar(self, missing_ok=False):
+        raise OSError("permissão negada")
+
+    monkeypatch.setattr("livro_razao.Path.unlink", falhar)
+    for _ in range(3):
+        futuro = livro.enviar([("a", 1)])
+        assert futuro.result(timeout=5).saldos
+    livro.fechar()
+    monkeypatch.undo()
+    assert livro.estatisticas()["snapshots"] >= 1
+    assert LivroRazao(tmp_path).saldo("a") == 3
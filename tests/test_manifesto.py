@@ -0,0 +1,104 @@
+#Testes do manifesto de ingestão e da ingestão incremental (deploy/manifesto.py, deploy/ingestao.py)
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+from hashlib import md5
+from typing import List
+
+import pytest
+from agno.knowledge.document import Document
+from agno.knowledge.reader.pdf_reader import PDFReader
+from agno.vectordb.chroma import ChromaDb
+
+import ingestao
+from ingestao import id_chunk, ingerir_pdf_incremental
+from manifesto import Manifesto
+
+
+class LeitorPaginas(PDFReader):
+    """Reader falso: cada linha do arquivo é uma página com um único chunk."""
+
+    async def async_read(self, pdf, name=None, password=None) -> List[Document]:
+        linhas = pdf.read().decode().splitlines()
+        return [Document(name=name, content=texto, meta_data={"page": i}) for i, texto in enumerate(linhas, start=1)]
+
+
+class EmbedderFake:
+    dimensions = 4
+
+    async def async_embed_lote(self, textos: List[str]) -> List[List[float]]:
+        return [[b / 255 for b in md5(t.encode()).digest()[:4]] for t in textos]
+
+
+@pytest.fixture
+def ambiente(tmp_path):
+    vector_db = ChromaDb(collection="teste", path=str(tmp_path / "chroma"), persistent_client=True, embedder=EmbedderFake())
+    manifesto = Manifesto(db_file=str(tmp_path / "manifesto.db"))
+    arquivo = tmp_path / "relatorio.txt"
+
+    def ingerir(*paginas: str):
+        arquivo.write_text("\n".join(paginas))
+        return asyncio.run(ingerir_pdf_incremental(
+            vector_db, str(arquivo), reader=LeitorPaginas(), manifesto=manifesto, batch_size=1,
+        ))
+
+    def conteudos() -> List[str]:
+        return sorted(vector_db.client.get_collection(name="teste").get()["documents"])
+
+    return ingerir, conteudos, manifesto, str(arquivo)
+
+
+def test_pagina_inserida_no_meio_nao_apaga_chunks_deslocados(ambiente):
+    ingerir, conteudos, manifesto, _ = ambiente
+    ingerir("Alpha", "Bravo", "Charlie")
+
+    resultado = ingerir("Alpha", "Zulu", "Bravo", "Charlie")
+
+    assert conteudos() == ["Alpha", "Bravo", "Charlie", "Zulu"]
+    assert resultado.chunks_removidos == 0
+    assert manifesto.estatisticas()["chunks"] == 4
+
+
+def test_pagina_removida_apaga_so_o_chunk_dela(ambiente):
+    ingerir, conteudos, _, _ = ambiente
+    ingerir("Alpha", "Bravo", "Charlie")
+
+    resultado = ingerir("Alpha", "Charlie")
+
+    assert conteudos() == ["Alpha", "Charlie"]
+    assert resultado.chunks_removidos == 1
+
+
+def test_execucao_interrompida_apaga_os_obsoletos_na_retomada(ambiente, monkeypatch):
+    ingerir, conteudos, manifesto, fonte = ambiente
+    ingerir("Alpha", "Bravo", "Charlie")
+
+    # Todas as páginas concluídas, e o processo cai antes de apagar os chunks obsoletos
+    def cair(*args):
+        raise RuntimeError("processo interrompido")
+
+    monkeypatch.setattr(ingestao, "remover_chunks", cair)
+    with pytest.raises(RuntimeError):
+        ingerir("Alpha", "Zulu", "Charlie")
+    monkeypatch.undo()
+    assert "Bravo" in conteudos()
+    assert manifesto.remocoes_pendentes(fonte) == [id_chunk("Bravo")]
+
+    resultado = ingerir("Alpha", "Zulu", "Charlie")
+
+    assert conteudos() == ["Alpha", "Charlie", "Zulu"]
+    assert resultado.chunks_removidos == 1
+    assert manifesto.remocoes_pendentes(fonte) == []
+
+
+def test_chunk_reaproveitado_sai_das_remocoes_pendentes(tmp_path):
+    manifesto = Manifesto(db_file=str(tmp_path / "manifesto.db"))
+    manifesto.concluir_pagina("pdf", 1, "h1", {"a"})
+    manifesto.concluir_pagina("pdf", 2, "h2", {"b"})
+
+    # A página 2 muda antes de a página 3 (nova) usar o chunk que era dela
+    assert manifesto.concluir_pagina("pdf", 2, "h2'", {"z"}) == ["b"]
+    manifesto.concluir_pagina("pdf", 3, "h3", {"b"})
+
+    assert manifesto.remocoes_pendentes("pdf") == []
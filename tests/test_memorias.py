@@ -0,0 +1,35 @@
+#Testes da fila de memórias compartilhada entre processos (deploy/memorias.py)
+#------------------------------------------
+
+#IMPORTACOES
+import time
+
+from memorias import MemoriaAdiada
+
+
+def fila(tmp_path, **kwargs) -> MemoriaAdiada:
+    # Sem workers: o teste chama _reservar direto, como cada processo faria
+    return MemoriaAdiada(db_file=str(tmp_path / "agent.db"), trabalhadores=0, debounce=0, **kwargs)
+
+
+def test_worker_novo_nao_rouba_lote_em_andamento(tmp_path):
+    primeiro = fila(tmp_path)
+    primeiro.create_user_memories(message="oi", user_id="u1")
+    lote = primeiro._reservar()
+    assert lote and lote[0][0] == "u1"
+
+    segundo = fila(tmp_path)  # outro processo subindo
+    segundo.create_user_memories(message="de novo", user_id="u1")
+    assert segundo._reservar() is None  # u1 já está com o primeiro
+
+
+def test_lote_de_processo_morto_volta_quando_o_prazo_vence(tmp_path):
+    morto = fila(tmp_path, lease=0.05)
+    morto.create_user_memories(message="oi", user_id="u1")
+    assert morto._reservar()
+
+    vivo = fila(tmp_path)
+    assert vivo._reservar() is None
+    time.sleep(0.1)
+    retomado = vivo._reservar()
+    assert retomado and retomado[0][0] == "u1"
@@ -0,0 +1,74 @@
+#Testes da instrumentação por requisição (deploy/metricas.py)
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from metricas import Metricas, instalar_metricas
+
+
+def criar_app(**kwargs) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/stream")
+    async def stream():
+        async def eventos():
+            yield "data: 1\n\n"
+
+        return StreamingResponse(eventos(), media_type="text/event-stream")
+
+    instalar_metricas(app, metricas=Metricas(), permitir_perfil=True, **kwargs)
+    return app
+
+
+async def desconectar_antes_do_corpo(app):
+    """Cliente que cai antes de receber os cabeçalhos: o corpo da resposta nunca é lido."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/stream", "raw_path": b"/stream", "root_path": "",
+        "query_string": b"", "headers": [(b"host", b"teste"), (b"x-perfil", b"1")],
+        "client": ("127.0.0.1", 1), "server": ("teste", 80),
+    }
+    mensagens = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if mensagens:
+            return mensagens.pop(0)
+        await asyncio.sleep(3600)
+
+    async def send(mensagem):
+        raise OSError("conexão fechada")
+
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        pass
+    await asyncio.sleep(0.2)  # passa do prazo_stream
+
+
+def test_corpo_nunca_lido_fecha_rastro_e_perfil_no_prazo():
+    app = criar_app(prazo_stream=0.05)
+    asyncio.run(desconectar_antes_do_corpo(app))
+
+    cliente = TestClient(app)
+    (rastro,) = cliente.get("/metrics/rastros").json()["rastros"]
+    assert rastro["rota"] == "/stream"
+    assert cliente.get(f"/metrics/perfis/{rastro['id']}").status_code == 200
+
+    # O perfil foi liberado: a próxima requisição consegue perfilar
+    resposta = cliente.get("/stream", headers={"X-Perfil": "1"})
+    assert resposta.headers["X-Perfil"] != "ocupado"
+
+
+def test_stream_lido_ate_o_fim_gera_rastro_com_server_timing():
+    cliente = TestClient(criar_app())
+    resposta = cliente.get("/stream")
+
+    assert resposta.text == "data: 1\n\n"
+    assert "Server-Timing" in resposta.headers
+    ids = [r["id"] for r in cliente.get("/metrics/rastros").json()["rastros"]]
+    assert ids == [resposta.headers["X-Requisicao-Id"]]
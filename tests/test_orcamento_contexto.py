@@ -0,0 +1,88 @@
+#Testes do orçamento de tokens do contexto (deploy/orcamento_contexto.py)
+#------------------------------------------
+
+#IMPORTACOES
+from agno.models.message import Message
+
+from orcamento_contexto import OrcamentoContexto, contar_tokens
+
+
+def historico(*pares):
+    mensagens = []
+    for pergunta, resposta in pares:
+        mensagens.append(Message(role="user", content=pergunta, from_history=True))
+        mensagens.append(Message(role="assistant", content=resposta, from_history=True))
+    return mensagens
+
+
+def tokens(mensagens) -> int:
+    return sum(contar_tokens(m.get_content_string()) for m in mensagens if m.from_history)
+
+
+def test_chunks_param_no_orcamento_e_redundantes_saem():
+    orcamento = OrcamentoContexto(max_tokens_knowledge=120, max_tokens_trecho=1000)
+    repetido = "A receita líquida do trimestre foi de 612,3 milhões, alta de oito por cento sobre o ano anterior."
+    documentos = [
+        {"name": "pdf", "content": repetido, "meta_data": {"page": 1, "chunk": 0}},
+        {"name": "pdf", "content": repetido + " Fim.", "meta_data": {"page": 2}},
+        {"name": "pdf", "content": "Outro assunto sem relação " * 40, "meta_data": {"page": 3}},
+    ]
+
+    escolhidos = orcamento.selecionar("Qual foi a receita líquida?", documentos, limite=3, run_id="r1")
+
+    assert escolhidos[0]["content"] == repetido
+    assert escolhidos[0]["meta_data"] == {"page": 1}  # só os metadados úteis
+    assert sum(contar_tokens(d["content"]) for d in escolhidos) <= 120
+    assert orcamento.estatisticas()["chunks_redundantes"] == 1
+    relatorio = orcamento.relatorio("r1")
+    assert relatorio["knowledge_depois"] < relatorio["knowledge_antes"]
+
+
+def test_chunk_longo_reduzido_aos_trechos_com_os_termos():
+    orcamento = OrcamentoContexto(max_tokens_trecho=40)
+    conteudo = " ".join(f"Frase de enchimento número {i}." for i in range(30)) + " O EBITDA ajustado foi 98,7."
+
+    (escolhido,) = orcamento.selecionar("EBITDA ajustado", [{"content": conteudo}], limite=1)
+
+    assert "EBITDA ajustado foi 98,7" in escolhido["content"]
+    assert "número 0." not in escolhido["content"]  # o começo irrelevante foi cortado
+    assert contar_tokens(escolhido["content"]) <= 40
+
+
+def test_historico_perde_as_ferramentas_e_resume_as_respostas_antigas():
+    antigas = [
+        Message(role="user", content="Qual a receita?", from_history=True),
+        Message(role="assistant", content="", tool_calls=[{"id": "1", "type": "function"}], from_history=True),
+        Message(role="tool", content="resultado da busca " * 50, tool_call_id="1", from_history=True),
+        Message(role="assistant", content="A receita foi 612,3. " * 20, from_history=True),
+    ]
+    orcamento = OrcamentoContexto(max_tokens_historico=60, tokens_resumo=10)
+    atual = Message(role="user", content="E o lucro?")
+
+    ajustadas = orcamento.ajustar_historico(antigas + [atual], run_id="r1")
+
+    assert [m.role for m in ajustadas] == ["user", "assistant", "user"]
+    assert ajustadas[-1] is atual
+    assert tokens(ajustadas) <= 60
+    assert contar_tokens(ajustadas[1].get_content_string()) < contar_tokens(antigas[3].get_content_string())
+
+
+def test_historico_acima_do_orcamento_descarta_pergunta_e_resposta_juntas():
+    mensagens = historico(*[(f"Pergunta {i} " * 10, f"Resposta {i} " * 10) for i in range(4)])
+    atual = Message(role="user", content="Pergunta atual")
+    orcamento = OrcamentoContexto(max_tokens_historico=tokens(mensagens[-3:]), tokens_resumo=1000)
+
+    ajustadas = orcamento.ajustar_historico(mensagens + [atual])
+
+    antigas = [m for m in ajustadas if m.from_history]
+    assert [m.role for m in antigas] == ["user", "assistant"] * (len(antigas) // 2)
+    assert antigas and antigas[0].role == "user"
+    assert tokens(ajustadas) <= orcamento.max_tokens_historico
+    assert ajustadas[-1] is atual
+
+
+def test_historico_dentro_do_orcamento_fica_igual():
+    mensagens = historico(("Qual a receita?", "612,3 milhões"))
+    orcamento = OrcamentoContexto(max_tokens_historico=1000)
+
+    assert orcamento.ajustar_historico(mensagens) == mensagens
@@ -0,0 +1,43 @@
+#Testes do SqliteDb com group commit (deploy/sessoes.py)
+#------------------------------------------
+
+#IMPORTACOES
+import pytest
+from agno.run.agent import RunOutput
+from agno.session import AgentSession
+from sqlalchemy import text
+
+from sessoes import SqliteDbOtimizado
+
+
+def sessao(*conteudos: str) -> AgentSession:
+    runs = [RunOutput(run_id=f"run-{i}", session_id="s1", agent_id="a1", content=c) for i, c in enumerate(conteudos)]
+    return AgentSession(session_id="s1", agent_id="a1", user_id="u1", runs=runs)
+
+
+def runs_gravados(db) -> int:
+    with db.db_engine.connect() as conn:
+        return conn.execute(text(f"SELECT COUNT(*) FROM {db.tabela_runs}")).scalar()
+
+
+def test_run_de_transacao_que_falhou_e_regravado_no_proximo_lote(tmp_path):
+    db = SqliteDbOtimizado(db_file=str(tmp_path / "agent.db"), aguardar_commit=True, intervalo_compactacao=0)
+    tabela = db.tabela_runs
+    db.tabela_runs = "tabela_que_nao_existe"  # o INSERT dos runs falha e a transação volta
+    with pytest.raises(Exception):
+        db.upsert_session(sessao("primeira resposta"))
+    db.tabela_runs = tabela
+
+    db.upsert_session(sessao("primeira resposta"))
+
+    assert runs_gravados(db) == 1
+    assert db.estatisticas()["runs_iguais"] == 0
+
+
+def test_run_sem_mudanca_nao_e_reescrito(tmp_path):
+    db = SqliteDbOtimizado(db_file=str(tmp_path / "agent.db"), aguardar_commit=True, intervalo_compactacao=0)
+    db.upsert_session(sessao("primeira resposta"))
+    db.upsert_session(sessao("primeira resposta", "segunda resposta"))
+
+    assert runs_gravados(db) == 2
+    assert db.estatisticas()["runs_iguais"] == 1
@@ -0,0 +1,89 @@
+#Testes da fila de ingestão em segundo plano (deploy/tarefas_ingestao.py)
+#------------------------------------------
+
+#IMPORTACOES
+import asyncio
+import threading
+import time
+
+import httpx
+from fastapi import FastAPI
+
+import tarefas_ingestao
+from tarefas_ingestao import FilaIngestao, instalar_rotas_ingestao
+
+
+def test_submeter_e_cancelar_de_outra_thread(tmp_path):
+    async def cenario():
+        executadas, comecou, liberar = [], asyncio.Event(), asyncio.Event()
+
+        async def executar(url, metadata):
+            executadas.append(url)
+            comecou.set()
+            await liberar.wait()
+
+        fila = FilaIngestao(executar, db_file=str(tmp_path / "tarefas.db"))
+        fila.iniciar()
+        await asyncio.sleep(0.05)  # worker parado no get() da fila vazia
+
+        # Como uma rota síncrona faria (threadpool)
+        submetidas = []
+        threading.Thread(target=lambda: submetidas.append(fila.submeter("http://x/a.pdf"))).start()
+        # Loop ocioso (nenhum timer curto): o worker só acorda se a fila foi avisada pelo próprio loop
+        inicio = time.perf_counter()
+        await asyncio.wait_for(comecou.wait(), timeout=3)
+        assert time.perf_counter() - inicio < 1
+        assert executadas == ["http://x/a.pdf"]
+        tarefa = submetidas[0]
+
+        await asyncio.to_thread(fila.cancelar, tarefa.id)
+        for _ in range(100):
+            if fila.status(tarefa.id).status == "cancelada":
+                break
+            await asyncio.sleep(0.01)
+        assert fila.status(tarefa.id).status == "cancelada"
+        await fila.parar()
+
+    asyncio.run(cenario())
+
+
+def test_tarefa_submetida_durante_o_snapshot_espera_ele_terminar(tmp_path, monkeypatch):
+    gravando, terminar = threading.Event(), threading.Event()
+
+    def criar_snapshot(arquivo, caminhos):
+        gravando.set()
+        terminar.wait(timeout=5)
+        return {"arquivo": arquivo}
+
+    monkeypatch.setattr(tarefas_ingestao, "criar_snapshot", criar_snapshot)
+
+    async def cenario():
+        executadas = []
+
+        async def executar(url, metadata):
+            executadas.append(url)
+
+        fila = FilaIngestao(executar, db_file=str(tmp_path / "tarefas.db"))
+        fila.iniciar()
+        app = FastAPI()
+        instalar_rotas_ingestao(app, fila, contar_chunks=lambda: 0, snapshot=str(tmp_path / "indice.tar.gz"))
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://teste") as cliente:
+            snapshot = asyncio.create_task(cliente.post("/ingestao/snapshot"))
+            while not gravando.is_set():
+                await asyncio.sleep(0.01)
+
+            assert (await cliente.post("/ingestao/tarefas", json={"url": "http://x/a.pdf"})).status_code == 202
+            assert (await cliente.post("/ingestao/snapshot")).status_code == 409
+            await asyncio.sleep(0.1)
+            assert executadas == []  # nada escreve no índice enquanto o tar é gravado
+
+            terminar.set()
+            assert (await snapshot).status_code == 200
+            for _ in range(100):
+                if executadas:
+                    break
+                await asyncio.sleep(0.01)
+        assert executadas == ["http://x/a.pdf"]
+        await fila.parar()
+
+    asyncio.run(cenario())
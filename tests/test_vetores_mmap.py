@@ -0,0 +1,113 @@
+#Testes do vector DB em memória mapeada (deploy/vetores_mmap.py)
+#------------------------------------------
+
+#IMPORTACOES
+import numpy as np
+import pytest
+from agno.knowledge.embedder import Embedder
+
+from vetores_mmap import VetoresMmap
+
+
+def base() -> np.ndarray:
+    """Oito vetores em 8 dimensões: o item i aponta para o eixo i (mais um ruído pequeno)."""
+    return np.eye(8, dtype=np.float32) + 0.01
+
+
+def abrir(tmp_path, **kwargs) -> VetoresMmap:
+    return VetoresMmap(collection="teste", path=str(tmp_path), embedder=Embedder(), **kwargs)
+
+
+def gravar(db, indices, versao="v1"):
+    vetores = base()
+    db.gravar(
+        [f"chunk-{i}" for i in indices],
+        vetores[indices],
+        [f"Trecho {i} {versao}" for i in indices],
+        [{"page": i // 2 + 1, "name": "relatorio"} for i in indices],
+    )
+
+
+def mais_proximo(db, i, **kwargs):
+    (documento,) = db.buscar_por_vetor(base()[i], limit=1, **kwargs) or [None]
+    return documento
+
+
+def test_gravar_e_buscar_o_vizinho_exato(tmp_path):
+    db = abrir(tmp_path)
+    gravar(db, list(range(8)))
+
+    documento = mais_proximo(db, 5)
+
+    assert documento.id == "chunk-5" and documento.content == "Trecho 5 v1"
+    assert documento.name == "relatorio" and documento.meta_data["page"] == 3
+    assert documento.meta_data["distances"] < 1e-6
+    assert db.get_count() == 8
+
+
+def test_upsert_e_delete_viram_lapides(tmp_path):
+    db = abrir(tmp_path, limite_lapides=0.9)
+    gravar(db, list(range(8)))
+
+    gravar(db, [2], versao="v2")
+    assert db.delete_by_id("chunk-3")
+
+    assert mais_proximo(db, 2).content == "Trecho 2 v2"
+    assert mais_proximo(db, 3).id != "chunk-3"
+    assert db.estatisticas()["lapides"] == 2 and db.get_count() == 7
+
+
+def test_compactacao_mantem_os_resultados_e_apaga_o_arquivo_antigo(tmp_path):
+    db = abrir(tmp_path, limite_lapides=0.9)
+    gravar(db, list(range(8)))
+    db.remover_ids(["chunk-0", "chunk-1", "chunk-6"])
+    antes = {i: mais_proximo(db, i).id for i in (2, 3, 4, 5, 7)}
+
+    db.compactar()
+
+    assert {i: mais_proximo(db, i).id for i in antes} == antes
+    assert db.estatisticas()["lapides"] == 0 and db.get_count() == 5
+    assert [p.name for p in (tmp_path / "teste").glob("vetores-*.bin")] == [db._arquivo]
+
+
+def test_filtro_por_metadados(tmp_path):
+    db = abrir(tmp_path)
+    gravar(db, list(range(8)))
+
+    documento = mais_proximo(db, 0, filters={"page": 4})
+
+    assert documento.id in {"chunk-6", "chunk-7"}
+    assert mais_proximo(db, 0, filters={"page": 99}) is None
+
+
+def test_dimensoes_diferentes_sao_rejeitadas(tmp_path):
+    db = abrir(tmp_path)
+    gravar(db, [0, 1])
+
+    with pytest.raises(ValueError):
+        db.gravar(["chunk-x"], [[1.0, 0.0, 0.0]], ["Outro modelo"], [{}])
+    assert db.get_count() == 2
+
+
+def test_leitor_recarrega_quando_a_compactacao_troca_o_arquivo_no_meio(tmp_path):
+    escritor = abrir(tmp_path, limite_lapides=0.9)
+    gravar(escritor, list(range(8)))
+    leitor = abrir(tmp_path, somente_leitura=True)
+    assert mais_proximo(leitor, 4).id == "chunk-4"
+    escritor.remover_ids(["chunk-0", "chunk-1", "chunk-2"])
+
+    # O leitor lê o meta (arquivo antigo) e, antes de abrir a matriz, o escritor compacta
+    abrir_matriz = leitor._abrir_matriz
+    compactou = []
+
+    def compactar_antes(*args):
+        if not compactou:
+            compactou.append(True)
+            escritor.compactar()
+        return abrir_matriz(*args)
+
+    leitor._abrir_matriz = compactar_antes
+
+    assert mais_proximo(leitor, 4).id == "chunk-4"
+    assert compactou and leitor._arquivo == escritor._arquivo
+    assert leitor.get_count() == 5